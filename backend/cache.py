@@ -1,8 +1,11 @@
 # backend/cache.py
+from collections import OrderedDict
 from functools import lru_cache
-from typing import Dict, Any, List
+from typing import Dict, Any, Hashable, List, Optional
+import threading
 import time
 from backend.logger_config import logger
+from backend.metrics import CACHE_REQUESTS
 
 # Simple in-memory cache with TTL
 _cache: Dict[str, tuple[Any, float]] = {}
@@ -15,10 +18,12 @@ def get_cached(key: str) -> Any:
         value, timestamp = _cache[key]
         if time.time() - timestamp < CACHE_TTL:
             logger.debug(f"Cache hit: {key}")
+            CACHE_REQUESTS.inc(cache="response", result="hit")
             return value
         else:
             logger.debug(f"Cache expired: {key}")
             del _cache[key]
+    CACHE_REQUESTS.inc(cache="response", result="miss")
     return None
 
 
@@ -32,3 +37,54 @@ def clear_cache() -> None:
     """Clear all cache entries."""
     _cache.clear()
     logger.info("Cache cleared")
+
+
+class TTLCache:
+    """Thread-safe, size-bounded cache with per-entry TTL; evicts least recently used entries."""
+
+    def __init__(self, maxsize: int, ttl: float, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Hits and misses are counted in pista_cache_requests_total for named caches
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        value = self._get(key)
+        if self.name is not None:
+            CACHE_REQUESTS.inc(cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def _get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
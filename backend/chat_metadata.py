@@ -0,0 +1,216 @@
+# backend/chat_metadata.py
+"""
+Compact storage of assistant message metadata in chat_messages.metadata.
+
+Assistant messages used to store the full result dicts (descriptions, designer
+lists, shared/missing/extra feature lists) for every result. Now only references
+are written: game ids, scores and the other per-result values that cannot be looked
+up again, plus the scoring version. Catalog fields and feature lists are rehydrated
+from the games table and the feature incidence when a thread is read. Both are only
+dropped when the games row or the incidence reproduces them exactly at write time
+(a comparison result's "A vs B" name is not game A's name); any field that cannot be
+rebuilt stays in the stored residual, so rehydration returns the same shape as before.
+
+The residual JSON is zstd-compressed when the optional `zstandard` package is
+installed (stored as "zstd:" + base64). Legacy plain-JSON rows are read unchanged.
+"""
+import base64
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from backend.collection_analysis import ANALYSIS_FACETS
+from backend.db import execute_query
+from backend.feature_incidence import FacetIncidence, get_incidence
+from backend.logger_config import logger
+from backend.similarity_engine import SCORING_VERSION
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+METADATA_FORMAT_VERSION = 2
+ZSTD_PREFIX = "zstd:"
+ZSTD_LEVEL = 9
+
+# Result fields that are a pure function of the games row (and its designers)
+GAME_FIELDS = (
+    "name",
+    "thumbnail",
+    "average_rating",
+    "num_ratings",
+    "year_published",
+    "description",
+    "min_players",
+    "max_players",
+    "avg_weight",
+    "designers",
+)
+FEATURE_PREFIXES = ("shared", "missing", "extra")
+
+QUERY_GAME_FIELDS = """SELECT id, name, thumbnail, average_rating, num_ratings, year_published, description,
+                              min_players, max_players, avg_weight
+                       FROM games WHERE id = ANY(%s)"""
+QUERY_GAME_DESIGNERS = """SELECT gd.game_id, d.name FROM designers d
+                          JOIN game_designers gd ON gd.designer_id = d.id
+                          WHERE gd.game_id = ANY(%s) ORDER BY gd.game_id, d.name"""
+
+
+def _feature_lists(incidence: Dict[str, FacetIncidence], base_game_id: int, game_id: int) -> Dict[str, List[str]]:
+    """shared_/missing_/extra_<facet> lists of game_id relative to the base game, as the engine builds them."""
+    lists = {}
+    for facet_name in ANALYSIS_FACETS:
+        facet = incidence[facet_name]
+        base = facet.feature_names(facet.features(base_game_id))
+        other = facet.feature_names(facet.features(game_id))
+        lists[f"shared_{facet_name}"] = sorted(base & other)
+        lists[f"missing_{facet_name}"] = sorted(base - other)
+        lists[f"extra_{facet_name}"] = sorted(other - base)
+    return lists
+
+
+def _rebuildable_game_keys(conn, results: List[Dict[str, Any]]) -> List[str]:
+    """Catalog keys present in every result and equal to the games row of every result."""
+    keys = set.intersection(*(set(r) & set(GAME_FIELDS) for r in results))
+    if not keys:
+        return []
+    try:
+        games = fetch_game_fields(conn, sorted({r["game_id"] for r in results}))
+    except Exception as e:
+        logger.warning(f"Game rows unavailable, storing catalog fields inline: {e}")
+        return []
+    for result in results:
+        game = games.get(result["game_id"])
+        keys = {k for k in keys if game is not None and game.get(k) == result[k]}
+        if not keys:
+            break
+    return sorted(keys)
+
+
+def _rebuildable_feature_keys(results: List[Dict[str, Any]], base_game_id: Optional[int]) -> List[str]:
+    """Feature-list keys present in every result and reproduced exactly by the incidence."""
+    if base_game_id is None or not results:
+        return []
+    candidates = {f"{prefix}_{facet}" for prefix in FEATURE_PREFIXES for facet in ANALYSIS_FACETS}
+    keys = set.intersection(*(set(r) & candidates for r in results))
+    if not keys:
+        return []
+    try:
+        incidence = get_incidence()
+    except Exception as e:
+        logger.warning(f"Feature incidence unavailable, storing feature lists inline: {e}")
+        return []
+    for result in results:
+        rebuilt = _feature_lists(incidence, base_game_id, result["game_id"])
+        keys = {k for k in keys if rebuilt[k] == result[k]}
+        if not keys:
+            break
+    return sorted(keys)
+
+
+def _encode(payload: Dict[str, Any]) -> str:
+    text = json.dumps(payload, separators=(",", ":"), default=str)
+    if zstandard is None:
+        return text
+    compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(text.encode("utf-8"))
+    return ZSTD_PREFIX + base64.b64encode(compressed).decode("ascii")
+
+
+def _decode(raw: str) -> Dict[str, Any]:
+    if raw.startswith(ZSTD_PREFIX):
+        if zstandard is None:
+            raise RuntimeError("Chat metadata is zstd-compressed but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(base64.b64decode(raw[len(ZSTD_PREFIX) :])).decode("utf-8")
+    return json.loads(raw)
+
+
+def pack_metadata(conn, results: Optional[List[Dict[str, Any]]], query_spec: Optional[Dict[str, Any]]) -> str:
+    """Serialise assistant metadata as compact references (see module docstring)."""
+    if not results or not all(isinstance(r, dict) and isinstance(r.get("game_id"), int) for r in results):
+        # Nothing to reference (or results without ids): store as-is
+        return _encode({"results": results, "query_spec": query_spec})
+
+    base_game_id = (query_spec or {}).get("base_game_id")
+    try:
+        base_game_id = int(base_game_id) if base_game_id is not None else None
+    except (TypeError, ValueError):
+        base_game_id = None
+
+    game_keys = _rebuildable_game_keys(conn, results)
+    feature_keys = _rebuildable_feature_keys(results, base_game_id)
+    dropped = set(game_keys) | set(feature_keys)
+
+    return _encode(
+        {
+            "v": METADATA_FORMAT_VERSION,
+            "scoring_version": SCORING_VERSION,
+            "query_spec": query_spec,
+            "base_game_id": base_game_id,
+            "game_fields": game_keys,
+            "feature_fields": feature_keys,
+            "results": [{k: v for k, v in r.items() if k not in dropped} for r in results],
+        }
+    )
+
+
+def fetch_game_fields(conn, game_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    if not game_ids:
+        return {}
+    cur = execute_query(conn, QUERY_GAME_FIELDS, (game_ids,))
+    games = {}
+    for row in cur.fetchall():
+        games[row[0]] = {
+            "name": row[1] or f"Game {row[0]}",
+            "thumbnail": row[2],
+            "average_rating": row[3],
+            "num_ratings": row[4],
+            "year_published": row[5],
+            "description": row[6] or None,
+            "min_players": row[7],
+            "max_players": row[8],
+            "avg_weight": float(row[9]) if row[9] is not None else None,
+            "designers": [],
+        }
+    cur = execute_query(conn, QUERY_GAME_DESIGNERS, (game_ids,))
+    for game_id, designer in cur.fetchall():
+        if game_id in games:
+            games[game_id]["designers"].append(designer)
+    return games
+
+
+def unpack_metadata(conn, raw_values: Iterable[Optional[str]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Decode stored metadata values, rehydrating compact ones in a single batch.
+
+    Returns {"results": [...], "query_spec": ...} (or the legacy dict) per value, None for NULLs.
+    """
+    decoded: List[Optional[Dict[str, Any]]] = [_decode(raw) if raw else None for raw in raw_values]
+    compact = [m for m in decoded if m and m.get("v") == METADATA_FORMAT_VERSION]
+    if not compact:
+        return decoded
+
+    game_ids = sorted({r["game_id"] for m in compact if m["game_fields"] for r in m["results"]})
+    games = fetch_game_fields(conn, game_ids)
+    incidence = get_incidence() if any(m["feature_fields"] for m in compact) else None
+
+    hydrated: List[Optional[Dict[str, Any]]] = []
+    for metadata in decoded:
+        if not metadata or metadata.get("v") != METADATA_FORMAT_VERSION:
+            hydrated.append(metadata)
+            continue
+        results = []
+        for stored in metadata["results"]:
+            gid = stored["game_id"]
+            result = dict(stored)
+            game = games.get(gid, {"name": f"Game {gid}", "designers": []})
+            for key in metadata["game_fields"]:
+                result[key] = game.get(key)
+            if metadata["feature_fields"]:
+                lists = _feature_lists(incidence, metadata["base_game_id"], gid)
+                for key in metadata["feature_fields"]:
+                    result[key] = lists[key]
+            results.append(result)
+        hydrated.append(
+            {"results": results, "query_spec": metadata["query_spec"], "scoring_version": metadata["scoring_version"]}
+        )
+    return hydrated
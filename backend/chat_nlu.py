@@ -185,6 +185,72 @@ def resolve_game_candidates(
     return final[:max_candidates]
 
 
+# Phrases after which mentioned games are ones to move away from ("like A but not B")
+NEGATION_CUES = ("but not", "not like", "except", "without", "unlike", "nothing like", "less like")
+# Words that join separately mentioned games ("like A and B", "A, B or C")
+SEED_CONNECTORS = ("and", "or", ",", "&")
+
+
+def _seed_text(text: str) -> str:
+    """normalize(), but keeping the connector punctuation between mentions."""
+    text = text.lower()
+    text = re.sub(r"[^\w\s:,&]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def _linked(gap: str) -> bool:
+    """Whether the text between two mentions joins them as separate games."""
+    words = [rf"\b{w}\b" if re.fullmatch(r"[\w ]+", w) else re.escape(w) for w in SEED_CONNECTORS + NEGATION_CUES]
+    return re.search("|".join(words), gap) is not None
+
+
+def split_seed_games(text: str, candidates: List[Dict[str, Any]]) -> Tuple[List[Any], List[Any]]:
+    """
+    Split resolved candidates into positive and negative seed game ids.
+
+    A game mentioned after a negation cue is negative. Both lists are in the order
+    the games appear in the text.
+
+    A candidate whose match lies inside another's ("catan" in "catan seafarers") is
+    the same mention and is dropped. Several mentions are several games only when
+    each pair of neighbours is joined by a connector or a negation cue; otherwise
+    ("catan that go fast") both lists are empty.
+    """
+    text_norm = _seed_text(text)
+    cue_positions = [m.start() for cue in NEGATION_CUES for m in re.finditer(rf"\b{cue}\b", text_norm)]
+    negation_start = min(cue_positions) if cue_positions else None
+
+    spans = []
+    for c in candidates:
+        match = re.search(rf"\b{re.escape(c['name_key'])}\b", text_norm)
+        if match is None:
+            # Token matches: the first of the name's tokens stands for the mention
+            tokens = c["name_key"].split()
+            match = re.search(rf"\b{re.escape(tokens[0])}\b", text_norm) if tokens else None
+        if match is not None:
+            spans.append((match.start(), match.end(), c["game_id"]))
+
+    mentions = []
+    for i, (start, end, gid) in enumerate(spans):
+        nested = any(
+            other_start <= start and end <= other_end and ((other_start, other_end) != (start, end) or j < i)
+            for j, (other_start, other_end, _) in enumerate(spans)
+            if j != i
+        )
+        if not nested:
+            mentions.append((start, end, gid))
+    mentions.sort(key=lambda m: m[0])
+
+    for (_, prev_end, _), (start, _, _) in zip(mentions, mentions[1:]):
+        if not _linked(text_norm[prev_end:start]):
+            return [], []
+
+    positive = [gid for pos, _, gid in mentions if negation_start is None or pos < negation_start]
+    negative = [gid for pos, _, gid in mentions if negation_start is not None and pos >= negation_start]
+    return positive, negative
+
+
 # -------------------------------------------------------------------
 # interpret_message using multi-game + scores + collection
 # -------------------------------------------------------------------
@@ -279,6 +345,13 @@ def interpret_message(user_id: str, text: str, context: Optional[Dict[str, Any]]
         # Only use candidates if we don't have features in context
         # If features are present, prefer feature-only search over game candidates
         base_game_id = candidates[0]["game_id"]
+        # "like A and B but not C": several seeds become one combined query vector
+        positive, negative = split_seed_games(text, candidates)
+        if positive and (len(positive) > 1 or negative) and "compare" not in text_l:
+            # The best-scoring positive seed is the base game and goes first, so it anchors the search
+            base_game_id = next(c["game_id"] for c in candidates if c["game_id"] in positive)
+            positive.sort(key=lambda gid: gid != base_game_id)
+            query_spec["seed_games"] = {"positive": positive, "negative": negative}
     elif last_game_id and not has_features_in_context:
         # Only use last_game_id if we don't have features in context
         # If features are present, prefer feature-only search
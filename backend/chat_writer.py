@@ -0,0 +1,269 @@
+# backend/chat_writer.py
+"""
+Persistence of chat history.
+
+A request reserves a thread id when it starts a new thread and hands each turn (the
+thread row if new, both messages and the thread timestamp) to ChatWriter, which
+writes it in one transaction.
+
+By default (CHAT_WRITE_BEHIND off) the writer thread is not started and submit()
+commits the turn before the response is sent. Turns are then durable once answered,
+and ordered and visible to every worker, because a follow-up can only arrive after
+the previous turn was committed.
+
+With CHAT_WRITE_BEHIND on, a single writer thread drains a queue and writes the
+turns of many requests in one transaction, off the response path. That trades the
+guarantees above for latency:
+
+- Ordering: entries are written in submission order, and one multi-row INSERT
+  assigns message ids in that order. A batch that cannot be written blocks the
+  ones after it. Across workers there is no order: a follow-up served by another
+  worker can reach the database before the turn that inserts the thread row. Its
+  foreign key violation is retried for FK_RETRY_SECONDS instead of dropping it.
+- Failures: while the database is unreachable (connection errors), the writer
+  retries the unwritten entries with exponential backoff instead of dropping them.
+  Other entries the database rejects (e.g. the thread was deleted) are isolated and
+  dropped, since no retry could write them.
+- Crash-loss window: queued entries live only in this process's memory until
+  committed. That is normally the batch window plus one INSERT, and longer while
+  the database is down. stop() drains the queue on a graceful shutdown, but a
+  SIGKILL, OOM kill or hard deploy inside the window loses chat turns the user
+  already received.
+- Read-your-writes holds per worker only: flush() waits for this process's queue,
+  so history, export and delete handlers on the same worker see every earlier
+  turn. A request served by another uvicorn worker may miss turns still inside
+  the window above.
+"""
+import queue
+import threading
+import time
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+import psycopg2
+import psycopg2.errors
+from psycopg2.extras import execute_values
+
+from backend.db import execute_query, get_connection, put_connection
+from backend.logger_config import logger
+
+QUERY_RESERVE_THREAD_ID = "SELECT nextval(pg_get_serial_sequence('chat_threads', 'id'))"
+QUERY_INSERT_THREADS = "INSERT INTO chat_threads (id, user_id, title) VALUES %s ON CONFLICT (id) DO NOTHING"
+QUERY_INSERT_MESSAGES = "INSERT INTO chat_messages (thread_id, role, message, metadata) VALUES %s"
+QUERY_TOUCH_THREADS = "UPDATE chat_threads SET updated_at = CURRENT_TIMESTAMP WHERE id = ANY(%s)"
+
+BATCH_SIZE = 200
+# How long the writer waits for more entries before committing a partial batch
+BATCH_WINDOW_SECONDS = 0.02
+FLUSH_TIMEOUT_SECONDS = 5.0
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 30.0
+# How long a write whose thread row is missing waits for another worker to insert it
+FK_RETRY_SECONDS = 60.0
+
+# Errors that say nothing about the entries themselves; retrying later can succeed
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class ChatWrite(NamedTuple):
+    thread_id: int
+    user_id: int
+    new_thread_title: Optional[str]  # set when this write creates the thread
+    messages: List[Tuple[str, str, Optional[str]]]  # (role, message, metadata)
+    missing_thread_since: Optional[float] = None  # first foreign key violation (monotonic time)
+
+
+def reserve_thread_id(conn=None) -> int:
+    """Allocate a chat thread id up front so it can be returned before the thread row exists."""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    try:
+        cur = execute_query(conn, QUERY_RESERVE_THREAD_ID)
+        thread_id = cur.fetchone()[0]
+        conn.commit()
+        return thread_id
+    finally:
+        if own_conn:
+            put_connection(conn)
+
+
+def write_chat_batch(conn, writes: List[ChatWrite]) -> None:
+    """Insert new threads, messages and thread timestamps for a batch; the caller commits."""
+    with conn.cursor() as cur:
+        threads = [(w.thread_id, w.user_id, w.new_thread_title) for w in writes if w.new_thread_title is not None]
+        if threads:
+            execute_values(cur, QUERY_INSERT_THREADS, threads, page_size=len(threads))
+        messages = [(w.thread_id, role, message, metadata) for w in writes for role, message, metadata in w.messages]
+        if messages:
+            execute_values(cur, QUERY_INSERT_MESSAGES, messages, page_size=len(messages))
+        cur.execute(QUERY_TOUCH_THREADS, (sorted({w.thread_id for w in writes}),))
+
+
+class ChatWriter:
+    def __init__(self, batch_size: int = BATCH_SIZE, batch_window: float = BATCH_WINDOW_SECONDS):
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._queue: "queue.Queue[ChatWrite]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # submitted/processed counters let flush() wait for everything enqueued before it
+        self._progress = threading.Condition()
+        self._submitted = 0
+        self._processed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+        logger.info("Chat history writer started")
+
+    def stop(self, timeout: float = FLUSH_TIMEOUT_SECONDS) -> None:
+        """Write everything still queued, then stop the writer thread."""
+        if not self.running:
+            return
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, write: ChatWrite) -> None:
+        """Queue a turn, or commit it before returning when the writer thread is not running."""
+        if not self.running:
+            if self._write([write]):
+                logger.error(f"Chat history for thread {write.thread_id} not written")
+            return
+        with self._progress:
+            self._submitted += 1
+        self._queue.put(write)
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT_SECONDS) -> bool:
+        """Wait until every write submitted to this process so far is committed (or rejected); False on timeout."""
+        with self._progress:
+            target = self._submitted
+            return self._progress.wait_for(lambda: self._processed >= target, timeout)
+
+    def _next_batch(self) -> List[ChatWrite]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._write_with_retry(batch)
+            finally:
+                with self._progress:
+                    self._processed += len(batch)
+                    self._progress.notify_all()
+
+    def _write_with_retry(self, batch: List[ChatWrite]) -> None:
+        """Write a batch, retrying with backoff while the database is unreachable."""
+        delay = RETRY_BASE_DELAY_SECONDS
+        pending = self._write(batch)
+        while pending:
+            if self._stop.is_set():
+                # Shutting down and the database is still unreachable
+                logger.error(f"Losing {len(pending)} chat history writes: database unavailable at shutdown")
+                return
+            logger.warning(f"Chat history writes pending ({len(pending)}), retrying in {delay:.1f}s")
+            self._stop.wait(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY_SECONDS)
+            pending = self._write(pending)
+
+    def _retry_later(self, write: ChatWrite, error: Exception) -> Optional[ChatWrite]:
+        """The write to retry when error may resolve itself, else None to drop it."""
+        if not isinstance(error, psycopg2.errors.ForeignKeyViolation) or write.new_thread_title is not None:
+            return None
+        # The thread id was reserved, but the turn that inserts the row may still be queued
+        # on another worker; a deleted thread stops being retried after FK_RETRY_SECONDS
+        now = time.monotonic()
+        since = write.missing_thread_since if write.missing_thread_since is not None else now
+        if now - since >= FK_RETRY_SECONDS:
+            return None
+        logger.warning(f"Chat thread {write.thread_id} not written yet, retrying its messages")
+        return write._replace(missing_thread_since=since)
+
+    def _write(self, batch: List[ChatWrite]) -> List[ChatWrite]:
+        """
+        Write a batch; returns the entries still unwritten after a connection error or
+        a missing thread row (see _retry_later).
+
+        Other entries the database rejects are isolated and dropped; the rest are committed.
+        """
+        try:
+            conn = get_connection()
+        except Exception as e:
+            logger.warning(f"No connection for chat history writes: {e}")
+            return batch
+        try:
+            try:
+                write_chat_batch(conn, batch)
+                conn.commit()
+                return []
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception as e:
+                conn.rollback()
+                if len(batch) == 1:
+                    retry = self._retry_later(batch[0], e)
+                    if retry is not None:
+                        return [retry]
+                    logger.error(f"Dropping chat history write for thread {batch[0].thread_id}: {e}", exc_info=True)
+                    return []
+                logger.warning(f"Chat history batch of {len(batch)} failed, writing entries one by one: {e}")
+            # Isolate the failing entry so the rest of the batch is still persisted
+            for position, write in enumerate(batch):
+                try:
+                    write_chat_batch(conn, [write])
+                    conn.commit()
+                except TRANSIENT_ERRORS as e:
+                    logger.warning(f"Lost the database connection writing chat history: {e}")
+                    return batch[position:]
+                except Exception as e:
+                    conn.rollback()
+                    retry = self._retry_later(write, e)
+                    if retry is not None:
+                        # Keep it and everything after it queued, in order
+                        return [retry] + batch[position + 1 :]
+                    logger.error(f"Dropping chat history write for thread {write.thread_id}: {e}", exc_info=True)
+            return []
+        except TRANSIENT_ERRORS as e:
+            logger.warning(f"Lost the database connection writing chat history: {e}")
+            return batch
+        finally:
+            put_connection(conn)
+
+
+CHAT_WRITER = ChatWriter()
+
+
+def submit_chat_messages(
+    thread_id: int, user_id: Any, messages: List[Tuple[str, str, Optional[str]]], new_thread_title: Optional[str] = None
+) -> None:
+    CHAT_WRITER.submit(ChatWrite(int(thread_id), int(user_id), new_thread_title, messages))
+
+
+def flush_chat_writes(timeout: float = FLUSH_TIMEOUT_SECONDS) -> None:
+    """Make pending chat writes visible before reading history."""
+    if CHAT_WRITER.running and not CHAT_WRITER.flush(timeout):
+        logger.warning(f"Chat history writes still pending after {timeout}s")
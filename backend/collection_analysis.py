@@ -0,0 +1,77 @@
+# backend/collection_analysis.py
+"""
+"Do I need this game?" analysis of a target game against a user's collection.
+
+Works on the cached feature incidence (backend/feature_incidence.py): the
+target-vs-collection meta similarity, the per-facet coverage of the collection and
+the target's features missing from it are computed in one vectorized pass per facet,
+without per-game queries.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+import numpy as np
+
+from backend.feature_incidence import FacetIncidence
+
+# Facets compared for the collection analysis
+ANALYSIS_FACETS = ("mechanics", "categories", "designers", "families")
+
+# Base-case weights of reasoning_utils.compute_meta_similarity (categories and mechanics only)
+SIMILARITY_WEIGHTS = {"mechanics": 0.5, "categories": 0.5}
+
+
+class CollectionAnalysis(NamedTuple):
+    top_matches: List[Tuple[int, float]]  # (game_id, meta similarity), best first
+    unique_features: Dict[str, List[str]]  # target features not present in any collection game
+    avg_unique_rarity: float  # mean rarity weight of unique_features (1.0 if there are none)
+
+
+def facet_jaccard(facet: FacetIncidence, target: np.ndarray, collection_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Jaccard similarity of the target feature set against each collection game.
+
+    Returns (jaccard per collection game, vocabulary positions covered by the collection).
+    """
+    rows = facet.rows(collection_ids)
+    owner, positions = facet.flatten(rows)
+    n = len(collection_ids)
+
+    sizes = np.bincount(owner, minlength=n)
+    shared = np.bincount(owner, weights=np.isin(positions, target), minlength=n)
+    union = sizes + len(target) - shared
+    jaccard = np.divide(shared, union, out=np.zeros(n, dtype="float64"), where=union > 0)
+    return jaccard, np.unique(positions)
+
+
+def analyze_collection(
+    incidence: Dict[str, FacetIncidence], target_game_id: int, collection_ids: Iterable[int], top_n: int = 5
+) -> CollectionAnalysis:
+    """Compare a target game with every game in a collection."""
+    collection = np.asarray(sorted(int(gid) for gid in collection_ids), dtype="int64")
+    similarity = np.zeros(len(collection), dtype="float64")
+    unique_features: Dict[str, List[str]] = {}
+    unique_rarities: List[np.ndarray] = []
+
+    for feature_type in ANALYSIS_FACETS:
+        facet = incidence[feature_type]
+        target = facet.features(target_game_id)
+        jaccard, covered = facet_jaccard(facet, target, collection)
+        similarity += SIMILARITY_WEIGHTS.get(feature_type, 0.0) * jaccard
+
+        novel = np.setdiff1d(target, covered)
+        if len(novel):
+            unique_features[feature_type] = sorted(facet.feature_names(novel))
+            unique_rarities.append(facet.rarity[novel])
+
+    # Stable sort keeps ties in game id order
+    order = np.argsort(-similarity, kind="stable")[:top_n]
+    top_matches = [(int(collection[i]), float(similarity[i])) for i in order]
+
+    rarities = np.concatenate(unique_rarities) if unique_rarities else np.zeros(0)
+    avg_rarity = float(rarities.mean()) if len(rarities) else 1.0
+    return CollectionAnalysis(top_matches, unique_features, avg_rarity)
+
+
+def game_feature_sets(incidence: Dict[str, FacetIncidence], game_id: int) -> Dict[str, Set[str]]:
+    """Feature names of one game per analyzed facet (same sets as get_game_features)."""
+    return {ft: incidence[ft].feature_names(incidence[ft].features(game_id)) for ft in ANALYSIS_FACETS}
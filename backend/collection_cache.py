@@ -0,0 +1,186 @@
+# backend/collection_cache.py
+"""
+Per-user cache of collection ids and their normalized embedding matrix.
+
+/chat reads a user's collection on every request, and "closest in my collection"
+searches compare the query vector against every game in it. Entries hold the id
+set plus a contiguous float32 matrix (built on first use), so those searches are a
+single matrix-vector product. Add/remove/import endpoints patch or invalidate the
+entry in their own worker.
+
+Other workers notice a changed collection through its version: row count, sum of
+game ids and latest added_at, one index-only aggregate per read. When it differs
+from the cached entry's, the ids are reloaded; matrix rows are kept when the ids
+did not change (e.g. this worker already patched them).
+"""
+import threading
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional
+
+import numpy as np
+import faiss
+
+from backend.cache import TTLCache
+from backend.config import COLLECTION_CACHE_MAX_SIZE, COLLECTION_CACHE_TTL_SECONDS
+from backend.db import execute_query, get_connection, put_connection
+from backend.logger_config import logger
+from backend.similarity_engine import decode_embedding
+
+QUERY_GET_COLLECTION_IDS = "SELECT game_id, added_at FROM user_collections WHERE user_id = %s"
+QUERY_GET_COLLECTION_VERSION = """SELECT COUNT(*), COALESCE(SUM(game_id), 0), MAX(added_at)
+                                  FROM user_collections WHERE user_id = %s"""
+QUERY_GET_EMBEDDINGS = "SELECT game_id, vector, vector_json FROM game_embeddings WHERE game_id = ANY(%s)"
+
+
+class CollectionVectors(NamedTuple):
+    """Embeddings of a collection: row i of matrix (L2-normalized) belongs to game_ids[i]."""
+
+    game_ids: np.ndarray  # int64
+    matrix: np.ndarray  # float32, shape (len(game_ids), dim)
+
+
+class _Entry(NamedTuple):
+    ids: FrozenSet[int]
+    version: Optional[tuple]  # (count, sum of game ids, max added_at); None after a local patch
+    vectors: Optional[CollectionVectors]  # None until a similarity search needs it
+
+
+def _version(rows) -> tuple:
+    """Same tuple as QUERY_GET_COLLECTION_VERSION, from (game_id, added_at) rows."""
+    added = [added_at for _, added_at in rows if added_at is not None]
+    return (len(rows), sum(gid for gid, _ in rows), max(added) if added else None)
+
+
+def _fetch_vectors(game_ids: Iterable[int]) -> Dict[int, np.ndarray]:
+    game_ids = [int(gid) for gid in game_ids]
+    if not game_ids:
+        return {}
+    conn = get_connection()
+    try:
+        cur = execute_query(conn, QUERY_GET_EMBEDDINGS, (game_ids,))
+        rows = cur.fetchall()
+    finally:
+        put_connection(conn)
+
+    vectors = {}
+    for gid, vec_bytes, vec_json in rows:
+        try:
+            vectors[gid] = decode_embedding(vec_bytes, vec_json)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Error parsing embedding for game_id={gid}: {e}")
+    return vectors
+
+
+def _build_vectors(vectors: Dict[int, np.ndarray]) -> CollectionVectors:
+    if not vectors:
+        return CollectionVectors(np.zeros(0, dtype="int64"), np.zeros((0, 0), dtype="float32"))
+    game_ids = np.fromiter(vectors.keys(), dtype="int64", count=len(vectors))
+    matrix = np.ascontiguousarray(np.vstack(list(vectors.values())), dtype="float32")
+    faiss.normalize_L2(matrix)
+    return CollectionVectors(game_ids, matrix)
+
+
+class UserCollectionCache:
+    """user_id -> (collection id set, lazily built embedding matrix)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name="user_collection")
+        # Serialises read-modify-write updates; reads go through the TTLCache lock only
+        self._lock = threading.Lock()
+
+    def get_ids(self, user_id: int) -> FrozenSet[int]:
+        """The user's collection game ids, reloaded from user_collections when missing or outdated."""
+        user_id = int(user_id)
+        entry = self._cache.get(user_id)
+        conn = get_connection()
+        try:
+            if entry is not None:
+                version = tuple(execute_query(conn, QUERY_GET_COLLECTION_VERSION, (user_id,)).fetchone())
+                if version == entry.version:
+                    return entry.ids
+            rows = execute_query(conn, QUERY_GET_COLLECTION_IDS, (user_id,)).fetchall()
+        finally:
+            put_connection(conn)
+
+        ids = frozenset(row[0] for row in rows)
+        with self._lock:
+            current = self._cache.get(user_id)
+            vectors = current.vectors if current is not None and current.ids == ids else None
+            self._cache.set(user_id, _Entry(ids, _version(rows), vectors))
+        return ids
+
+    def get_vectors(self, user_id: int) -> CollectionVectors:
+        """Normalized embedding matrix of the user's collection (games without embeddings are left out)."""
+        user_id = int(user_id)
+        ids = self.get_ids(user_id)
+        entry = self._cache.get(user_id)
+        if entry is not None and entry.vectors is not None:
+            return entry.vectors
+
+        vectors = _build_vectors(_fetch_vectors(ids))
+        with self._lock:
+            current = self._cache.get(user_id)
+            # Only store if the collection did not change while the matrix was being built
+            if current is not None and current.ids == ids:
+                self._cache.set(user_id, current._replace(vectors=vectors))
+        return vectors
+
+    def add_games(self, user_id: int, game_ids: Iterable[int]) -> None:
+        """Add games to a cached entry, appending their rows to the matrix if it was built."""
+        user_id = int(user_id)
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return
+        new_ids = {int(gid) for gid in game_ids} - entry.ids
+        if not new_ids:
+            return
+        # Fetched outside the lock, so other users' cache access does not wait on the query
+        fetched = _fetch_vectors(new_ids) if entry.vectors is not None else {}
+        with self._lock:
+            if self._cache.get(user_id) is not entry:
+                # Changed meanwhile; reload on next use rather than patch a different entry
+                self._cache.invalidate(user_id)
+                return
+            vectors = entry.vectors
+            if vectors is not None:
+                if fetched:
+                    appended = _build_vectors(fetched)
+                    if vectors.matrix.size and appended.matrix.shape[1] != vectors.matrix.shape[1]:
+                        vectors = None  # Dimension changed (re-embedded); rebuild on next use
+                    elif not vectors.matrix.size:
+                        vectors = appended
+                    else:
+                        vectors = CollectionVectors(
+                            np.concatenate([vectors.game_ids, appended.game_ids]),
+                            np.vstack([vectors.matrix, appended.matrix]),
+                        )
+            self._cache.set(user_id, _Entry(entry.ids | new_ids, None, vectors))
+
+    def remove_games(self, user_id: int, game_ids: Iterable[int]) -> None:
+        """Remove games from a cached entry and drop their matrix rows."""
+        user_id = int(user_id)
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is None:
+                return
+            removed = {int(gid) for gid in game_ids} & entry.ids
+            if not removed:
+                return
+            vectors = entry.vectors
+            if vectors is not None:
+                keep = ~np.isin(vectors.game_ids, np.fromiter(removed, dtype="int64", count=len(removed)))
+                vectors = CollectionVectors(vectors.game_ids[keep], np.ascontiguousarray(vectors.matrix[keep]))
+            self._cache.set(user_id, _Entry(entry.ids - removed, None, vectors))
+
+    def invalidate(self, user_id) -> None:
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._cache.invalidate(user_id)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+COLLECTION_CACHE = UserCollectionCache(maxsize=COLLECTION_CACHE_MAX_SIZE, ttl=COLLECTION_CACHE_TTL_SECONDS)
@@ -0,0 +1,97 @@
+# backend/collection_import.py
+"""
+Set-based import of a BGG collection into user_collections.
+
+One existence check against games and one upsert per import, instead of three
+queries and a commit per game. Imports can also run as a background job
+(backend/jobs.py) queued with start_import_job.
+"""
+from typing import Any, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from backend.bgg_collection import fetch_user_collection
+from backend.collection_cache import COLLECTION_CACHE
+from backend.db import execute_query, get_db_connection, put_connection
+from backend.jobs import enqueue_job, register_job_type, set_job_progress
+from backend.logger_config import logger
+
+QUERY_EXISTING_GAME_IDS = "SELECT id FROM games WHERE id = ANY(%s)"
+
+# Existing rows are only touched when BGG reports a rating; RETURNING tells inserts from updates
+QUERY_UPSERT_COLLECTION = """INSERT INTO user_collections (user_id, game_id, personal_rating)
+                             VALUES %s
+                             ON CONFLICT (user_id, game_id) DO UPDATE
+                                 SET personal_rating = EXCLUDED.personal_rating
+                                 WHERE EXCLUDED.personal_rating IS NOT NULL
+                             RETURNING (xmax = 0) AS inserted"""
+
+
+def bulk_import_collection(conn, user_id: int, games_data: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Upsert fetched collection entries for a user in one statement.
+
+    Games missing from the local DB are skipped. Returns added/updated/skipped counts;
+    the caller commits.
+    """
+    # Deduplicate, keeping the last rating BGG reported for a game
+    ratings: Dict[int, Optional[float]] = {}
+    for game_data in games_data:
+        ratings[int(game_data["game_id"])] = game_data.get("personal_rating")
+
+    if not ratings:
+        return {"added": 0, "updated": 0, "skipped": 0}
+
+    cur = execute_query(conn, QUERY_EXISTING_GAME_IDS, (list(ratings),))
+    known_ids = {row[0] for row in cur.fetchall()}
+    rows = [(user_id, gid, rating) for gid, rating in ratings.items() if gid in known_ids]
+    skipped = len(games_data) - len(rows)
+
+    if not rows:
+        return {"added": 0, "updated": 0, "skipped": skipped}
+
+    results = execute_values(cur, QUERY_UPSERT_COLLECTION, rows, page_size=1000, fetch=True)
+    added = sum(1 for (inserted,) in results if inserted)
+    return {"added": added, "updated": len(results) - added, "skipped": skipped}
+
+
+def import_user_collection(user_id: int, bgg_user_id: str, progress=None) -> Dict[str, Any]:
+    """Fetch a user's BGG collection and import it; progress(status) is called between stages."""
+    if progress:
+        progress("fetching")
+    games_data = fetch_user_collection(str(bgg_user_id))
+    logger.info(f"Fetched {len(games_data)} games from BGG")
+
+    if progress:
+        progress("importing")
+    conn = get_db_connection()
+    try:
+        counts = bulk_import_collection(conn, user_id, games_data)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        put_connection(conn)
+    COLLECTION_CACHE.invalidate(user_id)
+
+    logger.info(
+        f"Collection import complete: {counts['added']} added, {counts['updated']} updated, {counts['skipped']} skipped"
+    )
+    return {"success": True, **counts, "total_fetched": len(games_data)}
+
+
+def _run_import_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = job["payload"]
+    return import_user_collection(
+        payload["user_id"], payload["bgg_user_id"], progress=lambda stage: set_job_progress(job["id"], stage)
+    )
+
+
+# BGG rate-limits collection requests, so only run one import per process at a time
+register_job_type("bgg_collection_import", _run_import_job, concurrency=1, max_attempts=3)
+
+
+def start_import_job(user_id: int, bgg_user_id: str) -> int:
+    """Queue a background import; returns the job id to poll."""
+    return enqueue_job("bgg_collection_import", {"user_id": user_id, "bgg_user_id": bgg_user_id}, user_id=user_id)
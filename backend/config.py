@@ -25,6 +25,10 @@ if not DATABASE_URL:
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "change-this-in-production")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
+# Authenticated user lookups are cached per worker; changes made through another worker
+# become visible after at most this many seconds (0 disables the cache)
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", "10000"))
 
 # OAuth Configuration
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
@@ -47,6 +51,44 @@ REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN", "")
 # BEARER_TOKEN for external API calls (moved to env)
 BEARER_TOKEN = os.getenv("BEARER_TOKEN", "")
 
+# Similarity index hot reload: poll gen/ for a new export every N seconds (0 disables the watcher)
+INDEX_WATCH_INTERVAL_SECONDS = float(os.getenv("INDEX_WATCH_INTERVAL_SECONDS", "0"))
+# Memory-map the FAISS index and id array so uvicorn workers share one copy
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() == "true"
+# Per-user collection ids and embedding matrix, cached per worker (0 disables the cache); every read
+# checks the collection's version, so the TTL only bounds memory held for inactive users
+COLLECTION_CACHE_TTL_SECONDS = float(os.getenv("COLLECTION_CACHE_TTL_SECONDS", "300"))
+COLLECTION_CACHE_MAX_SIZE = int(os.getenv("COLLECTION_CACHE_MAX_SIZE", "1000"))
+# Similarity search widens the FAISS k geometrically until top_k results survive the filters,
+# starting from a k tuned by the observed filter pass rates (false: fixed over-fetch heuristics)
+SEARCH_ADAPTIVE_OVERFETCH = os.getenv("SEARCH_ADAPTIVE_OVERFETCH", "true").lower() == "true"
+SEARCH_OVERFETCH_GROWTH = float(os.getenv("SEARCH_OVERFETCH_GROWTH", "2"))
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "2000"))
+# Serve unconstrained "similar to X" searches from the precomputed game_neighbors table
+NEIGHBORS_LOOKUP = os.getenv("NEIGHBORS_LOOKUP", "true").lower() == "true"
+
+# Background job worker threads per process (0 disables the workers in this process)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Write chat history from a background batch writer instead of on the /chat response path.
+# Off by default: each turn is then committed before the response. With it on, a crash can
+# lose turns already answered and ordering holds per worker only (see backend/chat_writer.py)
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "false").lower() == "true"
+
+# Profiling: log search stages and sampled stacks of profiled operations slower than this (0 disables)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+# Prometheus metrics at /metrics; with a multiprocess directory every worker writes its values there
+# and a scrape of any worker returns the sum (METRICS_TOKEN, if set, is required as a bearer token)
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", os.getenv("PROMETHEUS_MULTIPROC_DIR", ""))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "10"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Request tracing: log requests and single SQL statements slower than these (0 disables)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
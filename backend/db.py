@@ -2,8 +2,10 @@
 Database connection and query utilities - PostgreSQL only.
 """
 import os
+import time
+import uuid
 from contextlib import contextmanager
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 
 # PostgreSQL dependencies (required)
 try:
@@ -25,6 +27,10 @@ except ImportError:
     if not DATABASE_URL:
         raise ValueError("DATABASE_URL environment variable is required for PostgreSQL")
 
+from backend.metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT, DB_QUERY_DURATION
+from backend.profiling import count_query
+from backend.tracing import record_query
+
 # db.py is now in backend/, so go up one level to reach root
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 SCHEMA_FILE_POSTGRES = os.path.join(BASE_DIR, "update_utils", "schema_postgres.sql")
@@ -48,12 +54,35 @@ def get_postgres_pool():
     return _postgres_pool
 
 
+def _pool_size(state: str) -> int:
+    if _postgres_pool is None:
+        raise LookupError("connection pool not created yet")
+    if state == "in_use":
+        return len(_postgres_pool._used)
+    if state == "idle":
+        return len(_postgres_pool._pool)
+    return _postgres_pool.maxconn
+
+
+for _state in ("in_use", "idle", "max"):
+    DB_POOL_CONNECTIONS.set_function(lambda state=_state: _pool_size(state), state=_state)
+
+
+def _getconn(pool):
+    """pool.getconn(), timed as pool wait."""
+    started = time.perf_counter()
+    try:
+        return pool.getconn()
+    finally:
+        DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+
 @contextmanager
 def db_connection():
     """Context manager for PostgreSQL database connections."""
     pool = get_postgres_pool()
     if pool:
-        conn = pool.getconn()
+        conn = _getconn(pool)
         try:
             yield conn
             conn.commit()
@@ -67,7 +96,7 @@ def get_connection():
     """Get a database connection (for use with SimilarityEngine)."""
     pool = get_postgres_pool()
     if pool:
-        conn = pool.getconn()
+        conn = _getconn(pool)
         return conn
     raise Exception("PostgreSQL connection pool not available")
 
@@ -89,7 +118,7 @@ def get_db_connection():
         raise Exception("psycopg2 is required for PostgreSQL")
     pool = get_postgres_pool()
     if pool:
-        conn = pool.getconn()
+        conn = _getconn(pool)
         try:
             # Test if connection is still alive
             cur = conn.cursor()
@@ -102,14 +131,31 @@ def get_db_connection():
                 pool.putconn(conn, close=True)
             except Exception:
                 pass
-            return pool.getconn()
+            return _getconn(pool)
     raise Exception("PostgreSQL connection pool not available")
 
 
+def statement_type(query: str) -> str:
+    """SELECT/INSERT/UPDATE/DELETE/WITH, else OTHER (a low-cardinality metric label)."""
+    keyword = query.lstrip().split(None, 1)[0].upper() if query.strip() else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
 def execute_query(conn, query: str, params: tuple = None):
     """Execute a query with PostgreSQL parameter placeholders (%s)."""
     # Ensure query uses %s placeholders for PostgreSQL
     query = query.replace("?", "%s")
+    count_query()
+    started = time.perf_counter()
+    try:
+        return _execute(conn, query, params)
+    finally:
+        seconds = time.perf_counter() - started
+        DB_QUERY_DURATION.observe(seconds, statement=statement_type(query))
+        record_query(query, seconds)
+
+
+def _execute(conn, query: str, params: tuple = None):
     cur = conn.cursor()
     try:
         if params:
@@ -157,6 +203,44 @@ def ensure_schema(conn, schema_path: str = None) -> None:
     conn.commit()
 
 
+def stream_query(conn, query: str, params: tuple = None, itersize: int = 500) -> Iterator[tuple]:
+    """
+    Iterate over a query's rows through a server-side (named) cursor.
+
+    Rows are fetched itersize at a time, so memory stays bounded however large the
+    result is. The cursor lives in the caller's transaction.
+    """
+    with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+        cur.itersize = itersize
+        cur.execute(query, params)
+        yield from cur
+
+
+def sync_serial_sequences(conn, tables: List[str]) -> List[str]:
+    """
+    Move each table's id sequence past MAX(id), e.g. after rows were restored with explicit ids.
+
+    Returns the names of the sequences that had to be moved.
+    """
+    fixed = []
+    with conn.cursor() as cur:
+        for table in tables:
+            cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+            sequence = cur.fetchone()[0]
+            if not sequence:
+                continue
+            cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            max_id = cur.fetchone()[0]
+            cur.execute(f"SELECT last_value, is_called FROM {sequence}")
+            last_value, is_called = cur.fetchone()
+            next_value = last_value + 1 if is_called else last_value
+            if max_id >= next_value:
+                cur.execute("SELECT setval(%s, %s)", (sequence, max_id))
+                fixed.append(sequence)
+    conn.commit()
+    return fixed
+
+
 def upsert_game(conn, game_row: Dict[str, Any]) -> None:
     """Upsert a game record."""
     cols = list(game_row.keys())
@@ -0,0 +1,222 @@
+# backend/feature_bitmaps.py
+"""
+Inverted bitmap index for feature-only searches.
+
+For each (facet, normalized feature name) the index holds a bitmap of games. Bits
+are popularity ranks (num_ratings DESC, then average_rating DESC), not game ids.
+That way the lowest set bits of any combination are the most popular matches, and
+top-k is a slice. Required values are ANDed, excluded values and games outside a
+collection are masked out, and no Postgres query is needed.
+
+Feature sets come from the cached incidence (backend/feature_incidence.py), so
+blacklisted features and feature_mods apply. The index is rebuilt whenever a new
+incidence is built.
+
+Bitmaps are roaring bitmaps when the optional `pyroaring` package is installed.
+Otherwise sorted NumPy rank arrays with the same operations are used.
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from backend.db import execute_query, get_connection, put_connection
+from backend.feature_incidence import FacetIncidence, get_incidence
+from backend.logger_config import logger
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # optional dependency
+    BitMap = None
+
+QUERY_POPULARITY_ORDER = "SELECT id FROM games ORDER BY num_ratings DESC NULLS LAST, average_rating DESC NULLS LAST, id"
+
+
+class RankArray:
+    """Sorted unique uint32 ranks; the subset of the pyroaring BitMap API used here."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: Iterable[int] = ()):
+        if isinstance(values, np.ndarray):
+            self.values = np.unique(values.astype("uint32"))
+        else:
+            self.values = np.unique(np.fromiter(values, dtype="uint32"))
+
+    @classmethod
+    def _wrap(cls, values: np.ndarray) -> "RankArray":
+        bitmap = cls.__new__(cls)
+        bitmap.values = values
+        return bitmap
+
+    def __and__(self, other: "RankArray") -> "RankArray":
+        return self._wrap(np.intersect1d(self.values, other.values, assume_unique=True))
+
+    def __or__(self, other: "RankArray") -> "RankArray":
+        return self._wrap(np.union1d(self.values, other.values))
+
+    def __sub__(self, other: "RankArray") -> "RankArray":
+        return self._wrap(np.setdiff1d(self.values, other.values, assume_unique=True))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values.tolist())
+
+    def __getitem__(self, key: slice) -> "RankArray":
+        return self._wrap(self.values[key])
+
+
+def make_bitmap(ranks: Iterable[int] = ()):
+    if BitMap is not None:
+        return BitMap(ranks.astype("uint32") if isinstance(ranks, np.ndarray) else ranks)
+    return RankArray(ranks if isinstance(ranks, np.ndarray) else list(ranks))
+
+
+def value_key(value: Any) -> str:
+    """Postings key of a feature value; index names and query values go through the same normalization."""
+    return str(value).strip().lower()
+
+
+class FeatureBitmapIndex(NamedTuple):
+    ranked_ids: np.ndarray  # int64 game ids, most popular first (bit i is ranked_ids[i])
+    sorted_ids: np.ndarray  # ranked_ids sorted, for id -> rank lookups
+    sorted_ranks: np.ndarray  # rank of sorted_ids[i]
+    postings: Dict[str, Dict[str, object]]  # facet -> value_key(name) -> bitmap of ranks
+
+    def ranks(self, game_ids: Iterable[int]):
+        """Bitmap of the given games (unknown ids are skipped)."""
+        ids = np.fromiter((int(g) for g in game_ids), dtype="int64")
+        pos = np.minimum(np.searchsorted(self.sorted_ids, ids), max(len(self.sorted_ids) - 1, 0))
+        found = self.sorted_ids[pos] == ids if len(self.sorted_ids) else np.zeros(len(ids), dtype=bool)
+        return make_bitmap(self.sorted_ranks[pos[found]])
+
+    def all_games(self):
+        return make_bitmap(np.arange(len(self.ranked_ids)))
+
+    def search(
+        self,
+        required: Optional[Mapping[str, Iterable[str]]] = None,
+        excluded: Optional[Mapping[str, Iterable[str]]] = None,
+        allowed_ids: Optional[Iterable[int]] = None,
+        top_k: int = 10,
+    ) -> List[int]:
+        """Game ids having every required value and none of the excluded ones, most popular first."""
+        matches = self.ranks(allowed_ids) if allowed_ids else None
+        # Smallest bitmaps first so the intersection shrinks fastest
+        terms = []
+        for facet, values in (required or {}).items():
+            if facet not in self.postings:
+                continue  # Unknown feature types were never filtered on
+            for value in values:
+                if value is not None:
+                    terms.append(self.postings[facet].get(value_key(value), make_bitmap()))
+        for bitmap in sorted(terms, key=len):
+            matches = bitmap if matches is None else matches & bitmap
+            if not len(matches):
+                return []
+        if matches is None:
+            matches = self.all_games()
+        for facet, values in (excluded or {}).items():
+            for value in values:
+                bitmap = self.postings.get(facet, {}).get(value_key(value)) if value is not None else None
+                if bitmap is not None:
+                    matches = matches - bitmap
+        return [int(self.ranked_ids[rank]) for rank in matches[:top_k]]
+
+    def value_mask(
+        self,
+        game_ids: np.ndarray,
+        required: Optional[Mapping[str, Iterable[str]]] = None,
+        excluded: Optional[Mapping[str, Iterable[str]]] = None,
+    ) -> np.ndarray:
+        """
+        Whether each game has every required value and none of the excluded ones.
+
+        Unlike search(), a required value of an unknown feature type matches no game.
+        """
+        game_ids = np.asarray(game_ids, dtype="int64")
+        matches = self.ranks(game_ids)
+        for facet, values in (required or {}).items():
+            for value in values:
+                if value is not None:
+                    matches = matches & self.postings.get(facet, {}).get(value_key(value), make_bitmap())
+        for facet, values in (excluded or {}).items():
+            for value in values:
+                bitmap = self.postings.get(facet, {}).get(value_key(value)) if value is not None else None
+                if bitmap is not None:
+                    matches = matches - bitmap
+        matched_ids = self.ranked_ids[np.fromiter(iter(matches), dtype="int64", count=len(matches))]
+        return np.isin(game_ids, matched_ids)
+
+
+def _facet_postings(facet: FacetIncidence, rank_of_row: np.ndarray) -> Dict[str, object]:
+    """value_key(name) -> bitmap of the ranks of games having that feature."""
+    row_of_element = np.repeat(np.arange(len(facet.game_ids)), np.diff(facet.indptr))
+    ranks = rank_of_row[row_of_element]
+    keep = ranks >= 0
+    positions, ranks = facet.indices[keep], ranks[keep]
+    order = np.lexsort((ranks, positions))
+    positions, ranks = positions[order], ranks[order]
+    bounds = np.flatnonzero(np.diff(positions)) + 1
+
+    postings: Dict[str, object] = {}
+    for chunk_positions, chunk_ranks in zip(np.split(positions, bounds), np.split(ranks, bounds)):
+        if not len(chunk_positions):
+            continue
+        name = value_key(facet.names[int(chunk_positions[0])])
+        bitmap = make_bitmap(chunk_ranks)
+        # Distinct vocabulary entries can share a name once normalized
+        postings[name] = postings[name] | bitmap if name in postings else bitmap
+    return postings
+
+
+def build_bitmap_index(incidence: Dict[str, FacetIncidence], ranked_ids: np.ndarray) -> FeatureBitmapIndex:
+    ranked_ids = np.asarray(ranked_ids, dtype="int64")
+    order = np.argsort(ranked_ids, kind="stable")
+    sorted_ids, sorted_ranks = ranked_ids[order], order.astype("int64")
+    index = FeatureBitmapIndex(ranked_ids, sorted_ids, sorted_ranks, {})
+
+    for facet_name, facet in incidence.items():
+        if not len(sorted_ids):
+            rank_of_row = np.full(len(facet.game_ids), -1, dtype="int64")
+        else:
+            pos = np.minimum(np.searchsorted(sorted_ids, facet.game_ids), len(sorted_ids) - 1)
+            rank_of_row = np.where(sorted_ids[pos] == facet.game_ids, sorted_ranks[pos], -1)
+        index.postings[facet_name] = _facet_postings(facet, rank_of_row)
+    return index
+
+
+_INDEX_LOCK = threading.Lock()
+# (incidence the index was built from, index), swapped as one object so a lock-free reader
+# never pairs a new incidence with the old index; rebuilt when get_incidence returns a new object
+_INDEX_STATE: Optional[Tuple[Dict[str, FacetIncidence], FeatureBitmapIndex]] = None
+
+
+def get_bitmap_index() -> FeatureBitmapIndex:
+    """The bitmap index for the current cached incidence."""
+    global _INDEX_STATE
+    incidence = get_incidence()
+    state = _INDEX_STATE
+    if state is not None and state[0] is incidence:
+        return state[1]
+    with _INDEX_LOCK:
+        state = _INDEX_STATE
+        if state is not None and state[0] is incidence:
+            return state[1]
+        started = time.perf_counter()
+        conn = get_connection()
+        try:
+            cur = execute_query(conn, QUERY_POPULARITY_ORDER)
+            ranked_ids = np.fromiter((row[0] for row in cur.fetchall()), dtype="int64")
+        finally:
+            put_connection(conn)
+        index = build_bitmap_index(incidence, ranked_ids)
+        _INDEX_STATE = (incidence, index)
+        logger.info(
+            f"Built feature bitmap index over {len(ranked_ids)} games in {time.perf_counter() - started:.2f}s "
+            f"({'roaring' if BitMap is not None else 'numpy'} bitmaps)"
+        )
+    return index
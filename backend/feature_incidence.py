@@ -0,0 +1,180 @@
+# backend/feature_incidence.py
+"""
+Catalog-wide game x feature incidence, held in memory as CSR-style NumPy arrays.
+
+One FacetIncidence per feature type (mechanics, categories, ...). Rows are games,
+columns are positions in the facet vocabulary. The effective feature sets match
+reasoning_utils.get_game_features (blacklisted and empty names dropped, then feature_mods
+applied), and rarity weights match reasoning_utils.get_feature_rarity_weights, so
+callers can replace per-game queries with array operations.
+"""
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from backend.cache import TTLCache
+from backend.db import execute_query, get_connection, put_connection
+from backend.feature_blacklist import get_blacklisted_features
+from backend.logger_config import logger
+
+# feature_type -> (join table, join column, vocabulary table)
+FACET_TABLES = {
+    "mechanics": ("game_mechanics", "mechanic_id", "mechanics"),
+    "categories": ("game_categories", "category_id", "categories"),
+    "families": ("game_families", "family_id", "families"),
+    "designers": ("game_designers", "designer_id", "designers"),
+    "artists": ("game_artists", "artist_id", "artists"),
+    "publishers": ("game_publishers", "publisher_id", "publishers"),
+}
+
+INCIDENCE_TTL_SECONDS = 3600
+
+
+class FacetIncidence(NamedTuple):
+    """Features of every game for one facet; row i covers game_ids[i]."""
+
+    game_ids: np.ndarray  # sorted int64 ids of games with at least one feature
+    indptr: np.ndarray  # int64, row i is indices[indptr[i]:indptr[i + 1]]
+    indices: np.ndarray  # int32 vocabulary positions
+    feature_ids: np.ndarray  # int64 DB ids of the vocabulary, sorted
+    names: List[str]  # names[pos] for each vocabulary position
+    rarity: np.ndarray  # float64 rarity weight per vocabulary position (0.5 - 3.0)
+
+    def rows(self, game_ids: Iterable[int]) -> np.ndarray:
+        """Row number for each game id, -1 for games without features in this facet."""
+        ids = np.asarray(list(game_ids) if not isinstance(game_ids, np.ndarray) else game_ids, dtype="int64")
+        if not len(self.game_ids):
+            return np.full(len(ids), -1, dtype="int64")
+        pos = np.searchsorted(self.game_ids, ids)
+        pos = np.minimum(pos, len(self.game_ids) - 1)
+        return np.where(self.game_ids[pos] == ids, pos, -1)
+
+    def features(self, game_id: int) -> np.ndarray:
+        """Vocabulary positions of one game's features."""
+        row = int(self.rows([game_id])[0])
+        if row < 0:
+            return np.zeros(0, dtype="int32")
+        return self.indices[self.indptr[row] : self.indptr[row + 1]]
+
+    def flatten(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Flatten the features of the given rows: (index into `rows`, vocabulary position); -1 rows are skipped."""
+        valid = rows >= 0
+        starts = self.indptr[rows[valid]]
+        lengths = self.indptr[rows[valid] + 1] - starts
+        owner = np.repeat(np.flatnonzero(valid), lengths)
+        # Offsets of every element inside its own row, added to that row's start
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return owner, self.indices[np.repeat(starts, lengths) + offsets]
+
+    def feature_names(self, positions: Iterable[int]) -> Set[str]:
+        return {self.names[int(pos)] for pos in positions}
+
+
+def _rarity_weights(counts: np.ndarray, total_games: int) -> np.ndarray:
+    # Same formula as reasoning_utils.get_feature_rarity_weights
+    frequency = counts / max(total_games, 1)
+    weight = 1.0 / (frequency + 0.001)
+    return 0.5 + (np.log(weight + 1) / math.log(1000)) * 2.5
+
+
+def _build_facet(conn, feature_type: str, total_games: int, mods: List[tuple]) -> FacetIncidence:
+    join_table, join_col, vocab_table = FACET_TABLES[feature_type]
+
+    cur = execute_query(conn, f"SELECT id, name FROM {vocab_table} ORDER BY id")
+    vocab = cur.fetchall()
+    feature_ids = np.fromiter((row[0] for row in vocab), dtype="int64", count=len(vocab))
+    names = [row[1] or "" for row in vocab]
+    n_vocab = max(len(vocab), 1)
+
+    cur = execute_query(conn, f"SELECT game_id, {join_col} FROM {join_table}")
+    pairs = np.asarray(cur.fetchall(), dtype="int64").reshape(-1, 2)
+    positions = np.searchsorted(feature_ids, pairs[:, 1]) if len(feature_ids) else np.zeros(0, dtype="int64")
+    known = positions < len(feature_ids)
+    known[known] = feature_ids[positions[known]] == pairs[known, 1]
+    game_col, pos_col = pairs[known, 0], positions[known]
+
+    # Rarity counts distinct games per feature before mods and blacklisting, like the SQL version
+    keys = np.unique(game_col * n_vocab + pos_col)
+    counts = np.bincount(keys % n_vocab, minlength=len(vocab)).astype("float64")
+    rarity = _rarity_weights(counts, total_games)
+
+    # Like get_game_features: empty and blacklisted names are dropped from the linked
+    # features first, then feature_mods apply on top, so a mod can add a blacklisted feature
+    blacklisted = get_blacklisted_features(conn, feature_type)
+    dropped = np.fromiter(
+        (pos for pos, name in enumerate(names) if not name.strip() or name in blacklisted), dtype="int64"
+    )
+    if len(dropped):
+        keys = keys[~np.isin(keys % n_vocab, dropped)]
+
+    # Mods come in created_at DESC order and each one overrides the previous, as in get_game_features
+    if mods:
+        actions: Dict[int, str] = {}
+        for game_id, mod_type, feature_id, action in mods:
+            if mod_type != feature_type:
+                continue
+            pos = int(np.searchsorted(feature_ids, feature_id))
+            if pos < len(feature_ids) and feature_ids[pos] == feature_id and action in ("add", "remove"):
+                actions[int(game_id) * n_vocab + pos] = action
+        added = np.fromiter((k for k, a in actions.items() if a == "add"), dtype="int64")
+        removed = np.fromiter((k for k, a in actions.items() if a == "remove"), dtype="int64")
+        keys = np.setdiff1d(np.union1d(keys, added), removed)
+
+    # keys are sorted by (game_id, position): slice them into CSR rows
+    game_of_key = keys // n_vocab
+    game_ids, starts = np.unique(game_of_key, return_index=True)
+    indptr = np.append(starts, len(keys)).astype("int64")
+    indices = (keys % n_vocab).astype("int32")
+    return FacetIncidence(game_ids.astype("int64"), indptr, indices, feature_ids, names, rarity)
+
+
+def build_incidence(conn, feature_types: Optional[Iterable[str]] = None) -> Dict[str, FacetIncidence]:
+    """Load the incidence of every requested facet (all of them by default) in a few bulk queries."""
+    started = time.perf_counter()
+    cur = execute_query(conn, "SELECT COUNT(DISTINCT id) FROM games")
+    total_games = cur.fetchone()[0] or 1
+    cur = execute_query(
+        conn, "SELECT game_id, feature_type, feature_id, action FROM feature_mods ORDER BY created_at DESC"
+    )
+    mods = cur.fetchall()
+
+    incidence = {ft: _build_facet(conn, ft, total_games, mods) for ft in (feature_types or FACET_TABLES)}
+    logger.info(
+        f"Built feature incidence for {sorted(incidence)} in {time.perf_counter() - started:.2f}s "
+        f"({sum(len(f.indices) for f in incidence.values())} game-feature pairs)"
+    )
+    return incidence
+
+
+_INCIDENCE_CACHE = TTLCache(maxsize=1, ttl=INCIDENCE_TTL_SECONDS, name="feature_incidence")
+_BUILD_LOCK = threading.Lock()
+
+
+def get_incidence(conn=None) -> Dict[str, FacetIncidence]:
+    """The cached catalog incidence, rebuilt at most once per INCIDENCE_TTL_SECONDS."""
+    incidence = _INCIDENCE_CACHE.get("all")
+    if incidence is not None:
+        return incidence
+    # One build at a time; concurrent callers wait and reuse the result
+    with _BUILD_LOCK:
+        incidence = _INCIDENCE_CACHE.get("all")
+        if incidence is not None:
+            return incidence
+        own_conn = conn is None
+        if own_conn:
+            conn = get_connection()
+        try:
+            incidence = build_incidence(conn)
+        finally:
+            if own_conn:
+                put_connection(conn)
+        _INCIDENCE_CACHE.set("all", incidence)
+    return incidence
+
+
+def invalidate_incidence() -> None:
+    """Drop the cached incidence after feature, blacklist or feature_mods changes."""
+    _INCIDENCE_CACHE.clear()
@@ -0,0 +1,225 @@
+# backend/game_attributes.py
+"""
+Columnar game attributes for the similarity engine.
+
+One NumPy column per attribute, where row i describes id_map[i] of the FAISS index.
+Player-count and playtime constraints become boolean masks over the whole candidate
+list, and the popularity/recency/complexity rerank is one array expression. Neither
+needs per-candidate Python or a query per candidate. Missing values are NaN, and 0
+for the recommended_players bitmask.
+
+The semantics match reasoning_utils.get_game_features: a min/max of 0 counts as
+unknown, and rows the ETL has not normalized yet are parsed from their JSON.
+"""
+import time
+from typing import Any, Dict, Mapping, NamedTuple, Optional
+
+import numpy as np
+
+from backend.db import execute_query, get_connection, put_connection
+from backend.game_stats import MAX_MASK_PLAYERS, parse_overall_rank, parse_player_counts, players_to_mask
+from backend.logger_config import logger
+
+# Age after which the similarity engine rebuilds the columns in the background
+GAME_ATTRIBUTES_TTL_SECONDS = 3600
+
+QUERY_GAME_ATTRIBUTES = """SELECT id, min_players, max_players, recommended_players, best_player_count,
+                                  playing_time, min_playtime, max_playtime, avg_weight, overall_rank,
+                                  num_ratings, year_published, stats_normalized,
+                                  CASE WHEN stats_normalized THEN NULL ELSE ranks_json END,
+                                  CASE WHEN stats_normalized THEN NULL ELSE polls_json END
+                           FROM games ORDER BY id"""
+
+FLOAT_COLUMNS = (
+    "min_players",
+    "max_players",
+    "best_player_count",
+    "playing_time",
+    "avg_weight",
+    "rank",
+    "num_ratings",
+    "year_published",
+)
+
+
+class GameAttributes(NamedTuple):
+    """Per-game columns; row i covers id_map[i] of the index they were built for."""
+
+    min_players: np.ndarray  # float64, NaN when unknown
+    max_players: np.ndarray
+    recommended_players: np.ndarray  # uint64 bitmask, bit n set when n players is recommended or best
+    best_player_count: np.ndarray
+    playing_time: np.ndarray  # playing_time, else the min/max average, else whichever is set
+    avg_weight: np.ndarray
+    rank: np.ndarray
+    num_ratings: np.ndarray
+    year_published: np.ndarray
+
+    def take(self, rows: np.ndarray) -> "GameAttributes":
+        """The columns for the given rows; rows of -1 come back as missing values."""
+        rows = np.asarray(rows, dtype="int64")
+        known = rows >= 0 if len(self.recommended_players) else np.zeros(len(rows), dtype=bool)
+        safe = np.where(known, rows, 0)
+        taken = []
+        for field, column in zip(self._fields, self):
+            if field == "recommended_players":
+                missing = np.zeros(len(rows), dtype="uint64")
+            else:
+                missing = np.full(len(rows), np.nan)
+            taken.append(np.where(known, column[safe], missing) if len(column) else missing)
+        return GameAttributes(*taken)
+
+
+def _effective_playtime(playing_time, min_playtime, max_playtime) -> Optional[float]:
+    if playing_time is not None:
+        return playing_time
+    if min_playtime is not None and max_playtime is not None:
+        return (min_playtime + max_playtime) / 2
+    return min_playtime if min_playtime is not None else max_playtime
+
+
+def build_game_attributes(conn, id_map: np.ndarray) -> GameAttributes:
+    """Load every game's attributes in one query and align them with id_map."""
+    cur = execute_query(conn, QUERY_GAME_ATTRIBUTES)
+    ids, masks = [], []
+    columns: Dict[str, list] = {name: [] for name in FLOAT_COLUMNS}
+    for row in cur.fetchall():
+        (game_id, min_p, max_p, mask, best, playing, min_t, max_t, weight, rank, ratings, year, normalized) = row[:13]
+        if not normalized:
+            recommended, best = parse_player_counts(row[14]) if row[14] else (set(), None)
+            mask = players_to_mask(recommended)
+            rank = parse_overall_rank(row[13]) if row[13] else None
+        ids.append(game_id)
+        masks.append(mask or 0)
+        values = (min_p or None, max_p or None, best, _effective_playtime(playing, min_t, max_t), weight, rank, ratings, year)
+        for name, value in zip(FLOAT_COLUMNS, values):
+            columns[name].append(np.nan if value is None else float(value))
+
+    game_ids = np.asarray(ids, dtype="int64")
+    id_map = np.asarray(id_map, dtype="int64")
+    if len(game_ids):
+        pos = np.minimum(np.searchsorted(game_ids, id_map), len(game_ids) - 1)
+        rows = np.where(game_ids[pos] == id_map, pos, -1)
+    else:
+        rows = np.full(len(id_map), -1, dtype="int64")
+    by_game = GameAttributes(
+        min_players=np.asarray(columns["min_players"], dtype="float64"),
+        max_players=np.asarray(columns["max_players"], dtype="float64"),
+        recommended_players=np.asarray(masks, dtype="uint64"),
+        best_player_count=np.asarray(columns["best_player_count"], dtype="float64"),
+        playing_time=np.asarray(columns["playing_time"], dtype="float64"),
+        avg_weight=np.asarray(columns["avg_weight"], dtype="float64"),
+        rank=np.asarray(columns["rank"], dtype="float64"),
+        num_ratings=np.asarray(columns["num_ratings"], dtype="float64"),
+        year_published=np.asarray(columns["year_published"], dtype="float64"),
+    )
+    return by_game.take(rows)
+
+
+def load_game_attributes(id_map: np.ndarray) -> GameAttributes:
+    """build_game_attributes on a pooled connection; callers run it off the request path."""
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        attributes = build_game_attributes(conn, id_map)
+    finally:
+        put_connection(conn)
+    logger.info(f"Built game attribute columns for {len(id_map)} games in {time.perf_counter() - started:.2f}s")
+    return attributes
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    bits = np.unpackbits(np.ascontiguousarray(masks, dtype="uint64").view("uint8").reshape(-1, 8), axis=1)
+    return bits.sum(axis=1)
+
+
+def player_constraint_mask(
+    attributes: GameAttributes, base_features: Mapping[str, Any], player_constraints: Mapping[str, Any]
+) -> np.ndarray:
+    """Which rows satisfy the "players" constraints relative to the base game's features."""
+    n = len(attributes.min_players)
+    ok = np.ones(n, dtype=bool)
+    if not player_constraints:
+        return ok
+    other_min, other_max = attributes.min_players, attributes.max_players
+    other_recommended = attributes.recommended_players
+    min_known, max_known = ~np.isnan(other_min), ~np.isnan(other_max)
+    both_known = min_known & max_known
+    has_recommended = other_recommended != 0
+
+    exact_players = player_constraints.get("exact")
+    if exact_players is not None:
+        exact_players = int(exact_players)
+        # The game must support the count; games outside min/max are never rescued by the polls
+        ok &= ~(max_known & (other_max < exact_players))
+        ok &= ~(min_known & (other_min > exact_players))
+        if player_constraints.get("use_recommended", False):
+            if 0 <= exact_players <= MAX_MASK_PLAYERS:
+                in_recommended = ((other_recommended >> np.uint64(exact_players)) & np.uint64(1)) == 1
+            else:
+                in_recommended = np.zeros(n, dtype=bool)
+            ok &= both_known | (has_recommended & in_recommended)
+        else:
+            # Without a known range the recommended counts are the only evidence left
+            ok &= both_known | has_recommended
+
+    min_overlap = player_constraints.get("min_overlap")
+    if min_overlap is not None:
+        base_min, base_max = base_features.get("min_players"), base_features.get("max_players")
+        base_recommended = players_to_mask(base_features.get("recommended_players") or ())
+        if base_min is not None and base_max is not None:
+            range_overlap = np.maximum(0, np.fmin(base_max, other_max) - np.fmax(base_min, other_min) + 1)
+            ok &= ~both_known | (range_overlap >= min_overlap)
+            checked = both_known
+        else:
+            checked = np.zeros(n, dtype=bool)
+        if base_recommended:
+            shared = _popcount(other_recommended & np.uint64(base_recommended))
+            ok &= checked | ~has_recommended | (shared >= min_overlap)
+
+    base_best = base_features.get("best_player_count")
+    if player_constraints.get("similar_best") and base_best is not None:
+        other_best = attributes.best_player_count
+        # Allow 1 player difference
+        ok &= np.isnan(other_best) | (np.abs(other_best - base_best) <= 1)
+    return ok
+
+
+def playtime_constraint_mask(attributes: GameAttributes, playtime_constraints: Mapping[str, Any]) -> np.ndarray:
+    """Which rows play within tolerance of the target time; games without playtime data pass."""
+    playing_time = attributes.playing_time
+    target_playtime = (playtime_constraints or {}).get("target")
+    if target_playtime is None:
+        return np.ones(len(playing_time), dtype=bool)
+    tolerance_range = target_playtime * playtime_constraints.get("tolerance", 0.3)
+    within = (playing_time >= target_playtime - tolerance_range) & (playing_time <= target_playtime + tolerance_range)
+    return np.isnan(playing_time) | within
+
+
+def weighted_scores(
+    base_scores: np.ndarray,
+    num_ratings: np.ndarray,
+    ranks: np.ndarray,
+    years: np.ndarray,
+    avg_weights: np.ndarray,
+    base_complexity: Optional[float],
+    current_year: int,
+) -> np.ndarray:
+    """
+    Similarity score plus small boosts for popularity, rank, recency and similar complexity.
+
+    All arguments are float arrays with NaN for missing values.
+    """
+    # num_ratings: max weight 0.1 at 10000 ratings
+    ratings_weight = 0.1 * np.clip(np.nan_to_num(num_ratings) / 10000.0, 0.0, 1.0)
+    # rank: rank 1 = 0.1, rank 10000 and worse = 0.0
+    rank_weight = np.where(ranks > 0, 0.1 * np.maximum(0.0, 1.0 - ranks / 10000.0), 0.0)
+    # years since publish: newer games get a slight boost, max weight 0.05
+    year_weight = np.nan_to_num(0.05 * np.maximum(0.0, 1.0 - (current_year - years) / 20.0))
+    # complexity (avg_weight): prefer similar complexity, max weight 0.05
+    if base_complexity is None:
+        complexity_weight = 0.0
+    else:
+        complexity_diff = np.abs(avg_weights - base_complexity)
+        complexity_weight = np.nan_to_num(0.05 * np.maximum(0.0, 1.0 - complexity_diff / 5.0))
+    return base_scores + ratings_weight + rank_weight + year_weight + complexity_weight
@@ -0,0 +1,114 @@
+# backend/game_neighbors.py
+"""
+Precomputed nearest neighbours of every game.
+
+build_game_neighbors runs the whole catalogue through the similarity index in batches.
+Each batch is one FAISS search over a matrix of query vectors
+(SimilarityEngine.search_batch). Every game's top-N neighbours are stored with their
+embedding and meta similarity in the game_neighbors table.
+
+Unconstrained "similar to X" searches take their candidates from that table instead
+of searching the index. Searches with collections, features or constraints still run
+online.
+
+Rows carry the version of the index they were computed from, and only rows of the
+loaded version are served. After a reload or delta the lookup falls back to the index
+until the table is rebuilt; an unversioned index is never served from the table.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from backend.db import execute_query, get_connection, put_connection
+from backend.feature_incidence import get_incidence
+from backend.logger_config import logger
+from backend.meta_scoring import candidate_overlaps, meta_scores
+
+NEIGHBORS_TOP_N = 50
+NEIGHBORS_BATCH_SIZE = 256
+
+QUERY_DELETE_NEIGHBORS = "DELETE FROM game_neighbors WHERE game_id = ANY(%s)"
+QUERY_INSERT_NEIGHBORS = (
+    "INSERT INTO game_neighbors (game_id, rank, neighbor_id, similarity, meta_score, index_version) VALUES %s"
+)
+# Games that left the index since the last build
+QUERY_DELETE_STALE_NEIGHBORS = "DELETE FROM game_neighbors WHERE NOT (game_id = ANY(%s))"
+QUERY_GET_NEIGHBORS = """SELECT neighbor_id, similarity FROM game_neighbors
+                         WHERE game_id = %s AND index_version = %s ORDER BY rank LIMIT %s"""
+
+
+def neighbor_rows(
+    game_id: int, neighbor_ids: np.ndarray, sims: np.ndarray, meta: np.ndarray, index_version: Optional[int] = None
+) -> List[tuple]:
+    """(game_id, rank, neighbor_id, similarity, meta_score, index_version) rows, nearest first."""
+    return [
+        (int(game_id), rank, int(nid), float(sim), float(score), index_version)
+        for rank, (nid, sim, score) in enumerate(zip(neighbor_ids, sims, meta))
+    ]
+
+
+def build_game_neighbors(
+    engine,
+    top_n: int = NEIGHBORS_TOP_N,
+    batch_size: int = NEIGHBORS_BATCH_SIZE,
+    progress: Optional[Callable[[str], None]] = None,
+) -> Dict[str, int]:
+    """
+    Store the top_n neighbours of every game in the engine's index.
+
+    Each batch replaces its games' rows in its own transaction, so lookups keep
+    working (on old or new rows) while the table is rebuilt. Rows are stamped with
+    the engine's index version at the start of their batch.
+    """
+    game_ids = np.asarray(engine.id_map, dtype="int64")
+    if engine.index_version is None:
+        logger.warning("Index has no version; the precomputed neighbours will not be served")
+    incidence = get_incidence()
+    stored_games = stored_rows = 0
+    conn = get_connection()
+    try:
+        for start in range(0, len(game_ids), batch_size):
+            batch = [int(gid) for gid in game_ids[start : start + batch_size]]
+            rows: List[tuple] = []
+            version = engine.index_version
+            for gid, (neighbor_ids, sims) in engine.search_batch(batch, top_n).items():
+                meta = meta_scores(candidate_overlaps(incidence, gid, neighbor_ids))
+                rows.extend(neighbor_rows(gid, neighbor_ids, sims, meta, version))
+                stored_games += 1
+            with conn.cursor() as cur:
+                cur.execute(QUERY_DELETE_NEIGHBORS, (batch,))
+                if rows:
+                    execute_values(cur, QUERY_INSERT_NEIGHBORS, rows, page_size=1000)
+            conn.commit()
+            stored_rows += len(rows)
+            if progress is not None:
+                progress(f"{min(start + batch_size, len(game_ids))}/{len(game_ids)} games")
+
+        with conn.cursor() as cur:
+            cur.execute(QUERY_DELETE_STALE_NEIGHBORS, (game_ids.tolist(),))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        put_connection(conn)
+    logger.info(f"Stored {stored_rows} precomputed neighbours for {stored_games} games")
+    return {"games": stored_games, "neighbors": stored_rows}
+
+
+def get_neighbors(
+    conn, game_id: int, limit: int, index_version: Optional[int]
+) -> Optional[Tuple[np.ndarray, List[int]]]:
+    """
+    (similarities, neighbour ids) of the limit nearest neighbours, nearest first.
+
+    None when fewer than limit were precomputed from index_version (or the index has
+    no version), so the caller searches the index.
+    """
+    if index_version is None:
+        return None
+    rows = execute_query(conn, QUERY_GET_NEIGHBORS, (game_id, index_version, limit)).fetchall()
+    if len(rows) < limit:
+        return None
+    return np.array([row[1] for row in rows], dtype="float32"), [int(row[0]) for row in rows]
@@ -0,0 +1,177 @@
+# backend/game_stats.py
+"""
+Typed game statistics derived from the BGG ranks/polls JSON.
+
+The ETL (update_utils/etl.py) stores these next to ranks_json/polls_json in the
+games table and sets stats_normalized, so the similarity engine and
+get_game_features read plain columns instead of decoding JSON per candidate.
+Rows loaded before the columns existed are filled by backfill_game_stats
+(`python -m backend.game_stats`); until then readers fall back to parsing the JSON
+with the same functions.
+"""
+import json
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from backend.db import execute_query, get_connection, put_connection
+
+# recommended_players is a BIGINT bitmask: bit n is set when n players is recommended or best
+MAX_MASK_PLAYERS = 62
+
+GAME_STATS_COLUMNS = (
+    "overall_rank",
+    "recommended_players",
+    "best_player_count",
+    "language_dependence_level",
+    "language_dependence_value",
+    "language_dependence_votes",
+)
+
+QUERY_UNNORMALIZED_GAMES = """SELECT id, ranks_json, polls_json FROM games
+                              WHERE NOT stats_normalized ORDER BY id LIMIT %s"""
+QUERY_UPDATE_GAME_STATS = f"""UPDATE games SET {", ".join(f"{c} = %s" for c in GAME_STATS_COLUMNS)},
+                                     stats_normalized = TRUE
+                              WHERE id = %s"""
+
+
+def _load(raw: Any) -> Any:
+    if isinstance(raw, str):
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+    return raw
+
+
+def parse_overall_rank(ranks: Any) -> Optional[int]:
+    """The overall "boardgame" rank, else the first numeric rank (ranks_json as str, dict or list)."""
+    ranks = _load(ranks)
+    rank_list = ranks.get("ranks", []) if isinstance(ranks, dict) else ranks
+    if not isinstance(rank_list, list):
+        return None
+    entries = [r for r in rank_list if isinstance(r, dict)]
+
+    def numeric(entry) -> Optional[int]:
+        value = entry.get("value")
+        if not value or value == "Not Ranked":
+            return None
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return None
+
+    for entry in entries:
+        # Match "boardgame" or "Board Game Rank" etc.
+        if "boardgame" in (entry.get("friendlyname") or "").lower() or (entry.get("name") or "").lower() == "boardgame":
+            rank = numeric(entry)
+            if rank is not None:
+                return rank
+    for entry in entries:
+        rank = numeric(entry)
+        if rank is not None:
+            return rank
+    return None
+
+
+def parse_player_counts(polls: Any) -> Tuple[Set[int], Optional[int]]:
+    """(player counts with Best or Recommended votes, count with most Best votes) from polls_json."""
+    polls = _load(polls)
+    recommended: Set[int] = set()
+    best_player_count = None
+    suggested = polls.get("suggested_numplayers", {}) if isinstance(polls, dict) else {}
+    if not isinstance(suggested, dict):
+        return recommended, best_player_count
+    max_best_votes = 0
+    for result in suggested.get("results", []):
+        if not isinstance(result, dict):
+            continue
+        votes = result.get("votes", {})
+        best_votes = votes.get("Best", 0)
+        if best_votes > 0 or votes.get("Recommended", 0) > 0:
+            try:
+                player_num = int(result.get("numplayers").replace("+", "").split()[0])
+            except (ValueError, AttributeError, IndexError):
+                continue
+            recommended.add(player_num)
+            if best_votes > max_best_votes:
+                max_best_votes = best_votes
+                best_player_count = player_num
+    return recommended, best_player_count
+
+
+def parse_language_dependence(polls: Any) -> Optional[Dict[str, Any]]:
+    """The language dependence level with the most votes, as {"level", "value", "numvotes"}."""
+    polls = _load(polls)
+    language_dep = polls.get("language_dependence", {}) if isinstance(polls, dict) else {}
+    if not isinstance(language_dep, dict):
+        return None
+    language_dependence = None
+    max_votes = 0
+    for result in language_dep.get("results", []):
+        if not isinstance(result, dict):
+            continue
+        level = result.get("level")
+        numvotes = result.get("numvotes", 0)
+        if level and numvotes > max_votes:
+            max_votes = numvotes
+            try:
+                language_dependence = {"level": int(level), "value": result.get("value", ""), "numvotes": numvotes}
+            except (ValueError, TypeError):
+                pass
+    return language_dependence
+
+
+def players_to_mask(players: Iterable[int]) -> int:
+    mask = 0
+    for n in players:
+        if 0 <= n <= MAX_MASK_PLAYERS:
+            mask |= 1 << n
+    return mask
+
+
+def mask_to_players(mask: Optional[int]) -> Set[int]:
+    mask = mask or 0
+    return {n for n in range(MAX_MASK_PLAYERS + 1) if mask >> n & 1}
+
+
+def normalize_game_stats(ranks_json: Any, polls_json: Any) -> Dict[str, Any]:
+    """Typed column values for one game (keys are GAME_STATS_COLUMNS)."""
+    recommended, best = parse_player_counts(polls_json)
+    language = parse_language_dependence(polls_json) or {}
+    return {
+        "overall_rank": parse_overall_rank(ranks_json),
+        "recommended_players": players_to_mask(recommended),
+        "best_player_count": best,
+        "language_dependence_level": language.get("level"),
+        "language_dependence_value": language.get("value"),
+        "language_dependence_votes": language.get("numvotes"),
+    }
+
+
+def language_dependence_from_columns(level, value, votes) -> Optional[Dict[str, Any]]:
+    if level is None:
+        return None
+    return {"level": level, "value": value or "", "numvotes": votes or 0}
+
+
+def backfill_game_stats(conn, batch_size: int = 1000) -> int:
+    """Normalize every game not yet marked stats_normalized; returns the number of games updated."""
+    updated = 0
+    while True:
+        cur = execute_query(conn, QUERY_UNNORMALIZED_GAMES, (batch_size,))
+        rows = cur.fetchall()
+        if not rows:
+            return updated
+        with conn.cursor() as write_cur:
+            for game_id, ranks_json, polls_json in rows:
+                stats = normalize_game_stats(ranks_json, polls_json)
+                write_cur.execute(QUERY_UPDATE_GAME_STATS, (*(stats[c] for c in GAME_STATS_COLUMNS), game_id))
+        conn.commit()
+        updated += len(rows)
+
+
+if __name__ == "__main__":
+    connection = get_connection()
+    try:
+        print(f"Normalized stats for {backfill_game_stats(connection)} games")
+    finally:
+        put_connection(connection)
@@ -0,0 +1,306 @@
+# backend/jobs.py
+"""
+In-process background jobs backed by the Postgres `jobs` table.
+
+Request handlers enqueue work with enqueue_job() and return the job id; worker
+threads started by start_job_workers() claim queued rows with
+FOR UPDATE SKIP LOCKED, so any number of uvicorn processes can share the queue
+without an external broker. Failed jobs are retried with exponential backoff up
+to max_attempts, and each job type has a concurrency limit (per process).
+
+A claimed job holds a lease (locked_by, lease_expires_at) that a heartbeat thread
+renews every HEARTBEAT_SECONDS while the job runs. Jobs whose lease expired belong
+to a process that died; the heartbeat of any live process requeues them, or marks
+them failed once they have used up max_attempts, so a job that kills its worker
+is not retried forever.
+
+Handlers are registered with register_job_type(job_type, handler). A handler
+receives the job dict (id, job_type, payload, attempts, user_id), may call
+set_job_progress(job_id, stage), and returns a JSON-serialisable result.
+"""
+import json
+import os
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from backend.db import execute_query, get_connection, put_connection
+from backend.logger_config import logger
+
+QUERY_INSERT_JOB = """INSERT INTO jobs (job_type, payload, user_id, max_attempts)
+                      VALUES (%s, %s, %s, %s) RETURNING id"""
+
+QUERY_CLAIM_JOB = """UPDATE jobs
+                     SET status = 'running', attempts = attempts + 1,
+                         started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP, error = NULL,
+                         locked_by = %s, lease_expires_at = CURRENT_TIMESTAMP + (%s * INTERVAL '1 second')
+                     WHERE id = (
+                         SELECT id FROM jobs
+                         WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP AND job_type = ANY(%s)
+                         ORDER BY run_after, id
+                         FOR UPDATE SKIP LOCKED
+                         LIMIT 1
+                     )
+                     RETURNING id, job_type, payload, attempts, max_attempts, user_id"""
+
+QUERY_COMPLETE_JOB = """UPDATE jobs
+                        SET status = 'completed', result = %s, progress = NULL, locked_by = NULL,
+                            lease_expires_at = NULL, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = %s"""
+
+QUERY_RETRY_JOB = """UPDATE jobs
+                     SET status = 'queued', error = %s, updated_at = CURRENT_TIMESTAMP,
+                         locked_by = NULL, lease_expires_at = NULL,
+                         run_after = CURRENT_TIMESTAMP + (%s * INTERVAL '1 second')
+                     WHERE id = %s"""
+
+QUERY_FAIL_JOB = """UPDATE jobs
+                    SET status = 'failed', error = %s, locked_by = NULL, lease_expires_at = NULL,
+                        finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s"""
+
+QUERY_SET_JOB_PROGRESS = "UPDATE jobs SET progress = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s"
+
+QUERY_RENEW_JOB_LEASES = """UPDATE jobs SET lease_expires_at = CURRENT_TIMESTAMP + (%s * INTERVAL '1 second')
+                            WHERE id = ANY(%s) AND status = 'running' AND locked_by = %s"""
+
+# Jobs whose lease expired were left 'running' by a process that died. attempts already
+# counts that run (it is incremented on claim). Rows claimed before leases existed have
+# no lease and fall back to updated_at.
+QUERY_REQUEUE_STALE_JOBS = """UPDATE jobs
+                              SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                                  error = 'Worker stopped while running the job',
+                                  finished_at = CASE WHEN attempts >= max_attempts THEN CURRENT_TIMESTAMP END,
+                                  locked_by = NULL, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+                              WHERE status = 'running'
+                                AND (lease_expires_at < CURRENT_TIMESTAMP
+                                     OR (lease_expires_at IS NULL
+                                         AND updated_at < CURRENT_TIMESTAMP - (%s * INTERVAL '1 second')))
+                              RETURNING id, status"""
+
+QUERY_GET_JOB = """SELECT id, job_type, status, progress, result, error, attempts, max_attempts,
+                          user_id, created_at, started_at, finished_at, updated_at
+                   FROM jobs WHERE id = %s"""
+
+QUERY_LIST_JOBS = """SELECT id, job_type, status, progress, result, error, attempts, max_attempts,
+                            user_id, created_at, started_at, finished_at, updated_at
+                     FROM jobs
+                     WHERE (%s::text IS NULL OR status = %s)
+                     ORDER BY id DESC
+                     LIMIT %s"""
+
+RETRY_BASE_DELAY_SECONDS = 5
+POLL_INTERVAL_SECONDS = 1.0
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 30
+# Only for rows without a lease (claimed by a version without heartbeats)
+STALE_JOB_SECONDS = 900
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _JobType:
+    def __init__(self, handler: Callable[[Dict[str, Any]], Any], concurrency: int, max_attempts: int):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.running = 0
+
+
+_JOB_TYPES: Dict[str, _JobType] = {}
+_JOB_TYPES_LOCK = threading.Lock()
+_WAKEUP = threading.Event()
+_STOP = threading.Event()
+_WORKERS: List[threading.Thread] = []
+# Ids of the jobs running in this process, whose leases the heartbeat renews
+_RUNNING_JOBS: Set[int] = set()
+
+
+def register_job_type(
+    job_type: str, handler: Callable[[Dict[str, Any]], Any], concurrency: int = 1, max_attempts: int = 3
+) -> None:
+    """Register the handler for a job type and its per-process concurrency limit."""
+    with _JOB_TYPES_LOCK:
+        _JOB_TYPES[job_type] = _JobType(handler, max(1, concurrency), max(1, max_attempts))
+
+
+def _row_to_job(row) -> Dict[str, Any]:
+    result = row[4]
+    if result is not None:
+        try:
+            result = json.loads(result)
+        except (TypeError, ValueError):
+            pass
+    return {
+        "job_id": row[0],
+        "job_type": row[1],
+        "status": row[2],
+        "progress": row[3],
+        "result": result,
+        "error": row[5],
+        "attempts": row[6],
+        "max_attempts": row[7],
+        "user_id": row[8],
+        "created_at": row[9],
+        "started_at": row[10],
+        "finished_at": row[11],
+        "updated_at": row[12],
+    }
+
+
+def _run_sql(query: str, params: tuple, fetch: bool = False):
+    conn = get_connection()
+    try:
+        cur = execute_query(conn, query, params)
+        rows = cur.fetchall() if fetch else None
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        put_connection(conn)
+
+
+def enqueue_job(
+    job_type: str, payload: Dict[str, Any], user_id: Optional[int] = None, max_attempts: Optional[int] = None
+) -> int:
+    """Insert a queued job and wake the local workers. Returns the job id."""
+    job_type_info = _JOB_TYPES.get(job_type)
+    if job_type_info is None:
+        raise ValueError(f"Unknown job type: {job_type}")
+    attempts = max_attempts or job_type_info.max_attempts
+    rows = _run_sql(QUERY_INSERT_JOB, (job_type, json.dumps(payload), user_id, attempts), fetch=True)
+    job_id = rows[0][0]
+    logger.info(f"Enqueued job {job_id} ({job_type})")
+    _WAKEUP.set()
+    return job_id
+
+
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    rows = _run_sql(QUERY_GET_JOB, (job_id,), fetch=True)
+    return _row_to_job(rows[0]) if rows else None
+
+
+def list_jobs(status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    rows = _run_sql(QUERY_LIST_JOBS, (status, status, limit), fetch=True)
+    return [_row_to_job(row) for row in rows]
+
+
+def set_job_progress(job_id: int, progress: str) -> None:
+    """Record the current stage of a running job (shown by the status endpoints)."""
+    try:
+        _run_sql(QUERY_SET_JOB_PROGRESS, (progress, job_id))
+    except Exception as e:
+        logger.warning(f"Could not update progress for job {job_id}: {e}")
+
+
+def _claim_next_job() -> Optional[Dict[str, Any]]:
+    """Claim one queued job of a type that still has free concurrency in this process."""
+    with _JOB_TYPES_LOCK:
+        job_types = [name for name, info in _JOB_TYPES.items() if info.running < info.concurrency]
+        if not job_types:
+            return None
+        rows = _run_sql(QUERY_CLAIM_JOB, (WORKER_ID, LEASE_SECONDS, job_types), fetch=True)
+        if not rows:
+            return None
+        job_id, job_type, payload, attempts, max_attempts, user_id = rows[0]
+        _JOB_TYPES[job_type].running += 1
+        _RUNNING_JOBS.add(job_id)
+    return {
+        "id": job_id,
+        "job_type": job_type,
+        "payload": json.loads(payload) if payload else {},
+        "attempts": attempts,
+        "max_attempts": max_attempts,
+        "user_id": user_id,
+    }
+
+
+def _execute_job(job: Dict[str, Any]) -> None:
+    job_type = _JOB_TYPES[job["job_type"]]
+    try:
+        result = job_type.handler(job)
+        _run_sql(QUERY_COMPLETE_JOB, (json.dumps(result, default=str), job["id"]))
+        logger.info(f"Job {job['id']} ({job['job_type']}) completed")
+    except Exception as e:
+        if job["attempts"] < job["max_attempts"]:
+            delay = RETRY_BASE_DELAY_SECONDS * (2 ** (job["attempts"] - 1))
+            logger.warning(f"Job {job['id']} ({job['job_type']}) failed, retrying in {delay}s: {e}")
+            _run_sql(QUERY_RETRY_JOB, (str(e), delay, job["id"]))
+        else:
+            logger.error(f"Job {job['id']} ({job['job_type']}) failed permanently: {e}", exc_info=True)
+            _run_sql(QUERY_FAIL_JOB, (str(e), job["id"]))
+    finally:
+        with _JOB_TYPES_LOCK:
+            job_type.running -= 1
+            _RUNNING_JOBS.discard(job["id"])
+
+
+def _requeue_stale_jobs() -> None:
+    for job_id, status in _run_sql(QUERY_REQUEUE_STALE_JOBS, (STALE_JOB_SECONDS,), fetch=True) or []:
+        if status == "failed":
+            logger.error(f"Job {job_id} lost its worker on its last attempt, marked failed")
+        else:
+            logger.warning(f"Job {job_id} lost its worker, requeued")
+
+
+def _heartbeat() -> None:
+    """Renew this process's leases and requeue jobs of processes that stopped renewing theirs."""
+    with _JOB_TYPES_LOCK:
+        running = sorted(_RUNNING_JOBS)
+    if running:
+        _run_sql(QUERY_RENEW_JOB_LEASES, (LEASE_SECONDS, running, WORKER_ID))
+    _requeue_stale_jobs()
+
+
+def _heartbeat_loop() -> None:
+    while not _STOP.wait(HEARTBEAT_SECONDS):
+        try:
+            _heartbeat()
+        except Exception as e:
+            logger.error(f"Job heartbeat failed: {e}", exc_info=True)
+
+
+def _worker_loop() -> None:
+    while not _STOP.is_set():
+        try:
+            job = _claim_next_job()
+        except Exception as e:
+            logger.error(f"Job worker could not claim a job: {e}", exc_info=True)
+            job = None
+        if job is None:
+            _WAKEUP.wait(POLL_INTERVAL_SECONDS)
+            _WAKEUP.clear()
+            continue
+        try:
+            _execute_job(job)
+        except Exception as e:
+            logger.error(f"Job worker error on job {job['id']}: {e}", exc_info=True)
+
+
+def start_job_workers(num_workers: int) -> None:
+    """Requeue jobs with expired leases and start the worker and heartbeat threads (idempotent)."""
+    if _WORKERS or num_workers <= 0:
+        return
+    try:
+        _requeue_stale_jobs()
+    except Exception as e:
+        logger.warning(f"Could not requeue stale jobs: {e}")
+    _STOP.clear()
+    for i in range(num_workers):
+        worker = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+        worker.start()
+        _WORKERS.append(worker)
+    heartbeat = threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True)
+    heartbeat.start()
+    _WORKERS.append(heartbeat)
+    logger.info(f"Started {num_workers} job workers for types: {sorted(_JOB_TYPES)}")
+
+
+def stop_job_workers(timeout: float = 5.0) -> None:
+    _STOP.set()
+    _WAKEUP.set()
+    for worker in _WORKERS:
+        worker.join(timeout)
+    _WORKERS.clear()
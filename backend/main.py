@@ -1,6 +1,9 @@
 # backend/app/main.py
-from typing import Dict, Any, Optional, Set, List
+from typing import Dict, Any, FrozenSet, Iterator, Optional, Set, List, Tuple
+import contextvars
+import hmac
 import json
+import queue
 
 # PostgreSQL is required
 import psycopg2
@@ -8,14 +11,30 @@ import psycopg2.errors
 from psycopg2.extensions import connection as psycopg2_connection
 
 import faiss
+import numpy as np
 from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 
-from .db import ensure_schema, DATABASE_URL, get_connection, put_connection, execute_query, get_db_connection
+from .db import ensure_schema, sync_serial_sequences, DATABASE_URL, get_connection, put_connection, execute_query, get_db_connection
 
 from backend.chat_nlu import interpret_message
-from backend.similarity_engine import SimilarityEngine
+from backend.similarity_engine import SEARCH_PASS_RATES, SimilarityEngine
+from backend.profiling import profiled, stage_snapshot
+from backend.vector_index import (
+    IndexVersionMismatch,
+    id_array_path,
+    id_lookup_path,
+    index_files_signature,
+    load_delta,
+    load_delta_versions,
+    load_id_lookup,
+    load_index,
+    manifest_path,
+    read_index_version,
+)
 from fastapi.middleware.cors import CORSMiddleware
 from backend.reasoning_utils import get_game_features, compute_meta_similarity, build_reason_summary
 from backend.auth_utils import (
@@ -27,15 +46,35 @@ from backend.auth_utils import (
     verify_bgg_username,
 )
 from backend.logger_config import logger
-from backend.bgg_collection import fetch_user_collection
-from backend.cache import get_cached, set_cached
+from backend.collection_cache import COLLECTION_CACHE
+from backend.chat_metadata import fetch_game_fields, pack_metadata, unpack_metadata
+from backend.chat_writer import CHAT_WRITER, flush_chat_writes, reserve_thread_id, submit_chat_messages
+from backend.user_data import delete_user, get_export_user, stream_user_export
+from backend.pagination import clamp_limit, decode_cursor, encode_cursor, page_response, parse_fields
+from backend.collection_analysis import ANALYSIS_FACETS, analyze_collection, game_feature_sets
+from backend.collection_import import import_user_collection, start_import_job
+from backend.jobs import (
+    enqueue_job,
+    get_job,
+    list_jobs,
+    register_job_type,
+    set_job_progress,
+    start_job_workers,
+    stop_job_workers,
+)
+from backend.game_neighbors import NEIGHBORS_TOP_N, build_game_neighbors
+from backend.cache import get_cached, set_cached, TTLCache
 from backend.monitoring import record_error
+from backend.metrics import collect, render_prometheus, start_metrics_flusher, stop_metrics_flusher
+from backend.middleware import RequestMetricsMiddleware, RequestTracingMiddleware
 from backend.feature_blacklist import find_matching_features
+from backend.feature_incidence import get_incidence, invalidate_incidence
+from backend.feature_bitmaps import get_bitmap_index
+from backend.game_attributes import player_constraint_mask, playtime_constraint_mask
 from backend.clickable_entities import extract_clickable_entities, ClickableEntity
 from backend.db_queries import (
     QUERY_GET_USER_BY_EMAIL,
     QUERY_GET_USER_BY_OAUTH,
-    QUERY_GET_USER_COLLECTION,
     QUERY_GET_GAME_BY_ID,
     QUERY_SEARCH_GAMES_SINGLE_WORD,
     QUERY_SEARCH_MECHANICS,
@@ -44,18 +83,29 @@ from backend.db_queries import (
     QUERY_SEARCH_ARTISTS,
     QUERY_SEARCH_PUBLISHERS,
     QUERY_GET_CHAT_THREAD,
-    QUERY_GET_CHAT_MESSAGES,
-    QUERY_INSERT_CHAT_THREAD,
-    QUERY_INSERT_CHAT_MESSAGE,
-    QUERY_INSERT_CHAT_MESSAGE_WITH_METADATA,
-    QUERY_UPDATE_CHAT_THREAD,
 )
 
 import os
+import threading
+import time
+
+from backend.config import (
+    INDEX_WATCH_INTERVAL_SECONDS,
+    INDEX_MMAP,
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    PRINCIPAL_CACHE_MAX_SIZE,
+    JOB_WORKERS,
+    CHAT_WRITE_BEHIND,
+    METRICS_TOKEN,
+)
 
 # BASE_DIR is now one level up since main.py is in backend/
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 index_path = os.path.join(BASE_DIR, "gen", "game_vectors.index")
+index_delta_path = os.path.join(BASE_DIR, "gen", "game_vectors.delta.npz")
+id_map_path = os.path.join(BASE_DIR, "gen", "game_ids.json")
+index_manifest_path = manifest_path(index_path)
+INDEX_FILES = (index_path, id_map_path, id_array_path(id_map_path), id_lookup_path(id_map_path), index_manifest_path)
 SCHEMA_FILE = os.path.join(BASE_DIR, "update_utils", "schema.sql")
 SCHEMA_FILE_POSTGRES = os.path.join(BASE_DIR, "update_utils", "schema_postgres.sql")
 
@@ -82,6 +132,9 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(RequestTracingMiddleware)
+# Outermost, so the latency includes CORS handling
+app.add_middleware(RequestMetricsMiddleware)
 
 
 # Globals for demo; for production you'd handle lifecycle more carefully.
@@ -190,9 +243,16 @@ class ChatMessage(BaseModel):
     created_at: str
 
 
-def load_id_map(path: str) -> List[int]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+# user_id -> principal dict, so authenticated requests skip the users lookup
+_PRINCIPAL_CACHE = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS, name="principal")
+
+
+def invalidate_principal(user_id: Any) -> None:
+    """Drop a cached principal after its username, BGG id, admin flag or account changed."""
+    try:
+        _PRINCIPAL_CACHE.invalidate(int(user_id))
+    except (TypeError, ValueError):
+        pass
 
 
 def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[Dict[str, Any]]:
@@ -208,6 +268,11 @@ def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depen
         if user_id is None:
             return None
 
+        cached = _PRINCIPAL_CACHE.get(int(user_id))
+        if cached is not None:
+            # Copy so callers can annotate the dict without touching the cache
+            return dict(cached)
+
         # Verify user exists - use connection pool instead of global ENGINE_CONN
         conn = get_db_connection()
         try:
@@ -226,6 +291,7 @@ def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depen
                 "is_admin": bool(user[4] if len(user) > 4 else False),
                 "oauth_provider": user[5] if len(user) > 5 else None,
             }
+            _PRINCIPAL_CACHE.set(result["id"], dict(result))
             return result
         finally:
             # Return connection to pool
@@ -246,31 +312,16 @@ def get_current_user_required(credentials: Optional[HTTPAuthorizationCredentials
 def get_current_admin_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Dict[str, Any]:
     """Get current admin user from JWT token. Raises exception if not authenticated or not admin."""
     user = get_current_user_required(credentials)
-    # Check if user is admin in database (token might be stale)
-    conn = get_db_connection()
-    try:
-        query = "SELECT is_admin FROM users WHERE id = %s"
-        cur = execute_query(conn, query, (user["id"],))
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-        is_admin = row[0] if isinstance(row[0], bool) else bool(row[0])
-        if not is_admin:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-        return user
-    finally:
-        put_connection(conn)
+    # is_admin comes from the users row (not the token), at most PRINCIPAL_CACHE_TTL_SECONDS old
+    if not user.get("is_admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
 
 
-def load_user_collection(user_id: str) -> Set[int]:
-    """Load user's collection BGG IDs from database."""
+def load_user_collection(user_id: str) -> FrozenSet[int]:
+    """Load user's collection BGG IDs (cached per user, see backend/collection_cache.py)."""
     try:
-        conn = get_db_connection()
-        try:
-            cur = execute_query(conn, QUERY_GET_USER_COLLECTION, (int(user_id),))
-            return {row[0] for row in cur.fetchall()}
-        finally:
-            put_connection(conn)
+        return COLLECTION_CACHE.get_ids(int(user_id))
     except (ValueError, psycopg2.Error):
         return set()
     except Exception:
@@ -293,27 +344,124 @@ def on_startup() -> None:
             SCHEMA_FILE_POSTGRES = os.path.join(BASE_DIR, "update_utils", "schema_postgres.sql")
             ensure_schema(ENGINE_CONN, SCHEMA_FILE_POSTGRES)
             logger.info("PostgreSQL schema ensured")
+            # Repair id sequences once here instead of on UniqueViolation in request handlers
+            fixed = sync_serial_sequences(ENGINE_CONN, ["chat_threads", "chat_messages"])
+            if fixed:
+                logger.warning(f"Advanced out-of-sync sequences: {', '.join(fixed)}")
         except Exception as db_err:
             logger.error(f"Failed to connect to PostgreSQL: {db_err}")
             raise
 
         # Load FAISS index and initialize similarity engine
         try:
-            index = faiss.read_index(index_path)
-            id_map = load_id_map(os.path.join(BASE_DIR, "gen", "game_ids.json"))
-            ENGINE = SimilarityEngine(ENGINE_CONN, index, id_map)
+            _INDEX_RELOAD_STATUS["signature"] = index_files_signature(*INDEX_FILES)
+            index, id_map, version, id_lookup = _load_index_files()
+            ENGINE = SimilarityEngine(ENGINE_CONN, index, id_map, version, id_lookup)
+            # Attribute columns for player/playtime filters, built before the first request needs them
+            ENGINE.refresh_attributes()
+            _INDEX_RELOAD_STATUS["loaded_at"] = time.time()
             logger.info(f"SimilarityEngine initialized with {len(id_map)} games")
         except Exception as e:
             logger.error(f"Failed to initialize SimilarityEngine: {e}")
             ENGINE = None
+
+        if INDEX_WATCH_INTERVAL_SECONDS > 0:
+            threading.Thread(target=_watch_index_files, name="index-watcher", daemon=True).start()
+            logger.info(f"Watching similarity index files every {INDEX_WATCH_INTERVAL_SECONDS}s")
+
+        start_job_workers(JOB_WORKERS)
+        start_metrics_flusher()
+        if CHAT_WRITE_BEHIND:
+            CHAT_WRITER.start()
     except Exception as startup_err:
         logger.error(f"Startup failed: {startup_err}", exc_info=True)
         raise
 
 
+# Similarity index hot reload state (guarded by _INDEX_RELOAD_LOCK for writers)
+_INDEX_RELOAD_LOCK = threading.Lock()
+_INDEX_RELOAD_STOP = threading.Event()
+_INDEX_RELOAD_STATUS: Dict[str, Any] = {
+    "state": "idle",  # 'idle', 'loading', 'failed'
+    "loaded_at": None,
+    "games": None,
+    "error": None,
+    "signature": (),
+}
+
+
+def _load_index_files():
+    """(index, id_map, version, id_lookup) from the export files; id_lookup may be None."""
+    # The manifest is written last; reading its version first can only underestimate the
+    # loaded version, which makes the next delta fall back to a full reload rather than skip changes
+    version = read_index_version(index_manifest_path)
+    index, id_map = load_index(index_path, id_map_path, mmap=INDEX_MMAP)
+    return index, id_map, version, load_id_lookup(id_map_path, id_map, mmap=INDEX_MMAP)
+
+
+def reload_similarity_index() -> bool:
+    """
+    Load the index files from disk and swap them into the running engine.
+
+    The new index is read fully before the swap, so requests keep searching the old one
+    until the new one is ready. Returns False if a reload is already running or failed.
+    """
+    global ENGINE
+    if not _INDEX_RELOAD_LOCK.acquire(blocking=False):
+        logger.info("Similarity index reload already in progress")
+        return False
+    try:
+        _INDEX_RELOAD_STATUS.update(state="loading", error=None)
+        signature = index_files_signature(*INDEX_FILES)
+        index, id_map, version, id_lookup = _load_index_files()
+        if ENGINE is None:
+            ENGINE = SimilarityEngine(ENGINE_CONN, index, id_map, version, id_lookup)
+            ENGINE.refresh_attributes()
+        else:
+            # Builds the attribute columns for the new id_map before swapping
+            ENGINE.replace_index(index, id_map, version, id_lookup)
+        _INDEX_RELOAD_STATUS.update(
+            state="idle", loaded_at=time.time(), games=len(id_map), signature=signature
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Failed to reload similarity index: {e}", exc_info=True)
+        _INDEX_RELOAD_STATUS.update(state="failed", error=str(e))
+        return False
+    finally:
+        _INDEX_RELOAD_LOCK.release()
+
+
+def _watch_index_files() -> None:
+    """Poll the index files and reload once a changed export has stopped changing."""
+    pending = None
+    while not _INDEX_RELOAD_STOP.wait(INDEX_WATCH_INTERVAL_SECONDS):
+        try:
+            signature = index_files_signature(*INDEX_FILES)
+            if not signature or signature == _INDEX_RELOAD_STATUS["signature"]:
+                pending = None
+                continue
+            if signature != pending:
+                # Files are still being written; wait for one quiet interval
+                pending = signature
+                continue
+            logger.info("Similarity index files changed on disk, reloading")
+            if not reload_similarity_index():
+                # Do not retry the same broken files on every tick
+                _INDEX_RELOAD_STATUS["signature"] = signature
+            pending = None
+        except Exception as e:
+            logger.error(f"Index file watcher error: {e}", exc_info=True)
+
+
 @app.on_event("shutdown")
 def on_shutdown() -> None:
     global ENGINE_CONN
+    _INDEX_RELOAD_STOP.set()
+    stop_job_workers()
+    stop_metrics_flusher()
+    # Drain queued chat history before the pool goes away
+    CHAT_WRITER.stop()
     if ENGINE_CONN is not None:
         put_connection(ENGINE_CONN)
         ENGINE_CONN = None
@@ -326,159 +474,88 @@ def search_by_features_only(
     constraints: Optional[Dict[str, Any]] = None,
     allowed_ids: Optional[Set[int]] = None,
     top_k: int = 10,
+    excluded_feature_values: Optional[Dict[str, Set[str]]] = None,
 ) -> List[Dict[str, Any]]:
-    """Search games by features only, ordered by rating."""
-    try:
-        constraints = constraints or {}
-        required_feature_values = required_feature_values or {}
+    """
+    Search games by features only, most rated first (in-memory bitmap index, see backend/feature_bitmaps.py).
 
-        # Build SQL query to find games with required features
-        # Start with base query
-        conditions = []
-        params = []
+    Player-count and playtime targets are applied on the cached game attributes. Filters that
+    compare games with a base game (include/exclude_features, overlap and jaccard constraints)
+    cannot apply here and raise ValueError instead of being dropped.
+    """
+    constraints = constraints or {}
+    player_constraints = constraints.get("players") or {}
+    playtime_constraints = constraints.get("playtime") or {}
+    relative_filters = [
+        name for name, value in (("include_features", include_features), ("exclude_features", exclude_features)) if value
+    ]
+    relative_filters += [f"players.{key}" for key in ("min_overlap", "similar_best") if player_constraints.get(key)]
+    relative_filters += [facet for facet, value in constraints.items() if facet not in ("players", "playtime") and value]
+    if relative_filters:
+        raise ValueError(f"Filters {', '.join(relative_filters)} compare against a base game")
 
-        # Add joins and conditions for each required feature type
-        # For each feature type, we need to ensure the game has ALL required values
-        for feature_type, required_values in required_feature_values.items():
-            if not required_values:
-                continue
+    try:
+        index = get_bitmap_index()
+        if player_constraints.get("exact") is not None or playtime_constraints.get("target") is not None:
+            id_map, attributes = ENGINE.game_attributes()
+            if attributes is None:
+                logger.warning("Game attribute columns unavailable, cannot apply player/playtime constraints")
+                return []
+            ok = player_constraint_mask(attributes, {}, player_constraints) & playtime_constraint_mask(
+                attributes, playtime_constraints
+            )
+            matching_ids = {int(game_id) for game_id in id_map[ok]}
+            allowed_ids = matching_ids if allowed_ids is None else matching_ids & set(allowed_ids)
+            if not allowed_ids:
+                logger.info("Feature-only search returned 0 results (no game meets the player/playtime constraints)")
+                return []
+        game_ids = index.search(
+            required=required_feature_values, excluded=excluded_feature_values, allowed_ids=allowed_ids, top_k=top_k
+        )
+        if not game_ids:
+            logger.info("Feature-only search returned 0 results")
+            return []
 
-            # For each required value, we need a separate condition to ensure ALL are present
-            # Use a subquery or multiple EXISTS clauses
-            feature_conditions = []
-            for req_value in required_values:
-                if feature_type == "mechanics":
-                    feature_conditions.append(
-                        """EXISTS (
-                        SELECT 1 FROM game_mechanics gm2
-                        JOIN mechanics m2 ON m2.id = gm2.mechanic_id
-                        WHERE gm2.game_id = g.id AND LOWER(m2.name) = LOWER(%s)
-                    )"""
-                    )
-                    params.append(req_value)
-                elif feature_type == "categories":
-                    feature_conditions.append(
-                        """EXISTS (
-                        SELECT 1 FROM game_categories gc2
-                        JOIN categories c2 ON c2.id = gc2.category_id
-                        WHERE gc2.game_id = g.id AND LOWER(c2.name) = LOWER(%s)
-                    )"""
-                    )
-                    params.append(req_value)
-                elif feature_type == "designers":
-                    feature_conditions.append(
-                        """EXISTS (
-                        SELECT 1 FROM game_designers gd2
-                        JOIN designers d2 ON d2.id = gd2.designer_id
-                        WHERE gd2.game_id = g.id AND LOWER(d2.name) = LOWER(%s)
-                    )"""
-                    )
-                    params.append(req_value)
-                elif feature_type == "families":
-                    feature_conditions.append(
-                        """EXISTS (
-                        SELECT 1 FROM game_families gf2
-                        JOIN families f2 ON f2.id = gf2.family_id
-                        WHERE gf2.game_id = g.id AND LOWER(f2.name) = LOWER(%s)
-                    )"""
-                    )
-                    params.append(req_value)
-
-            if feature_conditions:
-                conditions.append("(" + " AND ".join(feature_conditions) + ")")
-
-        # Build final query
-        if not conditions:
-            # No required features - just return top rated games
-            sql = """SELECT DISTINCT g.id, g.name, g.year_published, g.thumbnail,
-                            g.average_rating, g.num_ratings, g.min_players, g.max_players, g.description
-                     FROM games g"""
-            if allowed_ids and len(allowed_ids) > 0:
-                placeholders = ",".join(["%s" for _ in allowed_ids])
-                sql += f" WHERE g.id IN ({placeholders})"
-                params.extend(list(allowed_ids))
-            sql += " ORDER BY g.num_ratings DESC NULLS LAST, g.average_rating DESC NULLS LAST LIMIT %s"
-            params.append(top_k)
-        else:
-            # Has required features
-            sql = f"""SELECT DISTINCT g.id, g.name, g.year_published, g.thumbnail,
-                            g.average_rating, g.num_ratings, g.min_players, g.max_players, g.description
-                     FROM games g
-                     WHERE {' AND '.join(conditions)}"""
-            if allowed_ids and len(allowed_ids) > 0:
-                placeholders = ",".join(["%s" for _ in allowed_ids])
-                sql += f" AND g.id IN ({placeholders})"
-                params.extend(list(allowed_ids))
-            sql += " ORDER BY g.num_ratings DESC NULLS LAST, g.average_rating DESC NULLS LAST LIMIT %s"
-            params.append(top_k)
-
-        logger.debug(f"Feature-only search SQL: {sql[:200]}... with {len(params)} params")
+        incidence = get_incidence()
         conn = get_db_connection()
         try:
-            try:
-                cur = execute_query(conn, sql, tuple(params) if params else None)
-            except Exception as e:
-                logger.error(f"SQL error in feature-only search: {e}, SQL: {sql}, params: {params}")
-                return []
-            results = []
-            for row in cur.fetchall():
-                game_id = row[0]
-                # Get all features for this game
-                # Note: get_game_features is imported at top of file
-
-                try:
-                    game_features = get_game_features(conn, game_id)
-                except Exception as e:
-                    logger.warning(f"Error getting features for game {game_id}: {e}")
-                    game_features = {}
-
-                # Get designers for this game
-                designers = []
-                try:
-                    cur_d = execute_query(
-                        conn,
-                        """SELECT d.name FROM designers d
-                           JOIN game_designers gd ON gd.designer_id = d.id
-                           WHERE gd.game_id = %s ORDER BY d.name""",
-                        (game_id,),
-                    )
-                    designers = [r[0] for r in cur_d.fetchall()]
-                except Exception as e:
-                    logger.debug(f"Error fetching designers for game {game_id}: {e}")
-                    designers = []
-
-                # Row structure: id, name, year_published, thumbnail, average_rating, num_ratings, min_players, max_players, description
-                # Get all features as lists (not sets) for JSON serialization
-                all_mechanics = list(game_features.get("mechanics", []))
-                all_categories = list(game_features.get("categories", []))
-                all_designers = list(game_features.get("designers", []))
-                all_families = list(game_features.get("families", []))
-
-                results.append(
-                    {
-                        "game_id": game_id,
-                        "name": row[1],
-                        "year_published": row[2],
-                        "thumbnail": row[3],
-                        "average_rating": row[4],
-                        "num_ratings": row[5],
-                        "min_players": row[6],
-                        "max_players": row[7],
-                        "description": row[8] if len(row) > 8 and row[8] else None,
-                        "designers": designers,  # Keep for backward compatibility
-                        # Return all features (not shared) for feature-only search
-                        "mechanics": all_mechanics,
-                        "categories": all_categories,
-                        "designers_list": all_designers,  # Use designers_list to distinguish from designers (which is already used for display)
-                        "families": all_families,
-                        "reason_summary": "Found by matching required features",
-                    }
-                )
-
-            logger.info(f"Feature-only search returned {len(results)} results")
-            return results
+            # Display fields for the top-k only, in one batch
+            games = fetch_game_fields(conn, game_ids)
         finally:
             put_connection(conn)
+
+        results = []
+        for game_id in game_ids:
+            game = games.get(game_id)
+            if not game:
+                continue
+            features = {
+                ft: sorted(incidence[ft].feature_names(incidence[ft].features(game_id)))
+                for ft in ANALYSIS_FACETS
+            }
+            results.append(
+                {
+                    "game_id": game_id,
+                    "name": game["name"],
+                    "year_published": game["year_published"],
+                    "thumbnail": game["thumbnail"],
+                    "average_rating": game["average_rating"],
+                    "num_ratings": game["num_ratings"],
+                    "min_players": game["min_players"],
+                    "max_players": game["max_players"],
+                    "description": game["description"],
+                    "designers": game["designers"],  # Keep for backward compatibility
+                    # Return all features (not shared) for feature-only search
+                    "mechanics": features["mechanics"],
+                    "categories": features["categories"],
+                    "designers_list": features["designers"],  # Use designers_list to distinguish from designers (which is already used for display)
+                    "families": features["families"],
+                    "reason_summary": "Found by matching required features",
+                }
+            )
+
+        logger.info(f"Feature-only search returned {len(results)} results")
+        return results
     except Exception as e:
         logger.error(f"Error in feature-only search: {e}", exc_info=True)
         return []
@@ -554,6 +631,7 @@ def oauth_callback(req: OAuthCallbackRequest):
                     update_query = "UPDATE users SET bgg_id = %s WHERE id = %s"
                     execute_query(conn, update_query, (oauth_id, user_id))
                     conn.commit()
+                    invalidate_principal(user_id)
         else:
             # New user - create account (username is NULL initially, user will set it in profile)
             is_new_user = True
@@ -679,6 +757,7 @@ def update_username(req: UsernameUpdateRequest, current_user: Dict[str, Any] = D
         query = "UPDATE users SET username = %s WHERE id = %s"
         execute_query(conn, query, (username, current_user["id"]))
         conn.commit()
+        invalidate_principal(current_user["id"])
 
         logger.info(f"Username updated successfully for user {current_user['id']}")
         return {"success": True, "username": username}
@@ -704,6 +783,7 @@ def update_bgg_id(req: BggIdUpdateRequest, current_user: Dict[str, Any] = Depend
         query = "UPDATE users SET bgg_id = %s WHERE id = %s"
         execute_query(conn, query, (bgg_id, current_user["id"]))
         conn.commit()
+        invalidate_principal(current_user["id"])
 
         logger.info(f"BGG ID updated successfully for user {current_user['id']}")
         return {"success": True, "bgg_id": bgg_id}
@@ -712,79 +792,37 @@ def update_bgg_id(req: BggIdUpdateRequest, current_user: Dict[str, Any] = Depend
 
 
 @app.post("/profile/collection/import-bgg")
-def import_bgg_collection(current_user: Dict[str, Any] = Depends(get_current_user_required)):
-    """Import collection from BGG."""
+def import_bgg_collection(background: bool = False, current_user: Dict[str, Any] = Depends(get_current_user_required)):
+    """
+    Import collection from BGG.
+
+    With background=true the import is queued as a job and its id is returned;
+    poll GET /profile/collection/import-bgg/{job_id} (or /jobs/{job_id}) for progress.
+    """
     bgg_id_value = current_user.get("bgg_id")
     if not bgg_id_value:
         raise HTTPException(status_code=400, detail="BGG ID not set. Please set your BGG ID first.")
 
     logger.info(f"Importing BGG collection for user {current_user['id']} (BGG ID: {current_user['bgg_id']})")
 
-    conn = get_db_connection()
-    try:
-        # personal_rating column should exist in PostgreSQL schema
-
-        games_data = fetch_user_collection(str(current_user["bgg_id"]))
-        logger.info(f"Fetched {len(games_data)} games from BGG")
-
-        # Verify games exist in our DB and add to collection
-        added_count = 0
-        skipped_count = 0
-        updated_count = 0
-
-        for game_data in games_data:
-            game_id = game_data["game_id"]
-            personal_rating = game_data.get("personal_rating")
-
-            # Check if game exists in DB
-            query = "SELECT id FROM games WHERE id = %s"
-            cur = execute_query(conn, query, (game_id,))
-            if not cur.fetchone():
-                logger.debug(f"Game {game_id} not found in local DB, skipping")
-                skipped_count += 1
-                continue
-
-            # Check if already in collection
-            query = "SELECT personal_rating FROM user_collections WHERE user_id = %s AND game_id = %s"
-            cur = execute_query(conn, query, (current_user["id"], game_id))
-            existing = cur.fetchone()
-
-            if existing:
-                # Update with new rating if provided
-                if personal_rating is not None:
-                    try:
-                        query = "UPDATE user_collections SET personal_rating = %s WHERE user_id = %s AND game_id = %s"
-                        execute_query(conn, query, (personal_rating, current_user["id"], game_id))
-                        conn.commit()
-                        updated_count += 1
-                    except Exception as e:
-                        logger.warning(f"Error updating game {game_id} rating: {e}")
-            else:
-                # Add to collection with rating
-                try:
-                    query = "INSERT INTO user_collections (user_id, game_id, personal_rating) VALUES (%s, %s, %s)"
-                    execute_query(conn, query, (current_user["id"], game_id, personal_rating))
-                    conn.commit()
-                    added_count += 1
-                except Exception as e:
-                    logger.warning(f"Error adding game {game_id} to collection: {e}")
-                    skipped_count += 1
-
-        conn.commit()
-        logger.info(f"Collection import complete: {added_count} added, {updated_count} updated, {skipped_count} skipped")
+    if background:
+        job_id = start_import_job(current_user["id"], str(bgg_id_value))
+        return {"success": True, "job_id": job_id, "status": "queued"}
 
-        return {
-            "success": True,
-            "added": added_count,
-            "updated": updated_count,
-            "skipped": skipped_count,
-            "total_fetched": len(games_data),
-        }
+    try:
+        return import_user_collection(current_user["id"], str(bgg_id_value))
     except Exception as e:
         logger.error(f"Error importing BGG collection: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to import collection: {str(e)}")
-    finally:
-        put_connection(conn)
+
+
+@app.get("/profile/collection/import-bgg/{job_id}")
+def get_bgg_import_status(job_id: int, current_user: Dict[str, Any] = Depends(get_current_user_required)):
+    """Get progress of a background BGG collection import."""
+    job = get_job(job_id)
+    if job is None or job["job_type"] != "bgg_collection_import" or job["user_id"] != current_user["id"]:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
 
 
 @app.get("/games/search")
@@ -973,59 +1011,103 @@ def search_games(q: str, limit: int = 10):
             logger.warning(f"Error returning connection to pool: {e}")
 
 
+# Collection fields that can be projected with ?fields=, mapped to their SQL expression
+COLLECTION_FIELDS = {
+    "game_id": "uc.game_id",
+    "name": "g.name",
+    "year_published": "g.year_published",
+    "thumbnail": "g.thumbnail",
+    "added_at": "uc.added_at",
+    "average_rating": "g.average_rating",
+    "personal_rating": "uc.personal_rating",
+}
+COLLECTION_SORT_COLUMNS = {
+    "added_at": "uc.added_at",
+    "name": "g.name",
+    "year_published": "g.year_published",
+    "average_rating": "g.average_rating",
+    "rank": "g.overall_rank",
+}
+
+
+def _keyset_condition(sort_col: str, id_col: str, op: str, sort_value: Any) -> str:
+    """WHERE fragment selecting rows after (sort_value, id) in ORDER BY sort_col NULLS LAST, id_col."""
+    if sort_value is None:
+        return f"{sort_col} IS NULL AND {id_col} {op} %s"
+    return f"({sort_col} {op} %s OR {sort_col} IS NULL OR ({sort_col} = %s AND {id_col} {op} %s))"
+
+
 @app.get("/profile/collection")
 def get_collection(
-    sort_by: str = "year_published", order: str = "desc", current_user: Optional[Dict[str, Any]] = Depends(get_current_user)
+    sort_by: str = "year_published",
+    order: str = "desc",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: Optional[Dict[str, Any]] = Depends(get_current_user),
 ):
-    """Get user's game collection with sorting options."""
+    """
+    Get user's game collection with sorting options.
+
+    Without limit/cursor the whole collection is returned as a list. With them a page
+    {items, next_cursor, has_more} is returned; pass next_cursor back as cursor for the
+    next page. fields=name,thumbnail limits the returned fields (game_id is always included).
+    """
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
 
     # Validate sort_by and order
-    valid_sort_fields = ["added_at", "name", "year_published", "rank", "average_rating"]
-    if sort_by not in valid_sort_fields:
+    if sort_by not in COLLECTION_SORT_COLUMNS:
         sort_by = "year_published"
     if order.lower() not in ["asc", "desc"]:
         order = "desc"
+    direction = order.upper()
+    op = "<" if direction == "DESC" else ">"
+    sort_col = COLLECTION_SORT_COLUMNS[sort_by]
 
-    # Build ORDER BY clause
-    order_by = f"{sort_by} {order.upper()}"
-    if sort_by == "added_at":
-        order_by = f"uc.added_at {order.upper()}"
-    elif sort_by == "name":
-        order_by = f"g.name {order.upper()}"
-    elif sort_by == "year_published":
-        order_by = f"g.year_published {order.upper()}"
-    elif sort_by == "average_rating":
-        order_by = f"g.average_rating {order.upper()}"
+    try:
+        selected = parse_fields(fields, COLLECTION_FIELDS, required=["game_id"])
+        cursor_values = decode_cursor(cursor, 2) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    paginate = limit is not None or cursor is not None
+    page_size = clamp_limit(limit)
+
+    params: List[Any] = [current_user["id"]]
+    keyset = ""
+    if cursor_values is not None:
+        sort_value, last_game_id = cursor_values
+        keyset = "AND " + _keyset_condition(sort_col, "uc.game_id", op, sort_value)
+        params.extend([last_game_id] if sort_value is None else [sort_value, sort_value, last_game_id])
+    limit_sql = ""
+    if paginate:
+        # One extra row tells whether another page exists
+        limit_sql = "LIMIT %s"
+        params.append(page_size + 1)
 
     conn = get_db_connection()
     try:
-        # personal_rating column exists in PostgreSQL schema
-        query = f"""SELECT uc.game_id, g.name, g.year_published, g.thumbnail, uc.added_at,
-                    g.average_rating, uc.personal_rating
+        # The sort key is selected separately so the cursor works with any projection
+        query = f"""SELECT {", ".join(COLLECTION_FIELDS[f] for f in selected)}, {sort_col}
                FROM user_collections uc
                JOIN games g ON uc.game_id = g.id
-               WHERE uc.user_id = %s
-               ORDER BY {order_by}"""
-        cur = execute_query(conn, query, (current_user["id"],))
-        collection = []
-        for row in cur.fetchall():
-            collection.append(
-                {
-                    "game_id": row[0],
-                    "name": row[1],
-                    "year_published": row[2],
-                    "thumbnail": row[3],
-                    "added_at": row[4],
-                    "average_rating": row[5],
-                    "personal_rating": row[6],
-                }
-            )
-        return collection
+               WHERE uc.user_id = %s {keyset}
+               ORDER BY {sort_col} {direction} NULLS LAST, uc.game_id {direction}
+               {limit_sql}"""
+        cur = execute_query(conn, query, tuple(params))
+        rows = cur.fetchall()
     finally:
         put_connection(conn)
 
+    next_cursor = None
+    if paginate and len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[-1], last[selected.index("game_id")]])
+    collection = [dict(zip(selected, row[:-1])) for row in rows]
+    return page_response(collection, next_cursor) if paginate else collection
+
 
 class AddToCollectionRequest(BaseModel):
     game_id: int
@@ -1046,6 +1128,7 @@ def add_to_collection(req: AddToCollectionRequest, current_user: Dict[str, Any]
         insert_sql = "INSERT INTO user_collections (user_id, game_id) VALUES (%s, %s) ON CONFLICT DO NOTHING"
         execute_query(conn, insert_sql, (current_user["id"], game_id))
         conn.commit()
+        COLLECTION_CACHE.add_games(current_user["id"], [game_id])
         logger.info(f"Added game {game_id} to collection for user {current_user['id']}")
         return {"success": True, "game_id": game_id}
     finally:
@@ -1060,6 +1143,7 @@ def remove_from_collection(game_id: int, current_user: Dict[str, Any] = Depends(
         query = "DELETE FROM user_collections WHERE user_id = %s AND game_id = %s"
         cur = execute_query(conn, query, (current_user["id"], game_id))
         conn.commit()
+        COLLECTION_CACHE.remove_games(current_user["id"], [game_id])
         rowcount = cur.rowcount if hasattr(cur, "rowcount") else (0 if not cur.fetchone() else 1)
         if rowcount == 0:
             raise HTTPException(status_code=404, detail="Game not in collection")
@@ -1070,184 +1154,60 @@ def remove_from_collection(game_id: int, current_user: Dict[str, Any] = Depends(
 
 @app.get("/profile/export-data")
 def export_user_data(current_user: Dict[str, Any] = Depends(get_current_user_required)):
-    """Export all user data as JSON."""
+    """Export all user data as JSON, streamed from server-side cursors."""
     user_id = current_user["id"]
+    flush_chat_writes()
     conn = get_db_connection()
     try:
-        # Get user info
-        query = "SELECT id, email, username, bgg_id, oauth_provider, is_admin, created_at FROM users WHERE id = %s"
-        cur = execute_query(conn, query, (user_id,))
-        user_row = cur.fetchone()
-
+        user_row = get_export_user(conn, user_id)
         if not user_row:
             raise HTTPException(status_code=404, detail="User not found")
-
-        user_data = {
-            "id": user_row[0],
-            "email": user_row[1],
-            "username": user_row[2],
-            "bgg_id": user_row[3],
-            "oauth_provider": user_row[4],
-            "is_admin": bool(user_row[5]),
-            "created_at": str(user_row[6]) if user_row[6] else None,
-        }
-
-        # Get collection
-        query = """SELECT uc.game_id, g.name, g.year_published, uc.added_at, uc.personal_rating
-                   FROM user_collections uc
-                   JOIN games g ON uc.game_id = g.id
-                   WHERE uc.user_id = %s
-                   ORDER BY uc.added_at DESC"""
-        cur = execute_query(conn, query, (user_id,))
-        collection = []
-        for row in cur.fetchall():
-            collection.append(
-                {
-                    "game_id": row[0],
-                    "game_name": row[1],
-                    "year_published": row[2],
-                    "added_at": str(row[3]) if row[3] else None,
-                    "personal_rating": float(row[4]) if row[4] is not None else None,
-                }
-            )
-        user_data["collection"] = collection
-
-        # Get chat threads
-        query = """SELECT id, title, created_at, updated_at
-                   FROM chat_threads
-                   WHERE user_id = %s
-                   ORDER BY created_at DESC"""
-        cur = execute_query(conn, query, (user_id,))
-        threads = []
-        for row in cur.fetchall():
-            threads.append(
-                {
-                    "thread_id": row[0],
-                    "title": row[1],
-                    "created_at": str(row[2]) if row[2] else None,
-                    "updated_at": str(row[3]) if row[3] else None,
-                }
-            )
-        user_data["chat_threads"] = threads
-
-        # Get chat messages (for each thread)
-        for thread in threads:
-            query = """SELECT id, role, message, metadata, created_at
-                       FROM chat_messages
-                       WHERE thread_id = %s
-                       ORDER BY created_at ASC"""
-            cur = execute_query(conn, query, (thread["thread_id"],))
-            messages = []
-            for row in cur.fetchall():
-                messages.append(
-                    {
-                        "message_id": row[0],
-                        "role": row[1],
-                        "message": row[2],
-                        "metadata": json.loads(row[3]) if row[3] else None,
-                        "created_at": str(row[4]) if row[4] else None,
-                    }
-                )
-            thread["messages"] = messages
-
-        # Get feedback responses
-        query = """SELECT fr.id, fr.question_id, fr.option_id, fr.response, fr.context,
-                          fr.thread_id, fr.additional_details, fr.created_at,
-                          fq.question_text
-                   FROM feedback_responses fr
-                   LEFT JOIN feedback_questions fq ON fr.question_id = fq.id
-                   WHERE fr.user_id = %s
-                   ORDER BY fr.created_at DESC"""
-        cur = execute_query(conn, query, (user_id,))
-        feedback_responses = []
-        for row in cur.fetchall():
-            feedback_responses.append(
-                {
-                    "response_id": row[0],
-                    "question_id": row[1],
-                    "question_text": row[8],
-                    "option_id": row[2],
-                    "response": row[3],
-                    "context": row[4],
-                    "thread_id": row[5],
-                    "additional_details": row[6],
-                    "created_at": str(row[7]) if row[7] else None,
-                }
-            )
-        user_data["feedback_responses"] = feedback_responses
-
-        # Get scoring sessions
-        query = """SELECT id, game_id, mechanism_id, intermediate_scores_json,
-                          final_score, created_at, updated_at
-                   FROM user_scoring_sessions
-                   WHERE user_id = %s
-                   ORDER BY created_at DESC"""
-        cur = execute_query(conn, query, (user_id,))
-        scoring_sessions = []
-        for row in cur.fetchall():
-            scoring_sessions.append(
-                {
-                    "session_id": row[0],
-                    "game_id": row[1],
-                    "mechanism_id": row[2],
-                    "intermediate_scores": json.loads(row[3]) if row[3] else None,
-                    "final_score": float(row[4]) if row[4] is not None else None,
-                    "created_at": str(row[5]) if row[5] else None,
-                    "updated_at": str(row[6]) if row[6] else None,
-                }
-            )
-        user_data["scoring_sessions"] = scoring_sessions
-
-        return user_data
     except HTTPException:
+        put_connection(conn)
         raise
     except Exception as e:
+        put_connection(conn)
         logger.error(f"Error exporting user data: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to export user data: {str(e)}")
-    finally:
-        put_connection(conn)
+
+    def stream():
+        # The connection is held until the last chunk is sent (or the client disconnects)
+        try:
+            yield from stream_user_export(conn, user_row)
+        except Exception as e:
+            logger.error(f"Error streaming export for user {user_id}: {e}", exc_info=True)
+            raise
+        finally:
+            conn.rollback()
+            put_connection(conn)
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="pista-export-{user_id}.json"'},
+    )
 
 
 @app.delete("/profile/account")
 def delete_own_account(current_user: Dict[str, Any] = Depends(get_current_user_required)):
     """Delete the current user's account and all associated data."""
     user_id = current_user["id"]
+    # Queued chat writes would otherwise recreate threads after the delete
+    flush_chat_writes()
     conn = get_db_connection()
     try:
-        # Delete in order to respect foreign key constraints
-        # Delete scoring sessions
-        query = "DELETE FROM user_scoring_sessions WHERE user_id = %s"
-        execute_query(conn, query, (user_id,))
-
-        # Delete feedback responses
-        query = "DELETE FROM feedback_responses WHERE user_id = %s"
-        execute_query(conn, query, (user_id,))
-
-        # Delete chat messages (via threads)
-        query = "SELECT id FROM chat_threads WHERE user_id = %s"
-        cur = execute_query(conn, query, (user_id,))
-        thread_ids = [row[0] for row in cur.fetchall()]
-        if thread_ids:
-            placeholders = ",".join(["%s"] * len(thread_ids))
-            query = f"DELETE FROM chat_messages WHERE thread_id IN ({placeholders})"
-            execute_query(conn, query, tuple(thread_ids))
-
-        # Delete chat threads
-        query = "DELETE FROM chat_threads WHERE user_id = %s"
-        execute_query(conn, query, (user_id,))
-
-        # Delete collection
-        query = "DELETE FROM user_collections WHERE user_id = %s"
-        execute_query(conn, query, (user_id,))
-
-        # Finally delete user
-        query = "DELETE FROM users WHERE id = %s"
-        execute_query(conn, query, (user_id,))
-
+        # Collections, chat, feedback, A/B preferences, scoring sessions and jobs cascade from users
+        if not delete_user(conn, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
         conn.commit()
+        invalidate_principal(user_id)
+        COLLECTION_CACHE.invalidate(user_id)
 
         logger.info(f"User {user_id} account deleted successfully")
         return {"success": True, "message": "Account deleted successfully"}
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         logger.error(f"Error deleting user account: {e}", exc_info=True)
@@ -1257,33 +1217,86 @@ def delete_own_account(current_user: Dict[str, Any] = Depends(get_current_user_r
 
 
 @app.get("/chat/history")
-def get_chat_history(current_user: Optional[Dict[str, Any]] = Depends(get_current_user)):
-    """Get list of chat threads for the user."""
+def get_chat_history(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user: Optional[Dict[str, Any]] = Depends(get_current_user),
+):
+    """Get list of chat threads for the user, most recently updated first (paged when limit/cursor is given)."""
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
+    try:
+        cursor_values = decode_cursor(cursor, 2) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    flush_chat_writes()
+
+    paginate = limit is not None or cursor is not None
+    page_size = clamp_limit(limit)
+    params: List[Any] = [current_user["id"]]
+    keyset = ""
+    if cursor_values is not None:
+        keyset = "AND (updated_at, id) < (%s, %s)"
+        params.extend(cursor_values)
+    limit_sql = ""
+    if paginate:
+        limit_sql = "LIMIT %s"
+        params.append(page_size + 1)
+
     conn = get_db_connection()
     try:
         cur = execute_query(
             conn,
-            """SELECT id, title, created_at, updated_at
+            f"""SELECT id, title, created_at, updated_at
                FROM chat_threads
-               WHERE user_id = %s
-               ORDER BY updated_at DESC""",
-            (current_user["id"],),
+               WHERE user_id = %s {keyset}
+               ORDER BY updated_at DESC, id DESC
+               {limit_sql}""",
+            tuple(params),
         )
-        threads = []
-        for row in cur.fetchall():
-            threads.append({"id": row[0], "title": row[1] or f"Chat {row[0]}", "created_at": row[2], "updated_at": row[3]})
-        return threads
+        rows = cur.fetchall()
     finally:
         put_connection(conn)
 
+    next_cursor = None
+    if paginate and len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([rows[-1][3], rows[-1][0]])
+    threads = [
+        {"id": row[0], "title": row[1] or f"Chat {row[0]}", "created_at": row[2], "updated_at": row[3]} for row in rows
+    ]
+    return page_response(threads, next_cursor) if paginate else threads
+
 
 @app.get("/chat/history/{thread_id}")
-def get_chat_thread(thread_id: int, current_user: Optional[Dict[str, Any]] = Depends(get_current_user)):
-    """Get messages for a specific chat thread."""
+def get_chat_thread(
+    thread_id: int,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_metadata: Optional[bool] = None,
+    current_user: Optional[Dict[str, Any]] = Depends(get_current_user),
+):
+    """
+    Get messages for a specific chat thread.
+
+    Without limit/cursor every message is returned with its metadata. With them the
+    newest messages come first page-wise (each page in chronological order, next_cursor
+    pointing at older messages) and metadata is left out unless include_metadata=true;
+    load it per message from /chat/history/{thread_id}/messages/{message_id}/metadata.
+    """
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
+    try:
+        cursor_values = decode_cursor(cursor, 1) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    flush_chat_writes()
+
+    paginate = limit is not None or cursor is not None
+    if include_metadata is None:
+        include_metadata = not paginate
+    next_cursor = None
+
     conn = get_db_connection()
     try:
         # Verify thread belongs to user
@@ -1291,29 +1304,123 @@ def get_chat_thread(thread_id: int, current_user: Optional[Dict[str, Any]] = Dep
         if not cur.fetchone():
             raise HTTPException(status_code=404, detail="Thread not found")
 
-        # Get messages
-        cur = execute_query(conn, QUERY_GET_CHAT_MESSAGES, (thread_id,))
-        messages = []
-        for row in cur.fetchall():
-            messages.append(
-                {
-                    "id": row[0],
-                    "role": row[1],
-                    "message": row[2],
-                    "metadata": json.loads(row[3]) if row[3] else None,
-                    "created_at": row[4],
-                }
+        # Get messages; the metadata blob is only read when it will be returned
+        metadata_col = "metadata" if include_metadata else "metadata IS NOT NULL"
+        if paginate:
+            page_size = clamp_limit(limit)
+            params: List[Any] = [thread_id]
+            keyset = ""
+            if cursor_values is not None:
+                keyset = "AND id < %s"
+                params.append(cursor_values[0])
+            params.append(page_size + 1)
+            cur = execute_query(
+                conn,
+                f"""SELECT id, role, message, {metadata_col}, created_at
+                   FROM chat_messages
+                   WHERE thread_id = %s {keyset}
+                   ORDER BY id DESC
+                   LIMIT %s""",
+                tuple(params),
             )
-        return messages
+            rows = cur.fetchall()
+            if len(rows) > page_size:
+                rows = rows[:page_size]
+                next_cursor = encode_cursor([rows[-1][0]])
+            rows.reverse()
+        else:
+            cur = execute_query(
+                conn,
+                f"SELECT id, role, message, {metadata_col}, created_at FROM chat_messages WHERE thread_id = %s ORDER BY created_at ASC",
+                (thread_id,),
+            )
+            rows = cur.fetchall()
+
+        # Compact result references are rehydrated in one batch for the whole page
+        metadata = unpack_metadata(conn, [row[3] for row in rows]) if include_metadata else None
     finally:
         put_connection(conn)
 
+    messages = []
+    for i, row in enumerate(rows):
+        message = {"id": row[0], "role": row[1], "message": row[2], "created_at": row[4]}
+        if include_metadata:
+            message["metadata"] = metadata[i]
+        else:
+            message["has_metadata"] = bool(row[3])
+        messages.append(message)
+    return page_response(messages, next_cursor) if paginate else messages
+
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_current_user)) -> ChatResponse:
-    """Chat endpoint with history saving. Works with or without authentication."""
+@app.get("/chat/history/{thread_id}/messages/{message_id}/metadata")
+def get_chat_message_metadata(
+    thread_id: int, message_id: int, current_user: Optional[Dict[str, Any]] = Depends(get_current_user)
+):
+    """Get the metadata (results, query spec, ...) of one chat message."""
+    if current_user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication required")
+    flush_chat_writes()
+    conn = get_db_connection()
+    try:
+        cur = execute_query(
+            conn,
+            """SELECT m.metadata
+               FROM chat_messages m
+               JOIN chat_threads t ON t.id = m.thread_id
+               WHERE m.id = %s AND m.thread_id = %s AND t.user_id = %s""",
+            (message_id, thread_id, current_user["id"]),
+        )
+        row = cur.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Message not found")
+        return {"id": message_id, "metadata": unpack_metadata(conn, [row[0]])[0]}
+    finally:
+        put_connection(conn)
+
+
+def _stream_search(
+    name: str, results: Iterator[Dict[str, Any]], streamed: List[Dict[str, Any]]
+) -> Iterator[Tuple[str, Any]]:
+    """One "result" event per engine result as the engine produces it; each is also added to streamed."""
+    with profiled(name):
+        for result in results:
+            streamed.append(result)
+            yield "result", {"rank": len(streamed) - 1, "result": result}
+
+
+def _result_events(
+    reply_text: str, results: Optional[List[Dict[str, Any]]], streamed: Optional[List[Dict[str, Any]]] = None
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Reply text, then the results not streamed yet: one event per result in rank order
+    (top-1 first), or a "results" event when the final results replace the streamed ones.
+    """
+    yield "reply", {"reply_text": reply_text, "result_count": len(results or [])}
+    if not streamed:
+        for rank, result in enumerate(results or []):
+            yield "result", {"rank": rank, "result": result}
+    elif results is not streamed:
+        yield "results", {"results": results or []}
+
+
+def _chat_events(req: ChatRequest, current_user: Optional[Dict[str, Any]]) -> Iterator[Tuple[str, Any]]:
+    """
+    Run a chat turn as a sequence of (event, data) pairs.
+
+    Events, in order: "interpretation" (NLU query spec); one "result" per result as the
+    similarity search hydrates it (top-1 first); "reply"; "result" events for results that
+    were not streamed (fallback searches, other intents); "results" when the final results
+    replace the streamed ones (a failed search, A/B preferences); "ab_responses",
+    "clickable_entities" and finally "done" with the full ChatResponse.
+    /chat drains this and returns the "done" payload; /chat/stream forwards every event.
+    """
     assert ENGINE is not None, "ENGINE not initialized"
     logger.info(f"Chat request from user: {current_user['id'] if current_user else 'anonymous'}")
+    # Results already sent by the streaming similarity search
+    streamed: List[Dict[str, Any]] = []
+    # Only set by similarity searches that found results
+    followup_prompt = ""
+    should_show_prompt = False
 
     # Handle authenticated vs anonymous users
     if current_user:
@@ -1343,6 +1450,7 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
     if req.selected_game_id:
         query_spec["base_game_id"] = req.selected_game_id
         logger.debug(f"Overriding base_game_id to {req.selected_game_id}")
+    yield "interpretation", {"intent": query_spec.get("intent", "recommend_similar"), "query_spec": query_spec}
 
     intent = query_spec.get("intent", "recommend_similar")
     reply_text = "I'm not sure what to do with that yet."
@@ -1373,82 +1481,18 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                     # Get a connection for this section
                     conn_do_i_need = get_db_connection()
                     try:
-                        # Get game features
-                        from backend.reasoning_utils import get_game_features, get_feature_rarity_weights
-
-                        game_features = get_game_features(conn_do_i_need, base_game_id)
-
-                        # Find top 5 similar games in collection
-                        similar_games = []  # List of (game_id, similarity, overlaps, collection_features)
+                        # One vectorized pass over the cached game x feature incidence
+                        incidence = get_incidence()
+                        analysis = analyze_collection(incidence, base_game_id, user_collection, top_n=5)
+                        game_features = game_feature_sets(incidence, base_game_id)
 
-                        for collection_game_id in user_collection:
-                            try:
-                                collection_features = get_game_features(conn_do_i_need, collection_game_id)
-                                from backend.reasoning_utils import compute_meta_similarity
-
-                                similarity, overlaps, _ = compute_meta_similarity(game_features, collection_features)
-                                similar_games.append((collection_game_id, similarity, overlaps, collection_features))
-                            except Exception as e:
-                                logger.debug(f"Error comparing with game {collection_game_id}: {e}")
-                                continue
-
-                        # Sort by similarity and take top 5
-                        similar_games.sort(key=lambda x: x[1], reverse=True)
-                        top_similar_games = similar_games[:5]
-
-                        if not top_similar_games:
+                        if not analysis.top_matches:
                             reply_text = "I couldn't find any similar games in your collection to compare with."
                             results = []
                         else:
-                            max_similarity = top_similar_games[0][1]
-                            # most_similar_game_id = top_similar_games[0][0]  # Unused for now
-                            # most_similar_features = top_similar_games[0][2]  # Unused for now
-
-                            # Get rarity weights for missing features (need to call for each feature type)
-                            rarity_weights = {}
-                            for feature_type in ["mechanics", "categories", "designers", "families"]:
-                                rarity_weights[feature_type] = get_feature_rarity_weights(conn_do_i_need, feature_type)
-
-                            # Find features in target game that are NOT present in ANY game in the collection
-                            # Build a set of all features present in any collection game
-                            all_collection_features = {
-                                "mechanics": set(),
-                                "categories": set(),
-                                "designers": set(),
-                                "families": set(),
-                            }
-
-                            for collection_game_id in user_collection:
-                                try:
-                                    collection_features = get_game_features(conn_do_i_need, collection_game_id)
-                                    for feature_type in ["mechanics", "categories", "designers", "families"]:
-                                        all_collection_features[feature_type].update(
-                                            collection_features.get(feature_type, set())
-                                        )
-                                except Exception as e:
-                                    logger.debug(f"Error getting features for collection game {collection_game_id}: {e}")
-                                    continue
-
-                            # Find features unique to target game (not in any collection game)
-                            unique_features = {}
-                            for feature_type in ["mechanics", "categories", "designers", "families"]:
-                                target_features = game_features.get(feature_type, set())
-                                collection_features_set = all_collection_features[feature_type]
-                                unique = target_features - collection_features_set
-                                if unique:
-                                    unique_features[feature_type] = list(unique)
-
-                            # Calculate average rarity of unique features (features not in any collection game)
-                            avg_rarity = 1.0  # Default (common)
-                            if unique_features:
-                                rarities = []
-                                for feature_type, features in unique_features.items():
-                                    if feature_type in rarity_weights:
-                                        for feature in features:
-                                            rarity = rarity_weights[feature_type].get(feature, 1.0)
-                                            rarities.append(rarity)
-                                if rarities:
-                                    avg_rarity = sum(rarities) / len(rarities)
+                            max_similarity = analysis.top_matches[0][1]
+                            # Average rarity of features not present in any collection game
+                            avg_rarity = analysis.avg_unique_rarity
 
                             # Decision logic:
                             # - If similarity > 0.65 and unique features are not rare (avg_rarity > 0.5) → "No"
@@ -1458,7 +1502,12 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
 
                             # Build results with top 5 similar games
                             results = []
-                            for collection_game_id, similarity, overlaps, collection_features in top_similar_games:
+                            for collection_game_id, similarity in analysis.top_matches:
+                                collection_features = game_feature_sets(incidence, collection_game_id)
+                                overlaps = {
+                                    f"shared_{ft}": sorted(game_features[ft] & collection_features[ft])
+                                    for ft in ANALYSIS_FACETS
+                                }
                                 try:
                                     # Fetch game details
                                     cur = execute_query(
@@ -1576,10 +1625,13 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                 reply_text = "I encountered an error while analyzing your collection. Please try again."
                 results = []
 
+        yield from _result_events(reply_text, results)
+
         # Extract clickable entities from reply_text and results
         clickable_entities = extract_clickable_entities(reply_text, results)
+        yield "clickable_entities", clickable_entities
 
-        return ChatResponse(
+        yield "done", ChatResponse(
             reply_text=reply_text,
             results=results,
             query_spec=query_spec,
@@ -1587,6 +1639,7 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
             ab_responses=None,
             clickable_entities=clickable_entities,
         )
+        return
 
     if intent == "recommend_similar":
         base_game_id = query_spec.get("base_game_id")
@@ -1603,8 +1656,10 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                 logger.warning("base_game_id is None and no features specified")
                 reply_text = "I couldn't identify which game you're asking about. Please specify a game name or features."
                 results = []
+                yield from _result_events(reply_text, results)
                 clickable_entities = extract_clickable_entities(reply_text, results)
-                return ChatResponse(
+                yield "clickable_entities", clickable_entities
+                yield "done", ChatResponse(
                     reply_text=reply_text,
                     results=results,
                     query_spec=query_spec,
@@ -1612,6 +1667,7 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                     ab_responses=None,
                     clickable_entities=clickable_entities,
                 )
+                return
             else:
                 # Search by features only - we'll handle this differently
                 logger.info("Searching by features only (no base game)")
@@ -1638,6 +1694,13 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                 logger.debug("User collection is empty, falling back to global scope")
             else:
                 logger.debug(f"Searching in collection with {len(allowed_ids)} games")
+        # Cached, normalized embeddings of the collection for "closest in my collection" searches
+        collection_vectors = None
+        if allowed_ids:
+            try:
+                collection_vectors = COLLECTION_CACHE.get_vectors(int(user_id))
+            except Exception as e:
+                logger.warning(f"Could not load collection embeddings for user {user_id}: {e}")
 
         # Extract include/exclude features from query_spec (set by NLU)
         include_features = query_spec.get("include_features")
@@ -1749,25 +1812,63 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
             f"Search params: base_game_id={base_game_id}, include_features={include_features}, exclude_features={exclude_features}, constraints={constraints}, use_rarity_weighting={use_rarity_weighting}, excluded_feature_values={excluded_feature_values}, required_feature_values={required_feature_values}, category_weight_only={category_weight_only}, theme_only={theme_only}, mechanics_only={mechanics_only}"
         )
 
+        filter_error = ""
+        # Several seed games from the NLU; only while the first one is still the base game
+        seed_games = query_spec.get("seed_games")
+        if not seed_games or not seed_games.get("positive") or int(seed_games["positive"][0]) != base_game_id:
+            seed_games = None
+
         try:
             if base_game_id is None:
                 # Feature-only search - find games with required features, ordered by rating
-                results = search_by_features_only(
-                    required_feature_values=required_feature_values,
-                    include_features=include_features,
-                    exclude_features=exclude_features,
+                try:
+                    results = search_by_features_only(
+                        required_feature_values=required_feature_values,
+                        include_features=include_features,
+                        exclude_features=exclude_features,
+                        constraints=constraints,
+                        allowed_ids=allowed_ids,
+                        top_k=top_k,
+                        excluded_feature_values=excluded_feature_values,
+                    )
+                except ValueError as e:
+                    # No base game to compare against: say so rather than ignore the filter
+                    results = []
+                    filter_error = str(e)
+            elif seed_games:
+                # "Like A and B but not C": one search with the combined query vector
+                search = ENGINE.iter_multi(
+                    positive=seed_games["positive"],
+                    negative=seed_games.get("negative"),
+                    top_k=top_k,
+                    include_self=False,
                     constraints=constraints,
                     allowed_ids=allowed_ids,
-                    top_k=top_k,
+                    collection_vectors=collection_vectors,
+                    explain=True,
+                    include_features=include_features,
+                    exclude_features=exclude_features,
+                    use_rarity_weighting=use_rarity_weighting,
+                    excluded_feature_values=excluded_feature_values,
+                    required_feature_values=required_feature_values,
+                    category_weight_only=category_weight_only,
+                    theme_only=theme_only,
+                    mechanics_only=mechanics_only,
+                    mechanics_weight=0.5,
+                    categories_weight=0.5,
                 )
+                # Results go out as they are hydrated; the reply follows the search
+                yield from _stream_search("search_multi", search, streamed)
+                results = streamed
             else:
                 # Normal similarity search with base game
-                results = ENGINE.search_similar(
+                search = ENGINE.iter_similar(
                     game_id=base_game_id,
                     top_k=top_k,
                     include_self=False,
                     constraints=constraints,
                     allowed_ids=allowed_ids,
+                    collection_vectors=collection_vectors,
                     explain=True,
                     include_features=include_features,
                     exclude_features=exclude_features,
@@ -1780,6 +1881,8 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                     mechanics_weight=0.5,
                     categories_weight=0.5,
                 )
+                yield from _stream_search("search_similar", search, streamed)
+                results = streamed
             logger.debug(f"Found {len(results)} results for game_id={base_game_id}, scope={scope}")
 
             # If no results found, check if it's due to excluded families filtering out all top_k results
@@ -1794,6 +1897,7 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                         include_self=False,
                         constraints=constraints,
                         allowed_ids=allowed_ids,
+                        collection_vectors=collection_vectors,
                         explain=True,
                         include_features=include_features,
                         exclude_features=exclude_features,
@@ -1819,6 +1923,7 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                             include_self=False,
                             constraints=constraints,
                             allowed_ids=allowed_ids,
+                            collection_vectors=collection_vectors,
                             explain=True,
                             include_features=include_features,
                             exclude_features=exclude_features,
@@ -1968,6 +2073,8 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
             if exclude_features:
                 excluded_text = f" Excluded features: {', '.join(exclude_features)}."
             reply_text = f"I couldn't find any games matching those filters.{excluded_text}"
+            if filter_error:
+                reply_text = f"{filter_error}; name a game to compare with, or drop those filters."
 
     elif intent == "compare_pair":
         a = query_spec.get("game_a_id")
@@ -2008,8 +2115,12 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                 f"{cmp_result.get('reason_summary', 'Comparison completed')}"
             )
 
+    # Ranked results (unless streamed above) go out before the A/B variants and persistence
+    yield from _result_events(reply_text, results, streamed)
+
     # Check for A/B testing (only for recommend_similar with results and base_game_id)
     ab_responses = None
+    ranked_results = results
     if intent == "recommend_similar" and results and base_game_id is not None:
         # Check if any A/B test configs are active
         ab_configs_to_test = []
@@ -2054,6 +2165,7 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                         include_self=False,
                         constraints=constraints,
                         allowed_ids=allowed_ids,
+                        collection_vectors=collection_vectors,
                         explain=True,
                         include_features=include_features,
                         exclude_features=exclude_features,
@@ -2088,6 +2200,7 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                     include_self=False,
                     constraints=constraints,
                     allowed_ids=allowed_ids,
+                    collection_vectors=collection_vectors,
                     explain=True,
                     include_features=include_features,
                     exclude_features=exclude_features,
@@ -2103,6 +2216,7 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                     include_self=False,
                     constraints=constraints,
                     allowed_ids=allowed_ids,
+                    collection_vectors=collection_vectors,
                     explain=True,
                     include_features=include_features,
                     exclude_features=exclude_features,
@@ -2143,127 +2257,45 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
                     }
                 )
 
+    if results is not ranked_results:
+        # A stored A/B preference replaced the results already sent
+        yield "results", {"results": results}
+    if ab_responses:
+        yield "ab_responses", ab_responses
+
     # Save to chat history (only if authenticated)
     if current_user:
+        new_thread_title = None
         conn = get_db_connection()
         try:
             if not thread_id:
-                # Create new thread
-                insert_sql = QUERY_INSERT_CHAT_THREAD
-
-                try:
-                    cur = execute_query(
-                        conn, insert_sql, (current_user["id"], req.message[:50])  # Use first 50 chars as title
-                    )
-                    conn.commit()
-                    thread_id = cur.fetchone()[0]
-                    logger.debug(f"Created new chat thread {thread_id} for user {current_user['id']}")
-                except Exception as e:
-                    # Handle sequence sync issues for PostgreSQL
-                    is_unique_violation = False
-                    if psycopg2 and psycopg2.errors:
-                        is_unique_violation = isinstance(e, psycopg2.errors.UniqueViolation)
-                    else:
-                        # Fallback check if psycopg2.errors not available
-                        is_unique_violation = "UniqueViolation" in str(type(e).__name__) or "duplicate key" in str(e).lower()
-
-                    if is_unique_violation:
-                        logger.warning(f"Sequence out of sync for chat_threads, fixing: {e}")
-                        try:
-                            # Fix the sequence by setting it to max(id) + 1
-                            fix_seq_query = "SELECT setval('chat_threads_id_seq', COALESCE((SELECT MAX(id) FROM chat_threads), 0) + 1, false)"
-                            execute_query(conn, fix_seq_query)
-                            conn.commit()
-                            # Retry the insert
-                            cur = execute_query(conn, insert_sql, (current_user["id"], req.message[:50]))
-                            conn.commit()
-                            thread_id = cur.fetchone()[0]
-                            logger.info(
-                                f"Fixed sequence and created new chat thread {thread_id} for user {current_user['id']}"
-                            )
-                        except Exception as retry_error:
-                            logger.error(f"Failed to fix sequence and retry insert: {retry_error}", exc_info=True)
-                            raise
-                    else:
-                        raise
-
-            # Save user message
-            user_msg_sql = QUERY_INSERT_CHAT_MESSAGE
-            try:
-                execute_query(conn, user_msg_sql, (thread_id, "user", req.message))
-            except Exception as e:
-                # Handle sequence sync issues for PostgreSQL
-                is_unique_violation = False
-                if psycopg2 and psycopg2.errors:
-                    is_unique_violation = isinstance(e, psycopg2.errors.UniqueViolation)
-                else:
-                    is_unique_violation = "UniqueViolation" in str(type(e).__name__) or "duplicate key" in str(e).lower()
-
-                if is_unique_violation:
-                    logger.warning(f"Sequence out of sync for chat_messages, fixing: {e}")
-                    try:
-                        # Fix the sequence by setting it to max(id) + 1
-                        fix_seq_query = "SELECT setval('chat_messages_id_seq', COALESCE((SELECT MAX(id) FROM chat_messages), 0) + 1, false)"
-                        execute_query(conn, fix_seq_query)
-                        conn.commit()
-                        # Retry the insert
-                        execute_query(conn, user_msg_sql, (thread_id, "user", req.message))
-                        logger.info(f"Fixed sequence and inserted user message for thread {thread_id}")
-                    except Exception as retry_error:
-                        logger.error(f"Failed to fix sequence and retry user message insert: {retry_error}", exc_info=True)
-                        raise
-                else:
-                    raise
-
-            # Save assistant message
-            metadata = {"results": results, "query_spec": query_spec}
-            assistant_msg_sql = QUERY_INSERT_CHAT_MESSAGE_WITH_METADATA
-            try:
-                execute_query(conn, assistant_msg_sql, (thread_id, "assistant", reply_text, json.dumps(metadata)))
-            except Exception as e:
-                # Handle sequence sync issues for PostgreSQL
-                is_unique_violation = False
-                if psycopg2 and psycopg2.errors:
-                    is_unique_violation = isinstance(e, psycopg2.errors.UniqueViolation)
-                else:
-                    is_unique_violation = "UniqueViolation" in str(type(e).__name__) or "duplicate key" in str(e).lower()
-
-                if is_unique_violation:
-                    logger.warning(f"Sequence out of sync for chat_messages, fixing: {e}")
-                    try:
-                        # Fix the sequence by setting it to max(id) + 1
-                        fix_seq_query = "SELECT setval('chat_messages_id_seq', COALESCE((SELECT MAX(id) FROM chat_messages), 0) + 1, false)"
-                        execute_query(conn, fix_seq_query)
-                        conn.commit()
-                        # Retry the insert
-                        execute_query(conn, assistant_msg_sql, (thread_id, "assistant", reply_text, json.dumps(metadata)))
-                        logger.info(f"Fixed sequence and inserted assistant message for thread {thread_id}")
-                    except Exception as retry_error:
-                        logger.error(
-                            f"Failed to fix sequence and retry assistant message insert: {retry_error}", exc_info=True
-                        )
-                        raise
-                else:
-                    raise
-
-            # Update thread updated_at
-            execute_query(conn, QUERY_UPDATE_CHAT_THREAD, (thread_id,))
-            conn.commit()
+                # Reserve the id now; the thread row is written together with its first messages
+                thread_id = reserve_thread_id(conn)
+                new_thread_title = req.message[:50]  # Use first 50 chars as title
+                logger.debug(f"Reserved chat thread {thread_id} for user {current_user['id']}")
+            metadata = pack_metadata(conn, results, query_spec)
         finally:
             put_connection(conn)
-        logger.debug(f"Saved messages to thread {thread_id}")
+        submit_chat_messages(
+            thread_id,
+            current_user["id"],
+            [("user", req.message, None), ("assistant", reply_text, metadata)],
+            new_thread_title=new_thread_title,
+        )
+        logger.debug(f"Submitted messages for thread {thread_id}")
     else:
         logger.debug("Skipping history save for anonymous user")
 
     # Extract clickable entities from reply_text and results
     clickable_entities = extract_clickable_entities(reply_text, results) if results else []
+    yield "clickable_entities", clickable_entities
 
     # Extract followup_prompt if it was set
     followup_prompt_value = None
     if should_show_prompt and followup_prompt:
         followup_prompt_value = followup_prompt.strip()
 
-    return ChatResponse(
+    yield "done", ChatResponse(
         reply_text=reply_text,
         results=results,
         query_spec=query_spec,
@@ -2274,6 +2306,62 @@ def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_
     )
 
 
+@app.post("/chat", response_model=ChatResponse)
+def chat(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_current_user)) -> ChatResponse:
+    """Chat endpoint with history saving. Works with or without authentication."""
+    for event, data in _chat_events(req, current_user):
+        if event == "done":
+            return data
+    raise HTTPException(status_code=500, detail="Chat finished without a response")
+
+
+def _sse_event(event: str, data: Any) -> str:
+    # Engine scores can be NumPy scalars, which jsonable_encoder does not handle
+    payload = json.dumps(jsonable_encoder(data, custom_encoder={np.generic: lambda o: o.item()}))
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/chat/stream")
+def chat_stream(req: ChatRequest, current_user: Optional[Dict[str, Any]] = Depends(get_current_user)):
+    """
+    Streaming variant of /chat as Server-Sent Events (see _chat_events for the event order).
+
+    The NLU step runs before the response starts, so validation errors still return a
+    normal HTTP error; later failures are sent as an "error" event. The rest of the turn
+    runs on its own thread, so it finishes (and the turn is saved) even when the client
+    disconnects mid-stream.
+    """
+    events = _chat_events(req, current_user)
+    first = next(events)
+    pending: "queue.Queue[Optional[Tuple[str, Any]]]" = queue.Queue()
+
+    def run_turn() -> None:
+        try:
+            for event in events:
+                pending.put(event)
+        except Exception as e:
+            logger.error(f"Error while streaming chat response: {e}", exc_info=True)
+            pending.put(("error", {"detail": f"Failed to process chat: {str(e)}"}))
+        finally:
+            pending.put(None)
+
+    # The copied context keeps the request's trace and profile
+    threading.Thread(target=contextvars.copy_context().run, args=(run_turn,), name="chat-turn", daemon=True).start()
+
+    def stream() -> Iterator[str]:
+        yield _sse_event(*first)
+        while True:
+            event = pending.get()
+            if event is None:
+                return
+            yield _sse_event(*event)
+
+    # X-Accel-Buffering disables proxy buffering (nginx) so events are flushed immediately
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 class ImageGenerateRequest(BaseModel):
     game_id: Optional[int] = None
     context: Optional[str] = None
@@ -2613,61 +2701,81 @@ class ReviewScoringMechanismRequest(BaseModel):
     review_notes: Optional[str] = None
 
 
-@app.post("/admin/scoring/parse-rulebook")
-def parse_rulebook_for_scoring(
-    game_id: int, rulebook_text: str, current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user)
-):
-    """Parse a rulebook and create a pending scoring mechanism. Admin only."""
+def _parse_rulebook(game_id: int, rulebook_text: str) -> Dict[str, Any]:
+    """Extract a scoring mechanism from a rulebook and store it as pending review."""
+    from backend.rulebook_parser import extract_scoring_from_rulebook
+
+    # Extract scoring mechanism
+    mechanism_data = extract_scoring_from_rulebook(game_id, rulebook_text)
+
+    if not mechanism_data:
+        return {
+            "success": False,
+            "message": "Could not extract scoring criteria from rulebook. Confidence too low or no criteria found.",
+        }
+
+    conn = get_db_connection()
     try:
-        from backend.rulebook_parser import extract_scoring_from_rulebook
+        # Check if mechanism already exists for this game
+        check_query = """SELECT id FROM scoring_mechanisms WHERE game_id = %s AND status = 'pending'"""
 
-        # Extract scoring mechanism
-        mechanism_data = extract_scoring_from_rulebook(game_id, rulebook_text)
+        cur = execute_query(conn, check_query, (game_id,))
+        existing = cur.fetchone()
 
-        if not mechanism_data:
-            return {
-                "success": False,
-                "message": "Could not extract scoring criteria from rulebook. Confidence too low or no criteria found.",
-            }
+        if existing:
+            # Update existing pending mechanism
+            update_query = """UPDATE scoring_mechanisms
+                             SET criteria_json = %s, created_at = CURRENT_TIMESTAMP
+                             WHERE id = %s"""
 
-        conn = get_db_connection()
-        try:
-            # Check if mechanism already exists for this game
-            check_query = """SELECT id FROM scoring_mechanisms WHERE game_id = %s AND status = 'pending'"""
+            execute_query(conn, update_query, (mechanism_data["criteria_json"], existing[0]))
+            mechanism_id = existing[0]
+        else:
+            # Insert new mechanism
+            insert_query = """INSERT INTO scoring_mechanisms (game_id, criteria_json, status)
+                             VALUES (%s, %s, %s)"""
 
-            cur = execute_query(conn, check_query, (game_id,))
-            existing = cur.fetchone()
+            cur = execute_query(conn, insert_query, (game_id, mechanism_data["criteria_json"], "pending"))
+            conn.commit()
 
-            if existing:
-                # Update existing pending mechanism
-                update_query = """UPDATE scoring_mechanisms
-                                 SET criteria_json = %s, created_at = CURRENT_TIMESTAMP
-                                 WHERE id = %s"""
+            # Get the inserted ID
+            cur = execute_query(conn, "SELECT LASTVAL()", ())
+            mechanism_id = cur.fetchone()[0]
 
-                execute_query(conn, update_query, (mechanism_data["criteria_json"], existing[0]))
-                mechanism_id = existing[0]
-            else:
-                # Insert new mechanism
-                insert_query = """INSERT INTO scoring_mechanisms (game_id, criteria_json, status)
-                                 VALUES (%s, %s, %s)"""
+        conn.commit()
 
-                cur = execute_query(conn, insert_query, (game_id, mechanism_data["criteria_json"], "pending"))
-                conn.commit()
+        return {
+            "success": True,
+            "mechanism_id": mechanism_id,
+            "confidence": mechanism_data.get("confidence", 0.0),
+            "message": "Scoring mechanism created and pending review",
+        }
+    finally:
+        put_connection(conn)
 
-                # Get the inserted ID
-                cur = execute_query(conn, "SELECT LASTVAL()", ())
-                mechanism_id = cur.fetchone()[0]
 
-            conn.commit()
+register_job_type(
+    "parse_rulebook",
+    lambda job: _parse_rulebook(job["payload"]["game_id"], job["payload"]["rulebook_text"]),
+    concurrency=1,
+)
 
-            return {
-                "success": True,
-                "mechanism_id": mechanism_id,
-                "confidence": mechanism_data.get("confidence", 0.0),
-                "message": "Scoring mechanism created and pending review",
-            }
-        finally:
-            put_connection(conn)
+
+@app.post("/admin/scoring/parse-rulebook")
+def parse_rulebook_for_scoring(
+    game_id: int,
+    rulebook_text: str,
+    background: bool = False,
+    current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user),
+):
+    """Parse a rulebook and create a pending scoring mechanism. Admin only. background=true queues a job."""
+    try:
+        if background:
+            job_id = enqueue_job(
+                "parse_rulebook", {"game_id": game_id, "rulebook_text": rulebook_text}, user_id=current_user["id"]
+            )
+            return {"success": True, "job_id": job_id, "status": "queued"}
+        return _parse_rulebook(game_id, rulebook_text)
     except Exception as e:
         logger.error(f"Error parsing rulebook for scoring: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to parse rulebook: {str(e)}")
@@ -2965,6 +3073,7 @@ def modify_game_features(
                VALUES (%s, %s, %s, %s)"""
         execute_query(conn, query, (game_id, feature_type, feature_id, action))
         conn.commit()
+        invalidate_incidence()
 
         return {"success": True, "message": f"Feature {action}ed successfully"}
     except HTTPException:
@@ -2985,6 +3094,7 @@ def remove_feature_modification(
     try:
         cur = execute_query(conn, "DELETE FROM feature_mods WHERE id = %s AND game_id = %s", (mod_id, game_id))
         conn.commit()
+        invalidate_incidence()
 
         if cur.rowcount == 0:
             raise HTTPException(status_code=404, detail="Modification not found")
@@ -2999,43 +3109,89 @@ def remove_feature_modification(
         put_connection(conn)
 
 
+def _search_marketplace_for_game(game_id: int) -> Optional[Dict[str, Any]]:
+    """Aggregate marketplace listings for a game; None if the game does not exist."""
+    from backend.marketplace_service import search_marketplace
+
+    conn = get_db_connection()
+    try:
+        # Get game name for search
+        cur = execute_query(conn, "SELECT name FROM games WHERE id = %s", (game_id,))
+        game_row = cur.fetchone()
+    finally:
+        put_connection(conn)
+    if not game_row:
+        return None
+
+    game_name = game_row[0]
+
+    # Search all marketplaces (including BGA)
+    listings = search_marketplace(game_name, game_id)
+
+    return {
+        "game_id": game_id,
+        "game_name": game_name,
+        "listings": listings,
+        "total": len(listings),
+        "mock_mode": os.getenv("USE_MOCK_MARKETPLACE", "false").lower() == "true",
+    }
+
+
+register_job_type("marketplace_search", lambda job: _search_marketplace_for_game(job["payload"]["game_id"]), concurrency=2)
+
+
 @app.get("/marketplace/search")
-def search_marketplace_endpoint(game_id: int, current_user: Optional[Dict[str, Any]] = Depends(get_current_user)):
+def search_marketplace_endpoint(
+    game_id: int, background: bool = False, current_user: Optional[Dict[str, Any]] = Depends(get_current_user)
+):
     """
     Search marketplace listings for a game from multiple sources.
     Returns aggregated results from Amazon, eBay, GeekMarket, and Wallapop.
     Use USE_MOCK_MARKETPLACE environment variable to toggle mock mode.
+    With background=true the lookup is queued as a job; poll /jobs/{job_id} for the listings.
     """
-    conn = get_db_connection()
     try:
-        import os
-        from backend.marketplace_service import search_marketplace
+        if background:
+            user_id = current_user["id"] if current_user else None
+            job_id = enqueue_job("marketplace_search", {"game_id": game_id}, user_id=user_id)
+            return {"job_id": job_id, "status": "queued"}
 
-        # Get game name for search
-        cur = execute_query(conn, "SELECT name FROM games WHERE id = %s", (game_id,))
-        game_row = cur.fetchone()
-        if not game_row:
+        result = _search_marketplace_for_game(game_id)
+        if result is None:
             raise HTTPException(status_code=404, detail="Game not found")
-
-        game_name = game_row[0]
-
-        # Search all marketplaces (including BGA)
-        listings = search_marketplace(game_name, game_id)
-
-        return {
-            "game_id": game_id,
-            "game_name": game_name,
-            "listings": listings,
-            "total": len(listings),
-            "mock_mode": os.getenv("USE_MOCK_MARKETPLACE", "false").lower() == "true",
-        }
+        return result
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error searching marketplace: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to search marketplace: {str(e)}")
-    finally:
-        put_connection(conn)
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: int, current_user: Optional[Dict[str, Any]] = Depends(get_current_user)):
+    """Get the status (and result, once completed) of a background job."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Jobs owned by a user are only visible to that user (and admins)
+    if job["user_id"] is not None:
+        if current_user is None or (job["user_id"] != current_user["id"] and not current_user.get("is_admin")):
+            raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/admin/jobs")
+def get_jobs(
+    status_filter: Optional[str] = None,
+    limit: int = 100,
+    current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user),
+):
+    """List recent background jobs, optionally filtered by status. Admin only."""
+    try:
+        return {"jobs": list_jobs(status_filter, min(max(limit, 1), 500))}
+    except Exception as e:
+        logger.error(f"Error listing jobs: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to list jobs: {str(e)}")
 
 
 @app.get("/feedback/questions/random")
@@ -3752,55 +3908,22 @@ def get_all_users(
 
 
 @app.delete("/admin/users/{user_id}")
-def delete_user(user_id: int, current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user)):
+def delete_user_account(user_id: int, current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user)):
     """Delete a user account (admin only)."""
+    # Prevent admin from deleting themselves
+    if user_id == current_user["id"]:
+        raise HTTPException(
+            status_code=400, detail="Cannot delete your own account from admin panel. Use profile deletion instead."
+        )
+    flush_chat_writes()
     conn = get_db_connection()
     try:
-        # Verify user exists
-        query = "SELECT id, email FROM users WHERE id = %s"
-        cur = execute_query(conn, query, (user_id,))
-        user_row = cur.fetchone()
-
-        if not user_row:
+        # One statement: dependent rows go through ON DELETE CASCADE / SET NULL
+        if not delete_user(conn, user_id):
             raise HTTPException(status_code=404, detail="User not found")
-
-        # Prevent admin from deleting themselves
-        if user_id == current_user["id"]:
-            raise HTTPException(
-                status_code=400, detail="Cannot delete your own account from admin panel. Use profile deletion instead."
-            )
-
-        # Delete in order to respect foreign key constraints
-        # Delete scoring sessions
-        query = "DELETE FROM user_scoring_sessions WHERE user_id = %s"
-        execute_query(conn, query, (user_id,))
-
-        # Delete feedback responses
-        query = "DELETE FROM feedback_responses WHERE user_id = %s"
-        execute_query(conn, query, (user_id,))
-
-        # Delete chat messages (via threads)
-        query = "SELECT id FROM chat_threads WHERE user_id = %s"
-        cur = execute_query(conn, query, (user_id,))
-        thread_ids = [row[0] for row in cur.fetchall()]
-        if thread_ids:
-            placeholders = ",".join(["%s"] * len(thread_ids))
-            query = f"DELETE FROM chat_messages WHERE thread_id IN ({placeholders})"
-            execute_query(conn, query, tuple(thread_ids))
-
-        # Delete chat threads
-        query = "DELETE FROM chat_threads WHERE user_id = %s"
-        execute_query(conn, query, (user_id,))
-
-        # Delete collection
-        query = "DELETE FROM user_collections WHERE user_id = %s"
-        execute_query(conn, query, (user_id,))
-
-        # Finally delete user
-        query = "DELETE FROM users WHERE id = %s"
-        execute_query(conn, query, (user_id,))
-
         conn.commit()
+        invalidate_principal(user_id)
+        COLLECTION_CACHE.invalidate(user_id)
 
         logger.info(f"Admin {current_user['id']} deleted user {user_id}")
         return {"success": True, "message": f"User {user_id} deleted successfully"}
@@ -4038,6 +4161,7 @@ def add_feature_blacklist(
         cur = execute_query(conn, query, (req.keyword_phrase, req.feature_type, req.match_type, admin_user_id))
         rule_id = cur.fetchone()[0]
         conn.commit()
+        invalidate_incidence()
 
         return {
             "success": True,
@@ -4064,6 +4188,7 @@ def update_feature_blacklist(
                    WHERE id = %s"""
         execute_query(conn, query, (req.keyword_phrase, req.feature_type, req.match_type, rule_id))
         conn.commit()
+        invalidate_incidence()
 
         return {"success": True, "message": "Blacklist rule updated"}
     except Exception as e:
@@ -4081,6 +4206,7 @@ def delete_feature_blacklist(rule_id: int, current_user: Optional[Dict[str, Any]
         query = "DELETE FROM feature_blacklist WHERE id = %s"
         execute_query(conn, query, (rule_id,))
         conn.commit()
+        invalidate_incidence()
         return {"success": True, "message": "Blacklist rule deleted"}
     except Exception as e:
         logger.error(f"Error deleting feature blacklist: {e}", exc_info=True)
@@ -4104,6 +4230,7 @@ def toggle_feature_blacklist(rule_id: int, current_user: Optional[Dict[str, Any]
             if not row:
                 raise HTTPException(status_code=404, detail="Blacklist rule not found")
             conn.commit()
+            invalidate_incidence()
             return {"success": True, "is_active": row[0], "message": f"Rule {'activated' if row[0] else 'deactivated'}"}
         finally:
             put_connection(conn)
@@ -4114,6 +4241,99 @@ def toggle_feature_blacklist(rule_id: int, current_user: Optional[Dict[str, Any]
         raise HTTPException(status_code=500, detail=f"Failed to toggle blacklist rule: {str(e)}")
 
 
+@app.post("/admin/similarity/reload")
+def reload_similarity_engine(current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user)):
+    """Reload gen/game_vectors.index in the background and swap it in when ready."""
+    if _INDEX_RELOAD_LOCK.locked():
+        return {"success": True, "status": "already_running"}
+    threading.Thread(target=reload_similarity_index, name="index-reload", daemon=True).start()
+    return {"success": True, "status": "started"}
+
+
+@app.get("/admin/similarity/reload")
+def get_similarity_reload_status(current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user)):
+    """Get the state of the last similarity index (re)load."""
+    return {
+        "state": _INDEX_RELOAD_STATUS["state"],
+        "loaded_at": _INDEX_RELOAD_STATUS["loaded_at"],
+        "games": len(ENGINE.id_map) if ENGINE else None,
+        "version": ENGINE.index_version if ENGINE else None,
+        "error": _INDEX_RELOAD_STATUS["error"],
+    }
+
+
+@app.post("/admin/similarity/apply-delta")
+def apply_similarity_index_delta(current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user)):
+    """
+    Apply gen/game_vectors.delta.npz (written by export_faiss.py --delta-out) to the running engine.
+
+    A delta that was not diffed against the loaded index version (e.g. an earlier delta
+    was never applied) is rejected with 409, and the full index is reloaded instead.
+    """
+    if ENGINE is None:
+        raise HTTPException(status_code=503, detail="Similarity engine not loaded")
+    if not os.path.exists(index_delta_path):
+        raise HTTPException(status_code=404, detail="No index delta found")
+    try:
+        upsert_ids, upsert_vectors, remove_ids = load_delta(index_delta_path)
+        base_version, target_version = load_delta_versions(index_delta_path)
+        stats = ENGINE.apply_index_delta(upsert_ids, upsert_vectors, remove_ids, base_version, target_version)
+        return {"success": True, "games": len(ENGINE.id_map), "version": ENGINE.index_version, **stats}
+    except IndexVersionMismatch as e:
+        logger.warning(f"Rejected index delta: {e}; reloading the full index")
+        if not _INDEX_RELOAD_LOCK.locked():
+            threading.Thread(target=reload_similarity_index, name="index-reload", daemon=True).start()
+        raise HTTPException(status_code=409, detail=f"{e}; reloading the full index instead")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error applying index delta: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to apply index delta: {str(e)}")
+
+
+def _build_game_neighbors(job: Dict[str, Any]) -> Dict[str, int]:
+    if ENGINE is None:
+        raise RuntimeError("Similarity engine not loaded")
+    top_n = int(job["payload"].get("top_n", NEIGHBORS_TOP_N))
+    return build_game_neighbors(ENGINE, top_n=top_n, progress=lambda stage: set_job_progress(job["id"], stage))
+
+
+register_job_type("build_game_neighbors", _build_game_neighbors, concurrency=1)
+
+
+@app.post("/admin/similarity/neighbors")
+def rebuild_game_neighbors(
+    top_n: int = NEIGHBORS_TOP_N, current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user)
+):
+    """Queue a rebuild of the precomputed game_neighbors table. Admin only; poll /jobs/{job_id}."""
+    if ENGINE is None:
+        raise HTTPException(status_code=503, detail="Similarity engine not loaded")
+    try:
+        job_id = enqueue_job("build_game_neighbors", {"top_n": min(max(top_n, 1), 500)}, user_id=current_user["id"])
+        return {"success": True, "job_id": job_id, "status": "queued"}
+    except Exception as e:
+        logger.error(f"Error queueing neighbour rebuild: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to queue neighbour rebuild: {str(e)}")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
+    """Prometheus metrics of all workers (text format). Requires METRICS_TOKEN as bearer token when set."""
+    if METRICS_TOKEN and (credentials is None or not hmac.compare_digest(credentials.credentials, METRICS_TOKEN)):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    try:
+        return PlainTextResponse(render_prometheus(collect()), media_type="text/plain; version=0.0.4; charset=utf-8")
+    except Exception as e:
+        logger.error(f"Error collecting metrics: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to collect metrics: {str(e)}")
+
+
+@app.get("/admin/metrics/search")
+def get_search_metrics(current_user: Optional[Dict[str, Any]] = Depends(get_current_admin_user)):
+    """Latency histograms per search stage and the filter pass rates of this worker. Admin only."""
+    return {"pid": os.getpid(), "stages": stage_snapshot(), "pass_rates": SEARCH_PASS_RATES.snapshot()}
+
+
 @app.options("/{full_path:path}")
 async def options_handler(full_path: str):
     """Handle OPTIONS preflight requests for CORS."""
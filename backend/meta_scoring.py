@@ -0,0 +1,150 @@
+# backend/meta_scoring.py
+"""
+Vectorized metadata scoring of similarity candidates.
+
+This is the cheap stage of search_similar. The cached feature incidence
+(backend/feature_incidence.py) gives, for every candidate the index returned and
+in one pass per facet:
+
+- the overlap with the query game,
+- the meta score of reasoning_utils.compute_meta_similarity,
+- the include/exclude feature-type and generic jaccard/overlap constraints.
+
+Only the candidates that survive and make the top_k are hydrated and explained one by one.
+"""
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Set
+
+import numpy as np
+
+from backend.feature_incidence import FACET_TABLES, FacetIncidence
+
+
+class FacetOverlap(NamedTuple):
+    """Overlap of each candidate with the query game in one facet."""
+
+    shared: np.ndarray  # number of shared features
+    jaccard: np.ndarray
+    shared_rarity: np.ndarray  # summed rarity weight of the shared features
+
+
+def facet_overlap(facet: FacetIncidence, target: np.ndarray, candidate_ids: np.ndarray) -> FacetOverlap:
+    """Overlap of every candidate with the target's vocabulary positions."""
+    n = len(candidate_ids)
+    owner, positions = facet.flatten(facet.rows(candidate_ids))
+    is_shared = np.isin(positions, target)
+    sizes = np.bincount(owner, minlength=n)
+    shared = np.bincount(owner, weights=is_shared, minlength=n)
+    shared_rarity = np.bincount(owner[is_shared], weights=facet.rarity[positions[is_shared]], minlength=n)
+    union = sizes + len(target) - shared
+    jaccard = np.divide(shared, union, out=np.zeros(n, dtype="float64"), where=union > 0)
+    return FacetOverlap(shared, jaccard, shared_rarity)
+
+
+def candidate_overlaps(
+    incidence: Mapping[str, FacetIncidence], game_id: int, candidate_ids: np.ndarray
+) -> Dict[str, FacetOverlap]:
+    """Per-facet overlap of every candidate with the query game."""
+    return {ft: facet_overlap(facet, facet.features(game_id), candidate_ids) for ft, facet in incidence.items()}
+
+
+def _bucket_multiplier(shared: np.ndarray, shared_rarity: np.ndarray) -> np.ndarray:
+    # 1 + (average rarity of the shared features - 1) * 3, or 1 without shared features
+    avg_rarity = np.divide(shared_rarity, shared, out=np.ones(len(shared)), where=shared > 0)
+    return 1.0 + (avg_rarity - 1.0) * 3.0
+
+
+def meta_scores(
+    overlaps: Mapping[str, FacetOverlap],
+    use_rarity_weighting: bool = False,
+    category_weight_only: bool = False,
+    theme_only: bool = False,
+    mechanics_only: bool = False,
+    mechanics_weight: float = 0.5,
+    categories_weight: float = 0.5,
+) -> np.ndarray:
+    """compute_meta_similarity's meta score for every candidate."""
+    mechanics, categories, families = overlaps["mechanics"], overlaps["categories"], overlaps["families"]
+    theme_buckets = theme_only or category_weight_only
+    if theme_buckets:
+        mechanics_weight, categories_weight = 0.0, 1.0
+    elif mechanics_only:
+        mechanics_weight, categories_weight = 1.0, 0.0
+
+    mechanics_multiplier = np.ones(len(mechanics.shared))
+    categories_multiplier = np.ones(len(mechanics.shared))
+    if use_rarity_weighting:
+        mechanics_multiplier = _bucket_multiplier(mechanics.shared, mechanics.shared_rarity)
+        # The categories bucket averages over shared categories and families
+        categories_multiplier = _bucket_multiplier(
+            categories.shared + families.shared, categories.shared_rarity + families.shared_rarity
+        )
+
+    mechanics_bucket = mechanics.jaccard * mechanics_multiplier
+    if theme_buckets:
+        categories_bucket = (categories.jaccard + families.jaccard) / 2.0 * categories_multiplier
+    else:
+        categories_bucket = categories.jaccard * categories_multiplier
+    # Keep scores in [0, 1] when a rarity multiplier exceeds 1
+    max_multiplier = np.maximum(np.maximum(mechanics_multiplier, categories_multiplier), 1.0)
+    return (mechanics_weight * mechanics_bucket + categories_weight * categories_bucket) / max_multiplier
+
+
+def overlap_type_mask(
+    overlaps: Mapping[str, FacetOverlap],
+    include_features: Optional[Iterable[str]] = None,
+    exclude_features: Optional[Iterable[str]] = None,
+) -> np.ndarray:
+    """Candidates sharing a feature of every included type and none of the excluded types."""
+    n = len(next(iter(overlaps.values())).shared)
+    ok = np.ones(n, dtype=bool)
+    for feature_type in include_features or ():
+        if feature_type not in overlaps:
+            return np.zeros(n, dtype=bool)
+        ok &= overlaps[feature_type].shared > 0
+    for feature_type in exclude_features or ():
+        if feature_type in overlaps:
+            ok &= overlaps[feature_type].shared == 0
+    return ok
+
+
+def overlap_constraint_mask(overlaps: Mapping[str, FacetOverlap], constraints: Mapping[str, Any]) -> np.ndarray:
+    """
+    Generic per-facet constraints, e.g. {"mechanics": {"jaccard_min": 0.6}, "designers": {"min_overlap": 1}}.
+
+    "players" and "playtime" are checked on the game attribute columns instead.
+    """
+    n = len(next(iter(overlaps.values())).shared)
+    ok = np.ones(n, dtype=bool)
+    for facet, cfg in constraints.items():
+        if facet in ("players", "playtime") or not isinstance(cfg, Mapping):
+            continue
+        overlap = overlaps.get(facet)
+        jaccard = overlap.jaccard if overlap is not None else np.full(n, np.nan)
+        shared = overlap.shared if overlap is not None else np.zeros(n)
+        if cfg.get("jaccard_min") is not None:
+            ok &= jaccard >= cfg["jaccard_min"]
+        if cfg.get("jaccard_max") is not None:
+            ok &= jaccard <= cfg["jaccard_max"]
+        if cfg.get("min_overlap") is not None:
+            ok &= shared >= cfg["min_overlap"]
+        if cfg.get("max_overlap") is not None:
+            ok &= shared <= cfg["max_overlap"]
+    return ok
+
+
+def feature_sets(incidence: Mapping[str, FacetIncidence], game_id: int) -> Dict[str, Set[str]]:
+    """Feature names of one game for every facet (the sets get_game_features returns)."""
+    return {ft: incidence[ft].feature_names(incidence[ft].features(game_id)) for ft in FACET_TABLES if ft in incidence}
+
+
+def explain_overlap(base_features: Mapping[str, Any], other_sets: Mapping[str, Set[str]]) -> Dict[str, List[str]]:
+    """Shared, missing and extra features of a candidate against the query game."""
+    explanation: Dict[str, List[str]] = {}
+    for feature_type in FACET_TABLES:
+        base = set(base_features.get(feature_type) or ())
+        other = other_sets.get(feature_type, set())
+        explanation[f"shared_{feature_type}"] = sorted(base & other)
+        if feature_type in ("mechanics", "categories", "designers", "families"):
+            explanation[f"missing_{feature_type}"] = sorted(base - other)
+            explanation[f"extra_{feature_type}"] = sorted(other - base)
+    return explanation
@@ -0,0 +1,333 @@
+# backend/metrics.py
+"""
+Counters, gauges and histograms with labels, exposed in the Prometheus text format.
+
+Metrics are module-level objects (see the definitions at the bottom). Recording a
+value means one dict update under a lock, so they can stay on in production.
+
+Each uvicorn worker keeps its own values. When METRICS_MULTIPROC_DIR is set:
+- every worker writes a JSON snapshot of its values to that directory, every
+  METRICS_FLUSH_SECONDS and whenever it serves a scrape;
+- /metrics serves the sum over all snapshots, whichever worker answers;
+- counters and histograms of workers that exited still count;
+- gauges only count for live workers.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.config import METRICS_FLUSH_SECONDS, METRICS_MULTIPROC_DIR
+from backend.logger_config import logger
+
+# Upper bounds in seconds; the +Inf bucket is implicit
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Iterable[str] = (), registry: Optional[Dict] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry)[name] = self
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Dict[LabelValues, Any]:
+        with self._lock:
+            return {key: (list(value) if isinstance(value, list) else value) for key, value in self._values.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing total."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """Current value; either set directly or read from a callback at collection time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Iterable[str] = (), registry: Optional[Dict] = None
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels) -> None:
+        self._functions[self._key(labels)] = function
+
+    def samples(self) -> Dict[LabelValues, Any]:
+        values = super().samples()
+        for key, function in list(self._functions.items()):
+            try:
+                values[key] = float(function())
+            except Exception as e:
+                logger.debug(f"Gauge {self.name}{key} unavailable: {e}")
+        return values
+
+
+class Histogram(_Metric):
+    """Observations counted in fixed cumulative buckets, with their sum."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets=DEFAULT_BUCKETS,
+        registry: Optional[Dict] = None,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket plus +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[slot] += 1
+            counts[-1] += value
+
+    def summary(self, **labels) -> Dict[str, Any]:
+        """Count, sum, mean and bucket-bound quantiles in milliseconds (for JSON endpoints)."""
+        with self._lock:
+            counts = list(self._values.get(self._key(labels)) or [0] * (len(self.buckets) + 1) + [0.0])
+        total, bucket_counts = counts[-1], counts[:-1]
+        count = sum(bucket_counts)
+        bounds = self.buckets + (float("inf"),)
+
+        def quantile(q: float) -> Optional[float]:
+            # Upper bound of the bucket holding the q-th observation
+            target, seen = q * count, 0
+            for bound, n in zip(bounds, bucket_counts):
+                seen += n
+                if n and seen >= target:
+                    return None if bound == float("inf") else bound * 1000
+            return None
+
+        return {
+            "count": count,
+            "sum_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / count, 3) if count else None,
+            "p50_ms": quantile(0.5),
+            "p95_ms": quantile(0.95),
+            "p99_ms": quantile(0.99),
+            "buckets_ms": {_format_bound(b, scale=1000): n for b, n in zip(bounds, bucket_counts)},
+        }
+
+
+REGISTRY: Dict[str, _Metric] = {}
+
+
+def _format_bound(bound: float, scale: float = 1.0) -> str:
+    return "+Inf" if bound == float("inf") else f"{bound * scale:g}"
+
+
+def process_snapshot(registry: Optional[Dict[str, _Metric]] = None) -> Dict[str, Any]:
+    """JSON-serialisable values of every metric in this process."""
+    metrics = {}
+    for name, metric in (REGISTRY if registry is None else registry).items():
+        metrics[name] = {
+            "kind": metric.kind,
+            "help": metric.documentation,
+            "labelnames": list(metric.labelnames),
+            "buckets": list(getattr(metric, "buckets", ())),
+            "values": [[list(key), value] for key, value in metric.samples().items()],
+        }
+    return {"pid": os.getpid(), "written_at": time.time(), "metrics": metrics}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists but belongs to another user
+    return True
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]], live_pids: Optional[set] = None) -> Dict[str, Dict[str, Any]]:
+    """Sum the snapshots of several processes; gauges only from live_pids (all when None)."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        live = live_pids is None or snapshot.get("pid") in live_pids
+        for name, metric in snapshot["metrics"].items():
+            if metric["kind"] == "gauge" and not live:
+                continue
+            target = merged.setdefault(name, {**metric, "values": {}})
+            for key, value in metric["values"]:
+                key = tuple(key)
+                if isinstance(value, list):
+                    current = target["values"].get(key)
+                    target["values"][key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target["values"][key] = target["values"].get(key, 0.0) + value
+    return merged
+
+
+def _snapshot_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"metrics_{pid}.json")
+
+
+def write_process_snapshot(directory: Optional[str] = None) -> None:
+    """Atomically replace this process's snapshot file in the multiprocess directory."""
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory, os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(process_snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def collect(directory: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Merged values of all workers (or only this process without a multiprocess directory)."""
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory:
+        return merge_snapshots([process_snapshot()])
+    write_process_snapshot(directory)
+    snapshots = []
+    for filename in os.listdir(directory):
+        if not (filename.startswith("metrics_") and filename.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable metrics snapshot {filename}: {e}")
+    live_pids = {s["pid"] for s in snapshots if _pid_alive(s["pid"])}
+    return merge_snapshots(snapshots, live_pids)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_prometheus(merged: Dict[str, Dict[str, Any]]) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric["labelnames"]
+        for key in sorted(metric["values"]):
+            value = metric["values"][key]
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(labelnames, key)} {value:g}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + [float("inf")], value[:-1]):
+                cumulative += count
+                le = ("le", _format_bound(bound))
+                lines.append(f"{name}_bucket{_labels(labelnames, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labelnames, key)} {value[-1]:g}")
+            lines.append(f"{name}_count{_labels(labelnames, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+_FLUSHER: Dict[str, Any] = {"thread": None, "stop": threading.Event()}
+
+
+def start_metrics_flusher() -> None:
+    """Write this worker's snapshot every METRICS_FLUSH_SECONDS (multiprocess mode only)."""
+    if not METRICS_MULTIPROC_DIR or _FLUSHER["thread"] is not None:
+        return
+    stop = _FLUSHER["stop"]
+    stop.clear()
+
+    def run():
+        while not stop.wait(METRICS_FLUSH_SECONDS):
+            try:
+                write_process_snapshot()
+            except Exception as e:
+                logger.warning(f"Could not write metrics snapshot: {e}")
+
+    _FLUSHER["thread"] = threading.Thread(target=run, name="metrics-flusher", daemon=True)
+    _FLUSHER["thread"].start()
+
+
+def stop_metrics_flusher() -> None:
+    thread = _FLUSHER["thread"]
+    if thread is None:
+        return
+    _FLUSHER["stop"].set()
+    thread.join(timeout=5)
+    _FLUSHER["thread"] = None
+    try:
+        write_process_snapshot()
+    except Exception as e:
+        logger.warning(f"Could not write final metrics snapshot: {e}")
+
+
+# -------------------------------------------------------------------
+# Metrics
+# -------------------------------------------------------------------
+
+HTTP_REQUESTS = Counter("pista_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = Histogram(
+    "pista_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+DB_QUERY_DURATION = Histogram("pista_db_query_duration_seconds", "Time spent executing SQL statements.", ("statement",))
+DB_POOL_WAIT = Histogram("pista_db_pool_wait_seconds", "Time spent waiting for a pooled connection.")
+DB_POOL_CONNECTIONS = Gauge("pista_db_pool_connections", "Pooled database connections by state.", ("state",))
+CACHE_REQUESTS = Counter("pista_cache_requests_total", "In-process cache lookups by cache and result.", ("cache", "result"))
+STAGE_DURATION = Histogram(
+    "pista_stage_duration_seconds", "Duration of profiled stages (faiss_search, hydrate, ...).", ("stage",)
+)
+ERRORS = Counter("pista_errors_total", "Errors recorded by backend.monitoring.", ("error_type",))
@@ -0,0 +1,77 @@
+# backend/middleware.py
+"""
+ASGI middleware for request metrics and request tracing.
+
+RequestMetricsMiddleware records request count and latency per route.
+
+Routes are labelled by their template (e.g. /games/{game_id}/details), not the raw
+path, so the metric label sets stay bounded. Requests that match no route are
+labelled "unmatched". It is written against raw ASGI rather than BaseHTTPMiddleware,
+so streaming responses (/chat/stream) pass through unbuffered. Their latency runs
+until the last body chunk is sent.
+
+RequestTracingMiddleware gives every request an ID (the client's X-Request-ID when it
+sends a valid one) and traces its database time and queries (backend/tracing.py).
+The ID is returned in the X-Request-ID response header and appears in the slow
+request and slow query logs.
+"""
+import time
+
+from backend.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS
+from backend.tracing import REQUEST_ID_HEADER, request_id_from, traced_request
+
+
+def route_label(scope) -> str:
+    """The matched route's path template, or "unmatched"."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500  # Unless a response starts, the request failed
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route, method = route_label(scope), scope.get("method", "")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status_code))
+
+
+class RequestTracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header_name = REQUEST_ID_HEADER.lower().encode("latin-1")
+        incoming = next((value for name, value in scope.get("headers", []) if name == header_name), b"")
+        request_id = request_id_from(incoming.decode("latin-1"))
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = [(n, v) for n, v in message.get("headers", []) if n.lower() != header_name]
+                headers.append((header_name, request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with traced_request(request_id, scope.get("method", ""), scope.get("path", "")):
+            await self.app(scope, receive, send_with_request_id)
@@ -1,17 +1,22 @@
 """
 Monitoring and alerting utilities for silent failures and errors.
+
+Totals are exported as pista_errors_total (backend/metrics.py); the per-worker
+sliding windows below only drive the alerts.
 """
+import threading
 import time
-from typing import Dict, Any, Optional
-from collections import defaultdict
+from typing import Deque, Dict, Any, Optional
+from collections import defaultdict, deque
 import json
 
 from backend.logger_config import logger
+from backend.metrics import ERRORS
 
-# In-memory error tracking (for simple monitoring)
-_error_counts = defaultdict(int)
-_error_timestamps = defaultdict(list)
+# Recent error timestamps per error key, oldest first, for the alert window
+_error_timestamps: Dict[str, Deque[float]] = defaultdict(deque)
 _last_alert_time = {}
+_lock = threading.Lock()
 
 # Configuration
 ALERT_THRESHOLD = 5  # Number of errors before alerting
@@ -30,27 +35,30 @@ def record_error(error_type: str, error_message: str, context: Optional[Dict[str
     """
     timestamp = time.time()
     key = f"{error_type}:{error_message[:50]}"  # Truncate message for grouping
-
-    _error_counts[key] += 1
-    _error_timestamps[key].append(timestamp)
-
-    # Clean old timestamps (outside alert window)
-    cutoff = timestamp - ALERT_WINDOW_SECONDS
-    _error_timestamps[key] = [ts for ts in _error_timestamps[key] if ts > cutoff]
-    _error_counts[key] = len(_error_timestamps[key])
-
-    # Check if we should alert
-    if _error_counts[key] >= ALERT_THRESHOLD:
-        last_alert = _last_alert_time.get(key, 0)
-        if timestamp - last_alert > ALERT_COOLDOWN_SECONDS:
+    ERRORS.inc(error_type=error_type)
+
+    alert = False
+    with _lock:
+        timestamps = _error_timestamps[key]
+        timestamps.append(timestamp)
+        # Drop timestamps that left the alert window
+        cutoff = timestamp - ALERT_WINDOW_SECONDS
+        while timestamps and timestamps[0] <= cutoff:
+            timestamps.popleft()
+        count = len(timestamps)
+
+        # Check if we should alert
+        if count >= ALERT_THRESHOLD and timestamp - _last_alert_time.get(key, 0) > ALERT_COOLDOWN_SECONDS:
             _last_alert_time[key] = timestamp
-            send_alert(error_type, error_message, _error_counts[key], context)
+            alert = True
+    if alert:
+        send_alert(error_type, error_message, count, context)
 
     # Log the error
     log_data = {
         "error_type": error_type,
         "error_message": error_message,
-        "count": _error_counts[key],
+        "count": count,
         "context": context or {},
     }
     logger.error(f"MONITORING: {json.dumps(log_data)}")
@@ -79,10 +87,11 @@ def get_error_stats() -> Dict[str, Any]:
     current_time = time.time()
     cutoff = current_time - ALERT_WINDOW_SECONDS
 
-    stats = {"total_errors": sum(_error_counts.values()), "error_types": {}, "recent_errors": []}
+    with _lock:
+        windows = {key: [ts for ts in timestamps if ts > cutoff] for key, timestamps in _error_timestamps.items()}
+    stats = {"total_errors": sum(len(ts) for ts in windows.values()), "error_types": {}, "recent_errors": []}
 
-    for key, count in _error_counts.items():
-        recent_timestamps = [ts for ts in _error_timestamps[key] if ts > cutoff]
+    for key, recent_timestamps in windows.items():
         if recent_timestamps:
             error_type = key.split(":")[0]
             if error_type not in stats["error_types"]:
@@ -98,7 +107,6 @@ def get_error_stats() -> Dict[str, Any]:
 
 def reset_error_counts():
     """Reset error counts (useful for testing or manual reset)."""
-    global _error_counts, _error_timestamps, _last_alert_time
-    _error_counts.clear()
-    _error_timestamps.clear()
-    _last_alert_time.clear()
+    with _lock:
+        _error_timestamps.clear()
+        _last_alert_time.clear()
@@ -0,0 +1,60 @@
+# backend/pagination.py
+"""
+Keyset (cursor) pagination and field projection helpers for list endpoints.
+
+A cursor is the sort key of the last row of a page, encoded as URL-safe base64
+JSON, so the next page is a `WHERE key < cursor ... LIMIT n` range scan instead
+of an OFFSET over every earlier row.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a cursor produced by encode_cursor; raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str], required: Iterable[str] = ()) -> List[str]:
+    """
+    Resolve a comma-separated `fields` parameter against the allowed field names.
+
+    Unknown names raise ValueError; required fields are always included. No
+    parameter selects every allowed field.
+    """
+    allowed = list(allowed)
+    if not fields:
+        return allowed
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    selected = set(requested) | set(required)
+    return [f for f in allowed if f in selected]
+
+
+def page_response(items: List[Dict[str, Any]], next_cursor: Optional[str]) -> Dict[str, Any]:
+    return {"items": items, "next_cursor": next_cursor, "has_more": next_cursor is not None}
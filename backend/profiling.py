@@ -0,0 +1,238 @@
+# backend/profiling.py
+"""
+Per-stage timing spans for the search path.
+
+`with span("faiss_search"):` times a block under a stage name. The time goes to:
+
+- the pista_stage_duration_seconds histogram (backend/metrics.py), per stage; it is
+  exported at /metrics and summarised by /admin/metrics/search;
+- the current profile, when one is active. A profile is started with
+  `with profiled("search_similar"):` and kept in a contextvar. It collects every
+  stage's time and call count, and the number of SQL statements execute_query
+  ran inside it.
+
+Spans nest; a stage's time includes its children. A profiled() block inside an
+active profile is just another span of it.
+
+With PROFILE_SLOW_MS > 0, a sampling profiler runs. While a profile is active, a
+sampler thread records the profiled threads' stacks every PROFILE_SAMPLE_INTERVAL_MS.
+Profiles slower than the threshold are logged with their stage breakdown and their
+most frequent stacks.
+"""
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from backend.config import PROFILE_SAMPLE_INTERVAL_MS, PROFILE_SLOW_MS
+from backend.logger_config import logger
+from backend.metrics import STAGE_DURATION
+
+# Frames recorded per stack sample (the innermost one plus the nearest backend frames)
+SAMPLE_STACK_DEPTH = 6
+
+
+def stage_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Latency summary of every stage timed so far in this process."""
+    return {stage: STAGE_DURATION.summary(stage=stage) for (stage,) in sorted(STAGE_DURATION.samples())}
+
+
+class Profile:
+    """Stage timings and query counts of one profiled operation."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+        self.queries = 0
+        self.stages: Dict[str, List[float]] = {}  # stage -> [seconds, calls, queries]
+        self.threads: Set[int] = {threading.get_ident()}
+        self.samples: Counter = Counter()
+
+    def add(self, stage: str, seconds: float, queries: int) -> None:
+        totals = self.stages.setdefault(stage, [0.0, 0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+        totals[2] += queries
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        return {
+            "name": self.name,
+            "total_ms": round(elapsed * 1000, 3),
+            "queries": self.queries,
+            "stages": {
+                stage: {"ms": round(seconds * 1000, 3), "calls": int(calls), "queries": int(queries)}
+                for stage, (seconds, calls, queries) in self.stages.items()
+            },
+        }
+
+
+_CURRENT_PROFILE: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar("profile", default=None)
+
+
+def current_profile() -> Optional[Profile]:
+    return _CURRENT_PROFILE.get()
+
+
+def count_query() -> None:
+    """Called by execute_query for every statement."""
+    profile = _CURRENT_PROFILE.get()
+    if profile is not None:
+        profile.queries += 1
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block as one call of stage."""
+    profile = _CURRENT_PROFILE.get()
+    queries_before = 0
+    if profile is not None:
+        queries_before = profile.queries
+        # Blocks may run on a worker thread other than the one that started the profile
+        profile.threads.add(threading.get_ident())
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_DURATION.observe(seconds, stage=stage)
+        if profile is not None:
+            profile.add(stage, seconds, profile.queries - queries_before)
+
+
+@contextmanager
+def profiled(name: str, slow_ms: Optional[float] = None) -> Iterator[Profile]:
+    """
+    Profile a block, or time it as a span of the profile already active.
+
+    Blocks slower than slow_ms (default PROFILE_SLOW_MS; 0 disables) are logged.
+    """
+    active = _CURRENT_PROFILE.get()
+    if active is not None:
+        with span(name):
+            yield active
+        return
+
+    slow_ms = PROFILE_SLOW_MS if slow_ms is None else slow_ms
+    profile = Profile(name)
+    token = _CURRENT_PROFILE.set(profile)
+    if slow_ms > 0:
+        _SAMPLER.add(profile)
+    try:
+        yield profile
+    finally:
+        profile.elapsed = time.perf_counter() - profile.started
+        _CURRENT_PROFILE.reset(token)
+        STAGE_DURATION.observe(profile.elapsed, stage=name)
+        if slow_ms > 0:
+            _SAMPLER.remove(profile)
+            if profile.elapsed * 1000 >= slow_ms:
+                _log_slow(profile)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator: every call of the function is a span of stage."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profiled_call(name: str) -> Callable:
+    """Decorator: every call of the function is profiled (or a span of the active profile)."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiled(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _log_slow(profile: Profile) -> None:
+    summary = profile.summary()
+    stages = ", ".join(
+        f"{stage}={values['ms']:.1f}ms/{values['calls']}x/{values['queries']}q"
+        for stage, values in sorted(summary["stages"].items(), key=lambda item: -item[1]["ms"])
+    )
+    message = f"Slow {profile.name}: {summary['total_ms']:.1f}ms, {profile.queries} queries; {stages}"
+    total_samples = sum(profile.samples.values())
+    for stack, count in profile.samples.most_common(3):
+        message += f"\n  {100 * count / total_samples:.0f}% {' <- '.join(stack)}"
+    logger.warning(message)
+
+
+def _stack_key(frame) -> tuple:
+    """The innermost frame plus the nearest frames from backend/ code."""
+    backend_dir = os.sep + "backend" + os.sep
+    key = [f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"]
+    frame = frame.f_back
+    while frame is not None and len(key) < SAMPLE_STACK_DEPTH:
+        filename = frame.f_code.co_filename
+        if backend_dir in filename and not filename.endswith("profiling.py"):
+            key.append(f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return tuple(key)
+
+
+class _StackSampler:
+    """Daemon thread sampling the stacks of the threads running active profiles."""
+
+    def __init__(self):
+        self._profiles: Set[Profile] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def sample(self) -> None:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return
+        frames = sys._current_frames()
+        for profile in profiles:
+            for thread_id in list(profile.threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.samples[_stack_key(frame)] += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                idle = not self._profiles
+                if idle:
+                    self._wakeup.clear()
+            if idle:
+                self._wakeup.wait()
+            time.sleep(max(PROFILE_SAMPLE_INTERVAL_MS, 1) / 1000.0)
+            self.sample()
+
+
+_SAMPLER = _StackSampler()
@@ -4,6 +4,8 @@ from typing import Dict, Set, List, Tuple, Optional, Any
 
 from .db import execute_query
 from .feature_blacklist import filter_blacklisted_features
+from .game_stats import mask_to_players, parse_player_counts
+from .profiling import span, timed
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +55,7 @@ def _fetch_feature_names(
         return set()
 
 
+@timed("game_features")
 def get_game_features(conn, game_id: int) -> Dict[str, object]:
     # Validate game_id
     if game_id is None:
@@ -78,31 +81,34 @@ def get_game_features(conn, game_id: int) -> Dict[str, object]:
             logger.error(f"SQL error fetching {vocab_table} for game_id={game_id}: {e}")
             return set()  # Return empty set on error
 
-    mechanics = fetch("game_mechanics", "mechanics", "mechanic_id")
-    categories = fetch("game_categories", "categories", "category_id")
-    families = fetch("game_families", "families", "family_id")
-    designers = fetch("game_designers", "designers", "designer_id")
-    artists = fetch("game_artists", "artists", "artist_id")
-    publishers = fetch("game_publishers", "publishers", "publisher_id")
+    with span("game_features.fetch"):
+        mechanics = fetch("game_mechanics", "mechanics", "mechanic_id")
+        categories = fetch("game_categories", "categories", "category_id")
+        families = fetch("game_families", "families", "family_id")
+        designers = fetch("game_designers", "designers", "designer_id")
+        artists = fetch("game_artists", "artists", "artist_id")
+        publishers = fetch("game_publishers", "publishers", "publisher_id")
 
     # Filter out blacklisted features
-    mechanics = filter_blacklisted_features(conn, mechanics, "mechanics")
-    categories = filter_blacklisted_features(conn, categories, "categories")
-    families = filter_blacklisted_features(conn, families, "families")
-    designers = filter_blacklisted_features(conn, designers, "designers")
-    artists = filter_blacklisted_features(conn, artists, "artists")
-    publishers = filter_blacklisted_features(conn, publishers, "publishers")
+    with span("game_features.blacklist"):
+        mechanics = filter_blacklisted_features(conn, mechanics, "mechanics")
+        categories = filter_blacklisted_features(conn, categories, "categories")
+        families = filter_blacklisted_features(conn, families, "families")
+        designers = filter_blacklisted_features(conn, designers, "designers")
+        artists = filter_blacklisted_features(conn, artists, "artists")
+        publishers = filter_blacklisted_features(conn, publishers, "publishers")
 
     # Apply feature modifications from FeatureMod table
-    cur = execute_query(
-        conn,
-        """SELECT feature_type, feature_id, action
-           FROM feature_mods
-           WHERE game_id = %s
-           ORDER BY created_at DESC""",
-        (game_id,),
-    )
-    mods = cur.fetchall()
+    with span("game_features.mods"):
+        cur = execute_query(
+            conn,
+            """SELECT feature_type, feature_id, action
+               FROM feature_mods
+               WHERE game_id = %s
+               ORDER BY created_at DESC""",
+            (game_id,),
+        )
+        mods = cur.fetchall()
 
     # Create feature type to table mapping
     feature_tables = {
@@ -135,43 +141,25 @@ def get_game_features(conn, game_id: int) -> Dict[str, object]:
             elif action == "remove":
                 feature_set.discard(feature_name)
 
-    # Get player count info from games table and polls_json
-    cur = execute_query(conn, "SELECT min_players, max_players, polls_json FROM games WHERE id = %s", (game_id,))
+    # Player counts: typed columns filled by the ETL, polls_json only for rows not normalized yet
+    cur = execute_query(
+        conn,
+        """SELECT min_players, max_players, stats_normalized, recommended_players, best_player_count,
+                  CASE WHEN stats_normalized THEN NULL ELSE polls_json END
+           FROM games WHERE id = %s""",
+        (game_id,),
+    )
     player_row = cur.fetchone()
     min_players = player_row[0] if player_row and player_row[0] else None
     max_players = player_row[1] if player_row and player_row[1] else None
-    polls_json_str = player_row[2] if player_row and player_row[2] else None
 
-    # Parse polls_json to get recommended player counts
     recommended_players = set()
     best_player_count = None
-    if polls_json_str:
-        try:
-            import json
-
-            polls_data = json.loads(polls_json_str)
-            suggested_players = polls_data.get("suggested_numplayers", {})
-            if isinstance(suggested_players, dict):
-                results = suggested_players.get("results", [])
-                max_best_votes = 0
-                for result in results:
-                    if isinstance(result, dict):
-                        numplayers = result.get("numplayers")
-                        votes = result.get("votes", {})
-                        # Count "Best" votes
-                        best_votes = votes.get("Best", 0)
-                        recommended_votes = votes.get("Recommended", 0)
-                        if best_votes > 0 or recommended_votes > 0:
-                            try:
-                                player_num = int(numplayers.replace("+", "").split()[0])
-                                recommended_players.add(player_num)
-                                if best_votes > max_best_votes:
-                                    max_best_votes = best_votes
-                                    best_player_count = player_num
-                            except (ValueError, AttributeError):
-                                pass
-        except (json.JSONDecodeError, KeyError, TypeError):
-            pass
+    if player_row and player_row[2]:
+        recommended_players = mask_to_players(player_row[3])
+        best_player_count = player_row[4]
+    elif player_row and player_row[5]:
+        recommended_players, best_player_count = parse_player_counts(player_row[5])
 
     return {
         "id": game_id,
@@ -1,6 +1,9 @@
 # similarity_engine.py
 import json
-from typing import List, Dict, Any, Optional, Set
+import math
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Mapping, NamedTuple, Optional, Sequence, Set, Tuple, Union
 import os
 
 import numpy as np
@@ -8,19 +11,315 @@ import faiss
 import psycopg2
 from psycopg2.extensions import connection as psycopg2_connection
 
-from backend.reasoning_utils import get_game_features, compute_meta_similarity, build_reason_summary
+from backend.reasoning_utils import get_game_features, build_reason_summary
+from backend.feature_bitmaps import get_bitmap_index
+from backend.feature_incidence import get_incidence
+from backend.game_attributes import (
+    GAME_ATTRIBUTES_TTL_SECONDS,
+    GameAttributes,
+    load_game_attributes,
+    player_constraint_mask,
+    playtime_constraint_mask,
+    weighted_scores,
+)
+from backend.meta_scoring import (
+    candidate_overlaps,
+    explain_overlap,
+    feature_sets,
+    meta_scores,
+    overlap_constraint_mask,
+    overlap_type_mask,
+)
+from backend.game_neighbors import get_neighbors
+from backend.game_stats import language_dependence_from_columns, parse_language_dependence, parse_overall_rank
+from backend.config import NEIGHBORS_LOOKUP, SEARCH_ADAPTIVE_OVERFETCH, SEARCH_MAX_CANDIDATES, SEARCH_OVERFETCH_GROWTH
 from backend.logger_config import logger
+from backend.profiling import current_profile, profiled_call, span, timed
+from backend.vector_index import (
+    IdLookup,
+    IndexVersionMismatch,
+    apply_delta,
+    index_ids,
+    is_id_index,
+    owned_copy,
+    to_id_index,
+)
 from .db import execute_query, get_connection, put_connection
 
+# Version of the result scoring (final_score / meta_similarity_score weighting); stored with
+# chat results so old scores can be told apart after the formula changes
+SCORING_VERSION = 1
+
+# Candidate row for search_similar. ranks/polls JSON is only read for games the ETL has not
+# normalized yet (stats_normalized = FALSE); otherwise the typed columns are used.
+QUERY_CANDIDATE_GAME = """SELECT name, thumbnail, average_rating, num_ratings,
+                                 CASE WHEN stats_normalized THEN NULL ELSE ranks_json END, year_published,
+                                 CASE WHEN stats_normalized THEN NULL ELSE polls_json END,
+                                 min_players, max_players, description, avg_weight,
+                                 stats_normalized, overall_rank,
+                                 language_dependence_level, language_dependence_value, language_dependence_votes
+                          FROM games WHERE id = %s"""
+QUERY_EMBEDDINGS = "SELECT game_id, vector, vector_json FROM game_embeddings WHERE game_id = ANY(%s)"
+
+# Default weight of a negative seed game relative to a positive one
+NEGATIVE_SEED_WEIGHT = 0.5
+
+
+def decode_embedding(vector: Optional[bytes], vector_json: Optional[str]) -> np.ndarray:
+    """Decode a stored embedding: raw float32 bytes when present, else the legacy JSON list."""
+    if vector is not None:
+        return np.frombuffer(bytes(vector), dtype="float32").copy()
+    return np.array(json.loads(vector_json), dtype="float32")
+
+
+def combine_query_vector(
+    positive: List[Tuple[np.ndarray, float]],
+    negative: Optional[List[Tuple[np.ndarray, float]]] = None,
+    centroid: Optional[np.ndarray] = None,
+    centroid_weight: float = 0.0,
+) -> np.ndarray:
+    """
+    One L2-normalized (1, dim) query vector from weighted seed embeddings.
+
+    Each seed is (normalized vector, weight): positives are added, negatives subtracted,
+    and the centroid (e.g. of a user's collection) is added with centroid_weight.
+    """
+    if not positive:
+        raise ValueError("At least one positive seed game is required")
+    query = np.zeros(len(positive[0][0]), dtype="float64")
+    for vector, weight in positive:
+        query += weight * vector
+    for vector, weight in negative or ():
+        query -= weight * vector
+    if centroid is not None and centroid_weight:
+        query += centroid_weight * centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+    norm = float(np.linalg.norm(query))
+    if norm < 1e-9:
+        raise ValueError("Seed games cancel out; no query direction left")
+    return (query / norm).astype("float32").reshape(1, -1)
+
+
+class IndexState(NamedTuple):
+    """Everything derived from one FAISS index load; replaced as a whole, never mutated."""
+
+    index: Any
+    id_map: np.ndarray  # int64 BGG ids in row order; a read-only memmap when loaded from disk
+    id_to_index: IdLookup
+    version: Optional[int] = None  # export version from the manifest; None when unknown
+    attributes: Optional[GameAttributes] = None  # columns aligned with id_map; None until built
+    attributes_built_at: float = 0.0  # time.monotonic() of the attribute build
+
+    @classmethod
+    def build(cls, index, id_map, version: Optional[int] = None, id_lookup: Optional[IdLookup] = None) -> "IndexState":
+        if not isinstance(id_map, np.ndarray):
+            id_map = np.asarray(id_map, dtype="int64")
+        # precompute bgg_id -> index row, unless the export's lookup arrays were loaded
+        return cls(index, id_map, id_lookup if id_lookup is not None else IdLookup(id_map), version)
+
+
+class ScoredCandidates(NamedTuple):
+    """Candidates that survived the vectorized filters of search_similar, with their scores."""
+
+    game_ids: np.ndarray
+    similarity: np.ndarray  # embedding similarity
+    meta: np.ndarray  # meta similarity (0 without explain)
+    final: np.ndarray  # 0.8 * similarity + 0.2 * meta with explain, else similarity
+    weighted: np.ndarray  # final plus the popularity/rank/recency/complexity boosts
+
+
+class PassRateStats:
+    """
+    Share of index candidates that survive search_similar's filters, per filter shape.
+
+    An exponential moving average per shape (e.g. "collection+excluded_families") gives
+    the initial FAISS k for adaptive over-fetch: enough candidates for top_k survivors
+    at the observed rate, so most searches need a single index pass.
+    """
+
+    ALPHA = 0.2  # weight of the newest observation
+    MIN_RATE = 0.01
+    HEADROOM = 1.25  # over-fetch on top of the expected pass rate
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, shape: str, examined: int, survivors: int) -> None:
+        if examined <= 0:
+            return
+        rate = survivors / examined
+        with self._lock:
+            entry = self._stats.get(shape)
+            if entry is None:
+                self._stats[shape] = {"rate": rate, "searches": 1, "examined": examined, "survivors": survivors}
+            else:
+                entry["rate"] += self.ALPHA * (rate - entry["rate"])
+                entry["searches"] += 1
+                entry["examined"] += examined
+                entry["survivors"] += survivors
+
+    def rate(self, shape: str) -> Optional[float]:
+        entry = self._stats.get(shape)
+        return entry["rate"] if entry else None
+
+    def initial_k(self, shape: str, top_k: int, default_k: int, limit: int) -> int:
+        """FAISS k expected to yield top_k survivors; default_k until the shape has been seen."""
+        rate = self.rate(shape)
+        if rate is None:
+            k = default_k
+        else:
+            # +1 for the query game itself, which is usually the nearest neighbour
+            k = math.ceil(top_k * self.HEADROOM / max(rate, self.MIN_RATE)) + 1
+        return max(1, min(k, limit))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {shape: dict(entry) for shape, entry in self._stats.items()}
+
+
+SEARCH_PASS_RATES = PassRateStats()
+
+
+def filter_shape(
+    allowed_ids: Optional[Set[int]],
+    constraints: Optional[Dict[str, Any]],
+    include_features: Optional[List[str]],
+    exclude_features: Optional[List[str]],
+    excluded_feature_values: Optional[Dict[str, Set[str]]],
+    required_feature_values: Optional[Dict[str, Set[str]]],
+) -> str:
+    """Key of the filters a search applies; searches with the same key have similar pass rates."""
+    parts = []
+    if allowed_ids:
+        parts.append("collection")
+    if required_feature_values:
+        parts.append("required_values")
+    if excluded_feature_values:
+        parts.append("excluded_families" if "families" in excluded_feature_values else "excluded_values")
+    if include_features or exclude_features:
+        parts.append("feature_overlap")
+    if constraints:
+        parts.append("constraints")
+    return "+".join(parts) or "unfiltered"
+
 
 class SimilarityEngine:
-    def __init__(self, conn: psycopg2_connection, index, id_map: List[int]):
+    def __init__(
+        self, conn: psycopg2_connection, index, id_map, version: Optional[int] = None, id_lookup: Optional[IdLookup] = None
+    ):
         self.conn = conn
-        self.index = index
-        self.id_map = id_map
+        self._state = IndexState.build(index, id_map, version, id_lookup)
+        self._index_lock = threading.Lock()
+        # Held by the background attribute refresh, so at most one runs
+        self._attributes_refresh_lock = threading.Lock()
+
+    @property
+    def index(self):
+        return self._state.index
+
+    @property
+    def id_map(self) -> np.ndarray:
+        return self._state.id_map
+
+    @property
+    def _id_to_index(self) -> IdLookup:
+        return self._state.id_to_index
+
+    @property
+    def index_version(self) -> Optional[int]:
+        return self._state.version
+
+    def replace_index(
+        self, index, id_map, version: Optional[int] = None, id_lookup: Optional[IdLookup] = None
+    ) -> None:
+        """Atomically switch to a freshly loaded index; in-flight searches finish on the old one."""
+        # Game attribute columns are built before the swap, so no search has to build them
+        state = self._with_attributes(IndexState.build(index, id_map, version, id_lookup))
+        with self._index_lock:
+            self._state = state
+        logger.info(f"Similarity index replaced, now {len(id_map)} games (version {version})")
+
+    def apply_index_delta(
+        self,
+        upsert_ids,
+        upsert_vectors,
+        remove_ids,
+        base_version: Optional[int] = None,
+        target_version: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Add, replace or remove vectors without rebuilding the index.
 
-        # precompute bgg_id -> index row
-        self._id_to_index = {gid: i for i, gid in enumerate(id_map)}
+        The delta is applied to a copy which is then swapped in, so searches running
+        concurrently keep using the previous index. Raises IndexVersionMismatch when the
+        delta was diffed against another version than the loaded one.
+        """
+        with self._index_lock:
+            current = self._state
+            if base_version != current.version:
+                raise IndexVersionMismatch(
+                    f"Delta applies to index version {base_version}, but version {current.version} is loaded"
+                )
+            if is_id_index(current.index):
+                # Not clone_index: the loaded index may be a read-only memory mapping
+                patched = owned_copy(current.index)
+            else:
+                patched = to_id_index(current.index, current.id_map)
+            stats = apply_delta(patched, upsert_ids, upsert_vectors, remove_ids)
+            self._state = self._with_attributes(IndexState.build(patched, index_ids(patched), target_version))
+        logger.info(f"Applied index delta: {stats}, index now has {len(self.id_map)} games (version {target_version})")
+        return stats
+
+    @staticmethod
+    def _with_attributes(state: IndexState) -> IndexState:
+        """state with game attribute columns for its id_map; unchanged if they cannot be loaded."""
+        try:
+            return state._replace(attributes=load_game_attributes(state.id_map), attributes_built_at=time.monotonic())
+        except Exception as e:
+            logger.warning(f"Game attribute columns not built for {len(state.id_map)} games: {e}")
+            return state
+
+    def refresh_attributes(self) -> bool:
+        """
+        Rebuild the game attribute columns of the loaded index and swap them in.
+
+        Returns False when another index was swapped in meanwhile; it brought its own columns.
+        """
+        state = self._state
+        built = self._with_attributes(state)
+        if built.attributes is state.attributes:
+            return False
+        with self._index_lock:
+            if self._state.id_map is not state.id_map:
+                return False
+            self._state = self._state._replace(attributes=built.attributes, attributes_built_at=built.attributes_built_at)
+        return True
+
+    def _refresh_attributes_in_background(self) -> None:
+        try:
+            self.refresh_attributes()
+        finally:
+            self._attributes_refresh_lock.release()
+
+    def game_attributes(self, state: Optional[IndexState] = None) -> Tuple[np.ndarray, Optional[GameAttributes]]:
+        """
+        (id_map, attribute columns) of one index state; the columns are None if never built.
+
+        Columns older than GAME_ATTRIBUTES_TTL_SECONDS keep being served while a background
+        thread rebuilds them. Only an engine whose columns were never built (e.g. in a script)
+        builds them on the calling thread.
+        """
+        state = self._state if state is None else state
+        if state.attributes is None:
+            if self._state.id_map is state.id_map and self.refresh_attributes():
+                state = self._state
+            return state.id_map, state.attributes
+        if time.monotonic() - state.attributes_built_at >= GAME_ATTRIBUTES_TTL_SECONDS:
+            if self._attributes_refresh_lock.acquire(blocking=False):
+                threading.Thread(
+                    target=self._refresh_attributes_in_background, name="game-attributes", daemon=True
+                ).start()
+        return state.id_map, state.attributes
 
     def _ensure_connection(self):
         """Ensure the database connection is alive, refresh if needed."""
@@ -52,17 +351,34 @@ class SimilarityEngine:
             self.conn = get_connection()
             logger.info("Re-acquired database connection from pool")
 
+    @timed("embedding_fetch")
+    def _fetch_embeddings(self, game_ids: List[int]) -> Dict[int, np.ndarray]:
+        """L2-normalized embeddings of several games in one query; games without one are left out."""
+        self._ensure_connection()
+        cur = execute_query(self.conn, QUERY_EMBEDDINGS, ([int(gid) for gid in game_ids],))
+        vectors = {}
+        for gid, vec_bytes, vec_json in cur.fetchall():
+            try:
+                vec = decode_embedding(vec_bytes, vec_json)
+            except (json.JSONDecodeError, ValueError) as e:
+                logger.warning(f"Error parsing embedding for game_id={gid}: {e}")
+                continue
+            faiss.normalize_L2(vec.reshape(1, -1))
+            vectors[int(gid)] = vec
+        return vectors
+
+    @timed("embedding_fetch")
     def _fetch_embedding(self, game_id: int) -> np.ndarray:
         """Fetch embedding for a game, with error handling and connection health check."""
         # Ensure connection is alive before using it
         self._ensure_connection()
         try:
-            cur = execute_query(self.conn, "SELECT vector_json FROM game_embeddings WHERE game_id = %s", (game_id,))
+            cur = execute_query(self.conn, "SELECT vector, vector_json FROM game_embeddings WHERE game_id = %s", (game_id,))
             row = cur.fetchone()
             if not row:
                 logger.warning(f"No embedding found for game_id={game_id}")
                 raise ValueError(f"No embedding found for game_id={game_id}")
-            vec = np.array(json.loads(row[0]), dtype="float32")
+            vec = decode_embedding(row[0], row[1])
             faiss.normalize_L2(vec.reshape(1, -1))
             return vec
         except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
@@ -70,12 +386,12 @@ class SimilarityEngine:
             logger.warning(f"Connection error fetching embedding for game_id={game_id}, retrying: {e}")
             self._ensure_connection()
             try:
-                cur = execute_query(self.conn, "SELECT vector_json FROM game_embeddings WHERE game_id = %s", (game_id,))
+                cur = execute_query(self.conn, "SELECT vector, vector_json FROM game_embeddings WHERE game_id = %s", (game_id,))
                 row = cur.fetchone()
                 if not row:
                     logger.warning(f"No embedding found for game_id={game_id}")
                     raise ValueError(f"No embedding found for game_id={game_id}")
-                vec = np.array(json.loads(row[0]), dtype="float32")
+                vec = decode_embedding(row[0], row[1])
                 faiss.normalize_L2(vec.reshape(1, -1))
                 return vec
             except Exception as retry_e:
@@ -85,6 +401,207 @@ class SimilarityEngine:
             logger.error(f"Error fetching embedding for game_id={game_id}: {e}", exc_info=True)
             raise
 
+    @staticmethod
+    @timed("faiss_search")
+    def _search_index_batch(state: IndexState, query_matrix: np.ndarray, k: int):
+        """(similarities, game ids), each (n_queries, k), of one index search; -1 marks empty slots."""
+        sims, idxs = state.index.search(query_matrix, k)
+        if is_id_index(state.index):
+            # Labels are already BGG ids (-1 for empty slots)
+            return sims, idxs.astype("int64")
+        # Convert index positions to game IDs
+        id_map = state.id_map
+        valid = (idxs >= 0) & (idxs < len(id_map))
+        return sims, np.where(valid, id_map[np.where(valid, idxs, 0)] if len(id_map) else -1, -1).astype("int64")
+
+    @classmethod
+    def _search_index(cls, state: IndexState, query_vec: np.ndarray, k: int):
+        """(similarities, game ids) of the k nearest index entries; -1 marks empty slots."""
+        sims, ids = cls._search_index_batch(state, query_vec, k)
+        return sims[0], ids[0].tolist()
+
+    @profiled_call("search_batch")
+    def search_batch(
+        self, game_ids: Sequence[int], top_k: int = 10, include_self: bool = False
+    ) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Embedding neighbours of many games with one index search over their stacked vectors.
+
+        Returns game id -> (neighbour ids, similarities), nearest first. Games without an
+        embedding are left out. No filters, meta scores or hydration; see search_similar.
+        """
+        state = self._state
+        vectors = self._fetch_embeddings(list(game_ids))
+        query_ids = [int(gid) for gid in game_ids if int(gid) in vectors]
+        if not query_ids or not len(state.id_map):
+            return {}
+        query_matrix = np.ascontiguousarray(np.vstack([vectors[gid] for gid in query_ids]), dtype="float32")
+        k = min(top_k + (0 if include_self else 1), len(state.id_map))
+        sims, ids = self._search_index_batch(state, query_matrix, k)
+
+        neighbors = {}
+        for row, gid in enumerate(query_ids):
+            keep = ids[row] >= 0
+            if not include_self:
+                keep &= ids[row] != gid
+            neighbors[gid] = (ids[row][keep][:top_k], sims[row][keep][:top_k])
+        return neighbors
+
+    @timed("neighbor_lookup")
+    def _precomputed_neighbors(self, game_id: int, limit: int, index_version: Optional[int]):
+        """(similarities, ids) from the game_neighbors table, or None to search the index."""
+        try:
+            self._ensure_connection()
+            return get_neighbors(self.conn, int(game_id), limit, index_version)
+        except Exception as e:
+            logger.debug(f"Precomputed neighbours unavailable for game_id={game_id}: {e}")
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+            return None
+
+    @timed("hydrate")
+    def _hydrate_candidate(self, gid: int, sim: float) -> Optional[Dict[str, Any]]:
+        """The result record of one candidate (game row and designers), or None if it cannot be loaded."""
+        # Fetch additional game data including num_ratings, ranks_json, year_published, polls_json, min_players, max_players, description, designers for reordering
+        try:
+            # Ensure connection is healthy before querying
+            self._ensure_connection()
+            # Try to select avg_weight, but handle case where column might not exist
+            try:
+                cur = execute_query(
+                    self.conn,
+                    QUERY_CANDIDATE_GAME,
+                    (gid,),
+                )
+            except psycopg2.Error as col_err:
+                # If avg_weight column doesn't exist, fall back to query without it
+                if "column" in str(col_err).lower() and "avg_weight" in str(col_err).lower():
+                    logger.debug(f"avg_weight column not found, using query without it for game {gid}")
+                    cur = execute_query(
+                        self.conn,
+                        "SELECT name, thumbnail, average_rating, num_ratings, ranks_json, year_published, polls_json, min_players, max_players, description FROM games WHERE id = %s",
+                        (gid,),
+                    )
+                else:
+                    raise
+        except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
+            # Connection error - try once more with a fresh connection
+            logger.warning(f"Connection error fetching game {gid}, retrying: {e}")
+            self._ensure_connection()
+            try:
+                # Try to select avg_weight, but handle case where column might not exist
+                try:
+                    cur = execute_query(
+                        self.conn,
+                        QUERY_CANDIDATE_GAME,
+                        (gid,),
+                    )
+                except psycopg2.Error as col_err:
+                    # If avg_weight column doesn't exist, fall back to query without it
+                    if "column" in str(col_err).lower() and "avg_weight" in str(col_err).lower():
+                        logger.debug(f"avg_weight column not found in retry, using query without it for game {gid}")
+                        cur = execute_query(
+                            self.conn,
+                            "SELECT name, thumbnail, average_rating, num_ratings, ranks_json, year_published, polls_json, min_players, max_players, description FROM games WHERE id = %s",
+                            (gid,),
+                        )
+                    else:
+                        raise
+            except Exception as retry_e:
+                logger.warning(f"SQL error fetching game {gid} after retry: {retry_e}")
+                return None
+        except (psycopg2.Error, Exception) as e:
+            logger.warning(f"SQL error fetching game {gid}: {e}")
+            return None
+        game_row = cur.fetchone()
+        if not game_row:
+            return None
+
+        # Safely access columns with proper bounds checking
+        # Expected columns: name(0), thumbnail(1), average_rating(2), num_ratings(3), ranks_json(4),
+        # year_published(5), polls_json(6), min_players(7), max_players(8), description(9), avg_weight(10)
+        row_len = len(game_row)
+        if row_len < 10:
+            logger.warning(f"Game {gid} row has only {row_len} columns, expected at least 10. Skipping.")
+            return None
+
+        try:
+            game_name = game_row[0] if game_row[0] else self._fetch_name(gid)
+            thumbnail = game_row[1] if row_len > 1 and game_row[1] else None
+            average_rating = float(game_row[2]) if row_len > 2 and game_row[2] is not None else None
+            num_ratings = int(game_row[3]) if row_len > 3 and game_row[3] is not None else 0
+            ranks_json_str = game_row[4] if row_len > 4 and game_row[4] else None
+            year_published = int(game_row[5]) if row_len > 5 and game_row[5] is not None else None
+            polls_json_str = game_row[6] if row_len > 6 and game_row[6] else None
+            description = game_row[9] if row_len > 9 and game_row[9] else None
+            # avg_weight is optional (column 10), may not exist in all databases
+            avg_weight = float(game_row[10]) if row_len > 10 and game_row[10] is not None else None
+            stats_normalized = row_len > 15 and bool(game_row[11])
+        except (IndexError, ValueError, TypeError) as e:
+            logger.warning(f"Error parsing game row for game {gid}: {e}, row length: {row_len}")
+            return None
+
+        # Get designers for this game
+        designers = []
+        try:
+            # Connection should still be healthy from previous query, but check anyway
+            self._ensure_connection()
+            cur_designers = execute_query(
+                self.conn,
+                """SELECT d.name FROM designers d
+                   JOIN game_designers gd ON gd.designer_id = d.id
+                   WHERE gd.game_id = %s ORDER BY d.name""",
+                (gid,),
+            )
+            designers = [row[0] for row in cur_designers.fetchall()]
+        except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
+            # Connection error - try once more
+            logger.debug(f"Connection error fetching designers for game {gid}, retrying: {e}")
+            self._ensure_connection()
+            try:
+                cur_designers = execute_query(
+                    self.conn,
+                    """SELECT d.name FROM designers d
+                       JOIN game_designers gd ON gd.designer_id = d.id
+                       WHERE gd.game_id = %s ORDER BY d.name""",
+                    (gid,),
+                )
+                designers = [row[0] for row in cur_designers.fetchall()]
+            except Exception:
+                pass  # Ignore errors on retry
+        except (psycopg2.Error, Exception):
+            pass
+
+        if stats_normalized:
+            rank = game_row[12]
+            language_dependence = language_dependence_from_columns(game_row[13], game_row[14], game_row[15])
+        else:
+            # Not normalized by the ETL yet: parse the JSON (overall rank, else first rank)
+            rank = parse_overall_rank(ranks_json_str) if ranks_json_str else None
+            language_dependence = parse_language_dependence(polls_json_str) if polls_json_str else None
+
+        # Ensure we have at least a name and game_id
+        if not game_name:
+            game_name = self._fetch_name(gid)
+
+        record: Dict[str, Any] = {
+            "game_id": gid,
+            "name": game_name or f"Game {gid}",
+            "thumbnail": thumbnail,
+            "average_rating": average_rating,
+            "num_ratings": num_ratings,
+            "rank": rank,
+            "year_published": year_published,
+            "description": description,
+            "designers": designers,
+            "embedding_similarity": float(sim),
+            "language_dependence": language_dependence,
+            "avg_weight": avg_weight,
+        }
+        return record
+
     def _fetch_name(self, game_id: int) -> str:
         """Fetch game name, with connection health check."""
         self._ensure_connection()
@@ -104,7 +621,12 @@ class SimilarityEngine:
                 logger.error(f"Error fetching name for game_id={game_id} after retry: {retry_e}")
                 return f"(id={game_id})"
 
-    def search_similar(
+    @profiled_call("search_similar")
+    def search_similar(self, game_id: int, top_k: int = 10, **kwargs) -> List[Dict[str, Any]]:
+        """All results of iter_similar (same arguments), best first."""
+        return list(self.iter_similar(game_id, top_k, **kwargs))
+
+    def iter_similar(
         self,
         game_id: int,
         top_k: int = 10,
@@ -122,12 +644,26 @@ class SimilarityEngine:
         mechanics_only: bool = False,
         mechanics_weight: float = 0.5,
         categories_weight: float = 0.5,
-    ) -> List[Dict[str, Any]]:
+        collection_vectors: Optional[Any] = None,
+        adaptive: Optional[bool] = None,
+        query_vector: Optional[np.ndarray] = None,
+        exclude_ids: Optional[Set[int]] = None,
+    ) -> Iterator[Dict[str, Any]]:
         """
+        Games similar to game_id, best first. Each result is yielded as soon as it is
+        hydrated and explained, so callers can stream the top results before the rest.
+
         constraints: generic constraint spec (see section 2).
         allowed_ids: if provided, restrict results to this set (e.g. user's collection).
+        collection_vectors: cached (game_ids, normalized matrix) of allowed_ids
+            (backend/collection_cache.py); scores the whole collection without DB access.
         include_features: list of feature types to require (e.g., ['mechanics', 'categories'])
         exclude_features: list of feature types to exclude matches on
+        adaptive: widen the index search until top_k results survive the filters
+            (default SEARCH_ADAPTIVE_OVERFETCH); otherwise a fixed over-fetch is used
+        query_vector: normalized (1, dim) vector searched instead of game_id's embedding
+            (see search_multi); game_id still anchors the explanations and meta scores
+        exclude_ids: games never returned, e.g. the other seed games of a multi-game query
         """
         logger.debug(f"Searching similar to game_id={game_id}, top_k={top_k}, constraints={constraints}")
 
@@ -137,20 +673,51 @@ class SimilarityEngine:
         # Initialize sims and idxs to avoid UnboundLocalError if exception occurs early
         sims = np.array([])
         idxs = []
+        base_features = None
+        # Read the index state once so a concurrent reload cannot mix two indexes
+        state = self._state
+        shape = filter_shape(
+            allowed_ids, constraints, include_features, exclude_features, excluded_feature_values, required_feature_values
+        )
+        # Set for index searches, which can be widened when too few candidates survive
+        n_search = max_search = 0
 
         try:
             constraints = constraints or {}
-            query_vec = self._fetch_embedding(game_id).reshape(1, -1)
+            # Plain "similar to X": the neighbours were precomputed (backend/game_neighbors.py)
+            precomputed = None
+            if NEIGHBORS_LOOKUP and shape == "unfiltered" and query_vector is None and not include_self and not exclude_ids:
+                # Only rows computed from the loaded index; stale ones would miss new games
+                precomputed = self._precomputed_neighbors(game_id, top_k * 2, state.version)
+            if query_vector is not None:
+                query_vec = np.asarray(query_vector, dtype="float32").reshape(1, -1)
+            elif precomputed is None:
+                query_vec = self._fetch_embedding(game_id).reshape(1, -1)
 
             # When searching in a collection, try direct collection search first if collection is small enough
             # This ensures we find similar games even if they're not in top embedding candidates
             use_direct_collection_search = False
-            if allowed_ids is not None and len(allowed_ids) > 0 and len(allowed_ids) <= 500:
+            if collection_vectors is not None and len(collection_vectors.game_ids) > 0:
+                # The matrix is already built, so any collection size is one matrix-vector product
+                use_direct_collection_search = True
+            elif allowed_ids is not None and len(allowed_ids) > 0 and len(allowed_ids) <= 500:
                 # For collections <= 500 games, compute similarity directly for all games in collection
                 use_direct_collection_search = True
                 logger.debug(f"Using direct collection search for {len(allowed_ids)} games")
 
-            if use_direct_collection_search:
+            if precomputed is not None:
+                sims, idxs = precomputed
+            elif use_direct_collection_search and collection_vectors is not None:
+                collection_ids_arr, collection_matrix = collection_vectors
+                similarities = collection_matrix @ query_vec[0]
+                if not include_self:
+                    similarities = np.where(collection_ids_arr == game_id, -np.inf, similarities)
+                sorted_indices = np.argsort(similarities)[::-1]
+                if not include_self:
+                    sorted_indices = sorted_indices[np.isfinite(similarities[sorted_indices])]
+                sims = similarities[sorted_indices]
+                idxs = collection_ids_arr[sorted_indices].tolist()
+            elif use_direct_collection_search:
                 # Get embeddings for all games in collection - optimized batch fetch
                 collection_ids = [gid for gid in allowed_ids if include_self or gid != game_id]
 
@@ -158,16 +725,17 @@ class SimilarityEngine:
                     # Batch fetch all embeddings in a single query
                     try:
                         placeholders = ",".join(["%s"] * len(collection_ids))
-                        query = f"SELECT game_id, vector_json FROM game_embeddings WHERE game_id IN ({placeholders})"
-                        cur = execute_query(self.conn, query, tuple(collection_ids))
-                        rows = cur.fetchall()
+                        query = f"SELECT game_id, vector, vector_json FROM game_embeddings WHERE game_id IN ({placeholders})"
+                        with span("collection_embeddings"):
+                            cur = execute_query(self.conn, query, tuple(collection_ids))
+                            rows = cur.fetchall()
 
                         collection_embeddings = []
                         valid_collection_ids = []
                         for row in rows:
-                            gid, vec_json = row
+                            gid, vec_bytes, vec_json = row
                             try:
-                                vec = np.array(json.loads(vec_json), dtype="float32")
+                                vec = decode_embedding(vec_bytes, vec_json)
                                 collection_embeddings.append(vec)
                                 valid_collection_ids.append(gid)
                             except (json.JSONDecodeError, ValueError) as e:
@@ -199,19 +767,20 @@ class SimilarityEngine:
                 # search 2n matches to allow for reordering by weighted criteria
                 # When searching in collection, search more candidates since filtering is strict
                 # When excluding families, search even more to account for filtered results
+                id_map = state.id_map
                 n_search = top_k * 2  # Default: Find 2n matches for reordering
                 if allowed_ids is not None and len(allowed_ids) > 0:
                     # Search more candidates when filtering by collection to increase chance of finding matches
-                    n_search = min(top_k * 10, len(self.id_map))  # Increased from 4x to 10x
+                    n_search = min(top_k * 10, len(id_map))  # Increased from 4x to 10x
                 if excluded_feature_values and "families" in excluded_feature_values:
                     # When excluding families, search even more candidates to account for filtered results
                     n_search = max(n_search, top_k * 10)  # At least 10x top_k
-                    n_search = min(n_search, len(self.id_map))  # But not more than available games
-                sims, idxs = self.index.search(query_vec, n_search)
-                sims = sims[0]
-                idxs = idxs[0]
-                # Convert index positions to game IDs
-                idxs = [self.id_map[ix] if 0 <= ix < len(self.id_map) else -1 for ix in idxs]
+                    n_search = min(n_search, len(id_map))  # But not more than available games
+                if SEARCH_ADAPTIVE_OVERFETCH if adaptive is None else adaptive:
+                    # Start from the k the observed pass rate calls for; widened below if needed
+                    max_search = min(len(id_map), max(SEARCH_MAX_CANDIDATES, n_search))
+                    n_search = SEARCH_PASS_RATES.initial_k(shape, top_k, n_search, max_search)
+                sims, idxs = self._search_index(state, query_vec, n_search)
 
             if explain:
                 try:
@@ -245,539 +814,217 @@ class SimilarityEngine:
             logger.warning(f"Error getting details for game_id={game_id}: {e}")
             explain = False  # Fall back to embedding-only search
 
-        results: List[Dict[str, Any]] = []
+        player_constraints = constraints.get("players") or {}
+        playtime_constraints = constraints.get("playtime") or {}
+        exact_players = player_constraints.get("exact")
+        game_attributes = incidence = None
+        if len(idxs):
+            try:
+                with span("game_attributes"):
+                    game_attributes = self.game_attributes(state)[1]
+            except Exception as e:
+                logger.warning(f"Game attribute columns unavailable, player/playtime constraints not applied: {e}")
+            if explain and base_features:
+                with span("incidence"):
+                    incidence = get_incidence()
+        allowed_array = np.fromiter(allowed_ids, dtype="int64") if allowed_ids is not None else None
+        excluded_array = np.fromiter(exclude_ids, dtype="int64") if exclude_ids else None
+
+        # Get base game complexity for comparison
+        base_complexity = None
+        if base_features:
+            base_row = state.id_to_index.get(game_id, -1)
+            if game_attributes is not None and base_row >= 0:
+                base_weight = game_attributes.take([base_row]).avg_weight[0]
+                base_complexity = None if np.isnan(base_weight) else float(base_weight)
+            else:
+                try:
+                    self._ensure_connection()
+                    cur = execute_query(
+                        self.conn,
+                        "SELECT avg_weight FROM games WHERE id = %s",
+                        (game_id,),
+                    )
+                    row = cur.fetchone()
+                    if row and row[0] is not None:
+                        base_complexity = float(row[0])
+                except Exception:
+                    pass
+
+        current_year = time.localtime().tm_year
         total_candidates = 0
         filtered_out = {
             "invalid_index": 0,
             "self_excluded": 0,
             "not_in_allowed": 0,
-            "failed_explain": 0,
+            "max_players": 0,
+            "hydrate_failed": 0,
             "required_features": 0,
             "excluded_features": 0,
+            "feature_overlap": 0,
+            "player_playtime": 0,
+            "constraints": 0,
         }
 
-        for sim, gid_or_ix in zip(sims, idxs):
-            total_candidates += 1
-            # In direct collection search, gid_or_ix is already the game ID
-            # In regular search, gid_or_ix is already converted from index to game ID
-            if gid_or_ix < 0:
-                filtered_out["invalid_index"] += 1
-                continue
-            gid = gid_or_ix
-
-            if not include_self and gid == game_id:
-                filtered_out["self_excluded"] += 1
-                continue
-
-            if allowed_ids is not None and gid not in allowed_ids:
-                filtered_out["not_in_allowed"] += 1
+        @timed("score")
+        def score_batch(batch_sims, batch_ids) -> ScoredCandidates:
+            """
+            Stage 2: filter and score a batch of index candidates with array operations.
+
+            Uses the game attribute columns and the feature incidence; nothing is queried per candidate.
+            """
+            ids = np.asarray(batch_ids, dtype="int64")
+            batch_sims = np.asarray(batch_sims, dtype="float64")
+            if not len(ids):
+                return ScoredCandidates(ids, *(np.zeros(0) for _ in range(4)))
+            keep = ids >= 0
+            filtered_out["invalid_index"] += int((~keep).sum())
+
+            def drop_unless(mask, reason):
+                nonlocal keep
+                filtered_out[reason] += int((keep & ~mask).sum())
+                keep = keep & mask
+
+            if not include_self:
+                drop_unless(ids != game_id, "self_excluded")
+            if excluded_array is not None:
+                drop_unless(~np.isin(ids, excluded_array), "self_excluded")
+            if allowed_array is not None:
                 # "Closest in my collection" = just pass allowed_ids=user_collection_ids
-                continue
+                drop_unless(np.isin(ids, allowed_array), "not_in_allowed")
 
-            # Validate gid before querying
-            if gid is None:
-                filtered_out["invalid_index"] += 1
-                continue
-            try:
-                gid = int(gid)
-            except (ValueError, TypeError):
-                filtered_out["invalid_index"] += 1
-                continue
+            attributes = None
+            if game_attributes is not None:
+                attributes = game_attributes.take(state.id_to_index.rows(ids))
+                if exact_players is not None:
+                    # The max_players exclusion applies with or without explain mode
+                    drop_unless(~(attributes.max_players < exact_players), "max_players")
 
-            # Fetch additional game data including num_ratings, ranks_json, year_published, polls_json, min_players, max_players, description, designers for reordering
-            try:
-                # Ensure connection is healthy before querying
-                self._ensure_connection()
-                # Try to select avg_weight, but handle case where column might not exist
-                try:
-                    cur = execute_query(
-                        self.conn,
-                        "SELECT name, thumbnail, average_rating, num_ratings, ranks_json, year_published, polls_json, min_players, max_players, description, avg_weight FROM games WHERE id = %s",
-                        (gid,),
-                    )
-                except psycopg2.Error as col_err:
-                    # If avg_weight column doesn't exist, fall back to query without it
-                    if "column" in str(col_err).lower() and "avg_weight" in str(col_err).lower():
-                        logger.debug(f"avg_weight column not found, using query without it for game {gid}")
-                        cur = execute_query(
-                            self.conn,
-                            "SELECT name, thumbnail, average_rating, num_ratings, ranks_json, year_published, polls_json, min_players, max_players, description FROM games WHERE id = %s",
-                            (gid,),
-                        )
-                    else:
-                        raise
-            except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
-                # Connection error - try once more with a fresh connection
-                logger.warning(f"Connection error fetching game {gid}, retrying: {e}")
-                self._ensure_connection()
-                try:
-                    # Try to select avg_weight, but handle case where column might not exist
-                    try:
-                        cur = execute_query(
-                            self.conn,
-                            "SELECT name, thumbnail, average_rating, num_ratings, ranks_json, year_published, polls_json, min_players, max_players, description, avg_weight FROM games WHERE id = %s",
-                            (gid,),
-                        )
-                    except psycopg2.Error as col_err:
-                        # If avg_weight column doesn't exist, fall back to query without it
-                        if "column" in str(col_err).lower() and "avg_weight" in str(col_err).lower():
-                            logger.debug(f"avg_weight column not found in retry, using query without it for game {gid}")
-                            cur = execute_query(
-                                self.conn,
-                                "SELECT name, thumbnail, average_rating, num_ratings, ranks_json, year_published, polls_json, min_players, max_players, description FROM games WHERE id = %s",
-                                (gid,),
-                            )
-                        else:
-                            raise
-                except Exception as retry_e:
-                    logger.warning(f"SQL error fetching game {gid} after retry: {retry_e}")
-                    filtered_out["failed_explain"] += 1
-                    continue
-            except (psycopg2.Error, Exception) as e:
-                logger.warning(f"SQL error fetching game {gid}: {e}")
-                filtered_out["failed_explain"] += 1
-                continue
-            game_row = cur.fetchone()
-            if not game_row:
-                filtered_out["failed_explain"] += 1
-                continue
-
-            # Safely access columns with proper bounds checking
-            # Expected columns: name(0), thumbnail(1), average_rating(2), num_ratings(3), ranks_json(4),
-            # year_published(5), polls_json(6), min_players(7), max_players(8), description(9), avg_weight(10)
-            row_len = len(game_row)
-            if row_len < 10:
-                logger.warning(f"Game {gid} row has only {row_len} columns, expected at least 10. Skipping.")
-                filtered_out["failed_explain"] += 1
-                continue
-
-            try:
-                game_name = game_row[0] if game_row[0] else self._fetch_name(gid)
-                thumbnail = game_row[1] if row_len > 1 and game_row[1] else None
-                average_rating = float(game_row[2]) if row_len > 2 and game_row[2] is not None else None
-                num_ratings = int(game_row[3]) if row_len > 3 and game_row[3] is not None else 0
-                ranks_json_str = game_row[4] if row_len > 4 and game_row[4] else None
-                year_published = int(game_row[5]) if row_len > 5 and game_row[5] is not None else None
-                polls_json_str = game_row[6] if row_len > 6 and game_row[6] else None
-                min_players = int(game_row[7]) if row_len > 7 and game_row[7] is not None else None
-                max_players = int(game_row[8]) if row_len > 8 and game_row[8] is not None else None
-                description = game_row[9] if row_len > 9 and game_row[9] else None
-                # avg_weight is optional (column 10), may not exist in all databases
-                avg_weight = float(game_row[10]) if row_len > 10 and game_row[10] is not None else None
-            except (IndexError, ValueError, TypeError) as e:
-                logger.warning(f"Error parsing game row for game {gid}: {e}, row length: {row_len}")
-                filtered_out["failed_explain"] += 1
-                continue
-
-            # Get designers for this game
-            designers = []
-            try:
-                # Connection should still be healthy from previous query, but check anyway
-                self._ensure_connection()
-                cur_designers = execute_query(
-                    self.conn,
-                    """SELECT d.name FROM designers d
-                       JOIN game_designers gd ON gd.designer_id = d.id
-                       WHERE gd.game_id = %s ORDER BY d.name""",
-                    (gid,),
-                )
-                designers = [row[0] for row in cur_designers.fetchall()]
-            except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
-                # Connection error - try once more
-                logger.debug(f"Connection error fetching designers for game {gid}, retrying: {e}")
-                self._ensure_connection()
-                try:
-                    cur_designers = execute_query(
-                        self.conn,
-                        """SELECT d.name FROM designers d
-                           JOIN game_designers gd ON gd.designer_id = d.id
-                           WHERE gd.game_id = %s ORDER BY d.name""",
-                        (gid,),
-                    )
-                    designers = [row[0] for row in cur_designers.fetchall()]
-                except Exception:
-                    pass  # Ignore errors on retry
-            except (psycopg2.Error, Exception):
-                pass
-
-            # Early exclusion: Check max_players constraint before expensive explain mode
-            player_constraints = constraints.get("players", {})
-            if player_constraints:
-                exact_players = player_constraints.get("exact")
-                if exact_players is not None and max_players is not None:
-                    # Exclude if game's max_players is less than required player count
-                    if max_players < exact_players:
-                        filtered_out["failed_explain"] += 1
-                        continue
-
-            # Parse ranks_json to get best rank (overall, or category-specific)
-            rank = None
-            if ranks_json_str:
-                try:
-                    ranks_data = json.loads(ranks_json_str)
-                    # ranks_json structure from parser: {"ranks": [{"value": "123", "friendlyname": "boardgame", ...}, ...]}
-                    # But it might also be stored as a list directly in some cases
-                    rank_list = []
-                    if isinstance(ranks_data, dict):
-                        rank_list = ranks_data.get("ranks", [])
-                    elif isinstance(ranks_data, list):
-                        rank_list = ranks_data
-
-                    if isinstance(rank_list, list) and len(rank_list) > 0:
-                        # Look for overall rank (friendlyname contains "boardgame" or name="boardgame")
-                        for rank_entry in rank_list:
-                            if isinstance(rank_entry, dict):
-                                friendlyname = rank_entry.get("friendlyname", "").lower()
-                                name = rank_entry.get("name", "").lower()
-                                # Match "boardgame" or "Board Game Rank" etc.
-                                if "boardgame" in friendlyname or name == "boardgame":
-                                    rank_value = rank_entry.get("value")
-                                    if rank_value and rank_value != "Not Ranked":
-                                        try:
-                                            rank = int(rank_value)
-                                            break
-                                        except (ValueError, TypeError):
-                                            pass
-                        # If no overall rank, try first available rank
-                        if rank is None:
-                            for rank_entry in rank_list:
-                                if isinstance(rank_entry, dict):
-                                    rank_value = rank_entry.get("value")
-                                    if rank_value and rank_value != "Not Ranked":
-                                        try:
-                                            rank = int(rank_value)
-                                            break
-                                        except (ValueError, TypeError):
-                                            pass
-                except (json.JSONDecodeError, KeyError, TypeError) as e:
-                    logger.debug(f"Error parsing ranks_json for game {gid}: {e}")
-                    pass
-
-            # Parse polls_json to get language_dependence
-            language_dependence = None
-            if polls_json_str:
-                try:
-                    polls_data = json.loads(polls_json_str)
-                    language_dep = polls_data.get("language_dependence", {})
-                    if isinstance(language_dep, dict):
-                        language_results = language_dep.get("results", [])  # Fixed: renamed to avoid shadowing outer 'results'
-                        # Find the level with most votes
-                        max_votes = 0
-                        for result in language_results:
-                            if isinstance(result, dict):
-                                level = result.get("level")
-                                numvotes = result.get("numvotes", 0)
-                                if level and numvotes > max_votes:
-                                    max_votes = numvotes
-                                    try:
-                                        level_num = int(level)
-                                        value = result.get("value", "")
-                                        language_dependence = {"level": level_num, "value": value, "numvotes": numvotes}
-                                    except (ValueError, TypeError):
-                                        pass
-                except (json.JSONDecodeError, KeyError, TypeError) as e:
-                    logger.debug(f"Error parsing polls_json for game {gid}: {e}")
-                    pass
-
-            # Ensure we have at least a name and game_id
-            if not game_name:
-                game_name = self._fetch_name(gid)
-
-            record: Dict[str, Any] = {
-                "game_id": gid,
-                "name": game_name or f"Game {gid}",
-                "thumbnail": thumbnail,
-                "average_rating": average_rating,
-                "num_ratings": num_ratings,
-                "rank": rank,
-                "year_published": year_published,
-                "description": description,
-                "designers": designers,
-                "embedding_similarity": float(sim) if sim is not None else 0.0,
-                "language_dependence": language_dependence,
-                "avg_weight": avg_weight,
-            }
-
-            # Check required feature values EARLY (before computing similarity)
+            # Required values: every one must be present; excluded values: any one removes the game
             if required_feature_values:
-                try:
-                    self._ensure_connection()
-                    other_features_check = get_game_features(self.conn, gid)
-                except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
-                    # Connection error - try once more
-                    logger.warning(f"Connection error getting features for game_id={gid}, retrying: {e}")
-                    self._ensure_connection()
-                    try:
-                        other_features_check = get_game_features(self.conn, gid)
-                    except Exception as retry_e:
-                        logger.warning(f"Error getting features for game_id={gid} after retry: {retry_e}")
-                        continue
-                except (ValueError, psycopg2.Error) as e:
-                    logger.warning(f"Error getting features for game_id={gid} to check required features: {e}")
-                    # If we can't get features, skip this game (it likely doesn't exist or has invalid data)
-                    continue
-
-                should_skip = False
-                for feature_type, required_values in required_feature_values.items():
-                    # Normalize feature type name (e.g., "mechanics" -> check "mechanics" key)
-                    feature_key = feature_type
-                    if feature_key in other_features_check:
-                        feature_set = (
-                            other_features_check[feature_key]
-                            if isinstance(other_features_check[feature_key], set)
-                            else set(other_features_check[feature_key])
-                        )
-                        # Normalize feature names for case-insensitive comparison
-                        # Filter out None values before normalizing
-                        feature_set_normalized = {f.lower().strip() for f in feature_set if f is not None}
-                        required_values_normalized = {v.lower().strip() for v in required_values if v is not None}
-
-                        # Check if ALL required values are present (case-insensitive)
-                        missing_values = required_values_normalized - feature_set_normalized
-                        if missing_values:
-                            logger.info(
-                                f"Game {gid} ({other_features_check.get('name', 'unknown')}) missing required {feature_type} values: {missing_values}. Required: {required_values}, Has: {feature_set}"
-                            )
-                            should_skip = True
-                            break
-                    else:
-                        # Game doesn't have this feature type at all, so it's missing required values
-                        logger.info(
-                            f"Game {gid} ({other_features_check.get('name', 'unknown')}) missing required {feature_type} values {required_values} (no {feature_type} at all)"
-                        )
-                        should_skip = True
-                        break
-                if should_skip:
-                    filtered_out["required_features"] = filtered_out.get("required_features", 0) + 1
-                    continue
-
-            # Check excluded feature values EARLY (before computing similarity)
-            # If a game has any excluded families, skip it entirely
+                drop_unless(get_bitmap_index().value_mask(ids, required=required_feature_values), "required_features")
             if excluded_feature_values:
-                # Reuse other_features_check if we already fetched it for required features
-                if required_feature_values and other_features_check:
-                    other_features_exclude_check = other_features_check
-                else:
-                    try:
-                        self._ensure_connection()
-                        other_features_exclude_check = get_game_features(self.conn, gid)
-                    except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
-                        # Connection error - try once more
-                        logger.warning(f"Connection error getting features for game_id={gid} (exclude check), retrying: {e}")
-                        self._ensure_connection()
-                        try:
-                            other_features_exclude_check = get_game_features(self.conn, gid)
-                        except Exception as retry_e:
-                            logger.warning(f"Error getting features for game_id={gid} after retry (exclude check): {retry_e}")
-                            continue
-                    except (ValueError, psycopg2.Error) as e:
-                        logger.warning(f"Error getting features for game_id={gid} to check excluded features: {e}")
-                        continue
-
-                should_exclude = False
-                for feature_type, excluded_values in excluded_feature_values.items():
-                    feature_key = feature_type
-                    if feature_key in other_features_exclude_check:
-                        feature_set = (
-                            other_features_exclude_check[feature_key]
-                            if isinstance(other_features_exclude_check[feature_key], set)
-                            else set(other_features_exclude_check[feature_key])
-                        )
-                        # Normalize feature names for case-insensitive comparison
-                        feature_set_normalized = {f.lower().strip() for f in feature_set if f is not None}
-                        excluded_values_normalized = {v.lower().strip() for v in excluded_values if v is not None}
-
-                        # Log first game for debugging
-                        if filtered_out.get("excluded_features", 0) == 0 and filtered_out.get("total_checked", 0) == 0:
-                            logger.info(
-                                f"DEBUG: First game check - gid={gid}, name={other_features_exclude_check.get('name', 'unknown')}, feature_type={feature_type}, excluded_values={list(excluded_values_normalized)}, game_families={list(feature_set_normalized)[:5]}"
-                            )
-                            filtered_out["total_checked"] = filtered_out.get("total_checked", 0) + 1
-
-                        # Check if game has ANY excluded values - if so, skip it
-                        overlap = excluded_values_normalized & feature_set_normalized
-                        if overlap:
-                            logger.info(
-                                f"EXCLUDING game {gid} ({other_features_exclude_check.get('name', 'unknown')}) - has excluded {feature_type} values: {list(overlap)[:3]}... (total excluded: {len(excluded_values_normalized)}, game has: {len(feature_set_normalized)})"
-                            )
-                            should_exclude = True
-                            break
-                        else:
-                            # Log first few games that pass to understand what's happening
-                            if filtered_out.get("excluded_features", 0) < 3:
-                                logger.info(
-                                    f"PASSING game {gid} ({other_features_exclude_check.get('name', 'unknown')}) - no overlap with excluded {feature_type}. Excluded: {list(excluded_values_normalized)}, Game has: {list(feature_set_normalized)[:5]}"
-                                )
-
-                if should_exclude:
-                    filtered_out["excluded_features"] = filtered_out.get("excluded_features", 0) + 1
-                    continue
+                drop_unless(get_bitmap_index().value_mask(ids, excluded=excluded_feature_values), "excluded_features")
 
+            meta = np.zeros(len(ids))
+            final = batch_sims
             if explain and base_features:
-                try:
-                    self._ensure_connection()
-                    other_features = get_game_features(self.conn, gid)
-
-                    # Note: We don't remove excluded values from other_features anymore
-                    # because we've already filtered out games with excluded families above
-
-                    meta_score, overlaps, scores = compute_meta_similarity(
-                        base_features,
-                        other_features,
-                        conn=self.conn,
-                        use_rarity_weighting=use_rarity_weighting,
-                        category_weight_only=category_weight_only,
-                        theme_only=theme_only,
-                        mechanics_only=mechanics_only,
-                        mechanics_weight=mechanics_weight,
-                        categories_weight=categories_weight,
+                overlaps = candidate_overlaps(incidence, game_id, ids)
+                drop_unless(overlap_type_mask(overlaps, include_features, exclude_features), "feature_overlap")
+                if attributes is not None:
+                    drop_unless(
+                        player_constraint_mask(attributes, base_features, player_constraints)
+                        & playtime_constraint_mask(attributes, playtime_constraints),
+                        "player_playtime",
                     )
+                drop_unless(overlap_constraint_mask(overlaps, constraints), "constraints")
+                meta = meta_scores(
+                    overlaps,
+                    use_rarity_weighting=use_rarity_weighting,
+                    category_weight_only=category_weight_only,
+                    theme_only=theme_only,
+                    mechanics_only=mechanics_only,
+                    mechanics_weight=mechanics_weight,
+                    categories_weight=categories_weight,
+                )
+                final = 0.8 * batch_sims + 0.2 * meta
+
+            missing = np.full(len(ids), np.nan)
+            weighted = weighted_scores(
+                final,
+                attributes.num_ratings if attributes is not None else missing,
+                attributes.rank if attributes is not None else missing,
+                attributes.year_published if attributes is not None else missing,
+                attributes.avg_weight if attributes is not None else missing,
+                base_complexity,
+                current_year,
+            )
+            return ScoredCandidates(ids[keep], batch_sims[keep], meta[keep], final[keep], weighted[keep])
+
+        # Stage 2 over every candidate. With adaptive over-fetch the index search is widened
+        # geometrically while fewer than top_k candidates survive, until the catalogue (or
+        # SEARCH_MAX_CANDIDATES) is exhausted. Wider searches repeat the nearer neighbours,
+        # which are skipped.
+        batches: List[ScoredCandidates] = []
+        seen: Set[int] = set()
+        batch_sims, batch_ids = sims, idxs
+        while True:
+            total_candidates += len(batch_ids)
+            seen.update(batch_ids)
+            batches.append(score_batch(batch_sims, batch_ids))
+            survivors = sum(len(batch.game_ids) for batch in batches)
+            if survivors >= top_k or n_search >= max_search:
+                break
+            n_search = min(max(n_search + 1, int(n_search * SEARCH_OVERFETCH_GROWTH)), max_search)
+            wider_sims, wider_ids = self._search_index(state, query_vec, n_search)
+            new = [i for i, gid in enumerate(wider_ids) if gid >= 0 and gid not in seen]
+            if not new:
+                break
+            batch_sims, batch_ids = wider_sims[new], [wider_ids[i] for i in new]
+            logger.debug(f"Widened index search to k={n_search} ({survivors}/{top_k} candidates so far)")
+        scored = ScoredCandidates(*(np.concatenate(columns) for columns in zip(*batches)))
+
+        if n_search:
+            # Index searches only; collection searches score every game anyway
+            SEARCH_PASS_RATES.record(shape, total_candidates, len(scored.game_ids))
+
+        # Stage 3: hydrate and explain only the best candidates, in weighted score order.
+        # With the attribute columns that order is final, so results are yielded as they come.
+        stream = game_attributes is not None
+        results: List[Dict[str, Any]] = []
+        for i in np.argsort(-scored.weighted, kind="stable"):
+            if len(results) >= top_k:
+                break
+            gid = int(scored.game_ids[i])
+            record = self._hydrate_candidate(gid, scored.similarity[i])
+            if record is None:
+                filtered_out["hydrate_failed"] += 1
+                continue
 
-                    # Check include/exclude features
-                    if include_features:
-                        if not self._has_required_features(overlaps, include_features):
-                            logger.debug(f"Game {gid} missing required features {include_features}")
-                            continue
-
-                    if exclude_features:
-                        if self._has_excluded_features(overlaps, exclude_features):
-                            logger.debug(f"Game {gid} has excluded features {exclude_features}")
-                            continue
-
-                    # Check player count constraints (before generic constraints)
-                    if not self._satisfies_player_constraints(base_features, other_features, constraints):
-                        logger.debug(f"Game {gid} doesn't satisfy player constraints")
-                        continue
-
-                    # Check playtime constraints
-                    if not self._satisfies_playtime_constraints(gid, constraints):
-                        logger.debug(f"Game {gid} doesn't satisfy playtime constraints")
-                        continue
-
-                    # apply generic constraints
-                    if not self._satisfies_constraints(scores, overlaps, constraints):
-                        continue
-
-                    final_score = 0.8 * record["embedding_similarity"] + 0.2 * meta_score
-                    record["meta_similarity_score"] = meta_score
-                    record["final_score"] = final_score
-                    # Save game_id before update to prevent overwriting
-                    saved_game_id = record.get("game_id")
-                    record.update(overlaps)
-                    # Restore game_id if it was overwritten
-                    if "game_id" not in record or record.get("game_id") != saved_game_id:
-                        record["game_id"] = saved_game_id
-
-                    # Calculate missing and extra features (like "Do I need X" feature)
-                    # Missing: features in base game but not in other game
-                    missing_mechanics = sorted(base_features.get("mechanics", set()) - other_features.get("mechanics", set()))
-                    missing_categories = sorted(
-                        base_features.get("categories", set()) - other_features.get("categories", set())
-                    )
-                    missing_designers = sorted(base_features.get("designers", set()) - other_features.get("designers", set()))
-                    missing_families = sorted(base_features.get("families", set()) - other_features.get("families", set()))
-
-                    # Extra: features in other game but not in base game
-                    extra_mechanics = sorted(other_features.get("mechanics", set()) - base_features.get("mechanics", set()))
-                    extra_categories = sorted(other_features.get("categories", set()) - base_features.get("categories", set()))
-                    extra_designers = sorted(other_features.get("designers", set()) - base_features.get("designers", set()))
-                    extra_families = sorted(other_features.get("families", set()) - base_features.get("families", set()))
-
-                    # Add missing and extra features to record
-                    record["missing_mechanics"] = missing_mechanics
-                    record["missing_categories"] = missing_categories
-                    record["missing_designers"] = missing_designers
-                    record["missing_families"] = missing_families
-                    record["extra_mechanics"] = extra_mechanics
-                    record["extra_categories"] = extra_categories
-                    record["extra_designers"] = extra_designers
-                    record["extra_families"] = extra_families
-
-                    record["reason_summary"] = build_reason_summary(base_features, overlaps)
+            if explain and base_features:
+                try:
+                    with span("explain"):
+                        explanation = explain_overlap(base_features, feature_sets(incidence, gid))
+                        record["meta_similarity_score"] = float(scored.meta[i])
+                        record["final_score"] = float(scored.final[i])
+                        record.update(explanation)
+                        record["reason_summary"] = build_reason_summary(base_features, explanation)
                 except Exception as e:
                     logger.warning(f"Error processing game {gid} in explain mode: {e}", exc_info=True)
                     # Fall back to embedding-only for this game
                     record["final_score"] = record["embedding_similarity"]
                     record["reason_summary"] = "Similarity based on embeddings only"
-            elif explain and not base_features:
-                # explain=True but base_features unavailable - still try to get other_features for basic info
-                try:
-                    self._ensure_connection()
-                    other_features = get_game_features(self.conn, gid)
-                    # Can't compute meta_similarity without base_features, but we can still provide basic info
-                    record["final_score"] = record["embedding_similarity"]
-                    record["reason_summary"] = "Similarity based on embeddings only (base game features unavailable)"
-                except Exception as e:
-                    logger.debug(f"Could not get features for game {gid}: {e}")
-                    record["final_score"] = record["embedding_similarity"]
-                    record["reason_summary"] = "Similarity based on embeddings only"
-
+            elif explain:
+                # Can't compute meta_similarity without base_features
+                record["final_score"] = record["embedding_similarity"]
+                record["reason_summary"] = "Similarity based on embeddings only (base game features unavailable)"
             results.append(record)
-            # Don't break early - collect all 2n matches for reordering
+            if stream:
+                yield record
 
-        # Reorder by weighted criteria: similarity score + num_ratings + rank + years since publish + complexity
-        import time
+        if not stream and results:
+            # Without the attribute columns stage 2 ranked on similarity alone; rank the
+            # hydrated rows by popularity, rank, recency and complexity instead
+            def column(key: str, default=None) -> np.ndarray:
+                values = (r.get(key, default) for r in results)
+                return np.fromiter((np.nan if v is None else v for v in values), dtype="float64", count=len(results))
 
-        current_year = time.localtime().tm_year
-
-        # Get base game complexity for comparison
-        base_complexity = None
-        if base_features:
             try:
-                self._ensure_connection()
-                cur = execute_query(
-                    self.conn,
-                    "SELECT avg_weight FROM games WHERE id = %s",
-                    (game_id,),
-                )
-                row = cur.fetchone()
-                if row and row[0] is not None:
-                    base_complexity = float(row[0])
-            except Exception:
-                pass
-
-        def calculate_weighted_score(record):
-            base_score = record.get("final_score", record.get("embedding_similarity", 0.0))
-
-            # Normalize and weight factors
-            # num_ratings: log scale, max weight 0.1
-            num_ratings = record.get("num_ratings", 0)
-            ratings_weight = 0.1 * min(1.0, (num_ratings / 10000.0) if num_ratings > 0 else 0)
-
-            # rank: better rank (lower number) = higher score, max weight 0.1
-            rank = record.get("rank")
-            rank_weight = 0.0
-            if rank is not None and rank > 0:
-                # Normalize: rank 1 = 1.0, rank 10000 = 0.0
-                rank_weight = 0.1 * max(0.0, 1.0 - (rank / 10000.0))
-
-            # years since publish: newer games get slight boost, max weight 0.05
-            year = record.get("year_published")
-            year_weight = 0.0
-            if year is not None:
-                years_ago = current_year - year
-                # Games from last 5 years get full boost, older games get less
-                year_weight = 0.05 * max(0.0, 1.0 - (years_ago / 20.0))
-
-            # complexity (avg_weight): prefer similar complexity, max weight 0.05
-            complexity_weight = 0.0
-            avg_weight = record.get("avg_weight")
-            if avg_weight is not None and base_complexity is not None:
-                complexity_diff = abs(avg_weight - base_complexity)
-                # Normalize: difference of 0 = 1.0, difference of 5.0 = 0.0
-                complexity_weight = 0.05 * max(0.0, 1.0 - (complexity_diff / 5.0))
-
-            return base_score + ratings_weight + rank_weight + year_weight + complexity_weight
-
-        # Sort by weighted score
-        try:
-            results.sort(key=calculate_weighted_score, reverse=True)
-        except Exception as e:
-            logger.error(f"Error sorting results: {e}", exc_info=True)
-            # Fallback: sort by embedding similarity
-            results.sort(key=lambda r: r.get("embedding_similarity", 0.0), reverse=True)
+                with span("rerank"):
+                    scores = weighted_scores(
+                        np.array([r.get("final_score", r.get("embedding_similarity", 0.0)) for r in results], dtype="float64"),
+                        column("num_ratings", 0),
+                        column("rank"),
+                        column("year_published"),
+                        column("avg_weight"),
+                        base_complexity,
+                        current_year,
+                    )
+                    # Stable, so equal scores keep their similarity order
+                    results = [results[i] for i in np.argsort(-scores, kind="stable")]
+            except Exception as e:
+                logger.error(f"Error sorting results: {e}", exc_info=True)
 
-        # Return top_k after reordering
         # Log filtering summary
         if len(results) == 0 and total_candidates > 0:
             logger.warning(f"NO RESULTS after filtering! total_candidates: {total_candidates}, filtered_out: {filtered_out}")
@@ -791,189 +1038,64 @@ class SimilarityEngine:
         elif filtered_out.get("excluded_features", 0) > 0:
             logger.info(f"Filtering summary: {filtered_out}, total_candidates: {total_candidates}, results: {len(results)}")
 
-        return results[:top_k]
-
-    def _satisfies_player_constraints(
-        self,
-        base_features: Dict[str, Any],
-        other_features: Dict[str, Any],
-        constraints: Dict[str, Any],
-    ) -> bool:
-        """Check if player count constraints are satisfied."""
-        player_constraints = constraints.get("players", {})
-        if not player_constraints:
-            return True
-
-        base_min = base_features.get("min_players")
-        base_max = base_features.get("max_players")
-        base_recommended = base_features.get("recommended_players", set())
-        base_best = base_features.get("best_player_count")
-
-        other_min = other_features.get("min_players")
-        other_max = other_features.get("max_players")
-        other_recommended = other_features.get("recommended_players", set())
-        other_best = other_features.get("best_player_count")
-
-        # Check exact player count
-        exact_players = player_constraints.get("exact")
-        use_recommended = player_constraints.get("use_recommended", False)
-        if exact_players is not None:
-            # First check: max_players exclusion (already done early, but double-check here)
-            if other_max is not None and other_max < exact_players:
-                return False
-            # Second check: min_players (game must support at least this many)
-            if other_min is not None and other_min > exact_players:
-                return False
-            # Third check: If use_recommended is set, prefer recommended players from polls_json
-            if use_recommended and other_recommended:
-                if exact_players not in other_recommended:
-                    # Not in recommended, but still check if it's in the supported range
-                    if other_min is not None and other_max is not None:
-                        if not (other_min <= exact_players <= other_max):
-                            return False
-                    else:
-                        return False
-            elif other_min is not None and other_max is not None:
-                # Standard range check
-                if not (other_min <= exact_players <= other_max):
-                    return False
-            elif not other_recommended:
-                # No recommended players and no min/max, can't verify
-                return False
-
-        # Check player count range overlap
-        min_overlap = player_constraints.get("min_overlap")
-        if min_overlap is not None:
-            if base_min is not None and base_max is not None and other_min is not None and other_max is not None:
-                # Check if ranges overlap
-                range_overlap = max(0, min(base_max, other_max) - max(base_min, other_min) + 1)
-                if range_overlap < min_overlap:
-                    return False
-            elif base_recommended and other_recommended:
-                # Check recommended players overlap
-                overlap = len(base_recommended & other_recommended)
-                if overlap < min_overlap:
-                    return False
-
-        # Check similar best player count
-        similar_best = player_constraints.get("similar_best")
-        if similar_best and base_best is not None and other_best is not None:
-            if abs(base_best - other_best) > 1:  # Allow 1 player difference
-                return False
-
-        return True
-
-    def _satisfies_playtime_constraints(
-        self,
-        game_id: int,
-        constraints: Dict[str, Any],
-    ) -> bool:
-        """Check if playtime constraints are satisfied."""
-        playtime_constraints = constraints.get("playtime", {})
-        if not playtime_constraints:
-            return True
-
-        target_playtime = playtime_constraints.get("target")
-        tolerance = playtime_constraints.get("tolerance", 0.3)
-
-        if target_playtime is None:
-            return True
-
-        try:
-            # Ensure connection is healthy before querying
-            self._ensure_connection()
-            # Fetch playing_time from database
-            cur = execute_query(
-                self.conn, "SELECT playing_time, min_playtime, max_playtime FROM games WHERE id = %s", (game_id,)
-            )
-            row = cur.fetchone()
-            if not row:
-                return True
-
-            playing_time = int(row[0]) if row[0] is not None else None
-            min_playing_time = int(row[1]) if row[1] is not None else None
-            max_playing_time = int(row[2]) if row[2] is not None else None
-
-            # Use playing_time if available, otherwise use min/max average
-            if playing_time is not None:
-                actual_time = playing_time
-            elif min_playing_time is not None and max_playing_time is not None:
-                actual_time = (min_playing_time + max_playing_time) / 2
-            elif min_playing_time is not None:
-                actual_time = min_playing_time
-            elif max_playing_time is not None:
-                actual_time = max_playing_time
-            else:
-                # No playtime data available, allow it
-                return True
-
-            # Check if actual_time is within tolerance of target
-            tolerance_range = target_playtime * tolerance
-            min_time = target_playtime - tolerance_range
-            max_time = target_playtime + tolerance_range
+        profile = current_profile()
+        if profile is not None:
+            logger.debug(f"Search profile so far: {profile.summary()}")
+        if not stream:
+            yield from results
 
-            return min_time <= actual_time <= max_time
-        except (psycopg2.Error, ValueError, TypeError) as e:
-            logger.warning(f"Error checking playtime constraints for game {game_id}: {e}")
-            # On error, allow the game through (don't filter it out)
-            return True
+    @profiled_call("search_multi")
+    def search_multi(self, positive, negative=None, **kwargs) -> List[Dict[str, Any]]:
+        """All results of iter_multi (same arguments), best first."""
+        return list(self.iter_multi(positive, negative, **kwargs))
 
-    def _satisfies_constraints(
+    def iter_multi(
         self,
-        scores: Dict[str, float],
-        overlaps: Dict[str, Any],
-        constraints: Dict[str, Any],
-    ) -> bool:
-        """
-        Generic constraint checker for things like:
-        - "mechanics.jaccard >= 0.6"
-        - "categories.jaccard <= 0.2"
-        - "designers.overlap >= 1"
-        All encoded in a config dict (see next section).
+        positive: Union[Mapping[int, float], Sequence[int]],
+        negative: Optional[Union[Mapping[int, float], Sequence[int]]] = None,
+        centroid_vectors: Optional[Any] = None,
+        centroid_weight: float = 0.0,
+        top_k: int = 10,
+        **kwargs,
+    ) -> Iterator[Dict[str, Any]]:
         """
-        # Example expected shape:
-        # {
-        #   "mechanics": {"jaccard_min": 0.6},
-        #   "categories": {"jaccard_max": 0.2},
-        #   "designers": {"min_overlap": 1},
-        # }
-
-        for facet, cfg in constraints.items():
-            j_key = f"j_{facet}"  # e.g. 'j_mechanics'
-            shared_key = f"shared_{facet}"  # e.g. 'shared_mechanics'
-
-            j_val = scores.get(j_key)
-            shared_list = overlaps.get(shared_key, [])
-
-            j_min = cfg.get("jaccard_min")
-            j_max = cfg.get("jaccard_max")
-            min_overlap = cfg.get("min_overlap")
-            max_overlap = cfg.get("max_overlap")
-
-            if j_min is not None and (j_val is None or j_val < j_min):
-                return False
-            if j_max is not None and (j_val is None or j_val > j_max):
-                return False
-            if min_overlap is not None and len(shared_list) < min_overlap:
-                return False
-            if max_overlap is not None and len(shared_list) > max_overlap:
-                return False
-
-        return True
+        Games like the positive seeds but unlike the negative ones ("like A and B but not C").
 
-    def _has_required_features(self, overlaps: Dict[str, Any], include_features: List[str]) -> bool:
-        """Check if game has at least one feature from each required type."""
-        for feature_type in include_features:
-            shared_key = f"shared_{feature_type}"
-            if shared_key not in overlaps or len(overlaps[shared_key]) == 0:
-                return False
-        return True
-
-    def _has_excluded_features(self, overlaps: Dict[str, Any], exclude_features: List[str]) -> bool:
-        """Check if game has any features from excluded types (strict exclusion)."""
-        for feature_type in exclude_features:
-            shared_key = f"shared_{feature_type}"
-            if shared_key in overlaps and len(overlaps[shared_key]) > 0:
-                logger.debug(f"Game excluded due to {feature_type} overlap: {overlaps[shared_key]}")
-                return True
-        return False
+        positive/negative: game ids, or game id -> weight (negatives default to NEGATIVE_SEED_WEIGHT).
+        centroid_vectors: cached (game_ids, normalized matrix), e.g. a user's collection, whose
+            mean is added with centroid_weight.
+        The combined vector is searched once through iter_similar (kwargs are passed on). The
+        highest-weighted positive seed anchors the explanations; no seed game is returned.
+        """
+        if not isinstance(positive, Mapping):
+            positive = {gid: 1.0 for gid in positive}
+        if negative is not None and not isinstance(negative, Mapping):
+            negative = {gid: NEGATIVE_SEED_WEIGHT for gid in negative}
+        negative = negative or {}
+        seeds = [int(gid) for gid in list(positive) + list(negative)]
+        vectors = self._fetch_embeddings(seeds)
+        missing = [gid for gid in seeds if gid not in vectors]
+        if missing:
+            logger.warning(f"No embeddings for seed games {missing}; they are left out of the query")
+
+        positive_seeds = [(int(gid), float(w)) for gid, w in positive.items() if int(gid) in vectors]
+        if not positive_seeds:
+            raise ValueError("None of the positive seed games has an embedding")
+        centroid = None
+        if centroid_vectors is not None and len(centroid_vectors.game_ids) > 0:
+            centroid = centroid_vectors.matrix.mean(axis=0)
+        query_vector = combine_query_vector(
+            [(vectors[gid], weight) for gid, weight in positive_seeds],
+            [(vectors[int(gid)], float(w)) for gid, w in negative.items() if int(gid) in vectors],
+            centroid=centroid,
+            centroid_weight=centroid_weight,
+        )
+        anchor = max(positive_seeds, key=lambda seed: seed[1])[0]
+        logger.debug(f"Multi-game search: positive={dict(positive_seeds)}, negative={dict(negative)}, anchor={anchor}")
+        yield from self.iter_similar(
+            anchor,
+            top_k=top_k,
+            query_vector=query_vector,
+            exclude_ids=set(seeds),
+            **kwargs,
+        )
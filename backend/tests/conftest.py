@@ -142,6 +142,13 @@ def mock_db_connection(test_db, monkeypatch):
     monkeypatch.setattr("backend.db.get_db_connection", get_test_connection)
     monkeypatch.setattr("backend.main.ENGINE_CONN", test_db)
 
+    # Tables are truncated per test, so user ids get reused; drop cached principals and collections
+    from backend.collection_cache import COLLECTION_CACHE
+    from backend.main import _PRINCIPAL_CACHE
+
+    _PRINCIPAL_CACHE.clear()
+    COLLECTION_CACHE.clear()
+
     yield test_db
 
 
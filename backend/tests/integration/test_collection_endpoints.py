@@ -0,0 +1,51 @@
+"""
+Integration tests for paginated collection and chat history endpoints.
+"""
+from backend.db import execute_query
+
+
+def _auth_headers(user):
+    from backend.auth_utils import create_access_token
+
+    token = create_access_token({"sub": str(user["id"]), "user_id": user["id"]})
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestPaginatedCollection:
+    """Tests for keyset pagination on /profile/collection."""
+
+    def test_pages_cover_collection_once(self, client, mock_db_connection, create_test_user):
+        """Test following next_cursor returns every game exactly once."""
+        user = create_test_user
+        conn = mock_db_connection
+        for gid in range(900001, 900006):
+            execute_query(
+                conn,
+                "INSERT INTO games (id, name, year_published) VALUES (%s, %s, %s) ON CONFLICT (id) DO NOTHING",
+                (gid, f"Paged Game {gid}", 2000 + gid % 3),
+            )
+            execute_query(conn, "INSERT INTO user_collections (user_id, game_id) VALUES (%s, %s)", (user["id"], gid))
+        conn.commit()
+
+        headers = _auth_headers(user)
+        seen = []
+        cursor = None
+        for _ in range(5):
+            params = {"limit": 2, "fields": "name"}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/profile/collection", params=params, headers=headers)
+            assert response.status_code == 200
+            page = response.json()
+            assert all(set(item) == {"game_id", "name"} for item in page["items"])
+            seen.extend(item["game_id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        assert sorted(seen) == list(range(900001, 900006))
+
+    def test_invalid_cursor_is_rejected(self, client, create_test_user):
+        """Test a malformed cursor returns 400."""
+        response = client.get("/profile/collection", params={"cursor": "bogus"}, headers=_auth_headers(create_test_user))
+        assert response.status_code == 400
@@ -0,0 +1,55 @@
+"""
+Unit tests for cache utilities.
+"""
+import time
+
+from backend.cache import TTLCache
+
+
+class TestTTLCache:
+    """Tests for the size-bounded TTL cache."""
+
+    def test_set_and_get(self):
+        """Test storing and reading a value."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set(1, {"id": 1})
+
+        assert cache.get(1) == {"id": 1}
+        assert cache.get(2) is None
+
+    def test_expiry(self):
+        """Test that entries expire after the TTL."""
+        cache = TTLCache(maxsize=10, ttl=0.01)
+        cache.set("k", "v")
+        time.sleep(0.02)
+
+        assert cache.get("k") is None
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self):
+        """Test that the cache never grows past maxsize."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now the least recently used
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_invalidate(self):
+        """Test dropping a single entry."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set(5, "user")
+        cache.invalidate(5)
+        cache.invalidate(6)  # Missing keys are ignored
+
+        assert cache.get(5) is None
+
+    def test_disabled_when_ttl_zero(self):
+        """Test that a zero TTL disables caching."""
+        cache = TTLCache(maxsize=10, ttl=0)
+        cache.set(1, "x")
+
+        assert cache.get(1) is None
@@ -0,0 +1,102 @@
+"""
+Unit tests for compact chat result metadata.
+"""
+import json
+
+from backend import chat_metadata
+from backend.tests.unit.test_collection_analysis import make_incidence
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+def fake_execute_query(conn, query, params=None):
+    if query == chat_metadata.QUERY_GAME_FIELDS:
+        return FakeCursor([(1, "One", "t1.png", 7.5, 100, 2001, "Long description", 2, 4, 2.5)])
+    return FakeCursor([(1, "Designer A"), (1, "Designer B")])
+
+
+def make_result(incidence):
+    result = {
+        "game_id": 1,
+        "name": "One",
+        "thumbnail": "t1.png",
+        "designers": ["Designer A", "Designer B"],
+        "description": "Long description",
+        "final_score": 0.91,
+        "embedding_similarity": 0.88,
+        "rank": 12,
+        "reason_summary": "Shares mechanics",
+    }
+    result.update(chat_metadata._feature_lists(incidence, 10, 1))
+    return result
+
+
+class TestChatMetadata:
+    """Tests for packing results as references and rehydrating them."""
+
+    def test_round_trip_restores_results(self, monkeypatch):
+        """Test rehydrated results equal the originals and the stored form drops catalog fields."""
+        incidence = make_incidence()
+        monkeypatch.setattr(chat_metadata, "get_incidence", lambda: incidence)
+        monkeypatch.setattr(chat_metadata, "execute_query", fake_execute_query)
+        monkeypatch.setattr(chat_metadata, "zstandard", None)
+
+        result = make_result(incidence)
+        query_spec = {"intent": "recommend_similar", "base_game_id": 10}
+        raw = chat_metadata.pack_metadata(None, [result], query_spec)
+
+        stored = json.loads(raw)["results"][0]
+        assert set(stored) == {"game_id", "final_score", "embedding_similarity", "rank", "reason_summary"}
+
+        (metadata,) = chat_metadata.unpack_metadata(None, [raw])
+        assert metadata["query_spec"] == query_spec
+        assert metadata["results"] == [result]
+
+    def test_changed_feature_lists_are_kept_inline(self, monkeypatch):
+        """Test feature lists that the incidence cannot reproduce are stored as-is."""
+        incidence = make_incidence()
+        monkeypatch.setattr(chat_metadata, "get_incidence", lambda: incidence)
+        monkeypatch.setattr(chat_metadata, "execute_query", fake_execute_query)
+        monkeypatch.setattr(chat_metadata, "zstandard", None)
+
+        result = make_result(incidence)
+        result["shared_mechanics"] = ["Edited"]
+        raw = chat_metadata.pack_metadata(None, [result], {"base_game_id": 10})
+
+        assert json.loads(raw)["results"][0]["shared_mechanics"] == ["Edited"]
+        assert chat_metadata.unpack_metadata(None, [raw])[0]["results"] == [result]
+
+    def test_comparison_name_is_kept_inline(self, monkeypatch):
+        """Test catalog fields that differ from the games row (a compare result's title) are stored as-is."""
+        incidence = make_incidence()
+        monkeypatch.setattr(chat_metadata, "get_incidence", lambda: incidence)
+        monkeypatch.setattr(chat_metadata, "execute_query", fake_execute_query)
+        monkeypatch.setattr(chat_metadata, "zstandard", None)
+
+        result = {
+            "game_id": 1,
+            "name": "One vs Two",
+            "game_a_id": 1,
+            "game_b_id": 2,
+            "meta_score": 0.4,
+            "final_score": 0.4,
+            "embedding_similarity": 0.4,
+            "reason_summary": "Comparison completed",
+            "overlaps": {},
+        }
+        raw = chat_metadata.pack_metadata(None, [result], {"intent": "compare_pair", "game_a_id": 1, "game_b_id": 2})
+
+        assert json.loads(raw)["game_fields"] == []
+        assert json.loads(raw)["results"][0]["name"] == "One vs Two"
+        assert chat_metadata.unpack_metadata(None, [raw])[0]["results"] == [result]
+
+    def test_legacy_and_empty_values(self):
+        """Test legacy plain JSON rows and NULLs are returned unchanged."""
+        legacy = json.dumps({"results": [{"game_id": 3, "name": "Three"}], "query_spec": {}})
+        assert chat_metadata.unpack_metadata(None, [legacy, None]) == [json.loads(legacy), None]
@@ -0,0 +1,83 @@
+"""
+Unit tests for the rules-based chat interpreter.
+"""
+import pytest
+
+from backend import chat_nlu
+from backend.chat_nlu import interpret_message, split_seed_games
+
+CANDIDATES = [
+    {"game_id": 1, "name_key": "catan", "match_type": "phrase"},
+    {"game_id": 2, "name_key": "brass birmingham", "match_type": "phrase"},
+    {"game_id": 3, "name_key": "gloomhaven jaws", "match_type": "token"},
+]
+
+
+class TestSplitSeedGames:
+    """Tests for splitting mentioned games into positive and negative seeds."""
+
+    def test_negation_cue_splits_seeds(self):
+        """Test games after "but not" are negative and both lists follow the text order."""
+        positive, negative = split_seed_games("Like Brass: Birmingham and Catan, but not Jaws of Gloomhaven", CANDIDATES)
+
+        assert positive == [2, 1]
+        assert negative == [3]
+
+    def test_without_cue_all_positive(self):
+        """Test every game is positive when nothing is negated."""
+        assert split_seed_games("games like catan and brass birmingham", CANDIDATES[:2]) == ([1, 2], [])
+        assert split_seed_games("anything except catan", CANDIDATES[:1]) == ([], [1])
+
+    def test_nested_match_is_one_mention(self):
+        """Test a name inside a longer matched name is not a second seed."""
+        candidates = [
+            {"game_id": 4, "name_key": "catan seafarers", "match_type": "phrase"},
+            {"game_id": 1, "name_key": "catan", "match_type": "phrase"},
+        ]
+
+        assert split_seed_games("games like catan seafarers", candidates) == ([4], [])
+
+    def test_mentions_without_connector_are_not_seeds(self):
+        """Test separate matches not joined by a connector or negation cue give no seeds."""
+        candidates = [
+            {"game_id": 1, "name_key": "catan", "match_type": "phrase"},
+            {"game_id": 5, "name_key": "go", "match_type": "phrase"},
+        ]
+
+        assert split_seed_games("catan that go fast", candidates) == ([], [])
+        assert split_seed_games("catan, go", candidates) == ([1, 5], [])
+
+
+class TestInterpretMessageSeeds:
+    """Tests for the base game and seed games chosen by interpret_message."""
+
+    @pytest.fixture(autouse=True)
+    def name_index(self, monkeypatch):
+        names = {"catan": 1, "catan seafarers": 4, "go": 5}
+        index = [
+            {"name": name, "tokens": name.split(), "token_len": len(name.split()), "char_len": len(name), "id": gid}
+            for name, gid in names.items()
+        ]
+        index.sort(key=lambda x: (x["token_len"], x["char_len"]), reverse=True)
+        monkeypatch.setattr(chat_nlu, "NAME_INDEX", index)
+
+    def test_nested_name_is_single_base_game(self):
+        """Test "catan seafarers" is one game, not a Catan + Catan Seafarers query."""
+        spec = interpret_message("user", "games like catan seafarers")
+
+        assert spec["base_game_id"] == 4
+        assert "seed_games" not in spec
+
+    def test_common_word_name_is_not_a_seed(self):
+        """Test a game named like a common word does not join the query."""
+        spec = interpret_message("user", "catan that go fast")
+
+        assert spec["base_game_id"] == 1
+        assert "seed_games" not in spec
+
+    def test_best_scoring_seed_is_base_game(self):
+        """Test the base game is the best-scoring seed, not the first mentioned."""
+        spec = interpret_message("user", "like go and catan", {"user_collection_ids": [1]})
+
+        assert spec["base_game_id"] == 1
+        assert spec["seed_games"] == {"positive": [1, 5], "negative": []}
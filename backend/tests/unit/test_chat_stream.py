@@ -0,0 +1,129 @@
+"""
+Unit tests for the chat event sequence behind /chat and /chat/stream.
+"""
+import json
+import threading
+
+import pytest
+
+from backend import main
+
+
+class FakeCursor:
+    def fetchall(self):
+        return []
+
+
+class FakeEngine:
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    def search_similar(self, **kwargs):
+        return list(self.iter_similar(**kwargs))
+
+    def iter_similar(self, **kwargs):
+        self.calls += 1
+        for r in self.results:
+            yield dict(r)
+
+
+class TestChatEvents:
+    """Tests for event order and the non-streaming wrapper."""
+
+    @pytest.fixture(autouse=True)
+    def fake_chat(self, monkeypatch):
+        self.engine = FakeEngine(
+            [
+                {"game_id": 2, "name": "Second Best", "final_score": 0.9},
+                {"game_id": 3, "name": "Third", "final_score": 0.8},
+            ]
+        )
+        monkeypatch.setattr(main, "ENGINE", self.engine)
+        monkeypatch.setattr(
+            main,
+            "interpret_message",
+            lambda user_id, text, context: {"intent": "recommend_similar", "base_game_id": 1, "top_k": 2},
+        )
+        monkeypatch.setattr(main, "get_db_connection", lambda: object())
+        monkeypatch.setattr(main, "put_connection", lambda conn: None)
+        monkeypatch.setattr(main, "execute_query", lambda conn, query, params=None: FakeCursor())
+
+    def test_interpretation_then_ranked_results_then_done(self):
+        """Test events arrive as interpretation, results in rank order, reply, entities, done."""
+        events = list(main._chat_events(main.ChatRequest(message="Games like Test Game"), None))
+        names = [event for event, _ in events]
+
+        assert names == ["interpretation", "result", "result", "reply", "clickable_entities", "done"]
+        assert events[0][1]["intent"] == "recommend_similar"
+        assert [data["rank"] for event, data in events if event == "result"] == [0, 1]
+        assert events[1][1]["result"]["game_id"] == 2
+        assert events[3][1]["result_count"] == 2
+
+    def test_results_are_sent_before_the_search_finishes(self):
+        """Test the first result event goes out before the engine produces the second result."""
+        produced = []
+
+        def iter_similar(**kwargs):
+            for r in self.engine.results:
+                produced.append(r["game_id"])
+                yield dict(r)
+
+        self.engine.iter_similar = iter_similar
+        events = main._chat_events(main.ChatRequest(message="Games like Test Game"), None)
+
+        assert next(events)[0] == "interpretation"
+        event, data = next(events)
+        assert (event, data["result"]["game_id"]) == ("result", 2)
+        assert produced == [2]
+
+    def test_failed_search_replaces_streamed_results(self):
+        """Test results already streamed are replaced when the search fails afterwards."""
+
+        def iter_similar(**kwargs):
+            yield dict(self.engine.results[0])
+            raise RuntimeError("hydration failed")
+
+        self.engine.iter_similar = iter_similar
+        events = list(main._chat_events(main.ChatRequest(message="Games like Test Game"), None))
+
+        assert [event for event, _ in events][:4] == ["interpretation", "result", "reply", "results"]
+        assert events[3][1] == {"results": []}
+        assert events[-1][1].results == []
+
+    def test_turn_is_saved_when_the_client_disconnects(self, monkeypatch):
+        """Test the stream's turn runs to completion and is persisted without anyone reading it."""
+        saved = threading.Event()
+        monkeypatch.setattr(main, "load_user_collection", lambda user_id: set())
+        monkeypatch.setattr(main, "reserve_thread_id", lambda conn=None: 7)
+        monkeypatch.setattr(main, "pack_metadata", lambda conn, results, query_spec: "{}")
+        monkeypatch.setattr(main, "submit_chat_messages", lambda *args, **kwargs: saved.set())
+
+        response = main.chat_stream(main.ChatRequest(message="Games like Test Game"), {"id": 1})
+
+        assert isinstance(response, main.StreamingResponse)
+        assert saved.wait(timeout=5)
+
+    def test_chat_returns_done_payload(self):
+        """Test /chat returns the same response the stream ends with."""
+        response = main.chat(main.ChatRequest(message="Games like Test Game"), None)
+
+        assert isinstance(response, main.ChatResponse)
+        assert [r["game_id"] for r in response.results] == [2, 3]
+        assert self.engine.calls == 1
+
+    def test_empty_message_fails_before_streaming(self):
+        """Test validation errors surface when the first event is requested."""
+        with pytest.raises(main.HTTPException) as exc:
+            main.chat_stream(main.ChatRequest(message="   "), None)
+        assert exc.value.status_code == 400
+
+    def test_sse_event_format(self):
+        """Test events are framed as SSE and numpy scalars are serialized as numbers."""
+        import numpy as np
+
+        frame = main._sse_event("result", {"rank": 0, "score": np.float32(0.5)})
+
+        assert frame.startswith("event: result\ndata: ")
+        assert frame.endswith("\n\n")
+        assert json.loads(frame.split("data: ", 1)[1]) == {"rank": 0, "score": 0.5}
@@ -0,0 +1,189 @@
+"""
+Unit tests for the chat history writer.
+"""
+import psycopg2
+import pytest
+
+from backend import chat_writer
+from backend.chat_writer import ChatWrite, ChatWriter
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self):
+        log = self.log
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, query, params=None):
+                log.append(("execute", query, params))
+
+        return Cursor()
+
+    def commit(self):
+        self.log.append(("commit",))
+
+    def rollback(self):
+        self.log.append(("rollback",))
+
+
+class TestChatWriter:
+    """Tests for batching, ordering and failure isolation."""
+
+    @pytest.fixture(autouse=True)
+    def fake_db(self, monkeypatch):
+        self.log = []
+        self.fail_threads = set()
+
+        def fake_execute_values(cur, query, rows, page_size=100):
+            if any(row[0] in self.fail_threads for row in rows):
+                raise RuntimeError("foreign key violation")
+            self.log.append(("values", query, list(rows)))
+
+        monkeypatch.setattr(chat_writer, "execute_values", fake_execute_values)
+        monkeypatch.setattr(chat_writer, "get_connection", lambda: FakeConnection(self.log))
+        monkeypatch.setattr(chat_writer, "put_connection", lambda conn: None)
+
+    def _inserted_messages(self):
+        inserts = [e for e in self.log if e[0] == "values" and e[1] == chat_writer.QUERY_INSERT_MESSAGES]
+        return [row for entry in inserts for row in entry[2]]
+
+    def test_not_running_writes_synchronously(self):
+        """Test submit() commits immediately when the writer thread is not started."""
+        writer = ChatWriter()
+        writer.submit(ChatWrite(5, 1, "Hello", [("user", "Hello", None), ("assistant", "Hi", "{}")]))
+
+        assert self.log[0] == ("values", chat_writer.QUERY_INSERT_THREADS, [(5, 1, "Hello")])
+        assert self._inserted_messages() == [(5, "user", "Hello", None), (5, "assistant", "Hi", "{}")]
+        assert self.log[-2] == ("execute", chat_writer.QUERY_TOUCH_THREADS, ([5],))
+        assert self.log[-1] == ("commit",)
+
+    def test_batch_is_one_transaction_in_submission_order(self):
+        """Test queued writes from several requests are committed together, in order."""
+        writer = ChatWriter(batch_window=0.2)
+        writer.start()
+        try:
+            for i in range(5):
+                writer.submit(ChatWrite(10 + i % 2, 1, None, [("user", f"q{i}", None), ("assistant", f"a{i}", None)]))
+            assert writer.flush(timeout=5)
+        finally:
+            writer.stop()
+
+        assert self.log.count(("commit",)) == 1
+        assert [row[2] for row in self._inserted_messages()] == [m for i in range(5) for m in (f"q{i}", f"a{i}")]
+        assert ("execute", chat_writer.QUERY_TOUCH_THREADS, ([10, 11],)) in self.log
+
+    def test_failing_entry_does_not_drop_the_batch(self):
+        """Test a batch failure falls back to per-entry transactions and keeps the valid ones."""
+        self.fail_threads = {99}
+        writer = ChatWriter()
+        writer._write(
+            [
+                ChatWrite(1, 1, None, [("user", "first", None)]),
+                ChatWrite(99, 1, None, [("user", "orphan", None)]),
+                ChatWrite(2, 1, None, [("user", "second", None)]),
+            ]
+        )
+
+        assert [row[2] for row in self._inserted_messages()] == ["first", "second"]
+        assert self.log.count(("rollback",)) == 2
+        assert self.log[-1] == ("commit",)
+
+    def test_connection_errors_are_retried_not_dropped(self, monkeypatch):
+        """Test writes stay queued and are retried with backoff while the database is unreachable."""
+        monkeypatch.setattr(chat_writer, "RETRY_BASE_DELAY_SECONDS", 0.01)
+        outages = [psycopg2.OperationalError("server closed the connection"), RuntimeError("pool unavailable")]
+        connect = chat_writer.get_connection
+
+        def flaky_connection():
+            if outages:
+                raise outages.pop(0)
+            return connect()
+
+        monkeypatch.setattr(chat_writer, "get_connection", flaky_connection)
+        writer = ChatWriter()
+        writer.start()
+        try:
+            writer.submit(ChatWrite(3, 1, None, [("user", "kept", None)]))
+            assert writer.flush(timeout=5)
+        finally:
+            writer.stop()
+
+        assert outages == []
+        assert [row[2] for row in self._inserted_messages()] == ["kept"]
+
+    def test_connection_lost_mid_batch_returns_unwritten_entries(self, monkeypatch):
+        """Test only the entries not yet committed are handed back for retry."""
+        self.fail_threads = {99}
+        writes = [
+            ChatWrite(1, 1, None, [("user", "first", None)]),
+            ChatWrite(99, 1, None, [("user", "orphan", None)]),
+            ChatWrite(2, 1, None, [("user", "second", None)]),
+        ]
+        calls = []
+        original = chat_writer.write_chat_batch
+
+        def write_chat_batch(conn, batch):
+            calls.append(batch)
+            if len(calls) == 4:  # the batch, then "first", "orphan", then the connection drops
+                raise psycopg2.InterfaceError("connection already closed")
+            original(conn, batch)
+
+        monkeypatch.setattr(chat_writer, "write_chat_batch", write_chat_batch)
+
+        assert ChatWriter()._write(writes) == writes[2:]
+        assert [row[2] for row in self._inserted_messages()] == ["first"]
+
+    def test_missing_thread_row_is_retried(self, monkeypatch):
+        """Test a follow-up whose thread row another worker has not written yet is kept, not dropped."""
+        monkeypatch.setattr(chat_writer, "RETRY_BASE_DELAY_SECONDS", 0.01)
+        missing = [psycopg2.errors.ForeignKeyViolation("chat_messages_thread_id_fkey")]
+        original = chat_writer.write_chat_batch
+
+        def write_chat_batch(conn, batch):
+            if missing:
+                raise missing.pop()
+            original(conn, batch)
+
+        monkeypatch.setattr(chat_writer, "write_chat_batch", write_chat_batch)
+        writer = ChatWriter()
+        writer.start()
+        try:
+            writer.submit(ChatWrite(7, 1, None, [("user", "follow-up", None)]))
+            assert writer.flush(timeout=5)
+        finally:
+            writer.stop()
+
+        assert [row[2] for row in self._inserted_messages()] == ["follow-up"]
+
+    def test_missing_thread_row_is_dropped_after_the_retry_window(self, monkeypatch):
+        """Test a thread that never appears (e.g. deleted) stops blocking the queue."""
+
+        def write_chat_batch(conn, batch):
+            raise psycopg2.errors.ForeignKeyViolation("chat_messages_thread_id_fkey")
+
+        monkeypatch.setattr(chat_writer, "write_chat_batch", write_chat_batch)
+        write = ChatWrite(7, 1, None, [("user", "orphan", None)])
+        writer = ChatWriter()
+
+        (pending,) = writer._write([write])
+        assert pending.missing_thread_since is not None
+        monkeypatch.setattr(chat_writer, "FK_RETRY_SECONDS", 0.0)
+        assert writer._write([pending]) == []
+
+    def test_flush_without_pending_writes_returns_immediately(self):
+        """Test flush() succeeds when nothing is queued."""
+        writer = ChatWriter()
+        writer.start()
+        try:
+            assert writer.flush(timeout=0.1)
+        finally:
+            writer.stop()
+        assert not writer.running
@@ -0,0 +1,71 @@
+"""
+Unit tests for the vectorized collection analysis.
+"""
+import numpy as np
+
+from backend.collection_analysis import analyze_collection, game_feature_sets
+from backend.feature_incidence import FacetIncidence
+from backend.reasoning_utils import compute_meta_similarity
+
+NAMES = ["Alpha", "Beta", "Gamma", "Delta"]
+
+
+def make_facet(game_features, rarity=None):
+    """Build a FacetIncidence from {game_id: [vocabulary positions]}."""
+    game_ids = sorted(game_features)
+    indices, indptr = [], [0]
+    for gid in game_ids:
+        indices.extend(sorted(game_features[gid]))
+        indptr.append(len(indices))
+    return FacetIncidence(
+        game_ids=np.asarray(game_ids, dtype="int64"),
+        indptr=np.asarray(indptr, dtype="int64"),
+        indices=np.asarray(indices, dtype="int32"),
+        feature_ids=np.arange(len(NAMES), dtype="int64"),
+        names=NAMES,
+        rarity=np.asarray(rarity or [1.0] * len(NAMES), dtype="float64"),
+    )
+
+
+def make_incidence():
+    return {
+        "mechanics": make_facet({10: [0, 1, 2], 1: [0, 1], 2: [3], 3: [0, 1, 2]}),
+        "categories": make_facet({10: [0], 1: [1], 3: [0]}),
+        "designers": make_facet({10: [2], 2: [2]}),
+        "families": make_facet({10: [3], 1: [0]}, rarity=[1.0, 1.0, 1.0, 2.5]),
+    }
+
+
+class TestAnalyzeCollection:
+    """Tests for target-vs-collection analysis."""
+
+    def test_similarity_matches_meta_similarity(self):
+        """Test vectorized scores equal compute_meta_similarity in its base case."""
+        incidence = make_incidence()
+        analysis = analyze_collection(incidence, 10, [1, 2, 3, 4], top_n=4)
+
+        target = {ft: set() for ft in ("artists", "publishers")}
+        target.update(game_feature_sets(incidence, 10))
+        for game_id, score in analysis.top_matches:
+            other = {ft: set() for ft in ("artists", "publishers")}
+            other.update(game_feature_sets(incidence, game_id))
+            expected, _, _ = compute_meta_similarity(target, other)
+            assert abs(score - expected) < 1e-9
+
+        assert analysis.top_matches[0] == (3, 1.0)
+        # Game 4 has no features at all but is still part of the collection
+        assert [gid for gid, _ in analysis.top_matches] == [3, 1, 2, 4]
+
+    def test_unique_features_and_rarity(self):
+        """Test features absent from the whole collection and their average rarity."""
+        analysis = analyze_collection(make_incidence(), 10, [1, 2])
+
+        assert analysis.unique_features == {"mechanics": ["Gamma"], "categories": ["Alpha"], "families": ["Delta"]}
+        assert abs(analysis.avg_unique_rarity - (1.0 + 1.0 + 2.5) / 3) < 1e-9
+
+    def test_empty_collection(self):
+        """Test an empty collection yields no matches and default rarity."""
+        analysis = analyze_collection(make_incidence(), 10, [], top_n=5)
+
+        assert analysis.top_matches == []
+        assert analysis.avg_unique_rarity > 0
@@ -0,0 +1,123 @@
+"""
+Unit tests for the per-user collection cache.
+"""
+import numpy as np
+import pytest
+
+from backend import collection_cache
+from backend.collection_cache import UserCollectionCache
+
+VECTORS = {
+    1: np.array([1.0, 0.0], dtype="float32"),
+    2: np.array([0.0, 2.0], dtype="float32"),
+    3: np.array([3.0, 3.0], dtype="float32"),
+}
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0]
+
+
+class TestUserCollectionCache:
+    """Tests for cached collection ids and embedding matrices."""
+
+    @pytest.fixture(autouse=True)
+    def fake_db(self, monkeypatch):
+        self.collection = {1, 2}
+        self.queries = []
+
+        def fake_execute_query(conn, query, params=None):
+            self.queries.append(query)
+            if query == collection_cache.QUERY_GET_COLLECTION_IDS:
+                return FakeCursor([(gid, None) for gid in sorted(self.collection)])
+            if query == collection_cache.QUERY_GET_COLLECTION_VERSION:
+                return FakeCursor([(len(self.collection), sum(self.collection), None)])
+            return FakeCursor([(gid, VECTORS[gid].tobytes(), None) for gid in params[0] if gid in VECTORS])
+
+        monkeypatch.setattr(collection_cache, "execute_query", fake_execute_query)
+        monkeypatch.setattr(collection_cache, "get_connection", lambda: None)
+        monkeypatch.setattr(collection_cache, "put_connection", lambda conn: None)
+
+    def test_ids_loaded_once(self):
+        """Test repeated lookups only check the collection version."""
+        cache = UserCollectionCache(maxsize=10, ttl=60)
+
+        assert cache.get_ids(5) == {1, 2}
+        assert cache.get_ids("5") == {1, 2}
+        assert self.queries == [collection_cache.QUERY_GET_COLLECTION_IDS, collection_cache.QUERY_GET_COLLECTION_VERSION]
+
+    def test_change_from_another_worker_is_seen(self):
+        """Test a collection changed elsewhere is reloaded on the next read, without waiting for the TTL."""
+        cache = UserCollectionCache(maxsize=10, ttl=60)
+        cache.get_vectors(5)
+
+        self.collection = {1, 2, 3}
+
+        assert cache.get_ids(5) == {1, 2, 3}
+        game_ids, _ = cache.get_vectors(5)
+        assert sorted(game_ids.tolist()) == [1, 2, 3]
+
+    def test_vectors_are_normalized(self):
+        """Test the matrix rows are L2-normalized and aligned with game_ids."""
+        cache = UserCollectionCache(maxsize=10, ttl=60)
+
+        game_ids, matrix = cache.get_vectors(5)
+
+        assert sorted(game_ids.tolist()) == [1, 2]
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-6)
+        row = game_ids.tolist().index(2)
+        np.testing.assert_allclose(matrix[row], [0.0, 1.0])
+        # Second call only checks the version
+        queries = len(self.queries)
+        cache.get_vectors(5)
+        assert self.queries[queries:] == [collection_cache.QUERY_GET_COLLECTION_VERSION]
+
+    def test_add_and_remove_patch_matrix(self):
+        """Test add/remove update ids and matrix rows in place of a rebuild."""
+        cache = UserCollectionCache(maxsize=10, ttl=60)
+        cache.get_vectors(5)
+
+        self.collection = {2, 3}
+        cache.add_games(5, [3])
+        cache.remove_games(5, [1])
+        self.queries.clear()
+
+        assert cache.get_ids(5) == {2, 3}
+        game_ids, matrix = cache.get_vectors(5)
+        assert sorted(game_ids.tolist()) == [2, 3]
+        assert matrix.shape == (2, 2)
+        # The patched matrix is kept when the reloaded ids match it
+        assert collection_cache.QUERY_GET_EMBEDDINGS not in self.queries
+
+    def test_add_fetches_vectors_outside_the_lock(self, monkeypatch):
+        """Test the embedding query of add_games does not hold the cache lock."""
+        cache = UserCollectionCache(maxsize=10, ttl=60)
+        cache.get_vectors(5)
+        fetch = collection_cache._fetch_vectors
+
+        def unlocked_fetch(game_ids):
+            assert not cache._lock.locked()
+            return fetch(game_ids)
+
+        monkeypatch.setattr(collection_cache, "_fetch_vectors", unlocked_fetch)
+        cache.add_games(5, [3])
+
+        self.collection = {1, 2, 3}
+        assert sorted(cache.get_vectors(5).game_ids.tolist()) == [1, 2, 3]
+
+    def test_invalidate_reloads(self):
+        """Test invalidation forces a fresh load from user_collections."""
+        cache = UserCollectionCache(maxsize=10, ttl=60)
+        cache.get_ids(5)
+        self.collection = {3}
+
+        cache.invalidate(5)
+
+        assert cache.get_ids(5) == {3}
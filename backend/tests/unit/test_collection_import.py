@@ -0,0 +1,55 @@
+"""
+Unit tests for the bulk BGG collection import.
+"""
+from backend import collection_import
+from backend.collection_import import bulk_import_collection
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+class TestBulkImportCollection:
+    """Tests for set-based collection import."""
+
+    def test_skips_unknown_games_and_counts_upserts(self, monkeypatch):
+        """Test one existence check and one upsert for the whole collection."""
+        calls = {}
+
+        def fake_execute_query(conn, query, params=None):
+            calls["existence_ids"] = sorted(params[0])
+            return FakeCursor([(1,), (2,), (3,)])
+
+        def fake_execute_values(cur, sql, rows, page_size=100, fetch=False):
+            calls["rows"] = rows
+            # game 1 newly inserted, game 2 updated; game 3 unchanged (no rating) is not returned
+            return [(True,), (False,)]
+
+        monkeypatch.setattr(collection_import, "execute_query", fake_execute_query)
+        monkeypatch.setattr(collection_import, "execute_values", fake_execute_values)
+
+        games = [
+            {"game_id": 1, "personal_rating": 8.0},
+            {"game_id": 2, "personal_rating": 6.5},
+            {"game_id": 3, "personal_rating": None},
+            {"game_id": 99, "personal_rating": 7.0},
+        ]
+        counts = bulk_import_collection(object(), 42, games)
+
+        assert calls["existence_ids"] == [1, 2, 3, 99]
+        assert calls["rows"] == [(42, 1, 8.0), (42, 2, 6.5), (42, 3, None)]
+        assert counts == {"added": 1, "updated": 1, "skipped": 1}
+
+    def test_empty_collection(self, monkeypatch):
+        """Test that an empty BGG collection does not touch the database."""
+
+        def fail(*args, **kwargs):
+            raise AssertionError("no queries expected")
+
+        monkeypatch.setattr(collection_import, "execute_query", fail)
+
+        assert bulk_import_collection(object(), 1, []) == {"added": 0, "updated": 0, "skipped": 0}
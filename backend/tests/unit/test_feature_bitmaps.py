@@ -0,0 +1,118 @@
+"""
+Unit tests for the feature-only bitmap index.
+"""
+import numpy as np
+import pytest
+
+from backend import feature_bitmaps, main
+from backend.chat_metadata import GAME_FIELDS
+from backend.feature_bitmaps import build_bitmap_index
+from backend.tests.unit.test_collection_analysis import make_incidence
+from backend.tests.unit.test_game_attributes import make_attributes
+
+# Popularity order: most rated first
+RANKED_IDS = [3, 10, 1, 2, 4]
+
+
+@pytest.fixture(params=["roaring", "numpy"])
+def bitmap_backend(request, monkeypatch):
+    if request.param == "numpy":
+        monkeypatch.setattr(feature_bitmaps, "BitMap", None)
+    elif feature_bitmaps.BitMap is None:
+        pytest.skip("pyroaring not installed")
+    return request.param
+
+
+class TestFeatureBitmapIndex:
+    """Tests for required/excluded/collection filtering and popularity order."""
+
+    def test_required_values_are_anded_in_popularity_order(self, bitmap_backend):
+        """Test games must have every required value and come back most popular first."""
+        index = build_bitmap_index(make_incidence(), RANKED_IDS)
+
+        assert index.search({"mechanics": {"Alpha", "Beta"}}) == [3, 10, 1]
+        assert index.search({"mechanics": {"alpha"}, "categories": {"Alpha"}}) == [3, 10]
+
+    def test_unknown_required_value_matches_nothing(self, bitmap_backend):
+        """Test a value no game has yields no results, while unknown facets are ignored."""
+        index = build_bitmap_index(make_incidence(), RANKED_IDS)
+
+        assert index.search({"mechanics": {"Nope"}}) == []
+        assert index.search({"unknown_facet": {"Alpha"}}, top_k=2) == [3, 10]
+
+    def test_collection_restriction_exclusion_and_top_k(self, bitmap_backend):
+        """Test allowed_ids, excluded values and top_k are applied as bitmap operations."""
+        index = build_bitmap_index(make_incidence(), RANKED_IDS)
+
+        assert index.search({"mechanics": {"Alpha"}}, allowed_ids={1, 10, 999}) == [10, 1]
+        assert index.search({"mechanics": {"Alpha"}}, excluded={"families": {"Delta"}}) == [3, 1]
+        assert index.search({"mechanics": {"Alpha"}}, top_k=1) == [3]
+        assert index.search(None, top_k=3) == [3, 10, 1]
+
+    def test_games_missing_from_catalog_are_skipped(self, bitmap_backend):
+        """Test incidence rows for games not in the popularity order are dropped."""
+        index = build_bitmap_index(make_incidence(), [10, 2])
+
+        assert index.search({"mechanics": {"Alpha"}}) == [10]
+        assert index.search({"designers": {"Gamma"}}) == [10, 2]
+
+    def test_value_mask(self, bitmap_backend):
+        """Test per-candidate required/excluded checks, where an unknown feature type matches nothing."""
+        index = build_bitmap_index(make_incidence(), RANKED_IDS)
+        candidates = [1, 2, 3, 10, 999]
+
+        assert index.value_mask(candidates, required={"mechanics": {"alpha"}}).tolist() == [True, False, True, True, False]
+        assert index.value_mask(candidates, excluded={"families": {"Delta"}}).tolist() == [True, True, True, False, False]
+        assert not index.value_mask(candidates, required={"unknown": {"Alpha"}}).any()
+
+    def test_values_are_normalized_alike_in_search_and_value_mask(self, bitmap_backend):
+        """Test surrounding whitespace and case match the same postings in both lookups."""
+        index = build_bitmap_index(make_incidence(), RANKED_IDS)
+
+        assert index.search({"mechanics": {" ALPHA "}}, excluded={"families": {" delta"}}) == [3, 1]
+        mask = index.value_mask([1, 2, 3, 10], required={"mechanics": {" ALPHA "}}, excluded={"families": {" delta"}})
+        assert mask.tolist() == [True, False, True, False]
+
+
+class TestSearchByFeaturesOnly:
+    """Tests for constraints in the feature-only chat search."""
+
+    @pytest.fixture(autouse=True)
+    def fake_catalog(self, monkeypatch):
+        id_map = (1, 2, 3, 10, 4)
+        attributes = make_attributes(monkeypatch, id_map)
+        engine = type("FakeEngine", (), {"game_attributes": lambda self: (np.asarray(id_map, dtype="int64"), attributes)})
+        monkeypatch.setattr(main, "ENGINE", engine())
+        monkeypatch.setattr(main, "get_bitmap_index", lambda: build_bitmap_index(make_incidence(), RANKED_IDS))
+        monkeypatch.setattr(main, "get_incidence", make_incidence)
+        monkeypatch.setattr(main, "get_db_connection", lambda: None)
+        monkeypatch.setattr(main, "put_connection", lambda conn: None)
+        monkeypatch.setattr(
+            main, "fetch_game_fields", lambda conn, ids: {game_id: dict.fromkeys(GAME_FIELDS, None) for game_id in ids}
+        )
+
+    def result_ids(self, **kwargs):
+        return [r["game_id"] for r in main.search_by_features_only({"mechanics": {"Alpha"}}, **kwargs)]
+
+    def test_player_and_playtime_targets_filter_results(self):
+        """Test exact player counts and playtime targets are applied rather than dropped."""
+        assert self.result_ids() == [3, 10, 1]
+        # Game 10 has no player data; game 3 only has poll data
+        assert self.result_ids(constraints={"players": {"exact": 4}}) == [3, 1]
+        assert self.result_ids(constraints={"players": {"exact": 4, "use_recommended": True}}) == [1]
+        assert self.result_ids(constraints={"playtime": {"target": 60}}, allowed_ids={1, 10}) == [10, 1]
+        assert self.result_ids(constraints={"playtime": {"target": 30, "tolerance": 0.1}}, allowed_ids={1}) == []
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"include_features": ["mechanics"]},
+            {"exclude_features": ["categories"]},
+            {"constraints": {"mechanics": {"jaccard_max": 0.2}}},
+            {"constraints": {"players": {"min_overlap": 1}}},
+        ],
+    )
+    def test_filters_needing_a_base_game_are_rejected(self, kwargs):
+        """Test filters relative to a base game raise instead of being silently ignored."""
+        with pytest.raises(ValueError, match="base game"):
+            main.search_by_features_only({"mechanics": {"Alpha"}}, **kwargs)
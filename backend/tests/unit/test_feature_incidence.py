@@ -0,0 +1,51 @@
+"""
+Unit tests for building the feature incidence from the link tables.
+"""
+from backend import feature_incidence
+from backend.feature_incidence import _build_facet
+from backend.meta_scoring import feature_sets
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+class TestBuildFacet:
+    """Tests for blacklist and feature_mods handling, which must match get_game_features."""
+
+    def _build(self, monkeypatch, mods, blacklisted):
+        vocab = [(1, "Dice"), (2, "Cards"), (3, "Worker Placement"), (4, " ")]
+        links = [(10, 1), (10, 2), (10, 4), (20, 2), (20, 3)]
+
+        def fake_execute_query(conn, query, params=None):
+            return FakeCursor(vocab if query.startswith("SELECT id, name") else links)
+
+        monkeypatch.setattr(feature_incidence, "execute_query", fake_execute_query)
+        monkeypatch.setattr(feature_incidence, "get_blacklisted_features", lambda conn, ft: blacklisted)
+        return {"mechanics": _build_facet(None, "mechanics", 100, mods)}
+
+    def test_blacklisted_and_empty_names_are_dropped(self, monkeypatch):
+        """Test linked features with blacklisted or blank names are left out."""
+        incidence = self._build(monkeypatch, [], {"Cards"})
+
+        assert feature_sets(incidence, 10) == {"mechanics": {"Dice"}}
+        assert feature_sets(incidence, 20) == {"mechanics": {"Worker Placement"}}
+
+    def test_mod_can_add_a_blacklisted_feature(self, monkeypatch):
+        """Test mods apply after the blacklist, so an admin add of a blacklisted feature is kept."""
+        # created_at DESC: the older "remove" of Dice on game 20 is applied last and wins
+        mods = [
+            (10, "mechanics", 2, "add"),
+            (20, "mechanics", 1, "add"),
+            (20, "mechanics", 1, "remove"),
+            (20, "mechanics", 3, "remove"),
+            (20, "categories", 2, "add"),
+        ]
+        incidence = self._build(monkeypatch, mods, {"Cards"})
+
+        assert feature_sets(incidence, 10) == {"mechanics": {"Dice", "Cards"}}
+        assert feature_sets(incidence, 20) == {"mechanics": set()}
@@ -0,0 +1,100 @@
+"""
+Unit tests for the columnar game attributes used by search_similar.
+"""
+import json
+
+import numpy as np
+
+from backend import game_attributes
+from backend.game_attributes import (
+    build_game_attributes,
+    player_constraint_mask,
+    playtime_constraint_mask,
+    weighted_scores,
+)
+from backend.game_stats import players_to_mask
+
+RANKS_JSON = '{"ranks": [{"value": "7"}]}'
+POLLS = {"suggested_numplayers": {"results": [{"numplayers": "3", "votes": {"Best": 4, "Recommended": 1}}]}}
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+# id, min, max, recommended mask, best, playing_time, min/max playtime, avg_weight, rank, ratings, year,
+# stats_normalized, ranks_json, polls_json
+GAME_ROWS = [
+    (1, 2, 4, players_to_mask({2, 3, 4}), 3, 60, None, None, 2.5, 10, 5000, 2015, True, None, None),
+    (2, 1, 2, players_to_mask({2}), 2, None, 20, 40, 1.5, None, 100, 2020, True, None, None),
+    (3, 0, None, None, None, None, None, None, None, None, None, None, False, RANKS_JSON, json.dumps(POLLS)),
+    (5, 3, 6, 0, None, 240, None, None, 4.0, 500, 20, 1990, True, None, None),
+]
+
+
+def make_attributes(monkeypatch, id_map=(5, 1, 2, 3, 99)):
+    monkeypatch.setattr(game_attributes, "execute_query", lambda conn, query, params=None: FakeCursor(GAME_ROWS))
+    return build_game_attributes(None, np.asarray(id_map, dtype="int64"))
+
+
+class TestGameAttributes:
+    """Tests for the columns and the masks/scores computed from them."""
+
+    def test_columns_follow_id_map(self, monkeypatch):
+        """Test rows align with the index, ids missing from games are NaN and unnormalized rows are parsed."""
+        attributes = make_attributes(monkeypatch)
+
+        assert attributes.max_players[:3].tolist() == [6.0, 4.0, 2.0]
+        assert attributes.playing_time[2] == 30.0  # min/max average
+        # min_players of 0 counts as unknown, like get_game_features
+        assert np.isnan(attributes.min_players[3])
+        assert attributes.rank[3] == 7.0
+        assert attributes.recommended_players[3] == players_to_mask({3})
+        assert attributes.best_player_count[3] == 3.0
+        assert np.isnan(attributes.num_ratings[4])
+        assert attributes.recommended_players[4] == 0
+
+    def test_exact_player_count(self, monkeypatch):
+        """Test the exact count must be within min/max, or recommended when the range is unknown."""
+        attributes = make_attributes(monkeypatch)
+
+        assert player_constraint_mask(attributes, {}, {"exact": 3}).tolist() == [True, True, False, True, False]
+        recommended = player_constraint_mask(attributes, {}, {"exact": 4, "use_recommended": True})
+        assert recommended.tolist() == [True, True, False, False, False]
+
+    def test_overlap_and_similar_best(self, monkeypatch):
+        """Test player range overlap, the recommended fallback and the best count tolerance."""
+        attributes = make_attributes(monkeypatch)
+        base = {"min_players": 3, "max_players": 4, "recommended_players": {3}, "best_player_count": 4}
+
+        overlap = player_constraint_mask(attributes, base, {"min_overlap": 2})
+        assert overlap.tolist() == [True, True, False, False, True]
+        similar_best = player_constraint_mask(attributes, base, {"similar_best": True})
+        assert similar_best.tolist() == [True, True, False, True, True]
+
+    def test_playtime_tolerance(self, monkeypatch):
+        """Test playtime within tolerance of the target passes, as do games without playtime data."""
+        attributes = make_attributes(monkeypatch)
+
+        within = playtime_constraint_mask(attributes, {"target": 45, "tolerance": 0.4})
+        assert within.tolist() == [False, True, True, True, True]
+        assert playtime_constraint_mask(attributes, {}).all()
+
+    def test_weighted_scores(self):
+        """Test the boosts for ratings, rank, recency and complexity, with NaN contributing nothing."""
+        nan = np.nan
+        scores = weighted_scores(
+            np.array([0.5, 0.5]),
+            np.array([20000.0, nan]),
+            np.array([1.0, nan]),
+            np.array([2025.0, nan]),
+            np.array([2.0, nan]),
+            base_complexity=3.0,
+            current_year=2025,
+        )
+
+        assert np.allclose(scores, [0.5 + 0.1 + 0.1 * 0.9999 + 0.05 + 0.05 * 0.8, 0.5])
@@ -0,0 +1,83 @@
+"""
+Unit tests for the precomputed game neighbour table.
+"""
+import numpy as np
+
+from backend import game_neighbors
+from backend.game_neighbors import build_game_neighbors, get_neighbors
+from backend.tests.unit.test_collection_analysis import make_incidence
+from backend.tests.unit.test_chat_writer import FakeConnection
+
+
+class FakeEngine:
+    id_map = np.array([10, 1, 2, 3], dtype="int64")
+    index_version = 7
+
+    def search_batch(self, game_ids, top_k=10, include_self=False):
+        others = self.id_map.tolist()
+        return {
+            gid: (np.array([o for o in others if o != gid][:top_k], dtype="int64"), np.linspace(0.9, 0.5, top_k))
+            for gid in game_ids
+        }
+
+
+class TestGameNeighbors:
+    """Tests for building and reading the neighbour table."""
+
+    def test_build_replaces_rows_per_batch(self, monkeypatch):
+        """Test each batch is deleted and reinserted with meta scores, then stale games are removed."""
+        log, progress = [], []
+
+        def fake_execute_values(cur, query, rows, page_size=100):
+            log.append(("values", query, list(rows)))
+
+        monkeypatch.setattr(game_neighbors, "execute_values", fake_execute_values)
+        monkeypatch.setattr(game_neighbors, "get_connection", lambda: FakeConnection(log))
+        monkeypatch.setattr(game_neighbors, "put_connection", lambda conn: None)
+        monkeypatch.setattr(game_neighbors, "get_incidence", make_incidence)
+
+        stats = build_game_neighbors(FakeEngine(), top_n=2, batch_size=3, progress=progress.append)
+
+        assert stats == {"games": 4, "neighbors": 8}
+        assert progress == ["3/4 games", "4/4 games"]
+        deletes = [e[2] for e in log if e[0] == "execute" and e[1] == game_neighbors.QUERY_DELETE_NEIGHBORS]
+        assert deletes == [([10, 1, 2],), ([3],)]
+        rows = [row for e in log if e[0] == "values" for row in e[2]]
+        # Game 10 and game 1 share two of game 10's three mechanics (see make_incidence)
+        assert rows[0][:3] == (10, 0, 1)
+        assert 0.0 < rows[0][4] <= 1.0
+        assert {row[5] for row in rows} == {7}
+        assert log[-2][1] == game_neighbors.QUERY_DELETE_STALE_NEIGHBORS
+
+    def test_get_neighbors_needs_enough_rows(self, monkeypatch):
+        """Test fewer precomputed rows than requested mean the index has to be searched."""
+
+        class FakeCursor:
+            def fetchall(self):
+                return [(5, 0.9), (4, 0.8)]
+
+        monkeypatch.setattr(game_neighbors, "execute_query", lambda conn, query, params=None: FakeCursor())
+
+        sims, ids = get_neighbors(None, 1, 2, 7)
+        assert ids == [5, 4]
+        assert sims.tolist() == [np.float32(0.9), np.float32(0.8)]
+        assert get_neighbors(None, 1, 3, 7) is None
+
+    def test_get_neighbors_reads_only_the_loaded_version(self, monkeypatch):
+        """Test rows are filtered by index version and an unversioned index never reads them."""
+        queries = []
+
+        class FakeCursor:
+            def fetchall(self):
+                return []
+
+        def fake_execute_query(conn, query, params=None):
+            queries.append(params)
+            return FakeCursor()
+
+        monkeypatch.setattr(game_neighbors, "execute_query", fake_execute_query)
+
+        assert get_neighbors(None, 1, 2, 8) is None
+        assert queries == [(1, 8, 2)]
+        assert get_neighbors(None, 1, 2, None) is None
+        assert queries == [(1, 8, 2)]
@@ -0,0 +1,69 @@
+"""
+Unit tests for the ETL-time normalization of ranks/polls JSON.
+"""
+import json
+
+from backend.game_stats import (
+    mask_to_players,
+    normalize_game_stats,
+    parse_overall_rank,
+    parse_player_counts,
+    players_to_mask,
+)
+
+RANKS = {
+    "ranks": [
+        {"name": "strategygames", "friendlyname": "Strategy Game Rank", "value": "12"},
+        {"name": "boardgame", "friendlyname": "Board Game Rank", "value": "345"},
+    ]
+}
+POLLS = {
+    "suggested_numplayers": {
+        "results": [
+            {"numplayers": "1", "votes": {"Best": 0, "Recommended": 0, "Not Recommended": 40}},
+            {"numplayers": "2", "votes": {"Best": 5, "Recommended": 20}},
+            {"numplayers": "3", "votes": {"Best": 30, "Recommended": 10}},
+            {"numplayers": "4+", "votes": {"Best": 0, "Recommended": 3}},
+        ]
+    },
+    "language_dependence": {
+        "results": [
+            {"level": "1", "value": "No necessary in-game text", "numvotes": 2},
+            {"level": "4", "value": "Extensive use of text", "numvotes": 9},
+        ]
+    },
+}
+
+
+class TestGameStats:
+    """Tests for rank, player-count and language dependence parsing."""
+
+    def test_overall_rank_prefers_boardgame_rank(self):
+        """Test the overall rank wins over subdomain ranks, with the first numeric rank as fallback."""
+        assert parse_overall_rank(json.dumps(RANKS)) == 345
+        assert parse_overall_rank({"ranks": [{"name": "boardgame", "value": "Not Ranked"}, {"value": "7"}]}) == 7
+        assert parse_overall_rank(None) is None
+        assert parse_overall_rank("not json") is None
+
+    def test_player_counts(self):
+        """Test counts with Best or Recommended votes and the count with most Best votes."""
+        assert parse_player_counts(json.dumps(POLLS)) == ({2, 3, 4}, 3)
+        assert parse_player_counts(None) == (set(), None)
+
+    def test_mask_round_trip(self):
+        """Test the recommended_players bitmask round-trips and ignores out-of-range counts."""
+        assert mask_to_players(players_to_mask({1, 4, 62, 99})) == {1, 4, 62}
+        assert mask_to_players(None) == set()
+
+    def test_normalize_game_stats(self):
+        """Test the typed column values produced for the ETL."""
+        stats = normalize_game_stats(RANKS, POLLS)
+
+        assert stats == {
+            "overall_rank": 345,
+            "recommended_players": players_to_mask({2, 3, 4}),
+            "best_player_count": 3,
+            "language_dependence_level": 4,
+            "language_dependence_value": "Extensive use of text",
+            "language_dependence_votes": 9,
+        }
@@ -0,0 +1,88 @@
+"""
+Unit tests for the background job queue.
+"""
+import pytest
+
+from backend import jobs
+
+
+class TestJobQueue:
+    """Tests for job execution, retries and concurrency bookkeeping."""
+
+    @pytest.fixture(autouse=True)
+    def isolated_registry(self, monkeypatch):
+        monkeypatch.setattr(jobs, "_JOB_TYPES", {})
+        self.statements = []
+        monkeypatch.setattr(jobs, "_run_sql", lambda query, params, fetch=False: self.statements.append((query, params)))
+
+    def _job(self, job_type, attempts=1, max_attempts=3):
+        return {"id": 7, "job_type": job_type, "payload": {}, "attempts": attempts, "max_attempts": max_attempts}
+
+    def test_enqueue_unknown_type_raises(self):
+        """Test enqueueing a job type without a handler is rejected before touching the DB."""
+        with pytest.raises(ValueError):
+            jobs.enqueue_job("missing", {})
+        assert self.statements == []
+
+    def test_successful_job_is_completed(self):
+        """Test the handler result is stored and the running counter released."""
+        jobs.register_job_type("echo", lambda job: {"ok": True})
+        jobs._JOB_TYPES["echo"].running = 1
+
+        jobs._execute_job(self._job("echo"))
+
+        query, params = self.statements[-1]
+        assert query == jobs.QUERY_COMPLETE_JOB
+        assert params == ('{"ok": true}', 7)
+        assert jobs._JOB_TYPES["echo"].running == 0
+
+    def test_failed_job_retries_with_backoff(self):
+        """Test a failure below max_attempts requeues with exponential delay."""
+
+        def boom(job):
+            raise RuntimeError("upstream down")
+
+        jobs.register_job_type("flaky", boom)
+        jobs._JOB_TYPES["flaky"].running = 1
+
+        jobs._execute_job(self._job("flaky", attempts=2))
+
+        query, params = self.statements[-1]
+        assert query == jobs.QUERY_RETRY_JOB
+        assert params == ("upstream down", jobs.RETRY_BASE_DELAY_SECONDS * 2, 7)
+
+    def test_failed_job_on_last_attempt_is_failed(self):
+        """Test a failure on the last attempt marks the job failed."""
+
+        def boom(job):
+            raise RuntimeError("bad payload")
+
+        jobs.register_job_type("flaky", boom)
+        jobs._JOB_TYPES["flaky"].running = 1
+
+        jobs._execute_job(self._job("flaky", attempts=3, max_attempts=3))
+
+        assert self.statements[-1] == (jobs.QUERY_FAIL_JOB, ("bad payload", 7))
+
+    def test_heartbeat_renews_leases_of_running_jobs(self, monkeypatch):
+        """Test running jobs keep their lease until they finish, and stale jobs are swept each beat."""
+        monkeypatch.setattr(jobs, "_RUNNING_JOBS", set())
+        jobs.register_job_type("echo", lambda job: {"ok": True})
+
+        def run_sql(query, params, fetch=False):
+            self.statements.append((query, params))
+            return [(7, "echo", "{}", 1, 3, None)] if query == jobs.QUERY_CLAIM_JOB else None
+
+        monkeypatch.setattr(jobs, "_run_sql", run_sql)
+
+        job = jobs._claim_next_job()
+        assert self.statements[-1] == (jobs.QUERY_CLAIM_JOB, (jobs.WORKER_ID, jobs.LEASE_SECONDS, ["echo"]))
+
+        jobs._heartbeat()
+        assert self.statements[-2] == (jobs.QUERY_RENEW_JOB_LEASES, (jobs.LEASE_SECONDS, [7], jobs.WORKER_ID))
+        assert self.statements[-1] == (jobs.QUERY_REQUEUE_STALE_JOBS, (jobs.STALE_JOB_SECONDS,))
+
+        jobs._execute_job(job)
+        self.statements.clear()
+        jobs._heartbeat()
+        assert [query for query, _ in self.statements] == [jobs.QUERY_REQUEUE_STALE_JOBS]
@@ -0,0 +1,77 @@
+"""
+Unit tests for the vectorized candidate scoring of search_similar.
+"""
+import numpy as np
+import pytest
+
+from backend import reasoning_utils
+from backend.meta_scoring import (
+    candidate_overlaps,
+    explain_overlap,
+    feature_sets,
+    meta_scores,
+    overlap_constraint_mask,
+    overlap_type_mask,
+)
+from backend.reasoning_utils import compute_meta_similarity
+from backend.tests.unit.test_collection_analysis import make_incidence
+
+CANDIDATES = np.array([1, 2, 3, 99], dtype="int64")
+
+
+def full_features(incidence, game_id):
+    sets = feature_sets(incidence, game_id)
+    return {ft: sets.get(ft, set()) for ft in ("mechanics", "categories", "families", "designers", "artists", "publishers")}
+
+
+class TestMetaScoring:
+    """Tests for overlaps, meta scores and the overlap-based masks."""
+
+    @pytest.mark.parametrize(
+        "mode",
+        [{}, {"theme_only": True}, {"mechanics_only": True}, {"category_weight_only": True}, {"mechanics_weight": 0.8}],
+    )
+    @pytest.mark.parametrize("use_rarity_weighting", [False, True])
+    def test_scores_match_compute_meta_similarity(self, monkeypatch, mode, use_rarity_weighting):
+        """Test every weighting mode gives compute_meta_similarity's score for each candidate."""
+        incidence = make_incidence()
+
+        def rarity_weights(conn, feature_type):
+            facet = incidence[feature_type]
+            return {name: float(facet.rarity[pos]) for pos, name in enumerate(facet.names)}
+
+        monkeypatch.setattr(reasoning_utils, "get_feature_rarity_weights", rarity_weights)
+        scores = meta_scores(
+            candidate_overlaps(incidence, 10, CANDIDATES), use_rarity_weighting=use_rarity_weighting, **mode
+        )
+
+        base = full_features(incidence, 10)
+        for gid, score in zip(CANDIDATES, scores):
+            expected, _, _ = compute_meta_similarity(
+                base, full_features(incidence, int(gid)), conn=object(), use_rarity_weighting=use_rarity_weighting, **mode
+            )
+            assert score == pytest.approx(expected)
+
+    def test_type_and_constraint_masks(self):
+        """Test include/exclude feature types and generic jaccard/overlap constraints."""
+        overlaps = candidate_overlaps(make_incidence(), 10, CANDIDATES)
+
+        assert overlap_type_mask(overlaps, include_features=["mechanics"]).tolist() == [True, False, True, False]
+        assert overlap_type_mask(overlaps, exclude_features=["designers"]).tolist() == [True, False, True, True]
+        assert not overlap_type_mask(overlaps, include_features=["unknown"]).any()
+
+        constraints = {"mechanics": {"jaccard_min": 0.6}, "players": {"min_overlap": 2}}
+        assert overlap_constraint_mask(overlaps, constraints).tolist() == [True, False, True, False]
+        assert overlap_constraint_mask(overlaps, {"categories": {"min_overlap": 1}}).tolist() == [False, False, True, False]
+        assert not overlap_constraint_mask(overlaps, {"unknown": {"jaccard_min": 0.1}}).any()
+
+    def test_explain_overlap(self):
+        """Test shared, missing and extra feature names against the query game."""
+        incidence = make_incidence()
+        explanation = explain_overlap(full_features(incidence, 10), feature_sets(incidence, 1))
+
+        assert explanation["shared_mechanics"] == ["Alpha", "Beta"]
+        assert explanation["missing_mechanics"] == ["Gamma"]
+        assert explanation["extra_families"] == ["Alpha"]
+        assert explanation["shared_publishers"] == []
+        assert "missing_publishers" not in explanation
@@ -0,0 +1,127 @@
+"""
+Unit tests for the Prometheus metrics, the request middleware and error monitoring.
+"""
+import json
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import metrics, monitoring
+from backend.metrics import Counter, Gauge, Histogram, merge_snapshots, process_snapshot, render_prometheus
+from backend.middleware import RequestMetricsMiddleware
+
+
+def make_registry():
+    registry = {}
+    requests = Counter("t_requests_total", "Requests.", ("route",), registry=registry)
+    pool = Gauge("t_pool", "Pool size.", registry=registry)
+    latency = Histogram("t_latency_seconds", "Latency.", buckets=(0.1, 1.0), registry=registry)
+    return registry, requests, pool, latency
+
+
+class TestMetrics:
+    """Tests for recording, merging and the text exposition format."""
+
+    def test_render_prometheus(self):
+        """Test counters, gauges and cumulative histogram buckets in the text format."""
+        registry, requests, pool, latency = make_registry()
+        requests.inc(route='/a"b')
+        requests.inc(2, route="/c")
+        pool.set_function(lambda: 3)
+        for seconds in (0.05, 0.5, 5.0):
+            latency.observe(seconds)
+
+        text = render_prometheus(merge_snapshots([process_snapshot(registry)]))
+
+        assert '# TYPE t_requests_total counter\nt_requests_total{route="/a\\"b"} 1\nt_requests_total{route="/c"} 2' in text
+        assert "t_pool 3\n" in text
+        assert 't_latency_seconds_bucket{le="0.1"} 1\nt_latency_seconds_bucket{le="1"} 2\n' in text
+        assert 't_latency_seconds_bucket{le="+Inf"} 3\nt_latency_seconds_sum 5.55\nt_latency_seconds_count 3' in text
+
+    def test_histogram_summary(self):
+        """Test the JSON summary reports bucket upper bounds as quantiles."""
+        latency = Histogram("t_summary_seconds", "Latency.", ("stage",), buckets=(0.01, 0.1, 1.0), registry={})
+        for seconds in (0.005, 0.005, 0.05, 0.5, 5.0):
+            latency.observe(seconds, stage="search")
+
+        summary = latency.summary(stage="search")
+        assert summary["count"] == 5
+        assert summary["buckets_ms"] == {"10": 2, "100": 1, "1000": 1, "+Inf": 1}
+        assert summary["p50_ms"] == 100
+        assert summary["p99_ms"] is None  # beyond the last finite bucket
+        assert latency.summary(stage="other")["count"] == 0
+
+    def test_merge_across_workers(self):
+        """Test counters and histograms add up across workers and dead workers' gauges are dropped."""
+        registry, requests, pool, latency = make_registry()
+        requests.inc(route="/a")
+        pool.set(4)
+        latency.observe(0.5)
+        live, dead = process_snapshot(registry), {**process_snapshot(registry), "pid": -1}
+
+        merged = merge_snapshots([live, dead], live_pids={live["pid"]})
+
+        assert merged["t_requests_total"]["values"] == {("/a",): 2.0}
+        assert merged["t_pool"]["values"] == {(): 4.0}
+        assert merged["t_latency_seconds"]["values"][()] == [0, 2, 0, 1.0]
+
+    def test_collect_reads_multiprocess_dir(self, tmp_path):
+        """Test a scrape writes this worker's snapshot and includes the other workers' files."""
+        other = {"pid": 2**22 + 1, "metrics": {"pista_errors_total": {
+            "kind": "counter", "help": "Errors.", "labelnames": ["error_type"], "buckets": [],
+            "values": [[["db"], 7.0]],
+        }}}
+        (tmp_path / "metrics_other.json").write_text(json.dumps(other))
+
+        merged = metrics.collect(str(tmp_path))
+
+        assert os.path.exists(tmp_path / f"metrics_{os.getpid()}.json")
+        assert merged["pista_errors_total"]["values"][("db",)] >= 7.0
+
+
+class TestRequestMetricsMiddleware:
+    """Tests for per-route request metrics."""
+
+    def test_requests_are_labelled_by_route_template(self):
+        """Test the route template, method and status label every request, including failures."""
+        app = FastAPI()
+        app.add_middleware(RequestMetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        def read_item(item_id: int):
+            return {"id": item_id}
+
+        client = TestClient(app)
+        before = metrics.HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200")
+        assert client.get("/items/1").status_code == 200
+        assert client.get("/items/2").status_code == 200
+        client.get("/missing")
+
+        assert metrics.HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200") == before + 2
+        assert metrics.HTTP_REQUESTS.value(method="GET", route="unmatched", status="404") >= 1
+        assert metrics.HTTP_REQUEST_DURATION.summary(method="GET", route="/items/{item_id}")["count"] >= 2
+
+
+class TestMonitoring:
+    """Tests for error counting and alerting."""
+
+    def test_alert_after_threshold_within_window(self, monkeypatch):
+        """Test errors are counted, alert once per cooldown and leave the window."""
+        alerts = []
+        monkeypatch.setattr(monitoring, "send_alert", lambda *args: alerts.append(args))
+        clock = [1000.0]
+        monkeypatch.setattr(monitoring.time, "time", lambda: clock[0])
+        monitoring.reset_error_counts()
+        before = metrics.ERRORS.value(error_type="test_db")
+
+        for _ in range(monitoring.ALERT_THRESHOLD + 1):
+            monitoring.record_error("test_db", "connection refused")
+        assert len(alerts) == 1
+        assert alerts[0][2] == monitoring.ALERT_THRESHOLD
+        assert metrics.ERRORS.value(error_type="test_db") == before + monitoring.ALERT_THRESHOLD + 1
+        assert monitoring.get_error_stats()["error_types"] == {"test_db": monitoring.ALERT_THRESHOLD + 1}
+
+        clock[0] += monitoring.ALERT_WINDOW_SECONDS + 1
+        assert monitoring.get_error_stats()["total_errors"] == 0
+        monitoring.reset_error_counts()
@@ -0,0 +1,48 @@
+"""
+Unit tests for cursor pagination helpers.
+"""
+from datetime import datetime
+
+import pytest
+
+from backend.pagination import MAX_PAGE_SIZE, clamp_limit, decode_cursor, encode_cursor, parse_fields
+
+
+class TestCursor:
+    """Tests for cursor encoding."""
+
+    def test_round_trip(self):
+        """Test a cursor decodes to the values it was built from."""
+        cursor = encode_cursor([datetime(2024, 5, 1, 12, 30), 42])
+        assert decode_cursor(cursor, 2) == ["2024-05-01T12:30:00", 42]
+
+    def test_null_sort_value(self):
+        """Test NULL sort keys survive the round trip."""
+        assert decode_cursor(encode_cursor([None, 7]), 2) == [None, 7]
+
+    @pytest.mark.parametrize("cursor", ["not base64!", encode_cursor([1]), encode_cursor({"a": 1})])
+    def test_malformed_cursor_raises(self, cursor):
+        """Test garbage or wrongly sized cursors are rejected."""
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, 2)
+
+
+class TestFieldsAndLimits:
+    """Tests for projection and page size parsing."""
+
+    def test_parse_fields_keeps_order_and_required(self):
+        """Test projection follows the allowed order and always includes required fields."""
+        allowed = ["game_id", "name", "thumbnail", "added_at"]
+        assert parse_fields("added_at, name", allowed, required=["game_id"]) == ["game_id", "name", "added_at"]
+        assert parse_fields(None, allowed) == allowed
+
+    def test_parse_fields_rejects_unknown(self):
+        """Test unknown fields raise instead of being silently dropped."""
+        with pytest.raises(ValueError):
+            parse_fields("name,password_hash", ["game_id", "name"])
+
+    def test_clamp_limit(self):
+        """Test page sizes are bounded."""
+        assert clamp_limit(10) == 10
+        assert clamp_limit(0) > 0
+        assert clamp_limit(10_000) == MAX_PAGE_SIZE
@@ -0,0 +1,52 @@
+"""
+Unit tests for the search stage spans and profiles.
+"""
+import logging
+import time
+
+from backend import profiling
+from backend.profiling import count_query, profiled, span, stage_snapshot
+
+
+class TestProfiling:
+    """Tests for spans, query counts and the slow-profile log."""
+
+    def test_spans_and_queries_in_profile(self):
+        """Test nested spans, per-stage query counts and nested profiles becoming spans."""
+        with profiled("outer") as profile:
+            count_query()
+            with span("fetch"):
+                count_query()
+                count_query()
+            with span("fetch"):
+                with profiled("inner") as inner:
+                    count_query()
+
+        summary = profile.summary()
+        assert inner is profile
+        assert summary["queries"] == 4
+        assert summary["stages"]["fetch"]["calls"] == 2
+        assert summary["stages"]["fetch"]["queries"] == 3
+        assert summary["stages"]["inner"]["queries"] == 1
+        assert stage_snapshot()["outer"]["count"] >= 1
+        # Outside a profile queries are not counted anywhere
+        count_query()
+        assert profile.queries == 4
+
+    def test_slow_profile_is_logged_with_samples(self, caplog, monkeypatch):
+        """Test a profile over the threshold logs its stages and the sampled stacks."""
+        monkeypatch.setattr(profiling, "PROFILE_SAMPLE_INTERVAL_MS", 1)
+        with caplog.at_level(logging.WARNING):
+            with profiled("slow_search", slow_ms=1) as profile:
+                with span("faiss_search"):
+                    time.sleep(0.05)
+            with profiled("fast_search", slow_ms=10_000):
+                pass
+
+        assert sum(profile.samples.values()) > 0
+        messages = [r.getMessage() for r in caplog.records if "Slow" in r.getMessage()]
+        assert len(messages) == 1
+        assert "Slow slow_search" in messages[0]
+        assert "faiss_search=" in messages[0]
+        # The sleeping test function is the innermost frame of the samples
+        assert "test_profiling.py" in messages[0]
@@ -0,0 +1,522 @@
+"""
+Unit tests for similarity engine helpers.
+"""
+import json
+
+import numpy as np
+import pytest
+
+from backend.similarity_engine import decode_embedding
+
+
+class TestDecodeEmbedding:
+    """Tests for decoding stored embeddings."""
+
+    def test_decode_binary_vector(self):
+        """Test decoding raw float32 bytes (as returned for a BYTEA column)."""
+        vec = np.array([0.5, -1.25, 3.0], dtype="float32")
+        decoded = decode_embedding(memoryview(vec.tobytes()), None)
+
+        assert decoded.dtype == np.float32
+        assert np.array_equal(decoded, vec)
+        # Must be writable so it can be normalized in place
+        decoded *= 2
+        assert decoded[0] == 1.0
+
+    def test_decode_legacy_json_vector(self):
+        """Test falling back to the JSON list when no binary vector is stored."""
+        decoded = decode_embedding(None, json.dumps([1.0, 2.0]))
+
+        assert decoded.dtype == np.float32
+        assert decoded.tolist() == [1.0, 2.0]
+
+    def test_binary_vector_takes_precedence(self):
+        """Test that the binary vector wins when both columns are populated."""
+        vec = np.array([9.0], dtype="float32")
+        decoded = decode_embedding(vec.tobytes(), json.dumps([1.0]))
+
+        assert decoded.tolist() == [9.0]
+
+
+class TestIndexDelta:
+    """Tests for patching an id-keyed FAISS index."""
+
+    def _index(self):
+        from backend.vector_index import build_id_index
+
+        vectors = np.eye(3, dtype="float32")
+        return build_id_index([10, 20, 30], vectors)
+
+    def test_search_labels_are_game_ids(self):
+        """Test that an id-keyed index returns BGG ids as labels."""
+        index = self._index()
+        _, labels = index.search(np.array([[0, 1, 0]], dtype="float32"), 1)
+
+        assert labels[0][0] == 20
+
+    def test_apply_delta_add_update_remove(self):
+        """Test adding, replacing and removing vectors in one delta."""
+        from backend.vector_index import apply_delta, index_ids
+
+        index = self._index()
+        upsert_ids = np.array([20, 40], dtype="int64")
+        upsert_vectors = np.array([[1, 0, 0], [0, 0, 1]], dtype="float32")
+        stats = apply_delta(index, upsert_ids, upsert_vectors, np.array([30], dtype="int64"))
+
+        assert stats["upserted"] == 2
+        assert stats["removed"] == 1
+        assert sorted(index_ids(index)) == [10, 20, 40]
+        _, labels = index.search(np.array([[0, 0, 1]], dtype="float32"), 1)
+        assert labels[0][0] == 40
+
+    def test_delta_round_trip(self, tmp_path):
+        """Test that a delta written to disk loads back unchanged."""
+        from backend.vector_index import load_delta, save_delta
+
+        path = str(tmp_path / "delta.npz")
+        save_delta(path, [5], np.ones((1, 3), dtype="float32"), [7, 8])
+        upsert_ids, upsert_vectors, remove_ids = load_delta(path)
+
+        assert upsert_ids.tolist() == [5]
+        assert upsert_vectors.shape == (1, 3)
+        assert remove_ids.tolist() == [7, 8]
+
+    def test_delta_versions(self, tmp_path):
+        """Test a delta only applies on top of the index version it was diffed against."""
+        from backend.similarity_engine import SimilarityEngine
+        from backend.vector_index import IndexVersionMismatch, build_id_index, load_delta_versions, save_delta
+
+        path = str(tmp_path / "delta.npz")
+        save_delta(path, [], np.zeros((0, 3), dtype="float32"), [30], base_version=4, target_version=5)
+        assert load_delta_versions(path) == (4, 5)
+        save_delta(path, [], np.zeros((0, 3), dtype="float32"), [30])
+        assert load_delta_versions(path) == (None, None)
+
+        engine = SimilarityEngine(None, build_id_index([10, 20, 30], np.eye(3, dtype="float32")), [10, 20, 30], 3)
+        with pytest.raises(IndexVersionMismatch):
+            engine.apply_index_delta(np.array([], dtype="int64"), np.zeros((0, 3)), np.array([30]), 4, 5)
+        assert engine.index_version == 3 and sorted(engine.id_map) == [10, 20, 30]
+
+        engine.apply_index_delta(np.array([], dtype="int64"), np.zeros((0, 3)), np.array([30]), 3, 4)
+        assert engine.index_version == 4 and sorted(engine.id_map) == [10, 20]
+
+    def test_manifest_versions(self, tmp_path):
+        """Test manifests round-trip their version and unversioned manifests read as version 0."""
+        from backend.vector_index import read_index_version, read_manifest, write_manifest
+
+        path = str(tmp_path / "game_vectors.manifest.json")
+        with open(path, "w") as f:
+            json.dump({"7": "abc"}, f)
+        assert read_manifest(path) == (0, {7: "abc"})
+
+        write_manifest(path, 2, {7: "def"})
+        assert read_manifest(path) == (2, {7: "def"})
+        assert read_index_version(str(tmp_path / "missing.json")) is None
+
+    def test_engine_converts_legacy_index(self):
+        """Test that a positional IndexFlatIP is converted when a delta is applied."""
+        import faiss
+        from backend.similarity_engine import SimilarityEngine
+
+        legacy = faiss.IndexFlatIP(3)
+        legacy.add(np.eye(3, dtype="float32"))
+        engine = SimilarityEngine(None, legacy, [10, 20, 30])
+        engine.apply_index_delta(np.array([], dtype="int64"), np.zeros((0, 3), dtype="float32"), np.array([10]))
+
+        assert sorted(engine.id_map) == [20, 30]
+        assert 10 not in engine._id_to_index
+
+
+class TestIndexReplace:
+    """Tests for swapping a reloaded index into a running engine."""
+
+    def test_replace_index_swaps_state_atomically(self):
+        """Test that index, id map and reverse lookup change together."""
+        from backend.similarity_engine import SimilarityEngine
+        from backend.vector_index import build_id_index
+
+        engine = SimilarityEngine(None, build_id_index([1, 2], np.eye(2, dtype="float32")), [1, 2])
+        old_state = engine._state
+        engine.replace_index(build_id_index([7, 8, 9], np.eye(3, dtype="float32")), [7, 8, 9])
+
+        assert engine.id_map.tolist() == [7, 8, 9]
+        assert engine._id_to_index[9] == 2
+        assert 1 not in engine._id_to_index
+        assert engine.index.ntotal == 3
+        # The previous state object is untouched for searches still holding it
+        assert old_state.id_map.tolist() == [1, 2]
+
+    @pytest.fixture
+    def attribute_loads(self, monkeypatch):
+        from backend import similarity_engine
+
+        loads = []
+
+        def load(id_map):
+            loads.append(id_map.tolist())
+            return ("columns", len(loads))
+
+        monkeypatch.setattr(similarity_engine, "load_game_attributes", load)
+        return loads
+
+    def test_attribute_columns_are_swapped_in_with_the_index(self, attribute_loads):
+        """Test replace_index and deltas build the columns for the new id_map before the swap."""
+        from backend.similarity_engine import SimilarityEngine
+        from backend.vector_index import build_id_index
+
+        engine = SimilarityEngine(None, build_id_index([1, 2], np.eye(2, dtype="float32")), [1, 2], 1)
+        assert attribute_loads == []
+        engine.replace_index(build_id_index([7, 8, 9], np.eye(3, dtype="float32")), [7, 8, 9], 2)
+        assert engine.game_attributes() == (engine.id_map, ("columns", 1))
+
+        engine.apply_index_delta(np.array([], dtype="int64"), np.zeros((0, 3)), np.array([9]), 2, 3)
+        assert attribute_loads == [[7, 8, 9], [7, 8]]
+        assert engine.game_attributes()[1] == ("columns", 2)
+
+    def test_stale_columns_are_served_while_rebuilt_in_background(self, attribute_loads, monkeypatch):
+        """Test expired columns are returned as they are and refreshed off the calling thread."""
+        import threading
+
+        from backend import similarity_engine
+        from backend.vector_index import build_id_index
+
+        engine = similarity_engine.SimilarityEngine(None, build_id_index([1, 2], np.eye(2, dtype="float32")), [1, 2])
+        # Never built: a script's engine builds them on first use
+        assert engine.game_attributes()[1] == ("columns", 1)
+        monkeypatch.setattr(similarity_engine, "GAME_ATTRIBUTES_TTL_SECONDS", 0)
+        release = threading.Event()
+        monkeypatch.setattr(similarity_engine, "load_game_attributes", lambda id_map: release.wait(5) and ("columns", 2))
+
+        assert engine.game_attributes()[1] == ("columns", 1)
+        assert engine.game_attributes()[1] == ("columns", 1)  # one refresh at a time
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == "game-attributes":
+                thread.join(5)
+        assert engine._state.attributes == ("columns", 2)
+
+    def test_refresh_for_a_replaced_index_is_dropped(self, attribute_loads, monkeypatch):
+        """Test columns built for an id_map that was swapped out meanwhile are not installed."""
+        from backend import similarity_engine
+        from backend.vector_index import build_id_index
+
+        engine = similarity_engine.SimilarityEngine(None, build_id_index([1, 2], np.eye(2, dtype="float32")), [1, 2])
+
+        def load_while_replaced(id_map):
+            monkeypatch.setattr(similarity_engine, "load_game_attributes", lambda new_id_map: ("columns", "new"))
+            engine.replace_index(build_id_index([7], np.eye(1, dtype="float32")), [7])
+            return ("columns", "old")
+
+        monkeypatch.setattr(similarity_engine, "load_game_attributes", load_while_replaced)
+        assert not engine.refresh_attributes()
+        assert engine.game_attributes() == (engine.id_map, ("columns", "new"))
+
+
+class TestIndexLoading:
+    """Tests for loading a memory-mapped index from disk."""
+
+    def test_load_index_mmap_shares_vector_storage(self, tmp_path):
+        """Test that the vectors and the id lookup of an exported index are file-backed, not private copies."""
+        import faiss
+        from backend.similarity_engine import SimilarityEngine
+        from backend.vector_index import build_id_index, load_id_lookup, load_index, save_id_array
+
+        index_path = str(tmp_path / "game_vectors.index")
+        id_map_path = str(tmp_path / "game_ids.json")
+        faiss.write_index(build_id_index([3, 1, 2], np.eye(3, dtype="float32")), index_path)
+        save_id_array(id_map_path, [3, 1, 2])
+
+        index, id_map = load_index(index_path, id_map_path, mmap=True)
+        lookup = load_id_lookup(id_map_path, id_map, mmap=True)
+
+        if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+            assert not faiss.downcast_index(index.index).codes.is_owned
+        assert isinstance(id_map, np.memmap)
+        assert isinstance(lookup._sorted, np.memmap) and isinstance(lookup._order, np.memmap)
+        assert lookup[2] == 2 and 4 not in lookup
+        _, labels = index.search(np.array([[0, 0, 1]], dtype="float32"), 1)
+        assert labels[0][0] == 2
+
+        # Deltas patch a private copy; the mapped file is read-only
+        engine = SimilarityEngine(None, index, id_map, None, lookup)
+        engine.apply_index_delta(np.array([4], dtype="int64"), np.eye(3, dtype="float32")[:1], np.array([3]))
+        assert sorted(engine.id_map) == [1, 2, 4]
+        assert index.ntotal == 3
+
+    def test_stale_id_lookup_is_ignored(self, tmp_path):
+        """Test a lookup file that does not match the id array falls back to an in-memory lookup."""
+        from backend.vector_index import load_id_lookup, save_id_array
+
+        id_map_path = str(tmp_path / "game_ids.json")
+        save_id_array(id_map_path, [3, 1, 2])
+
+        assert load_id_lookup(id_map_path, np.array([3, 1, 5], dtype="int64")) is None
+        assert load_id_lookup(str(tmp_path / "other.json"), np.array([3], dtype="int64")) is None
+
+    def test_load_legacy_index_from_json(self, tmp_path):
+        """Test that a positional index with only game_ids.json still loads."""
+        import json
+        import faiss
+        from backend.vector_index import load_index
+
+        index_path = str(tmp_path / "game_vectors.index")
+        id_map_path = str(tmp_path / "game_ids.json")
+        legacy = faiss.IndexFlatIP(2)
+        legacy.add(np.eye(2, dtype="float32"))
+        faiss.write_index(legacy, index_path)
+        with open(id_map_path, "w") as f:
+            json.dump([11, 12], f)
+
+        index, id_map = load_index(index_path, id_map_path, mmap=False)
+
+        assert id_map.tolist() == [11, 12]
+        assert index.ntotal == 2
+
+    def test_id_lookup(self):
+        """Test the array-backed id -> row lookup."""
+        from backend.vector_index import IdLookup
+
+        lookup = IdLookup(np.array([50, 10, 30], dtype="int64"))
+
+        assert lookup[10] == 1
+        assert lookup.get(30) == 2
+        assert lookup.get(99) is None
+        assert 50 in lookup
+        assert "x" not in lookup
+        assert len(lookup) == 3
+
+    def test_id_lookup_rows(self):
+        """Test the vectorized id -> index row lookup used to gather game attribute columns."""
+        from backend.vector_index import IdLookup
+
+        lookup = IdLookup([30, 10, 20])
+
+        assert lookup.rows([10, 30, 99]).tolist() == [1, 0, -1]
+        assert IdLookup([]).rows([5]).tolist() == [-1]
+
+
+class TestAdaptiveOverfetch:
+    """Tests for widening the index search until enough candidates survive the filters."""
+
+    def _engine(self, monkeypatch):
+        import faiss
+
+        from backend import similarity_engine
+        from backend.game_attributes import GameAttributes
+
+        # Game i sits at angle 0.02 * i, so neighbours of game 1 come back in id order
+        angles = 0.02 * np.arange(1, 51)
+        vectors = np.stack([np.cos(angles), np.sin(angles)], axis=1).astype("float32")
+        index = faiss.IndexFlatIP(2)
+        index.add(vectors)
+        engine = similarity_engine.SimilarityEngine(None, index, np.arange(1, 51, dtype="int64"))
+
+        class FakeCursor:
+            def fetchone(self):
+                return ("Game", None, None, 0, None, None, None, 2, 4, None, None, True, None, None, None, None)
+
+            def fetchall(self):
+                return []
+
+        monkeypatch.setattr(engine, "_ensure_connection", lambda: None)
+        monkeypatch.setattr(engine, "_fetch_embedding", lambda game_id: vectors[0].copy())
+        monkeypatch.setattr(similarity_engine, "execute_query", lambda conn, query, params=None: FakeCursor())
+
+        class FakeBitmaps:
+            def value_mask(self, game_ids, required=None, excluded=None):
+                # Games 2-40 are all in the excluded family
+                return np.asarray(game_ids) > 40
+
+        monkeypatch.setattr(similarity_engine, "get_bitmap_index", lambda: FakeBitmaps())
+        empty_columns = GameAttributes(*(np.zeros(0) for _ in GameAttributes._fields))
+        monkeypatch.setattr(similarity_engine, "load_game_attributes", lambda id_map: empty_columns)
+        monkeypatch.setattr(similarity_engine, "SEARCH_PASS_RATES", similarity_engine.PassRateStats())
+        return engine, similarity_engine.SEARCH_PASS_RATES
+
+    def _search(self, engine, adaptive):
+        results = engine.search_similar(
+            1, top_k=3, explain=False, excluded_feature_values={"families": {"excluded"}}, adaptive=adaptive
+        )
+        return [r["game_id"] for r in results]
+
+    def test_search_widens_until_top_k_survive(self, monkeypatch):
+        """Test the search is widened past the fixed 10x over-fetch and the pass rate is recorded."""
+        engine, pass_rates = self._engine(monkeypatch)
+
+        assert self._search(engine, adaptive=False) == []
+        assert self._search(engine, adaptive=True) == [41, 42, 43]
+        stats = pass_rates.snapshot()["excluded_families"]
+        assert stats["searches"] == 2
+        assert stats["survivors"] == 10
+
+    def test_initial_k_follows_pass_rate(self):
+        """Test the first k falls back to the fixed heuristic and then tracks the observed pass rate."""
+        from backend.similarity_engine import PassRateStats
+
+        stats = PassRateStats()
+        assert stats.initial_k("collection", top_k=10, default_k=100, limit=5000) == 100
+
+        stats.record("collection", examined=100, survivors=50)
+        assert stats.initial_k("collection", top_k=10, default_k=100, limit=5000) == 26
+        stats.record("collection", examined=100, survivors=0)
+        assert stats.rate("collection") == 0.4
+        assert stats.initial_k("collection", top_k=10, default_k=100, limit=20) == 20
+
+
+class TestTwoStageSearch:
+    """Tests for scoring every candidate in bulk and explaining only the top_k."""
+
+    def test_only_top_k_are_hydrated_and_explained(self, monkeypatch):
+        """Test filters and meta scores run on arrays and only the returned games are loaded."""
+        import faiss
+
+        from backend import similarity_engine
+        from backend.game_attributes import GameAttributes
+        from backend.meta_scoring import feature_sets
+        from backend.tests.unit.test_collection_analysis import make_incidence
+
+        incidence = make_incidence()
+        index = faiss.IndexFlatIP(2)
+        vectors = np.array([[1, 0], [0.8, 0.6], [0.6, 0.8], [0, 1]], dtype="float32")
+        index.add(vectors)
+        engine = similarity_engine.SimilarityEngine(None, index, np.array([10, 2, 3, 1], dtype="int64"))
+        hydrated = []
+
+        def hydrate(gid, sim):
+            hydrated.append(gid)
+            return {"game_id": gid, "name": f"Game {gid}", "num_ratings": 0, "embedding_similarity": float(sim)}
+
+        monkeypatch.setattr(engine, "_ensure_connection", lambda: None)
+        monkeypatch.setattr(engine, "_fetch_embedding", lambda game_id: vectors[0].copy())
+        monkeypatch.setattr(engine, "_hydrate_candidate", hydrate)
+        monkeypatch.setattr(similarity_engine, "get_incidence", lambda: incidence)
+        monkeypatch.setattr(similarity_engine, "get_game_features", lambda conn, gid: feature_sets(incidence, gid))
+        empty_columns = GameAttributes(*(np.zeros(0) for _ in GameAttributes._fields))
+        monkeypatch.setattr(similarity_engine, "load_game_attributes", lambda id_map: empty_columns)
+        monkeypatch.setattr(similarity_engine, "SEARCH_PASS_RATES", similarity_engine.PassRateStats())
+
+        results = engine.search_similar(10, top_k=1, include_features=["mechanics"], adaptive=True)
+
+        # Game 2 is nearer but shares no mechanics; game 3 shares all of them (meta score 1.0)
+        assert hydrated == [3]
+        assert results[0]["game_id"] == 3
+        assert results[0]["meta_similarity_score"] == 1.0
+        assert results[0]["final_score"] == pytest.approx(0.8 * 0.6 + 0.2)
+        assert results[0]["shared_mechanics"] == ["Alpha", "Beta", "Gamma"]
+        assert "reason_summary" in results[0]
+
+
+class TestMultiGameSearch:
+    """Tests for combining several seed games into one query vector."""
+
+    def test_combine_query_vector(self):
+        """Test positives add, negatives subtract and the result is normalized."""
+        from backend.similarity_engine import combine_query_vector
+
+        a, b = np.array([1.0, 0.0]), np.array([0.0, 1.0])
+        query = combine_query_vector([(a, 1.0), (b, 1.0)], [(b, 0.5)])
+
+        assert query.shape == (1, 2)
+        assert query.dtype == np.float32
+        assert np.allclose(query[0], np.array([1.0, 0.5]) / np.linalg.norm([1.0, 0.5]))
+        assert np.allclose(combine_query_vector([(a, 1.0)], centroid=np.array([0.0, 4.0]), centroid_weight=1.0)[0], [0.5**0.5] * 2)
+        with pytest.raises(ValueError):
+            combine_query_vector([(a, 1.0)], [(a, 1.0)])
+
+    def test_search_multi_excludes_seeds(self, monkeypatch):
+        """Test "like 1 and 5 but not 2" searches once, between the positives and away from the negative."""
+        import faiss
+
+        from backend import similarity_engine
+        from backend.game_attributes import GameAttributes
+
+        angles = np.radians([0, 30, 45, 60, 90])
+        vectors = np.stack([np.cos(angles), np.sin(angles)], axis=1).astype("float32")
+        index = faiss.IndexFlatIP(2)
+        index.add(vectors)
+        engine = similarity_engine.SimilarityEngine(None, index, np.arange(1, 6, dtype="int64"))
+        searched = []
+
+        def fetch_embeddings(game_ids):
+            return {gid: vectors[gid - 1].copy() for gid in game_ids if gid != 99}
+
+        def hydrate(gid, sim):
+            return {"game_id": gid, "name": f"Game {gid}", "num_ratings": 0, "embedding_similarity": float(sim)}
+
+        monkeypatch.setattr(engine, "_ensure_connection", lambda: None)
+        monkeypatch.setattr(engine, "_fetch_embeddings", fetch_embeddings)
+        monkeypatch.setattr(engine, "_fetch_embedding", lambda game_id: searched.append(game_id))
+        monkeypatch.setattr(engine, "_hydrate_candidate", hydrate)
+        empty_columns = GameAttributes(*(np.zeros(0) for _ in GameAttributes._fields))
+        monkeypatch.setattr(similarity_engine, "load_game_attributes", lambda id_map: empty_columns)
+        monkeypatch.setattr(similarity_engine, "SEARCH_PASS_RATES", similarity_engine.PassRateStats())
+
+        results = engine.search_multi([1, 5, 99], negative=[2], top_k=2, explain=False, adaptive=True)
+
+        # (1, 0) + (0, 1) - 0.5 * (cos 30, sin 30) points at ~53 degrees: game 4 (60) before game 3 (45)
+        assert [r["game_id"] for r in results] == [4, 3]
+        assert searched == []  # the anchor's own embedding is never searched
+        with pytest.raises(ValueError):
+            engine.search_multi([99])
+
+
+class TestBatchSearch:
+    """Tests for batch index searches and the precomputed neighbour lookup."""
+
+    def _engine(self, monkeypatch):
+        import faiss
+
+        from backend import similarity_engine
+
+        angles = np.radians([0, 30, 45, 60, 90])
+        vectors = np.stack([np.cos(angles), np.sin(angles)], axis=1).astype("float32")
+        index = faiss.IndexFlatIP(2)
+        index.add(vectors)
+        engine = similarity_engine.SimilarityEngine(None, index, np.arange(1, 6, dtype="int64"))
+        monkeypatch.setattr(engine, "_ensure_connection", lambda: None)
+        monkeypatch.setattr(
+            engine, "_fetch_embeddings", lambda game_ids: {g: vectors[g - 1].copy() for g in game_ids if g != 99}
+        )
+        return engine
+
+    def test_search_batch(self, monkeypatch):
+        """Test every query game gets its nearest neighbours, without itself or games lacking embeddings."""
+        engine = self._engine(monkeypatch)
+
+        neighbors = engine.search_batch([1, 3, 99], top_k=2)
+
+        assert set(neighbors) == {1, 3}
+        assert neighbors[1][0].tolist() == [2, 3]
+        assert sorted(neighbors[3][0].tolist()) == [2, 4]
+        assert neighbors[1][1][0] == pytest.approx(np.cos(np.radians(30)))
+        assert engine.search_batch([5], top_k=1, include_self=True)[5][0].tolist() == [5]
+
+    def test_unfiltered_search_uses_precomputed_neighbors(self, monkeypatch):
+        """Test plain searches read the game_neighbors table and filtered ones search the index."""
+        from backend import similarity_engine
+        from backend.game_attributes import GameAttributes
+
+        engine = self._engine(monkeypatch)
+        lookups = []
+
+        def precomputed(game_id, limit, index_version):
+            lookups.append((game_id, limit, index_version))
+            return np.array([0.9, 0.8, 0.7, 0.6], dtype="float32"), [5, 4, 3, 2]
+
+        def hydrate(gid, sim):
+            return {"game_id": gid, "name": f"Game {gid}", "num_ratings": 0, "embedding_similarity": float(sim)}
+
+        monkeypatch.setattr(engine, "_precomputed_neighbors", precomputed)
+        monkeypatch.setattr(engine, "_fetch_embedding", lambda game_id: np.array([1.0, 0.0], dtype="float32"))
+        monkeypatch.setattr(engine, "_hydrate_candidate", hydrate)
+        empty_columns = GameAttributes(*(np.zeros(0) for _ in GameAttributes._fields))
+        monkeypatch.setattr(similarity_engine, "load_game_attributes", lambda id_map: empty_columns)
+        monkeypatch.setattr(similarity_engine, "SEARCH_PASS_RATES", similarity_engine.PassRateStats())
+
+        plain = engine.search_similar(1, top_k=2, explain=False)
+        assert [r["game_id"] for r in plain] == [5, 4]
+        assert lookups == [(1, 4, None)]
+
+        constrained = engine.search_similar(1, top_k=2, explain=False, constraints={"playtime": {}}, adaptive=False)
+        assert [r["game_id"] for r in constrained] == [2, 3]
+        assert lookups == [(1, 4, None)]
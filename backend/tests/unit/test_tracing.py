@@ -0,0 +1,82 @@
+"""
+Unit tests for request tracing and the slow request / slow query logs.
+"""
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import tracing
+from backend.middleware import RequestTracingMiddleware
+from backend.tracing import current_request_id, normalize_sql, record_query, request_id_from, traced_request
+
+
+class TestTracing:
+    """Tests for SQL normalization, per-request DB time and the slow logs."""
+
+    def test_normalize_sql_redacts_literals(self):
+        """Test literals, placeholders and value lists are replaced and whitespace collapsed."""
+        query = """SELECT name FROM games  -- lookup
+                   WHERE id IN (1, 2, 3) AND name = 'Azul''s' AND rank > %s AND t1.x = -2.5"""
+        assert normalize_sql(query) == "SELECT name FROM games WHERE id IN (?, ...) AND name = ? AND rank > ? AND t1.x = ?"
+        assert normalize_sql("INSERT INTO t (a, b) VALUES (%(a)s, %(b)s)") == "INSERT INTO t (a, b) VALUES (?, ...)"
+
+    def test_request_id_from(self):
+        """Test well-formed client IDs are kept and anything else is replaced."""
+        assert request_id_from("abc-123") == "abc-123"
+        generated = request_id_from("bad id\nwith newline")
+        assert generated != "bad id\nwith newline" and len(generated) == 32
+        assert request_id_from(None) != request_id_from(None)
+
+    def test_slow_request_lists_repeated_statements(self, monkeypatch, caplog):
+        """Test a slow request is logged with its DB time and its N+1 statement first."""
+        monkeypatch.setattr(tracing, "SLOW_REQUEST_MS", 0.001)
+        monkeypatch.setattr(tracing, "SLOW_QUERY_MS", 0)
+        with caplog.at_level(logging.WARNING, logger="pista"):
+            with traced_request("req-1", "GET", "/games/7/similar") as trace:
+                assert current_request_id() == "req-1"
+                record_query("SELECT * FROM games WHERE id = 7", 0.002)
+                for gid in range(5):
+                    record_query(f"SELECT name FROM mechanics WHERE game_id = {gid}", 0.001)
+        assert current_request_id() is None
+
+        assert trace.queries == 6
+        assert abs(trace.db_seconds - 0.007) < 1e-9
+        message = caplog.records[-1].getMessage()
+        assert message.startswith("Slow request [req-1] GET /games/7/similar")
+        assert "db 7.0ms in 6 queries" in message
+        assert message.split("\n")[1].strip() == "5x 5.0ms SELECT name FROM mechanics WHERE game_id = ?"
+
+    def test_slow_query_is_logged_without_params(self, monkeypatch, caplog):
+        """Test only statements over the threshold are logged, normalized."""
+        monkeypatch.setattr(tracing, "SLOW_QUERY_MS", 50)
+        with caplog.at_level(logging.WARNING, logger="pista"):
+            record_query("SELECT * FROM users WHERE email = 'a@b.c'", 0.01)
+            record_query("SELECT * FROM users WHERE email = 'a@b.c'", 0.2)
+        messages = [record.getMessage() for record in caplog.records]
+        assert messages == ["Slow query: 200.0ms SELECT * FROM users WHERE email = ?"]
+
+
+class TestRequestTracingMiddleware:
+    """Tests for the request ID and tracing of endpoints."""
+
+    def test_request_id_header_and_sync_endpoint_trace(self):
+        """Test the ID is echoed or generated and a sync endpoint's queries reach the request trace."""
+        app = FastAPI()
+        app.add_middleware(RequestTracingMiddleware)
+        traces = []
+
+        @app.get("/ping")
+        def ping():
+            record_query("SELECT 1", 0.001)
+            traces.append(tracing.current_trace())
+            return {"request_id": current_request_id()}
+
+        client = TestClient(app)
+        response = client.get("/ping", headers={"X-Request-ID": "client-42"})
+        assert response.headers["x-request-id"] == "client-42"
+        assert response.json() == {"request_id": "client-42"}
+        assert traces[0].queries == 1
+
+        generated = client.get("/ping").headers["x-request-id"]
+        assert generated and generated != "client-42"
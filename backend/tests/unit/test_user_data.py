@@ -0,0 +1,66 @@
+"""
+Unit tests for the streamed user data export.
+"""
+import json
+
+import pytest
+
+from backend import user_data
+
+USER_ROW = (7, "a@example.com", "alice", None, None, False, "2024-01-01 10:00:00")
+
+
+class TestUserExport:
+    """Tests for the JSON produced by stream_user_export."""
+
+    @pytest.fixture(autouse=True)
+    def fake_queries(self, monkeypatch):
+        self.rows = {
+            user_data.QUERY_EXPORT_COLLECTION: [(1, "Catan", 1995, "2024-02-01", 8)],
+            user_data.QUERY_EXPORT_CHAT: [],
+            user_data.QUERY_EXPORT_FEEDBACK: [],
+            user_data.QUERY_EXPORT_SCORING: [(3, 1, 2, '{"round": 1}', 42, None, None)],
+        }
+        self.unpack_calls = []
+
+        def fake_unpack(conn, raw_values):
+            raw_values = list(raw_values)
+            self.unpack_calls.append(len(raw_values))
+            return [{"raw": raw} if raw else None for raw in raw_values]
+
+        monkeypatch.setattr(user_data, "stream_query", lambda conn, query, params: iter(self.rows[query]))
+        monkeypatch.setattr(user_data, "unpack_metadata", fake_unpack)
+
+    def _export(self):
+        return json.loads("".join(user_data.stream_user_export(None, USER_ROW)))
+
+    def test_document_shape(self):
+        """Test the streamed chunks form the same document the export always returned."""
+        data = self._export()
+
+        assert data["id"] == 7
+        assert data["email"] == "a@example.com"
+        assert data["collection"] == [
+            {"game_id": 1, "game_name": "Catan", "year_published": 1995, "added_at": "2024-02-01", "personal_rating": 8.0}
+        ]
+        assert data["chat_threads"] == []
+        assert data["feedback_responses"] == []
+        assert data["scoring_sessions"][0]["intermediate_scores"] == {"round": 1}
+
+    def test_threads_group_messages_in_chunks(self, monkeypatch):
+        """Test messages are grouped under their thread and metadata is rehydrated per chunk."""
+        monkeypatch.setattr(user_data, "EXPORT_MESSAGE_CHUNK", 2)
+        self.rows[user_data.QUERY_EXPORT_CHAT] = [
+            (20, "Newer", "t2", "t2", 5, "user", "hi", None, "m"),
+            (20, "Newer", "t2", "t2", 6, "assistant", "hello", "meta6", "m"),
+            (20, "Newer", "t2", "t2", 7, "user", "more", None, "m"),
+            (10, "Empty", "t1", "t1", None, None, None, None, None),
+        ]
+
+        threads = self._export()["chat_threads"]
+
+        assert [t["thread_id"] for t in threads] == [20, 10]
+        assert [m["message_id"] for m in threads[0]["messages"]] == [5, 6, 7]
+        assert threads[0]["messages"][1]["metadata"] == {"raw": "meta6"}
+        assert threads[1]["messages"] == []
+        assert self.unpack_calls == [2, 1]
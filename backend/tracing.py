@@ -0,0 +1,141 @@
+# backend/tracing.py
+"""
+Per-request tracing: a request ID, database time and query count for every request.
+
+RequestTracingMiddleware (backend/middleware.py) starts a trace for each HTTP request
+and keeps it in a contextvar. Sync endpoints run in a worker thread, but that thread
+gets a copy of the context, so they still see the trace. execute_query calls
+record_query for every statement, which adds its time to the current trace.
+
+Two logs use the thresholds in config (0 disables either):
+- a statement slower than SLOW_QUERY_MS is logged on its own;
+- a request slower than SLOW_REQUEST_MS is logged with its DB time, query count and
+  its most frequent statements. N+1 patterns (one query per candidate game) show up
+  there as one statement run dozens of times.
+
+SQL is logged normalized: literals become ?, whitespace is collapsed and parameters are
+never logged.
+"""
+import contextvars
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from backend.config import SLOW_QUERY_MS, SLOW_REQUEST_MS
+from backend.logger_config import logger
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Statements listed in the slow-request log
+SLOW_REQUEST_TOP_STATEMENTS = 3
+MAX_LOGGED_SQL_LENGTH = 300
+
+# Incoming request IDs are echoed only when they look like an ID
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+_SQL_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_SQL_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_SQL_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(query: str) -> str:
+    """Query text with literals and placeholders as ?, value lists as (?, ...) and whitespace collapsed."""
+    sql = _SQL_COMMENT.sub(" ", query)
+    sql = _SQL_STRING.sub("?", sql)
+    sql = _SQL_PLACEHOLDER.sub("?", sql)
+    sql = _SQL_NUMBER.sub("?", sql)
+    sql = _SQL_VALUE_LIST.sub("(?, ...)", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    if len(sql) > MAX_LOGGED_SQL_LENGTH:
+        sql = sql[:MAX_LOGGED_SQL_LENGTH] + "..."
+    return sql
+
+
+def request_id_from(value: Optional[str]) -> str:
+    """The client's request ID when it is well-formed, else a new one."""
+    if value and _VALID_REQUEST_ID.match(value):
+        return value
+    return uuid.uuid4().hex
+
+
+class RequestTrace:
+    """Database time and statements of one request."""
+
+    def __init__(self, request_id: str, method: str = "", path: str = ""):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+        self.queries = 0
+        self.db_seconds = 0.0
+        # Raw query text -> [calls, seconds]; normalized only when logged
+        self.statements: Dict[str, List[float]] = {}
+
+    def add_query(self, query: str, seconds: float) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        totals = self.statements.get(query)
+        if totals is None:
+            totals = self.statements[query] = [0, 0.0]
+        totals[0] += 1
+        totals[1] += seconds
+
+    def top_statements(self, limit: int = SLOW_REQUEST_TOP_STATEMENTS) -> List[Dict[str, object]]:
+        """Most frequent normalized statements, with their calls and total time."""
+        merged: Dict[str, List[float]] = {}
+        for query, (calls, seconds) in self.statements.items():
+            totals = merged.setdefault(normalize_sql(query), [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+        ranked = sorted(merged.items(), key=lambda item: (-item[1][0], -item[1][1]))[:limit]
+        return [{"sql": sql, "calls": int(calls), "ms": round(seconds * 1000, 3)} for sql, (calls, seconds) in ranked]
+
+
+_CURRENT_TRACE: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _CURRENT_TRACE.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _CURRENT_TRACE.get()
+    return trace.request_id if trace is not None else None
+
+
+def record_query(query: str, seconds: float) -> None:
+    """Called by execute_query after every statement."""
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add_query(query, seconds)
+    if SLOW_QUERY_MS > 0 and seconds * 1000 >= SLOW_QUERY_MS:
+        request = f" [{trace.request_id}]" if trace is not None else ""
+        logger.warning(f"Slow query{request}: {seconds * 1000:.1f}ms {normalize_sql(query)}")
+
+
+@contextmanager
+def traced_request(request_id: str, method: str = "", path: str = "") -> Iterator[RequestTrace]:
+    """Trace a request; logs it when slower than SLOW_REQUEST_MS."""
+    trace = RequestTrace(request_id, method, path)
+    token = _CURRENT_TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.elapsed = time.perf_counter() - trace.started
+        _CURRENT_TRACE.reset(token)
+        if SLOW_REQUEST_MS > 0 and trace.elapsed * 1000 >= SLOW_REQUEST_MS:
+            _log_slow_request(trace)
+
+
+def _log_slow_request(trace: RequestTrace) -> None:
+    message = (
+        f"Slow request [{trace.request_id}] {trace.method} {trace.path}: {trace.elapsed * 1000:.1f}ms, "
+        f"db {trace.db_seconds * 1000:.1f}ms in {trace.queries} queries"
+    )
+    for statement in trace.top_statements():
+        message += f"\n  {statement['calls']}x {statement['ms']:.1f}ms {statement['sql']}"
+    logger.warning(message)
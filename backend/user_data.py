@@ -0,0 +1,183 @@
+# backend/user_data.py
+"""
+Account deletion and GDPR data export.
+
+Every user-owned table references users(id) with ON DELETE CASCADE (chat messages
+cascade through chat_threads) or ON DELETE SET NULL, so deleting an account is a
+single DELETE on users.
+
+The export is the same JSON document /profile/export-data always returned. It is
+now written incrementally from server-side cursors: chat messages are read in one
+ordered pass and their metadata is rehydrated in chunks, so memory stays bounded
+for very active accounts.
+"""
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.chat_metadata import unpack_metadata
+from backend.db import execute_query, stream_query
+
+QUERY_DELETE_USER = "DELETE FROM users WHERE id = %s RETURNING id, email"
+QUERY_EXPORT_USER = "SELECT id, email, username, bgg_id, oauth_provider, is_admin, created_at FROM users WHERE id = %s"
+QUERY_EXPORT_COLLECTION = """SELECT uc.game_id, g.name, g.year_published, uc.added_at, uc.personal_rating
+                             FROM user_collections uc
+                             JOIN games g ON uc.game_id = g.id
+                             WHERE uc.user_id = %s
+                             ORDER BY uc.added_at DESC"""
+# Threads newest first, each followed by its messages in order (threads without messages give one NULL row)
+QUERY_EXPORT_CHAT = """SELECT t.id, t.title, t.created_at, t.updated_at,
+                              m.id, m.role, m.message, m.metadata, m.created_at
+                       FROM chat_threads t
+                       LEFT JOIN chat_messages m ON m.thread_id = t.id
+                       WHERE t.user_id = %s
+                       ORDER BY t.created_at DESC, t.id, m.created_at ASC, m.id"""
+QUERY_EXPORT_FEEDBACK = """SELECT fr.id, fr.question_id, fr.option_id, fr.response, fr.context,
+                                  fr.thread_id, fr.created_at, fq.question_text
+                           FROM user_feedback_responses fr
+                           LEFT JOIN feedback_questions fq ON fr.question_id = fq.id
+                           WHERE fr.user_id = %s
+                           ORDER BY fr.created_at DESC"""
+QUERY_EXPORT_SCORING = """SELECT id, game_id, mechanism_id, intermediate_scores_json,
+                                 final_score, created_at, updated_at
+                          FROM user_scoring_sessions
+                          WHERE user_id = %s
+                          ORDER BY created_at DESC"""
+
+# Messages whose metadata is rehydrated together (one games/designers lookup per chunk)
+EXPORT_MESSAGE_CHUNK = 200
+
+
+def delete_user(conn, user_id: int) -> Optional[Tuple[int, str]]:
+    """Delete a user and, through the foreign keys, all their data; returns (id, email) or None if missing."""
+    cur = execute_query(conn, QUERY_DELETE_USER, (user_id,))
+    return cur.fetchone()
+
+
+def get_export_user(conn, user_id: int) -> Optional[tuple]:
+    cur = execute_query(conn, QUERY_EXPORT_USER, (user_id,))
+    return cur.fetchone()
+
+
+def _ts(value) -> Optional[str]:
+    return str(value) if value else None
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+def _json_array(items: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    yield "["
+    for i, item in enumerate(items):
+        yield ("," if i else "") + _dump(item)
+    yield "]"
+
+
+def _collection(conn, user_id: int) -> Iterator[Dict[str, Any]]:
+    for row in stream_query(conn, QUERY_EXPORT_COLLECTION, (user_id,)):
+        yield {
+            "game_id": row[0],
+            "game_name": row[1],
+            "year_published": row[2],
+            "added_at": _ts(row[3]),
+            "personal_rating": float(row[4]) if row[4] is not None else None,
+        }
+
+
+def _messages(conn, rows: List[tuple]) -> List[Dict[str, Any]]:
+    metadata = unpack_metadata(conn, [row[7] for row in rows])
+    return [
+        {
+            "message_id": row[4],
+            "role": row[5],
+            "message": row[6],
+            "metadata": message_metadata,
+            "created_at": _ts(row[8]),
+        }
+        for row, message_metadata in zip(rows, metadata)
+    ]
+
+
+def _chat_threads(conn, user_id: int) -> Iterator[str]:
+    """The chat_threads array, one thread at a time with its messages streamed in chunks."""
+    yield "["
+    current = None
+    pending: List[tuple] = []
+    written = 0  # messages already written for the current thread
+
+    def flush_messages():
+        nonlocal pending, written
+        if not pending:
+            return ""
+        parts = []
+        for message in _messages(conn, pending):
+            parts.append(("," if written else "") + _dump(message))
+            written += 1
+        pending = []
+        return "".join(parts)
+
+    for row in stream_query(conn, QUERY_EXPORT_CHAT, (user_id,)):
+        if row[0] != current:
+            if current is not None:
+                yield flush_messages() + "]}"
+            thread = {"thread_id": row[0], "title": row[1], "created_at": _ts(row[2]), "updated_at": _ts(row[3])}
+            yield ("," if current is not None else "") + _dump(thread)[:-1] + ',"messages":['
+            current, written = row[0], 0
+        if row[4] is not None:
+            pending.append(row)
+            if len(pending) >= EXPORT_MESSAGE_CHUNK:
+                yield flush_messages()
+    if current is not None:
+        yield flush_messages() + "]}"
+    yield "]"
+
+
+def _feedback_responses(conn, user_id: int) -> Iterator[Dict[str, Any]]:
+    for row in stream_query(conn, QUERY_EXPORT_FEEDBACK, (user_id,)):
+        yield {
+            "response_id": row[0],
+            "question_id": row[1],
+            "question_text": row[7],
+            "option_id": row[2],
+            "response": row[3],
+            "context": row[4],
+            "thread_id": row[5],
+            "created_at": _ts(row[6]),
+        }
+
+
+def _scoring_sessions(conn, user_id: int) -> Iterator[Dict[str, Any]]:
+    for row in stream_query(conn, QUERY_EXPORT_SCORING, (user_id,)):
+        yield {
+            "session_id": row[0],
+            "game_id": row[1],
+            "mechanism_id": row[2],
+            "intermediate_scores": json.loads(row[3]) if row[3] else None,
+            "final_score": float(row[4]) if row[4] is not None else None,
+            "created_at": _ts(row[5]),
+            "updated_at": _ts(row[6]),
+        }
+
+
+def stream_user_export(conn, user_row: tuple) -> Iterator[str]:
+    """JSON export of one user as text chunks; runs inside one transaction on conn."""
+    user_id = user_row[0]
+    header = {
+        "id": user_row[0],
+        "email": user_row[1],
+        "username": user_row[2],
+        "bgg_id": user_row[3],
+        "oauth_provider": user_row[4],
+        "is_admin": bool(user_row[5]),
+        "created_at": _ts(user_row[6]),
+    }
+    yield _dump(header)[:-1]
+    yield ',"collection":'
+    yield from _json_array(_collection(conn, user_id))
+    yield ',"chat_threads":'
+    yield from _chat_threads(conn, user_id)
+    yield ',"feedback_responses":'
+    yield from _json_array(_feedback_responses(conn, user_id))
+    yield ',"scoring_sessions":'
+    yield from _json_array(_scoring_sessions(conn, user_id))
+    yield "}"
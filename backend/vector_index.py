@@ -0,0 +1,311 @@
+"""
+FAISS index helpers: indexes keyed directly by BGG id and incremental deltas.
+
+Indexes written by update_utils/export_faiss.py are IndexIDMap2 wrappers around an
+IndexFlatIP, so search labels are BGG ids and single vectors can be added, removed
+or replaced in place. Older exports (plain IndexFlatIP with positional labels plus
+gen/game_ids.json) are still supported and converted on first patch.
+
+Every export bumps the version recorded in its manifest. A delta carries the version
+it was diffed against (base) and the one it produces (target); it only applies to an
+index at exactly its base version, so a skipped delta is detected instead of lost.
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from backend.logger_config import logger
+
+
+class IndexVersionMismatch(Exception):
+    """A delta was diffed against a different index version than the one loaded."""
+
+
+def is_id_index(index) -> bool:
+    """True if search labels from this index are BGG ids rather than row positions."""
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def build_id_index(ids: Iterable[int], vectors: np.ndarray) -> "faiss.IndexIDMap2":
+    """Build an inner-product index over L2-normalized vectors, labelled by BGG id."""
+    mat = np.ascontiguousarray(vectors, dtype="float32")
+    faiss.normalize_L2(mat)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(mat.shape[1]))
+    index.add_with_ids(mat, np.asarray(list(ids), dtype="int64"))
+    return index
+
+
+def index_ids(index, id_map: Optional[Iterable[int]] = None) -> np.ndarray:
+    """BGG ids stored in the index, in row order, as an int64 array."""
+    if is_id_index(index):
+        return faiss.vector_to_array(index.id_map).astype("int64", copy=False)
+    return np.asarray(list(id_map or []), dtype="int64")
+
+
+def id_array_path(id_map_path: str) -> str:
+    """Path of the .npy copy of the id map written next to game_ids.json."""
+    return os.path.splitext(id_map_path)[0] + ".npy"
+
+
+def id_lookup_path(id_map_path: str) -> str:
+    """Path of the sorted ids and their row order (IdLookup's arrays) written next to game_ids.json."""
+    return os.path.splitext(id_map_path)[0] + ".lookup.npy"
+
+
+def _save_npy(path: str, array: np.ndarray) -> None:
+    # Replace rather than overwrite so processes mapping the old array keep a valid file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def save_id_array(id_map_path: str, ids: Iterable[int]) -> None:
+    """Write the id map as JSON (legacy readers) and as .npy arrays (mmap-able) with its sorted lookup."""
+    ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype="int64")
+    with open(id_map_path, "w", encoding="utf-8") as f:
+        json.dump(ids.tolist(), f, ensure_ascii=False)
+    _save_npy(id_array_path(id_map_path), ids)
+    order = np.argsort(ids, kind="stable")
+    _save_npy(id_lookup_path(id_map_path), np.stack([ids[order], order]))
+
+
+def manifest_path(index_path: str) -> str:
+    """Path of the export manifest written next to the index file."""
+    return os.path.splitext(index_path)[0] + ".manifest.json"
+
+
+def read_manifest(path: str) -> Tuple[int, Dict[int, str]]:
+    """(version, {game_id: vector fingerprint}) of an export; unversioned manifests are version 0."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "fingerprints" not in data:
+        data = {"version": 0, "fingerprints": data}
+    return int(data["version"]), {int(gid): fp for gid, fp in data["fingerprints"].items()}
+
+
+def write_manifest(path: str, version: int, fingerprints: Dict[int, str]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "fingerprints": {str(gid): fp for gid, fp in fingerprints.items()}}, f)
+    os.replace(tmp_path, path)
+
+
+def read_index_version(path: str) -> Optional[int]:
+    """Version in the manifest at path, or None when there is no readable manifest."""
+    try:
+        return read_manifest(path)[0]
+    except (OSError, ValueError, KeyError) as e:
+        logger.debug(f"No index version from {path}: {e}")
+        return None
+
+
+def _read_index(index_path: str, mmap: bool):
+    if mmap:
+        # IO_FLAG_MMAP_IFC maps the flat vector storage itself, so the vectors stay in the
+        # page cache and are shared by every worker. Plain IO_FLAG_MMAP still copies
+        # IndexFlat codes into private memory; it is only the fallback for older FAISS.
+        flag_name = "IO_FLAG_MMAP_IFC" if hasattr(faiss, "IO_FLAG_MMAP_IFC") else "IO_FLAG_MMAP"
+        try:
+            index = faiss.read_index(index_path, getattr(faiss, flag_name))
+            logger.info(f"Loaded {index_path} with faiss.{flag_name}")
+            return index
+        except RuntimeError as e:
+            logger.warning(f"Could not mmap {index_path}, loading into memory instead: {e}")
+    return faiss.read_index(index_path)
+
+
+def owned_copy(index):
+    """
+    Copy of an index in private memory, safe to modify.
+
+    clone_index of a memory-mapped index still points at the read-only mapping, so the
+    index is serialized and read back instead.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def load_index(index_path: str, id_map_path: str, mmap: bool = True) -> Tuple[object, np.ndarray]:
+    """
+    Read a FAISS index and its BGG id list from disk.
+
+    With mmap=True the index vectors and the .npy id array are memory-mapped read-only,
+    so several uvicorn workers share one physical copy. The JSON id map is only read
+    when no .npy copy exists (older exports).
+    """
+    index = _read_index(index_path, mmap)
+    npy_path = id_array_path(id_map_path)
+    if os.path.exists(npy_path):
+        id_map = np.load(npy_path, mmap_mode="r" if mmap else None)
+    elif is_id_index(index):
+        id_map = index_ids(index)
+    else:
+        with open(id_map_path, "r", encoding="utf-8") as f:
+            id_map = np.asarray(json.load(f), dtype="int64")
+    if index.ntotal != len(id_map):
+        raise ValueError(f"{index_path} has {index.ntotal} vectors but the id map lists {len(id_map)} ids")
+    return index, id_map
+
+
+def load_id_lookup(id_map_path: str, id_map: np.ndarray, mmap: bool = True) -> Optional["IdLookup"]:
+    """
+    IdLookup over the sorted arrays saved next to the id map, memory-mapped with mmap=True.
+
+    None when the file is missing or does not belong to id_map (e.g. an export landed
+    in between); the caller then builds the lookup in memory.
+    """
+    path = id_lookup_path(id_map_path)
+    if not os.path.exists(path):
+        return None
+    lookup = np.load(path, mmap_mode="r" if mmap else None)
+    if lookup.shape != (2, len(id_map)) or not np.array_equal(id_map[lookup[1]], lookup[0]):
+        logger.warning(f"{path} does not match the loaded id map, building the id lookup in memory")
+        return None
+    return IdLookup(id_map, sorted_ids=lookup[0], order=lookup[1])
+
+
+class IdLookup:
+    """
+    BGG id -> index row lookup over sorted NumPy arrays.
+
+    Costs 16 bytes per game instead of a per-process dict entry, and supports the
+    mapping operations the engine uses (`in`, `[]`, `get`, `len`). Exports save the
+    arrays (load_id_lookup), so workers can share them memory-mapped.
+    """
+
+    def __init__(
+        self, id_map: Iterable[int], sorted_ids: Optional[np.ndarray] = None, order: Optional[np.ndarray] = None
+    ):
+        if sorted_ids is not None and order is not None:
+            self._sorted, self._order = sorted_ids, order
+            return
+        ids = np.asarray(id_map, dtype="int64")
+        self._order = np.argsort(ids, kind="stable")
+        self._sorted = ids[self._order]
+
+    def _position(self, game_id) -> int:
+        try:
+            key = int(game_id)
+        except (TypeError, ValueError):
+            return -1
+        pos = int(np.searchsorted(self._sorted, key))
+        if pos < len(self._sorted) and self._sorted[pos] == key:
+            return pos
+        return -1
+
+    def __contains__(self, game_id) -> bool:
+        return self._position(game_id) >= 0
+
+    def __getitem__(self, game_id) -> int:
+        pos = self._position(game_id)
+        if pos < 0:
+            raise KeyError(game_id)
+        return int(self._order[pos])
+
+    def get(self, game_id, default=None):
+        pos = self._position(game_id)
+        return int(self._order[pos]) if pos >= 0 else default
+
+    def rows(self, game_ids: Iterable[int]) -> np.ndarray:
+        """Index row for each game id, -1 for ids not in the index."""
+        ids = np.asarray(game_ids if isinstance(game_ids, np.ndarray) else list(game_ids), dtype="int64")
+        if not len(self._sorted):
+            return np.full(len(ids), -1, dtype="int64")
+        pos = np.minimum(np.searchsorted(self._sorted, ids), len(self._sorted) - 1)
+        return np.where(self._sorted[pos] == ids, self._order[pos], -1)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+
+def index_files_signature(*paths: str) -> Tuple[Tuple[str, float, int], ...]:
+    """(path, mtime, size) for each existing file; changes when an export lands on disk."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, st.st_mtime, st.st_size))
+    return tuple(signature)
+
+
+def to_id_index(index, id_map: List[int]) -> "faiss.IndexIDMap2":
+    """Convert a legacy positional IndexFlatIP into an IndexIDMap2 keyed by BGG id."""
+    if is_id_index(index):
+        return index
+    if index.ntotal != len(id_map):
+        raise ValueError(f"Index has {index.ntotal} vectors but id map has {len(id_map)} entries")
+    vectors = index.reconstruct_n(0, index.ntotal)
+    converted = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+    converted.add_with_ids(vectors, np.asarray(id_map, dtype="int64"))
+    return converted
+
+
+def apply_delta(index, upsert_ids: np.ndarray, upsert_vectors: np.ndarray, remove_ids: np.ndarray) -> Dict[str, int]:
+    """
+    Apply a delta to an id-keyed index in place.
+
+    Upserted ids are removed first and re-added, so a changed vector replaces the old one.
+    Vectors must already be L2-normalized (export_faiss writes them that way).
+    """
+    if not is_id_index(index):
+        raise ValueError("Deltas can only be applied to an id-keyed index (IndexIDMap)")
+
+    upsert_ids = np.asarray(upsert_ids, dtype="int64")
+    remove_ids = np.asarray(remove_ids, dtype="int64")
+    stale = np.unique(np.concatenate([upsert_ids, remove_ids]))
+
+    removed = int(index.remove_ids(stale)) if len(stale) else 0
+    if len(upsert_ids):
+        index.add_with_ids(np.ascontiguousarray(upsert_vectors, dtype="float32"), upsert_ids)
+
+    return {"upserted": int(len(upsert_ids)), "removed": int(len(remove_ids)), "replaced_rows": removed}
+
+
+def save_delta(
+    path: str,
+    upsert_ids: List[int],
+    upsert_vectors: np.ndarray,
+    remove_ids: List[int],
+    base_version: Optional[int] = None,
+    target_version: Optional[int] = None,
+) -> None:
+    """Write an index delta (taking base_version to target_version) as a compressed .npz file."""
+    dim = upsert_vectors.shape[1] if len(upsert_ids) else 0
+    versions = {}
+    if base_version is not None:
+        versions = {"base_version": np.int64(base_version), "target_version": np.int64(target_version)}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            upsert_ids=np.asarray(upsert_ids, dtype="int64"),
+            upsert_vectors=np.asarray(upsert_vectors, dtype="float32").reshape(len(upsert_ids), dim),
+            remove_ids=np.asarray(remove_ids, dtype="int64"),
+            **versions,
+        )
+    os.replace(tmp_path, path)
+
+
+def load_delta(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Read a delta written by save_delta; returns (upsert_ids, upsert_vectors, remove_ids)."""
+    with np.load(path) as data:
+        upsert_ids = data["upsert_ids"]
+        upsert_vectors = data["upsert_vectors"]
+        remove_ids = data["remove_ids"]
+    if len(upsert_ids) != len(upsert_vectors):
+        raise ValueError(f"Delta {path} has {len(upsert_ids)} ids but {len(upsert_vectors)} vectors")
+    logger.debug(f"Loaded index delta from {path}: {len(upsert_ids)} upserts, {len(remove_ids)} removals")
+    return upsert_ids, upsert_vectors, remove_ids
+
+
+def load_delta_versions(path: str) -> Tuple[Optional[int], Optional[int]]:
+    """(base_version, target_version) of a delta; (None, None) for deltas written before versioning."""
+    with np.load(path) as data:
+        if "base_version" not in data.files:
+            return None, None
+        return int(data["base_version"]), int(data["target_version"])
@@ -1,32 +1,97 @@
 import argparse
-import sqlite3
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+from psycopg2.extras import execute_values
 from tqdm import tqdm
 
 from backend.db import db_connection, ensure_schema
 
+# (label, vocab table, link table, link column) in the order they appear in the profile text
+FACETS: List[Tuple[str, str, str, str]] = [
+    ("Mechanics", "mechanics", "game_mechanics", "mechanic_id"),
+    ("Categories", "categories", "game_categories", "category_id"),
+    ("Families", "families", "game_families", "family_id"),
+    ("Designers", "designers", "game_designers", "designer_id"),
+    ("Artists", "artists", "game_artists", "artist_id"),
+    ("Publishers", "publishers", "game_publishers", "publisher_id"),
+]
 
-def _fetch_one_game(conn: sqlite3.Connection, game_id: int):
-    cur = conn.execute(
-        """SELECT id, name, description, year_published, min_players, max_players,
-                      playing_time, min_playtime, max_playtime, min_age, avg_weight
-               FROM games WHERE id = ?""",
-        (game_id,),
-    )
-    return cur.fetchone()
+GAME_COLUMNS = """id, name, description, year_published, min_players, max_players,
+                  playing_time, min_playtime, max_playtime, min_age, avg_weight"""
+
+STREAM_ITERSIZE = 5000
+UPSERT_PAGE_SIZE = 1000
 
 
-def _fetch_names(conn: sqlite3.Connection, sql: str, game_id: int) -> List[str]:
-    cur = conn.execute(sql, (game_id,))
-    return [row[0] for row in cur.fetchall()]
+def _stream(conn, name: str, sql: str, params: Optional[tuple] = None) -> Iterator[tuple]:
+    """Iterate over a query through a server-side (named) cursor so large tables are never fully buffered."""
+    with conn.cursor(name=name) as cur:
+        cur.itersize = STREAM_ITERSIZE
+        cur.execute(sql, params)
+        for row in cur:
+            yield row
 
 
-def build_profile_text(conn: sqlite3.Connection, game_id: int) -> str:
-    row = _fetch_one_game(conn, game_id)
-    if row is None:
+def _target_filter(rebuild_all: bool, alias: str) -> str:
+    """SQL predicate restricting rows to games that still need a profile."""
+    if rebuild_all:
         return ""
+    return f"""WHERE NOT EXISTS (
+                   SELECT 1 FROM game_profiles p WHERE p.game_id = {alias}
+               )"""
+
+
+def count_games(conn, rebuild_all: bool) -> int:
+    """Number of games that need a profile."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM games g {_target_filter(rebuild_all, 'g.id')}")
+        return cur.fetchone()[0]
+
+
+def iter_games_with_facets(conn, rebuild_all: bool) -> Iterator[Tuple[tuple, Dict[str, List[str]]]]:
+    """
+    Stream (game row, {label: [names sorted by name]}) for the games that need a profile.
+
+    The games query and one query per facet table are all ordered by game id and read
+    through server-side cursors side by side, so only the current game is in memory.
+    """
+    games = _stream(
+        conn,
+        "profile_games",
+        f"""SELECT {GAME_COLUMNS}
+            FROM games g
+            {_target_filter(rebuild_all, "g.id")}
+            ORDER BY g.id""",
+    )
+    links = []
+    for label, vocab_table, link_table, link_col in FACETS:
+        sql = f"""SELECT l.game_id, v.name
+                  FROM {link_table} l
+                  JOIN {vocab_table} v ON v.id = l.{link_col}
+                  {_target_filter(rebuild_all, "l.game_id")}
+                  ORDER BY l.game_id, v.name"""
+        rows = _stream(conn, f"profile_{link_table}", sql)
+        links.append([label, rows, next(rows, None)])
+
+    for row in games:
+        game_id = row[0]
+        facets: Dict[str, List[str]] = {}
+        for link in links:
+            label, rows, pending = link
+            # Skip links of games without a row; they sort before the current game
+            while pending is not None and pending[0] < game_id:
+                pending = next(rows, None)
+            while pending is not None and pending[0] == game_id:
+                facets.setdefault(label, []).append(pending[1])
+                pending = next(rows, None)
+            link[2] = pending
+        yield row, facets
+
 
+def format_profile_text(row: Sequence[Any], facets: Dict[str, List[str]]) -> str:
+    """Render the profile text for one game row and its facet names."""
     (
         _id,
         name,
@@ -41,66 +106,6 @@ def build_profile_text(conn: sqlite3.Connection, game_id: int) -> str:
         avg_weight,
     ) = row
 
-    mechanics = _fetch_names(
-        conn,
-        """SELECT m.name
-               FROM mechanics m
-               JOIN game_mechanics gm ON gm.mechanic_id = m.id
-               WHERE gm.game_id = ?
-               ORDER BY m.name""",
-        game_id,
-    )
-
-    categories = _fetch_names(
-        conn,
-        """SELECT c.name
-               FROM categories c
-               JOIN game_categories gc ON gc.category_id = c.id
-               WHERE gc.game_id = ?
-               ORDER BY c.name""",
-        game_id,
-    )
-
-    families = _fetch_names(
-        conn,
-        """SELECT f.name
-               FROM families f
-               JOIN game_families gf ON gf.family_id = f.id
-               WHERE gf.game_id = ?
-               ORDER BY f.name""",
-        game_id,
-    )
-
-    designers = _fetch_names(
-        conn,
-        """SELECT d.name
-               FROM designers d
-               JOIN game_designers gd ON gd.designer_id = d.id
-               WHERE gd.game_id = ?
-               ORDER BY d.name""",
-        game_id,
-    )
-
-    artists = _fetch_names(
-        conn,
-        """SELECT a.name
-               FROM artists a
-               JOIN game_artists ga ON ga.artist_id = a.id
-               WHERE ga.game_id = ?
-               ORDER BY a.name""",
-        game_id,
-    )
-
-    publishers = _fetch_names(
-        conn,
-        """SELECT p.name
-               FROM publishers p
-               JOIN game_publishers gp ON gp.publisher_id = p.id
-               WHERE gp.game_id = ?
-               ORDER BY p.name""",
-        game_id,
-    )
-
     lines = []
 
     if name:
@@ -128,66 +133,133 @@ def build_profile_text(conn: sqlite3.Connection, game_id: int) -> str:
     if description:
         lines.append(f"Description: {description.strip()}")
 
-    if mechanics:
-        lines.append("Mechanics: " + ", ".join(mechanics))
-    if categories:
-        lines.append("Categories: " + ", ".join(categories))
-    if families:
-        lines.append("Families: " + ", ".join(families))
-    if designers:
-        lines.append("Designers: " + ", ".join(designers))
-    if artists:
-        lines.append("Artists: " + ", ".join(artists))
-    if publishers:
-        lines.append("Publishers: " + ", ".join(publishers))
+    for label, _vocab, _link, _col in FACETS:
+        names = facets.get(label)
+        if names:
+            lines.append(f"{label}: " + ", ".join(names))
 
     return "\n".join(lines)
 
 
+def _format_chunk(chunk: List[Tuple[Sequence[Any], Dict[str, List[str]]]]) -> List[Tuple[int, str]]:
+    return [(row[0], format_profile_text(row, facets)) for row, facets in chunk]
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def build_profiles(
+    items: Iterable[Tuple[Sequence[Any], Dict[str, List[str]]]],
+    workers: int = 1,
+    chunk_size: int = 2000,
+) -> Iterable[Tuple[int, str]]:
+    """Assemble (game_id, profile_text) pairs from (row, facets) items, optionally across a process pool."""
+    if workers <= 1:
+        for chunk in _chunks(items, chunk_size):
+            yield from _format_chunk(chunk)
+        return
+
+    # Keep at most a few chunks per worker in flight so the input stream is not read ahead entirely
+    chunks = _chunks(items, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            window = list(islice(chunks, workers * 2))
+            if not window:
+                return
+            for result in pool.map(_format_chunk, window):
+                yield from result
+
+
+def build_profile_text(conn, game_id: int) -> str:
+    """Build the profile text for a single game (used for ad-hoc rebuilds)."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {GAME_COLUMNS} FROM games WHERE id = %s", (game_id,))
+        row = cur.fetchone()
+        if row is None:
+            return ""
+        facets: Dict[str, List[str]] = {}
+        for label, vocab_table, link_table, link_col in FACETS:
+            cur.execute(
+                f"""SELECT v.name
+                    FROM {link_table} l
+                    JOIN {vocab_table} v ON v.id = l.{link_col}
+                    WHERE l.game_id = %s
+                    ORDER BY v.name""",
+                (game_id,),
+            )
+            facets[label] = [r[0] for r in cur.fetchall()]
+    return format_profile_text(row, facets)
+
+
+def upsert_profiles(conn, pairs: Iterable[Tuple[int, str]], page_size: int = UPSERT_PAGE_SIZE) -> int:
+    """Bulk upsert profile texts; returns the number of rows written."""
+    sql = """INSERT INTO game_profiles (game_id, profile_text)
+             VALUES %s
+             ON CONFLICT (game_id) DO UPDATE SET
+                 profile_text = EXCLUDED.profile_text"""
+    written = 0
+    batch: List[Tuple[int, str]] = []
+    with conn.cursor() as cur:
+        for gid, text in pairs:
+            if not text:
+                continue
+            batch.append((gid, text))
+            if len(batch) >= page_size:
+                execute_values(cur, sql, batch, page_size=page_size)
+                written += len(batch)
+                batch = []
+        if batch:
+            execute_values(cur, sql, batch, page_size=page_size)
+            written += len(batch)
+    return written
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Build semantic profile texts for games (for embeddings)."
     )
-    parser.add_argument("--db", required=True, help="Path to SQLite DB.")
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Deprecated (SQLite path); ignored. The DATABASE_URL connection is used.",
+    )
     parser.add_argument(
         "--rebuild-all",
         type=int,
         default=0,
         help="If 1, rebuild profiles for all games; else only missing profiles.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to format profile texts.",
+    )
     args = parser.parse_args()
     rebuild_all = bool(args.rebuild_all)
 
-    with db_connection(args.db) as conn:
+    with db_connection() as conn:
         ensure_schema(conn)
 
-        if rebuild_all:
-            cur = conn.execute("SELECT id FROM games ORDER BY id")
-        else:
-            cur = conn.execute(
-                """SELECT g.id
-                       FROM games g
-                       LEFT JOIN game_profiles p ON p.game_id = g.id
-                       WHERE p.game_id IS NULL
-                       ORDER BY g.id"""
-            )
-
-        game_ids = [row[0] for row in cur.fetchall()]
-        if not game_ids:
+        total = count_games(conn, rebuild_all)
+        if not total:
             print("No games found that need profiles.")
             return
 
-        for gid in tqdm(game_ids, desc="Building profiles"):
-            text = build_profile_text(conn, gid)
-            if not text:
-                continue
-            conn.execute(
-                """INSERT INTO game_profiles (game_id, profile_text)
-                       VALUES (?, ?)
-                       ON CONFLICT(game_id) DO UPDATE SET
-                           profile_text = excluded.profile_text""",
-                (gid, text),
-            )
+        pairs = tqdm(
+            build_profiles(iter_games_with_facets(conn, rebuild_all), workers=max(1, args.workers)),
+            total=total,
+            desc="Building profiles",
+        )
+        # The streaming cursors read the snapshot taken when they opened, so the upserts below do not affect them
+        written = upsert_profiles(conn, pairs)
+        print(f"Upserted {written} profiles")
 
 
 if __name__ == "__main__":
@@ -1,90 +1,263 @@
 import argparse
+import hashlib
 import json
-import sqlite3
-from typing import List, Tuple
+import os
+from typing import Iterator, List, Optional, Tuple
 
+import numpy as np
+from psycopg2.extras import execute_values
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 
 from backend.db import db_connection, ensure_schema
 
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(__file__), ".embed_games.checkpoint.json")
+STREAM_ITERSIZE = 2000
 
-def _fetch_profiles_to_embed(conn: sqlite3.Connection, reembed_all: bool) -> List[Tuple[int, str]]:
+
+def text_hash(text: str) -> str:
+    """Hash of a profile text; matches Postgres md5(profile_text) for UTF-8 databases."""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _load_checkpoint(path: str, model_name: str) -> int:
+    """Return the last game_id written by an interrupted run with the same model, or 0."""
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if data.get("model_name") != model_name:
+        return 0
+    return int(data.get("last_game_id") or 0)
+
+
+def _save_checkpoint(path: str, model_name: str, last_game_id: int) -> None:
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"model_name": model_name, "last_game_id": last_game_id}, f)
+    os.replace(tmp_path, path)
+
+
+def _clear_checkpoint(path: str) -> None:
+    """Forget the resume point; the next run starts from the hash comparison again."""
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def _stream_profiles_to_embed(
+    conn, model_name: str, reembed_all: bool, after_game_id: int
+) -> Iterator[Tuple[int, str]]:
+    """
+    Stream (game_id, profile_text) for profiles whose stored embedding is missing,
+    was produced by another model, or was computed from a different profile text.
+    """
     if reembed_all:
-        sql = "SELECT game_id, profile_text FROM game_profiles ORDER BY game_id"
-        cur = conn.execute(sql)
+        sql = """SELECT p.game_id, p.profile_text
+                 FROM game_profiles p
+                 WHERE p.game_id > %s
+                 ORDER BY p.game_id"""
+        params = (after_game_id,)
     else:
         sql = """SELECT p.game_id, p.profile_text
+                 FROM game_profiles p
+                 LEFT JOIN game_embeddings e ON e.game_id = p.game_id
+                 WHERE p.game_id > %s
+                   AND (e.game_id IS NULL
+                        OR e.vector IS NULL
+                        OR e.model_name <> %s
+                        OR e.text_hash IS DISTINCT FROM md5(p.profile_text))
+                 ORDER BY p.game_id"""
+        params = (after_game_id, model_name)
+
+    # WITH HOLD keeps the cursor open across the per-chunk commits below
+    with conn.cursor(name="embed_profiles", withhold=True) as cur:
+        cur.itersize = STREAM_ITERSIZE
+        cur.execute(sql, params)
+        for row in cur:
+            yield row[0], row[1]
+
+
+def _chunks(rows: Iterator[Tuple[int, str]], size: int) -> Iterator[List[Tuple[int, str]]]:
+    chunk: List[Tuple[int, str]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _count_profiles_to_embed(conn, model_name: str, reembed_all: bool, after_game_id: int) -> int:
+    with conn.cursor() as cur:
+        if reembed_all:
+            cur.execute("SELECT COUNT(*) FROM game_profiles WHERE game_id > %s", (after_game_id,))
+        else:
+            cur.execute(
+                """SELECT COUNT(*)
                    FROM game_profiles p
                    LEFT JOIN game_embeddings e ON e.game_id = p.game_id
-                   WHERE e.game_id IS NULL
-                   ORDER BY p.game_id"""
-        cur = conn.execute(sql)
-    return [(row[0], row[1]) for row in cur.fetchall()]
+                   WHERE p.game_id > %s
+                     AND (e.game_id IS NULL
+                          OR e.vector IS NULL
+                          OR e.model_name <> %s
+                          OR e.text_hash IS DISTINCT FROM md5(p.profile_text))""",
+                (after_game_id, model_name),
+            )
+        return cur.fetchone()[0]
+
+
+def write_embeddings(
+    conn, game_ids: List[int], texts: List[str], embeddings: np.ndarray, model_name: str
+) -> None:
+    """Bulk upsert float32 vectors as raw bytes together with the hash of the embedded text."""
+    embeddings = np.asarray(embeddings, dtype="float32")
+    dim = int(embeddings.shape[1])
+    rows = [
+        (gid, embeddings[i].tobytes(), dim, model_name, text_hash(text))
+        for i, (gid, text) in enumerate(zip(game_ids, texts))
+    ]
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """INSERT INTO game_embeddings (game_id, vector, dim, model_name, text_hash)
+               VALUES %s
+               ON CONFLICT (game_id) DO UPDATE SET
+                   vector = EXCLUDED.vector,
+                   vector_json = NULL,
+                   dim = EXCLUDED.dim,
+                   model_name = EXCLUDED.model_name,
+                   text_hash = EXCLUDED.text_hash""",
+            rows,
+            page_size=len(rows),
+        )
+
+
+def _embed_pass(
+    conn,
+    model,
+    pool: Optional[dict],
+    model_name: str,
+    reembed_all: bool,
+    after_game_id: int,
+    batch_size: int,
+    chunk_size: int,
+    checkpoint: str,
+) -> int:
+    """Embed the profiles after after_game_id that need it; returns how many. An empty checkpoint is not saved."""
+    total = _count_profiles_to_embed(conn, model_name, reembed_all, after_game_id)
+    if not total:
+        return 0
+
+    progress = tqdm(total=total, desc="Embedding games")
+    rows = _stream_profiles_to_embed(conn, model_name, reembed_all, after_game_id)
+    for chunk in _chunks(rows, chunk_size):
+        game_ids = [gid for gid, _ in chunk]
+        texts = [text for _, text in chunk]
+
+        if pool is not None:
+            embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        else:
+            embeddings = model.encode(
+                texts,
+                convert_to_numpy=True,
+                batch_size=batch_size,
+                show_progress_bar=False,
+            )
+
+        write_embeddings(conn, game_ids, texts, embeddings, model_name)
+        conn.commit()
+        _save_checkpoint(checkpoint, model_name, game_ids[-1])
+        progress.update(len(chunk))
+    progress.close()
+    return total
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Create/update embeddings for game profiles (Option B)."
     )
-    parser.add_argument("--db", required=True, help="Path to SQLite DB.")
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Deprecated (SQLite path); ignored. The DATABASE_URL connection is used.",
+    )
     parser.add_argument(
         "--model-name",
         default="sentence-transformers/all-MiniLM-L6-v2",
         help="Sentence-Transformers model name to use.",
     )
     parser.add_argument("--batch-size", type=int, default=32, help="Batch size for embedding.")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=2048,
+        help="Profiles encoded and committed per chunk (the resume granularity).",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="CPU encoder processes (sentence-transformers multi-process pool). 0 or 1 encodes in-process.",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=DEFAULT_CHECKPOINT,
+        help="Checkpoint file used to resume an interrupted run. Empty string disables it.",
+    )
     parser.add_argument(
         "--reembed-all",
         type=int,
         default=0,
-        help="If 1, re-embed all profiles (overwrite existing embeddings).",
+        help="If 1, re-embed all profiles (overwrite existing embeddings), even if unchanged.",
     )
 
     args = parser.parse_args()
     reembed_all = bool(args.reembed_all)
+    batch_size = max(1, args.batch_size)
+    chunk_size = max(batch_size, args.chunk_size)
 
     print(f"Loading model: {args.model_name}")
     from sentence_transformers import SentenceTransformer  # local import to avoid early import cost
-    model = SentenceTransformer(args.model_name)
-
-    with db_connection(args.db) as conn:
-        ensure_schema(conn)
-
-        pairs = _fetch_profiles_to_embed(conn, reembed_all=reembed_all)
-        if not pairs:
-            print("No profiles found that need embeddings.")
-            return
-
-        game_ids = [gid for gid, _ in pairs]
-        texts = [text for _, text in pairs]
 
-        batch_size = max(1, args.batch_size)
+    model = SentenceTransformer(args.model_name, device="cpu")
+    pool: Optional[dict] = None
+    if args.processes > 1:
+        pool = model.start_multi_process_pool(target_devices=["cpu"] * args.processes)
+        print(f"Started encoder pool with {args.processes} processes")
 
-        for i in tqdm(range(0, len(texts), batch_size), desc="Embedding games"):
-            batch_ids = game_ids[i : i + batch_size]
-            batch_texts = texts[i : i + batch_size]
+    try:
+        with db_connection() as conn:
+            ensure_schema(conn)
 
-            embeddings = model.encode(
-                batch_texts,
-                convert_to_numpy=True,
-                batch_size=batch_size,
-                show_progress_bar=False,
-            )
+            after_game_id = _load_checkpoint(args.checkpoint, args.model_name)
+            if after_game_id:
+                print(f"Resuming after game_id={after_game_id}")
+            passes = [(reembed_all, after_game_id, args.checkpoint)]
+            if after_game_id:
+                # Profiles at or below the checkpoint may have changed since the interrupted
+                # run; a catch-up pass embeds the stale ones once the rest is done. It is not
+                # checkpointed, so an interruption there resumes after the first pass.
+                passes.append((False, 0, ""))
 
-            for gid, emb in zip(batch_ids, embeddings):
-                vec_list = emb.tolist()
-                dim = len(vec_list)
-                vec_json = json.dumps(vec_list)
-                conn.execute(
-                    """INSERT INTO game_embeddings (game_id, vector_json, dim, model_name)
-                           VALUES (?, ?, ?, ?)
-                           ON CONFLICT(game_id) DO UPDATE SET
-                               vector_json = excluded.vector_json,
-                               dim = excluded.dim,
-                               model_name = excluded.model_name""",
-                    (gid, vec_json, dim, args.model_name),
+            embedded = 0
+            for pass_reembed_all, pass_after, pass_checkpoint in passes:
+                embedded += _embed_pass(
+                    conn, model, pool, args.model_name, pass_reembed_all, pass_after,
+                    batch_size, chunk_size, pass_checkpoint,
                 )
+            if not embedded:
+                print("No profiles found that need embeddings.")
+
+        # Finished cleanly
+        _clear_checkpoint(args.checkpoint)
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
 
 
 if __name__ == "__main__":
@@ -11,6 +11,7 @@ from tqdm import tqdm
 from bgg_client import fetch_thing, BGGError
 from parser import parse_game_item
 from backend.db import db_connection, ensure_schema, upsert_game, upsert_links
+from backend.game_stats import normalize_game_stats
 
 
 import logging
@@ -145,6 +146,8 @@ def main() -> None:
 
                 item = fetch_thing(gid, thing_type="boardgame", stats=True)
                 parsed = parse_game_item(item)
+                # Store rank/player-count/language stats as typed columns so queries skip the JSON
+                parsed["game"].update(normalize_game_stats(parsed["ranks"], parsed["polls"]), stats_normalized=True)
                 upsert_game(conn, parsed["game"])
                 upsert_links(conn, parsed["game"]["id"], parsed["links"])
             except BGGError as e:
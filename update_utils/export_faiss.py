@@ -1,61 +1,162 @@
 import argparse
 import json
-import sqlite3
+import os
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import faiss
 
 from backend.db import db_connection, ensure_schema
-
-
-def main():
-    parser = argparse.ArgumentParser(description="Export game_embeddings to a FAISS index.")
-    parser.add_argument("--db", required=True, help="Path to SQLite DB.")
-    parser.add_argument("--index-out", required=True, help="Path to write FAISS index file.")
-    parser.add_argument("--id-map-out", required=True, help="Path to write JSON list of game_ids.")
-    args = parser.parse_args()
-
-    with db_connection(args.db) as conn:
-        ensure_schema(conn)
-        cur = conn.execute(
-            "SELECT game_id, vector_json FROM game_embeddings ORDER BY game_id"
-        )
+from backend.similarity_engine import decode_embedding
+from backend.vector_index import (
+    apply_delta,
+    build_id_index,
+    index_ids,
+    manifest_path,
+    read_manifest,
+    save_delta,
+    save_id_array,
+    to_id_index,
+    write_manifest,
+)
+
+# Fingerprint of the stored vector, used to detect re-embedded games between exports
+FINGERPRINT_SQL = "COALESCE(md5(vector), md5(vector_json))"
+
+
+def _fetch_fingerprints(conn) -> Dict[int, str]:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT game_id, {FINGERPRINT_SQL} FROM game_embeddings ORDER BY game_id")
+        return {gid: fp for gid, fp in cur.fetchall()}
+
+
+def _fetch_vectors(conn, game_ids: Optional[List[int]] = None) -> Tuple[List[int], np.ndarray]:
+    """Fetch and decode embeddings (all of them, or only game_ids)."""
+    with conn.cursor() as cur:
+        if game_ids is None:
+            cur.execute("SELECT game_id, vector, vector_json FROM game_embeddings ORDER BY game_id")
+        else:
+            cur.execute(
+                "SELECT game_id, vector, vector_json FROM game_embeddings WHERE game_id = ANY(%s) ORDER BY game_id",
+                (list(game_ids),),
+            )
         rows = cur.fetchall()
 
-    if not rows:
-        print("No embeddings found in game_embeddings.")
-        return
-
-    game_ids = []
+    ids = []
     vectors = []
-    for gid, vjson in rows:
+    for gid, vbytes, vjson in rows:
         try:
-            vec = np.array(json.loads(vjson), dtype="float32")
+            vec = decode_embedding(vbytes, vjson)
         except Exception:
             continue
-        game_ids.append(gid)
+        ids.append(gid)
         vectors.append(vec)
-
-    if not vectors:
+    mat = np.stack(vectors, axis=0) if vectors else np.zeros((0, 0), dtype="float32")
+    return ids, mat
+
+
+def _write_outputs(
+    index, id_map_out: str, index_out: str, manifest_out: str, version: int, fingerprints: Dict[int, str]
+) -> List[int]:
+    # Write to a temp file and rename: running backends may have the old file memory-mapped
+    tmp_index = f"{index_out}.tmp"
+    faiss.write_index(index, tmp_index)
+    os.replace(tmp_index, index_out)
+    game_ids = index_ids(index).tolist()
+    # JSON for older readers plus a .npy copy the backend memory-maps
+    save_id_array(id_map_out, game_ids)
+    # Games whose vector did not decode are left out, so the next delta retries them
+    kept = set(game_ids)
+    write_manifest(manifest_out, version, {gid: fp for gid, fp in fingerprints.items() if gid in kept})
+    return game_ids
+
+
+def export_full(conn, args, manifest_out: str) -> None:
+    fingerprints = _fetch_fingerprints(conn)
+    game_ids, mat = _fetch_vectors(conn)
+    if not game_ids:
         print("No valid vectors parsed from game_embeddings.")
         return
 
-    mat = np.stack(vectors, axis=0)
-
-    # Normalize for cosine similarity via inner product
-    faiss.normalize_L2(mat)
+    # Versions keep increasing across full exports, so a delta of an older export never matches
+    version = read_manifest(manifest_out)[0] + 1 if os.path.exists(manifest_out) else 1
+    index = build_id_index(game_ids, mat)
+    _write_outputs(index, args.id_map_out, args.index_out, manifest_out, version, fingerprints)
+
+    print(f"Wrote index version {version} with {len(game_ids)} vectors (dim={mat.shape[1]}) to {args.index_out}")
+    print(f"Wrote id map to {args.id_map_out} (and .npy)")
+
+
+def export_delta(conn, args, manifest_out: str) -> None:
+    """
+    Diff current embeddings against the last export, patch the index file and write the delta.
+
+    The delta takes the last export's version to the next one; a backend only applies it
+    on top of exactly that version.
+    """
+    base_version, previous = read_manifest(manifest_out)
+    target_version = base_version + 1
+    current = _fetch_fingerprints(conn)
+
+    remove_ids = set(previous) - set(current)
+    changed = sorted(gid for gid, fp in current.items() if previous.get(gid) != fp)
+    upsert_ids, upsert_vectors = _fetch_vectors(conn, changed) if changed else ([], np.zeros((0, 0), dtype="float32"))
+    if len(upsert_ids):
+        faiss.normalize_L2(upsert_vectors)
+    # A changed vector that no longer decodes must not keep serving its stale copy
+    undecodable = set(changed) - set(upsert_ids)
+    if undecodable:
+        print(f"Removing {len(undecodable)} games whose changed vectors could not be decoded")
+    remove_ids = sorted(remove_ids | undecodable)
+
+    save_delta(args.delta_out, upsert_ids, upsert_vectors, remove_ids, base_version, target_version)
+    print(
+        f"Wrote delta {base_version} -> {target_version} with {len(upsert_ids)} upserts "
+        f"and {len(remove_ids)} removals to {args.delta_out}"
+    )
+
+    # Keep the full index file in step so a restart loads the same state
+    index = faiss.read_index(args.index_out)
+    with open(args.id_map_out, "r", encoding="utf-8") as f:
+        index = to_id_index(index, json.load(f))
+    apply_delta(index, np.asarray(upsert_ids, dtype="int64"), upsert_vectors, np.asarray(remove_ids, dtype="int64"))
+    game_ids = _write_outputs(index, args.id_map_out, args.index_out, manifest_out, target_version, current)
+    print(f"Patched {args.index_out}; index now has {len(game_ids)} vectors")
 
-    dim = mat.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(mat)
 
-    faiss.write_index(index, args.index_out)
-
-    with open(args.id_map_out, "w", encoding="utf-8") as f:
-        json.dump(game_ids, f, ensure_ascii=False)
+def main():
+    parser = argparse.ArgumentParser(description="Export game_embeddings to a FAISS index.")
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Deprecated (SQLite path); ignored. The DATABASE_URL connection is used.",
+    )
+    parser.add_argument("--index-out", required=True, help="Path to write FAISS index file.")
+    parser.add_argument("--id-map-out", required=True, help="Path to write JSON list of game_ids.")
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="Path of the export manifest (game_id -> vector fingerprint). Defaults next to --index-out.",
+    )
+    parser.add_argument(
+        "--delta-out",
+        default=None,
+        help="If set, diff against the previous export and write an index delta (.npz) here "
+        "instead of rebuilding; the existing index file is patched in place.",
+    )
+    args = parser.parse_args()
+    manifest_out = args.manifest or manifest_path(args.index_out)
 
-    print(f"Wrote index with {len(game_ids)} vectors (dim={dim}) to {args.index_out}")
-    print(f"Wrote id map to {args.id_map_out}")
+    with db_connection() as conn:
+        ensure_schema(conn)
+        if args.delta_out:
+            if not (os.path.exists(args.index_out) and os.path.exists(manifest_out)):
+                print("No previous export found; writing a full index instead of a delta.")
+                export_full(conn, args, manifest_out)
+            else:
+                export_delta(conn, args, manifest_out)
+        else:
+            export_full(conn, args, manifest_out)
 
 
 if __name__ == "__main__":
@@ -210,7 +210,7 @@ def main():
             ("game_artists", ["game_id", "artist_id"]),
             ("game_publishers", ["game_id", "publisher_id"]),
             ("game_profiles", ["game_id", "profile_text"]),
-            ("game_embeddings", ["game_id", "vector_json", "dim", "model_name"]),
+            ("game_embeddings", ["game_id", "vector_json", "dim", "model_name", "vector", "text_hash"]),
         ]
 
         # Migrate main tables first
@@ -15,12 +15,22 @@ import sys
 from psycopg2.extras import execute_values
 from typing import List, Tuple, Any
 
+# Columns newer than some SQLite databases; copied only when the source table has them
+OPTIONAL_COLUMNS = {
+    "game_embeddings": {"vector", "text_hash"},
+}
+
 def migrate_table(sqlite_conn: sqlite3.Connection, pg_conn: psycopg2.extensions.connection,
                   table_name: str, columns: List[str], batch_size: int = 1000,
                   skip_foreign_key_errors: bool = True):
     """Migrate a single table from SQLite to PostgreSQL."""
     print(f"Migrating table: {table_name}")
 
+    optional = OPTIONAL_COLUMNS.get(table_name)
+    if optional:
+        present = {row[1] for row in sqlite_conn.execute(f"PRAGMA table_info({table_name})")}
+        columns = [col for col in columns if col in present or col not in optional]
+
     # Read from SQLite
     sqlite_cur = sqlite_conn.execute(f"SELECT {', '.join(columns)} FROM {table_name}")
 
@@ -217,7 +227,7 @@ def main():
             ("game_artists", ["game_id", "artist_id"]),
             ("game_publishers", ["game_id", "publisher_id"]),
             ("game_profiles", ["game_id", "profile_text"]),
-            ("game_embeddings", ["game_id", "vector_json", "dim", "model_name"]),
+            ("game_embeddings", ["game_id", "vector_json", "dim", "model_name", "vector", "text_hash"]),
         ]
 
         # Migrate main tables first
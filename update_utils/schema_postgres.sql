@@ -20,9 +20,25 @@ CREATE TABLE IF NOT EXISTS games (
     num_ratings     INTEGER,
     num_comments    INTEGER,
     ranks_json      TEXT,
-    polls_json      TEXT
+    polls_json      TEXT,
+    -- Typed values derived from ranks_json/polls_json at ETL time (backend/game_stats.py)
+    overall_rank              INTEGER,
+    recommended_players       BIGINT,  -- Bitmask: bit n set when n players is recommended or best
+    best_player_count         INTEGER,
+    language_dependence_level INTEGER,
+    language_dependence_value TEXT,
+    language_dependence_votes INTEGER,
+    stats_normalized          BOOLEAN NOT NULL DEFAULT FALSE
 );
 
+ALTER TABLE games ADD COLUMN IF NOT EXISTS overall_rank INTEGER;
+ALTER TABLE games ADD COLUMN IF NOT EXISTS recommended_players BIGINT;
+ALTER TABLE games ADD COLUMN IF NOT EXISTS best_player_count INTEGER;
+ALTER TABLE games ADD COLUMN IF NOT EXISTS language_dependence_level INTEGER;
+ALTER TABLE games ADD COLUMN IF NOT EXISTS language_dependence_value TEXT;
+ALTER TABLE games ADD COLUMN IF NOT EXISTS language_dependence_votes INTEGER;
+ALTER TABLE games ADD COLUMN IF NOT EXISTS stats_normalized BOOLEAN NOT NULL DEFAULT FALSE;
+
 CREATE TABLE IF NOT EXISTS mechanics (
     id          INTEGER PRIMARY KEY,
     name        TEXT NOT NULL UNIQUE
@@ -109,12 +125,18 @@ CREATE TABLE IF NOT EXISTS game_profiles (
 
 CREATE TABLE IF NOT EXISTS game_embeddings (
     game_id     INTEGER PRIMARY KEY,
-    vector_json TEXT NOT NULL,
+    vector_json TEXT,  -- Legacy JSON list; new rows use vector
+    vector      BYTEA,  -- Raw float32 bytes
     dim         INTEGER NOT NULL,
     model_name  TEXT NOT NULL,
+    text_hash   TEXT,  -- md5 of the profile_text that was embedded
     FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE
 );
 
+ALTER TABLE game_embeddings ADD COLUMN IF NOT EXISTS vector BYTEA;
+ALTER TABLE game_embeddings ADD COLUMN IF NOT EXISTS text_hash TEXT;
+ALTER TABLE game_embeddings ALTER COLUMN vector_json DROP NOT NULL;
+
 -- Updated users table with OAuth support
 CREATE TABLE IF NOT EXISTS users (
     id             INTEGER PRIMARY KEY,  -- Using INTEGER to match SQLite migration
@@ -300,6 +322,49 @@ CREATE TABLE IF NOT EXISTS marketplace_entries (
 CREATE INDEX IF NOT EXISTS idx_marketplace_entries_game ON marketplace_entries(game_id);
 CREATE INDEX IF NOT EXISTS idx_marketplace_entries_marketplace ON marketplace_entries(marketplace_name);
 
+CREATE TABLE IF NOT EXISTS jobs (
+    id           SERIAL PRIMARY KEY,
+    job_type     TEXT NOT NULL,  -- e.g. 'bgg_collection_import', 'parse_rulebook', 'marketplace_search'
+    payload      TEXT NOT NULL,  -- JSON arguments for the handler
+    status       TEXT NOT NULL DEFAULT 'queued',  -- 'queued', 'running', 'completed', 'failed'
+    progress     TEXT,  -- Free-form stage reported by the handler
+    result       TEXT,  -- JSON result of the last successful run
+    error        TEXT,  -- Error of the last failed attempt
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    user_id      INTEGER,  -- Owner, if triggered by a user
+    run_after    TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- Retry backoff
+    created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at   TIMESTAMP,
+    finished_at  TIMESTAMP,
+    updated_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_by    TEXT,  -- host:pid of the process running the job
+    lease_expires_at TIMESTAMP,  -- Renewed by that process's heartbeat; once past, the job is requeued
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS locked_by TEXT;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+
+-- Top-N embedding neighbours of every game (backend/game_neighbors.py), rebuilt by the build_game_neighbors job
+CREATE TABLE IF NOT EXISTS game_neighbors (
+    game_id     INTEGER NOT NULL,
+    rank        INTEGER NOT NULL,  -- 0 = nearest
+    neighbor_id INTEGER NOT NULL,
+    similarity  REAL NOT NULL,  -- Embedding (cosine) similarity
+    meta_score  REAL NOT NULL,  -- Meta similarity with the default mechanics/categories weighting
+    index_version INTEGER,  -- Index version the row was computed from; other versions' rows are not served
+    PRIMARY KEY (game_id, rank),
+    FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE
+);
+ALTER TABLE game_neighbors ADD COLUMN IF NOT EXISTS index_version INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(job_type, run_after) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs(user_id);
+CREATE INDEX IF NOT EXISTS idx_chat_threads_user_updated ON chat_threads(user_id, updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_thread_id ON chat_messages(thread_id, id);
+CREATE INDEX IF NOT EXISTS idx_user_collections_user_added ON user_collections(user_id, added_at, game_id);
+CREATE INDEX IF NOT EXISTS idx_games_not_normalized ON games(id) WHERE NOT stats_normalized;
+
 -- Performance indexes
 CREATE INDEX IF NOT EXISTS idx_game_mechanics_game ON game_mechanics(game_id);
 CREATE INDEX IF NOT EXISTS idx_game_categories_game ON game_categories(game_id);